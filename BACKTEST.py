@@ -8,7 +8,7 @@ Indikatoren (RSI, MACD, EMA, ATR, ADX) wie im Live-System.
 
 Datenquellen:
   - yfinance (empfohlen, pip install yfinance)
-  - oder: vorberechnete Candles-Liste aus DataAgent
+  - oder: CandleFrame / Candles-Liste aus DataAgent
 
 Starten:
   python BACKTEST.py
@@ -23,11 +23,12 @@ from __future__ import annotations
 
 import math
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 import pandas as pd
 
-from DEF_INDICATORS import _AVAILABLE as _TA_AVAILABLE
+import indicator_kernels as kern
+from candle_frame import CandleFrame
 
 # ── Daten-Helper ──────────────────────────────────────────────────────────────
 
@@ -35,92 +36,60 @@ def fetch_candles_yfinance(
     symbol: str,
     period: str = "90d",
     interval: str = "1d",
-) -> List[Dict[str, Any]]:
+) -> CandleFrame:
     """
-    Lädt historische OHLCV-Daten via yfinance.
+    Lädt historische OHLCV-Daten via yfinance (über den persistenten BarStore).
     period: "1y", "2y", "5y", "90d" usw. (swing trading: 90d statt 2y)
     interval: "1d", "1h", "15m" usw.
     """
-    try:
-        import yfinance as yf
-    except ImportError:
-        raise RuntimeError(
-            "yfinance fehlt. Bitte installieren: pip install yfinance"
-        )
+    import bar_store
 
-    ticker = yf.Ticker(symbol)
-    df = ticker.history(period=period, interval=interval, auto_adjust=True)
-
-    if df.empty:
+    candles = bar_store.get_candles(symbol, period=period, interval=interval)
+    if not candles:
         raise RuntimeError(f"Keine Daten für {symbol} von yfinance erhalten.")
-
-    df = df.reset_index()
-    date_col = "Datetime" if "Datetime" in df.columns else "Date"
-
-    candles = []
-    for _, row in df.iterrows():
-        candles.append({
-            "timestamp": str(row[date_col]),
-            "open":   float(row["Open"]),
-            "high":   float(row["High"]),
-            "low":    float(row["Low"]),
-            "close":  float(row["Close"]),
-            "volume": float(row["Volume"]),
-        })
     return candles
 
 
 # ── Indikator-Berechnung (vektorisiert für Backtest) ──────────────────────────
 
-def _build_indicator_df(candles: List[Dict]) -> pd.DataFrame:
+def _build_indicator_df(candles: Union[CandleFrame, List[Dict]]) -> pd.DataFrame:
     """
     Baut DataFrame mit allen Indikatoren vektorisiert (einmalig, nicht bar-by-bar).
     """
-    if not _TA_AVAILABLE:
-        raise RuntimeError("pandas-ta fehlt. Bitte installieren: pip install pandas-ta")
-
-    import pandas_ta as ta
-
-    df = pd.DataFrame(candles)[["timestamp", "open", "high", "low", "close", "volume"]].copy()
-    df[["open", "high", "low", "close", "volume"]] = \
-        df[["open", "high", "low", "close", "volume"]].astype(float)
+    frame = CandleFrame.coerce(candles)
+    df = frame.to_dataframe()
 
-    close = df["close"]
-    high  = df["high"]
-    low   = df["low"]
-    vol   = df["volume"]
+    close = frame.close
+    high  = frame.high
+    low   = frame.low
+    vol   = frame.volume
 
     # RSI(14)
-    df["rsi"]        = ta.rsi(close, length=14)
+    df["rsi"]        = kern.rsi(close, 14)
 
     # MACD(12,26,9)
-    macd_df          = ta.macd(close, fast=12, slow=26, signal=9)
-    if macd_df is not None:
-        cols          = macd_df.columns.tolist()
-        df["macd"]    = macd_df[cols[0]]
-        df["macd_sig"]= macd_df[cols[2]]
-        df["macd_hist"]= macd_df[cols[1]]
+    macd             = kern.macd(close, fast=12, slow=26, signal=9)
+    df["macd"]       = macd["macd"]
+    df["macd_sig"]   = macd["signal"]
+    df["macd_hist"]  = macd["hist"]
 
     # ATR(14)
-    df["atr"]        = ta.atr(high, low, close, length=14)
+    df["atr"]        = kern.atr(high, low, close, 14)
 
     # EMAs
-    df["ema20"]      = ta.ema(close, length=20)
-    df["ema50"]      = ta.ema(close, length=50)
+    df["ema20"]      = kern.ema(close, 20)
+    df["ema50"]      = kern.ema(close, 50)
 
     # ADX(14)
-    adx_df           = ta.adx(high, low, close, length=14)
-    if adx_df is not None:
-        df["adx"]    = adx_df[adx_df.columns[0]]
+    df["adx"]        = kern.adx(high, low, close, 14)["adx"]
 
     # Volume MA(20)
-    df["vol_ma20"]   = ta.sma(vol, length=20)
-    df["vol_ratio"]  = vol / df["vol_ma20"]
+    df["vol_ma20"]   = kern.sma(vol, 20)
+    df["vol_ratio"]  = kern.volume_ratio(vol, 20)
 
     # MACD-Cross: +1 = bullish, -1 = bearish, 0 = kein Cross
-    if "macd" in df.columns and "macd_sig" in df.columns:
-        above          = (df["macd"] > df["macd_sig"]).astype(int)
-        df["macd_cross"] = above.diff().fillna(0).astype(int)
+    above            = (df["macd"] > df["macd_sig"]).astype(int)
+    df["macd_cross"] = above.diff().fillna(0).astype(int)
 
     return df.dropna(subset=["rsi", "atr", "ema20", "ema50"]).reset_index(drop=True)
 
@@ -335,7 +304,7 @@ def _compute_stats(
 # ── Haupt-API ─────────────────────────────────────────────────────────────────
 
 def run_backtest(
-    candles: List[Dict[str, Any]],
+    candles: Union[CandleFrame, List[Dict[str, Any]]],
     account_size: float = 100_000.0,
     max_risk_per_trade: float = 0.01,
     atr_stop_mult: float = 2.0,
@@ -346,7 +315,7 @@ def run_backtest(
     Führt einen vollständigen Backtest durch.
 
     Args:
-        candles:              OHLCV-Liste (wie DataAgent.fetch liefert)
+        candles:              CandleFrame oder OHLCV-Liste (wie DataAgent.fetch liefert)
         account_size:         Startkapital
         max_risk_per_trade:   Max. Risiko pro Trade (z.B. 0.01 = 1%)
         atr_stop_mult:        Stop-Loss = entry − mult × ATR
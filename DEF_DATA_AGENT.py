@@ -5,9 +5,25 @@ from ibapi.order import Order as IBOrder
 from ibapi.common import *
 from ibapi.ticktype import *
 
+import asyncio
+import concurrent.futures
+import itertools
+import os
+import sqlite3
 import threading
 import time
-from typing import List, Dict, Any, Optional
+from collections import deque
+from contextlib import closing
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import bar_store
+import fetch_planner
+from candle_frame import CandleFrame
+from fetch_planner import FetchPlan
+from provider_router import ProviderRouter
+from ttl_cache import TTLCache
 
 
 # ============================================================
@@ -15,35 +31,42 @@ from typing import List, Dict, Any, Optional
 # ============================================================
 
 class IBKRClient(EWrapper, EClient):
-    def __init__(self):
+    """
+    Socket-Client. Alle Callbacks werden per reqId / orderId an die
+    IBKRSession weitergereicht, die sie dem passenden offenen Request zuordnet.
+    """
+
+    def __init__(self, session: "IBKRSession"):
         EClient.__init__(self, self)
-        self.data: List[Dict[str, Any]] = []
-        self.contract_details_received: bool = False
-        self.historical_data_finished: bool = False
-        self.conid: Optional[int] = None
-        # Order tracking
-        self.next_order_id: Optional[int] = None
-        self.order_done: bool = False
-        self.order_status_data: Dict[str, Any] = {}
+        self.session = session
 
     # -------- ERROR LOGGING ----------
-    def error(self, reqId, errorCode, errorString):
+    def error(self, reqId, errorCode, errorString, advancedOrderRejectJson=""):
         print(f"[IBKRClient][ERROR] reqId={reqId}, code={errorCode}, msg={errorString}")
+        self.session._on_error(reqId, errorCode, errorString)
+
+    # -------- Verbindung ----------
+    def nextValidId(self, orderId: int):
+        self.session._on_next_valid_id(orderId)
+
+    def connectionClosed(self):
+        print("[IBKRClient] Verbindung zu TWS geschlossen")
+        self.session._on_connection_closed(self)
 
     # -------- Contract Details (für conid) ----------
     def contractDetails(self, reqId, contractDetails):
-        self.conid = contractDetails.contract.conId
-        print(f"[IBKRClient] contractDetails erhalten: conid={self.conid}")
-        self.contract_details_received = True
+        conid = contractDetails.contract.conId
+        print(f"[IBKRClient] contractDetails erhalten: reqId={reqId}, conid={conid}")
+        self.session._append(reqId, conid)
 
     def contractDetailsEnd(self, reqId):
         print(f"[IBKRClient] contractDetailsEnd für reqId={reqId}")
-        self.contract_details_received = True
+        self.session._finish(reqId)
 
     # -------- Historical Data ----------
     def historicalData(self, reqId, bar):
         # bar: BarData
-        self.data.append({
+        self.session._append(reqId, {
             "timestamp": bar.date,
             "open": float(bar.open),
             "high": float(bar.high),
@@ -51,36 +74,763 @@ class IBKRClient(EWrapper, EClient):
             "close": float(bar.close),
             "volume": float(bar.volume),
         })
-        # Erste Bar zu Debug-Zwecken
-        if len(self.data) == 1:
-            print(f"[IBKRClient] erste Historical-Bar: {bar.date}, "
-                  f"O={bar.open}, H={bar.high}, L={bar.low}, C={bar.close}, V={bar.volume}")
 
     def historicalDataEnd(self, reqId, start, end):
-        print(f"[IBKRClient] historicalDataEnd: reqId={reqId}, start={start}, end={end}, bars={len(self.data)}")
-        self.historical_data_finished = True
+        print(f"[IBKRClient] historicalDataEnd: reqId={reqId}, start={start}, end={end}")
+        self.session._finish(reqId)
 
     # -------- Order Callbacks ----------
-    def nextValidId(self, orderId: int):
-        self.next_order_id = orderId
-
     def openOrder(self, orderId, contract, order, orderState):
-        self.order_status_data.update({
-            "orderId": orderId,
-            "status": orderState.status,
-        })
+        self.session._update_order(orderId, {"orderId": orderId, "status": orderState.status})
 
     def orderStatus(self, orderId, status, filled, remaining, avgFillPrice,
                     permId, parentId, lastFillPrice, clientId, whyHeld, mktCapPrice):
-        self.order_status_data.update({
+        self.session._update_order(orderId, {
             "orderId": orderId,
             "status": status,
             "filled": float(filled),
             "remaining": float(remaining),
             "avgFillPrice": float(avgFillPrice),
         })
-        if status in {"Filled", "Submitted", "PreSubmitted"}:
-            self.order_done = True
+
+
+# ============================================================
+# Pacing für Historical Data (IB-Limits)
+# ============================================================
+
+_HIST_MAX_REQUESTS   = int(os.getenv("IBKR_HIST_MAX_REQUESTS", "60"))        # pro Fenster
+_HIST_WINDOW_SECONDS = float(os.getenv("IBKR_HIST_WINDOW_SECONDS", "600"))   # 10 Minuten
+_HIST_MAX_IN_FLIGHT  = int(os.getenv("IBKR_HIST_MAX_IN_FLIGHT", "50"))
+# Zeitzone von Bar-Zeiten ohne Suffix (formatDate=1 liefert die TWS-Login-Zeitzone)
+_HIST_DEFAULT_TZ     = os.getenv("IBKR_HISTORY_TZ", "US/Eastern")
+
+
+class _PacedJob:
+    __slots__ = ("key", "contract_key", "send", "future", "queued_at", "inner", "waiters", "abandoned", "finished")
+
+    def __init__(self, key: tuple, contract_key: Any, send: Callable[[], concurrent.futures.Future]):
+        self.key = key
+        self.contract_key = contract_key
+        self.send = send
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.queued_at = time.monotonic()
+        self.inner: Optional[concurrent.futures.Future] = None   # Future der IBKRSession, sobald gesendet
+        self.waiters = 1            # Aufrufer, die auf future warten (inkl. zusammengelegter)
+        self.abandoned = False      # alle Wartenden per Timeout ausgestiegen
+        self.finished = False
+
+
+class HistoricalPacer:
+    """
+    Warteschlange für reqHistoricalData, die die IB-Pacing-Regeln einhält:
+      - max. max_requests Requests je window_seconds (Default 60 / 10 min)
+      - max. 5 Requests je Kontrakt innerhalb von 2 s
+      - kein identischer Request innerhalb von 15 s
+      - max. max_in_flight gleichzeitig offene Requests
+
+    Identische wartende/laufende Requests werden zusammengelegt (ein Future),
+    identische Ergebnisse der letzten 15 s direkt wiederverwendet. Ein Request,
+    der wegen des Kontrakt-Limits warten muss, blockiert andere Kontrakte nicht.
+
+    Wer per Timeout aufgibt, meldet das über abandon(). Erst wenn der letzte
+    Wartende eines (zusammengelegten) Requests aufgibt, wird er aus der Queue
+    genommen bzw. sein Slot freigegeben und der IB-Request über cancel(inner)
+    verworfen – die übrigen Wartenden behalten ihr Future.
+    """
+
+    def __init__(
+        self,
+        max_requests: int = _HIST_MAX_REQUESTS,
+        window_seconds: float = _HIST_WINDOW_SECONDS,
+        max_per_contract: int = 5,
+        contract_window: float = 2.0,
+        identical_window: float = 15.0,
+        max_in_flight: int = _HIST_MAX_IN_FLIGHT,
+        cancel: Optional[Callable[[concurrent.futures.Future], None]] = None,
+    ):
+        self.max_requests = max(1, max_requests)
+        self.window_seconds = window_seconds
+        self.max_per_contract = max(1, max_per_contract)
+        self.contract_window = contract_window
+        self.identical_window = identical_window
+        self.max_in_flight = max(1, max_in_flight)
+        self._cancel = cancel
+
+        self._cond = threading.Condition()
+        self._queue: Deque[_PacedJob] = deque()
+        self._active: Dict[tuple, _PacedJob] = {}                   # key → wartend/laufend
+        self._recent: Dict[tuple, Tuple[float, Any]] = {}          # key → (t, Ergebnis)
+        self._sent: Deque[float] = deque()
+        self._sent_by_contract: Dict[Any, Deque[float]] = {}
+        self._sent_by_key: Dict[tuple, float] = {}
+        self._in_flight = 0
+        self._thread: Optional[threading.Thread] = None
+
+        self._completed = 0
+        self._failed = 0
+        self._coalesced = 0
+        self._timed_out = 0
+        self._queue_wait_total = 0.0
+
+    # ── Öffentliche API ───────────────────────────────────────────────────────
+
+    def submit(self, key: tuple, contract_key: Any, send: Callable[[], concurrent.futures.Future]) -> concurrent.futures.Future:
+        """
+        key:          identifiziert den Request (conid, Dauer, Bar-Size, ...)
+        contract_key: Kontrakt für das Per-Kontrakt-Limit
+        send():       schickt den Request ab und liefert das Future der IBKRSession
+        """
+        with self._cond:
+            now = time.monotonic()
+            hit = self._recent.get(key)
+            if hit is not None and now - hit[0] < self.identical_window:
+                self._coalesced += 1
+                done: concurrent.futures.Future = concurrent.futures.Future()
+                done.set_result(list(hit[1]))
+                return done
+            active = self._active.get(key)
+            if active is not None and not active.future.done():
+                self._coalesced += 1
+                active.waiters += 1
+                return active.future
+
+            job = _PacedJob(key, contract_key, send)
+            self._queue.append(job)
+            self._active[key] = job
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ibkr-hist-pacer")
+                self._thread.start()
+            self._cond.notify_all()
+            return job.future
+
+    def abandon(self, future: concurrent.futures.Future) -> bool:
+        """
+        Ein Wartender gibt future auf (Timeout). False, wenn future nicht vom Pacer stammt.
+        Der letzte Wartende nimmt den Job aus der Queue bzw. gibt seinen In-Flight-Slot frei.
+        """
+        with self._cond:
+            job = next((j for j in self._active.values() if j.future is future), None)
+            if job is None:
+                return False
+            job.waiters -= 1
+            if job.waiters > 0:
+                return True
+            del self._active[job.key]
+            job.abandoned = True
+            self._timed_out += 1
+            if job in self._queue:
+                self._queue.remove(job)
+                job.future.cancel()
+                self._cond.notify_all()
+                return True
+            inner = job.inner
+        # gesendet: Slot freigeben; ist send() noch unterwegs, erledigt das _run()
+        if inner is not None:
+            self._release(job, inner)
+        return True
+
+    def estimate_seconds(self, n: Optional[int] = None) -> float:
+        """Geschätzte Zeit, bis n weitere Requests (Default: alle wartenden) abgeschickt sind."""
+        with self._cond:
+            now = time.monotonic()
+            self._prune(now)
+            n = len(self._queue) if n is None else n
+            slots = list(self._sent)
+            t = now
+            for _ in range(n):
+                if len(slots) >= self.max_requests:
+                    t = max(t, slots[len(slots) - self.max_requests] + self.window_seconds)
+                slots.append(t)
+            return max(0.0, t - now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Auslastung + Durchsatz-Schätzung."""
+        eta = self.estimate_seconds()
+        with self._cond:
+            done = self._completed + self._failed
+            return {
+                "queued": len(self._queue),
+                "in_flight": self._in_flight,
+                "sent_in_window": len(self._sent),
+                "window_seconds": self.window_seconds,
+                "max_requests": self.max_requests,
+                "max_throughput_per_min": round(self.max_requests / self.window_seconds * 60, 2),
+                "completed": self._completed,
+                "failed": self._failed,
+                "coalesced": self._coalesced,
+                "timed_out": self._timed_out,
+                "avg_queue_wait_s": round(self._queue_wait_total / done, 3) if done else 0.0,
+                "eta_queue_s": round(eta, 1),
+            }
+
+    # ── Intern ────────────────────────────────────────────────────────────────
+
+    def _prune(self, now: float) -> None:
+        while self._sent and now - self._sent[0] >= self.window_seconds:
+            self._sent.popleft()
+        for ck in list(self._sent_by_contract):
+            dq = self._sent_by_contract[ck]
+            while dq and now - dq[0] >= self.contract_window:
+                dq.popleft()
+            if not dq:
+                del self._sent_by_contract[ck]
+        for k in [k for k, t in self._sent_by_key.items() if now - t >= self.identical_window]:
+            del self._sent_by_key[k]
+        for k in [k for k, (t, _) in self._recent.items() if now - t >= self.identical_window]:
+            del self._recent[k]
+
+    def _earliest(self, job: _PacedJob, now: float) -> float:
+        """Frühester Zeitpunkt, zu dem job abgeschickt werden darf."""
+        t = now
+        if len(self._sent) >= self.max_requests:
+            t = max(t, self._sent[0] + self.window_seconds)
+        per_contract = self._sent_by_contract.get(job.contract_key)
+        if per_contract is not None and len(per_contract) >= self.max_per_contract:
+            t = max(t, per_contract[-self.max_per_contract] + self.contract_window)
+        last_identical = self._sent_by_key.get(job.key)
+        if last_identical is not None:
+            t = max(t, last_identical + self.identical_window)
+        return t
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                job: Optional[_PacedJob] = None
+                while job is None:
+                    now = time.monotonic()
+                    self._prune(now)
+                    wait: Optional[float] = None
+                    if self._in_flight < self.max_in_flight:
+                        for candidate in list(self._queue):
+                            if candidate.future.cancelled():
+                                self._queue.remove(candidate)
+                                if self._active.get(candidate.key) is candidate:
+                                    del self._active[candidate.key]
+                                continue
+                            at = self._earliest(candidate, now)
+                            if at <= now:
+                                job = candidate
+                                break
+                            wait = at - now if wait is None else min(wait, at - now)
+                    if job is None:
+                        self._cond.wait(timeout=wait if wait is not None else (None if not self._queue else 1.0))
+
+                self._queue.remove(job)
+                if not job.future.set_running_or_notify_cancel():
+                    if self._active.get(job.key) is job:
+                        del self._active[job.key]
+                    continue
+                self._sent.append(now)
+                self._sent_by_contract.setdefault(job.contract_key, deque()).append(now)
+                self._sent_by_key[job.key] = now
+                self._in_flight += 1
+                self._queue_wait_total += now - job.queued_at
+
+            try:
+                inner = job.send()
+            except Exception as exc:
+                self._finish(job, None, exc)
+                continue
+            with self._cond:
+                job.inner = inner
+                abandoned = job.abandoned
+            if abandoned:
+                self._release(job, inner)
+                continue
+            inner.add_done_callback(lambda f, j=job: self._on_done(j, f))
+
+    def _on_done(self, job: _PacedJob, inner: concurrent.futures.Future) -> None:
+        if inner.cancelled():
+            self._finish(job, None, ConnectionError("IBKR-Request abgebrochen"))
+        elif inner.exception() is not None:
+            self._finish(job, None, inner.exception())
+        else:
+            self._finish(job, inner.result(), None)
+
+    def _release(self, job: _PacedJob, inner: concurrent.futures.Future) -> None:
+        """Aufgegebenen, gesendeten Job beenden: Slot frei, IB-Request über cancel() verwerfen."""
+        self._finish(job, None, TimeoutError("IBKR-History-Request aufgegeben (Timeout)"))
+        if self._cancel is not None:
+            self._cancel(inner)
+
+    def _finish(self, job: _PacedJob, result: Any, exc: Optional[BaseException]) -> None:
+        """Genau einmal pro gesendetem Job: In-Flight-Slot freigeben und das äußere Future setzen."""
+        with self._cond:
+            if job.finished:
+                return
+            job.finished = True
+            self._in_flight -= 1
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+            if exc is None:
+                self._completed += 1
+                self._recent[job.key] = (time.monotonic(), result)
+            else:
+                self._failed += 1
+            self._cond.notify_all()
+        try:
+            if exc is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(exc)
+        except concurrent.futures.InvalidStateError:
+            pass
+
+
+# ============================================================
+# Persistente Session (eine Verbindung, viele Requests)
+# ============================================================
+
+class IBKRRequestError(RuntimeError):
+    """TWS hat einen Request per error()-Callback abgelehnt (z.B. 200 = kein Kontrakt, 162 = History)."""
+
+    def __init__(self, req_id: int, code: int, message: str):
+        super().__init__(f"[IBKR] reqId={req_id} code={code}: {message}")
+        self.req_id = req_id
+        self.code = code
+        self.message = message
+
+
+# Daten-reqIds (History, Contract Details) liegen in einem eigenen Bereich weit
+# oberhalb der orderIds aus nextValidId – TWS meldet error() für beide über
+# dieselbe ID, eine Überschneidung würde Callbacks dem falschen Request zuordnen.
+_DATA_REQ_ID_BASE = 1_000_000_000
+
+
+def _is_ib_warning(code: int) -> bool:
+    """Info-/Warnmeldungen (Farm-Status 21xx, 399 Order-Hinweis, 10167 delayed data) beenden keinen Request."""
+    return 2100 <= code < 2200 or code in (399, 10167)
+
+
+class _PendingRequest:
+    """Offener Request: sammelt Callback-Zeilen bis zum End-Callback."""
+
+    __slots__ = ("kind", "future", "rows", "state", "created")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+        self.rows: List[Any] = []
+        self.state: Dict[str, Any] = {}
+        self.created = time.time()
+
+
+class IBKRSession:
+    """
+    Hält EINEN IBKRClient dauerhaft verbunden und multiplext beliebig viele
+    Requests darüber. Callbacks landen per reqId im passenden Future, dadurch
+    können mehrere History-/Contract-/Order-Requests gleichzeitig laufen.
+
+    - verbindet lazy beim ersten Request, wartet auf nextValidId statt fixer Pause
+    - bricht die Verbindung ab, schlagen offene Requests mit ConnectionError fehl;
+      der nächste Request verbindet automatisch neu
+    - health() liefert Verbindungsstatus + Zähler
+
+    Orders (orderId aus nextValidId) und Daten-Requests (reqId ab
+    _DATA_REQ_ID_BASE) werden in getrennten Tabellen geführt.
+    """
+
+    ORDER_DONE_STATUS = {"Filled", "Submitted", "PreSubmitted", "Cancelled", "ApiCancelled", "Inactive"}
+
+    _shared: Dict[tuple, "IBKRSession"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        client_id: int,
+        connect_timeout: float = 10.0,
+        client_factory: Callable[["IBKRSession"], IBKRClient] = IBKRClient,
+    ):
+        self.host = host
+        self.port = port
+        self.client_id = client_id
+        self.connect_timeout = connect_timeout
+        self._client_factory = client_factory
+
+        self._lock = threading.RLock()            # Zustand (_app, _pending, _orders, Zähler)
+        self._connect_lock = threading.Lock()     # serialisiert Verbindungsaufbau
+        self._app: Optional[IBKRClient] = None
+        self._ready = threading.Event()
+        self._pending: Dict[int, _PendingRequest] = {}   # reqId → History/Contract Details
+        self._orders: Dict[int, _PendingRequest] = {}    # orderId → Order
+        self._req_ids = itertools.count(_DATA_REQ_ID_BASE)
+        self._next_order_id: Optional[int] = None
+        self.history_pacer = HistoricalPacer(cancel=self._cancel_request)
+
+        self._connects = 0
+        self._disconnects = 0
+        self._connected_since: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    @classmethod
+    def shared(cls, host: str, port: int) -> "IBKRSession":
+        """Eine Session pro (host, port) im Prozess – von allen IBKRApi-Instanzen geteilt."""
+        key = (host, port)
+        with cls._shared_lock:
+            session = cls._shared.get(key)
+            if session is None:
+                with IBKRApi._client_id_lock:
+                    cid = IBKRApi._next_client_id
+                    IBKRApi._next_client_id += 1
+                session = cls._shared[key] = cls(host, port, cid)
+            return session
+
+    # ── Verbindung ────────────────────────────────────────────────────────────
+
+    @property
+    def is_connected(self) -> bool:
+        app = self._app
+        return app is not None and self._ready.is_set() and app.isConnected()
+
+    def ensure_connected(self) -> IBKRClient:
+        app = self._app
+        if app is not None and self.is_connected:
+            return app
+        with self._connect_lock:
+            if self.is_connected:
+                return self._app
+            if self._app is not None:
+                self._drop(self._app, ConnectionError("IBKR-Verbindung verloren – reconnect"))
+
+            app = self._client_factory(self)
+            with self._lock:
+                self._ready.clear()
+                self._app = app
+            print(f"[IBKRSession] Verbinde zu TWS: host={self.host}, port={self.port}, client_id={self.client_id}")
+            app.connect(self.host, self.port, self.client_id)
+            thread = threading.Thread(target=app.run, daemon=True, name=f"ibkr-reader-{self.client_id}")
+            thread.start()
+
+            # nextValidId signalisiert "verbunden" – keine fixe Pause mehr
+            if not self._ready.wait(self.connect_timeout) or not app.isConnected():
+                self._last_error = "connect_timeout"
+                self._drop(app, ConnectionError("IBKR connect timeout"))
+                raise RuntimeError(
+                    f"[IBKRSession] Keine Verbindung zu TWS {self.host}:{self.port} "
+                    f"(client_id={self.client_id}) nach {self.connect_timeout:.0f}s"
+                )
+
+            self._connects += 1
+            self._connected_since = time.time()
+            return app
+
+    def _drop(self, app: IBKRClient, exc: Exception) -> None:
+        """Verbindung verwerfen und alle offenen Requests fehlschlagen lassen."""
+        with self._lock:
+            if app is self._app:
+                self._app = None
+                self._ready.clear()
+                self._connected_since = None
+                pending = list(self._pending.values()) + list(self._orders.values())
+                self._pending, self._orders = {}, {}
+            else:
+                pending = []
+        try:
+            app.disconnect()
+        except Exception:
+            pass
+        for req in pending:
+            if not req.future.done():
+                req.future.set_exception(exc)
+
+    def close(self) -> None:
+        app = self._app
+        if app is not None:
+            self._drop(app, ConnectionError("IBKRSession geschlossen"))
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "connected": self.is_connected,
+                "host": self.host,
+                "port": self.port,
+                "client_id": self.client_id,
+                "connected_since": self._connected_since,
+                "connects": self._connects,
+                "reconnects": max(0, self._connects - 1),
+                "disconnects": self._disconnects,
+                "pending_requests": len(self._pending),
+                "open_orders": len(self._orders),
+                "last_error": self._last_error,
+                "history_pacing": self.history_pacer.stats(),
+            }
+
+    # ── Request-Routing ───────────────────────────────────────────────────────
+
+    def submit(self, kind: str, send: Callable[[IBKRClient, int], None]) -> concurrent.futures.Future:
+        """
+        Registriert einen Request unter neuer reqId und schickt ihn ab.
+        send(app, req_id) ruft die eigentliche EClient-Methode auf.
+        """
+        app = self.ensure_connected()
+        with self._lock:
+            req_id = next(self._req_ids)
+            req = self._pending[req_id] = _PendingRequest(kind)
+        try:
+            send(app, req_id)
+        except Exception:
+            with self._lock:
+                self._pending.pop(req_id, None)
+            raise
+        return req.future
+
+    def submit_order(self, send: Callable[[IBKRClient, int], None]) -> Tuple[int, concurrent.futures.Future]:
+        """Wie submit, aber mit der nächsten gültigen orderId als Schlüssel → (orderId, Future)."""
+        app = self.ensure_connected()
+        with self._lock:
+            order_id = self._next_order_id
+            self._next_order_id += 1
+            req = self._orders[order_id] = _PendingRequest("order")
+            req.state["orderId"] = order_id
+        try:
+            send(app, order_id)
+        except Exception:
+            with self._lock:
+                self._orders.pop(order_id, None)
+            raise
+        return order_id, req.future
+
+    def release_order(self, order_id: int) -> Dict[str, Any]:
+        """Order nicht weiter verfolgen; liefert den letzten bekannten Status."""
+        with self._lock:
+            req = self._orders.pop(order_id, None)
+        return dict(req.state) if req is not None else {"orderId": order_id}
+
+    def wait(self, future: concurrent.futures.Future, timeout: float, what: str) -> Any:
+        """
+        Blockiert genau bis der End-Callback (oder error()) den Request abschließt.
+        future kann vom HistoricalPacer mit anderen Aufrufern geteilt sein – bei
+        Timeout wird es daher nicht abgebrochen, sondern nur aufgegeben (_abandon).
+        """
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            self._abandon(future)
+            raise RuntimeError(f"[IBKRSession] Timeout ({timeout:.0f}s) bei {what}")
+
+    async def wait_async(self, future: concurrent.futures.Future, timeout: float, what: str) -> Any:
+        """Wie wait(), aber awaitable – blockiert keinen Event-Loop-Thread."""
+        try:
+            # shield: wait_for würde sonst beim Timeout das geteilte Future mit abbrechen
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            raise RuntimeError(f"[IBKRSession] Timeout ({timeout:.0f}s) bei {what}")
+
+    def _abandon(self, future: concurrent.futures.Future) -> None:
+        """Pacer-Future: Wartenden abmelden; direktes Session-Future: Request verwerfen."""
+        if not self.history_pacer.abandon(future):
+            self._cancel_request(future)
+
+    def _cancel_request(self, future: concurrent.futures.Future) -> None:
+        """Offenen Daten-Request zu future austragen; History-Requests auch bei TWS abbrechen."""
+        with self._lock:
+            req_id = next((rid for rid, req in self._pending.items() if req.future is future), None)
+            req = self._pending.pop(req_id) if req_id is not None else None
+            app = self._app
+        if req is None:
+            return
+        if req.kind == "historical_data" and app is not None and self.is_connected:
+            try:
+                app.cancelHistoricalData(req_id)
+            except Exception as exc:
+                print(f"[IBKRSession] cancelHistoricalData({req_id}) fehlgeschlagen: {exc}")
+        req.future.cancel()
+
+    # ── Callbacks (aus dem Reader-Thread) ─────────────────────────────────────
+
+    def _on_error(self, req_id: int, code: int, message: str) -> None:
+        """Fehler zu einem offenen Request beendet ihn sofort statt erst per Timeout."""
+        if req_id is None or req_id < 0 or _is_ib_warning(int(code)):
+            return
+        with self._lock:
+            table = self._pending if req_id >= _DATA_REQ_ID_BASE else self._orders
+            req = table.pop(req_id, None)
+            if req is None:
+                return
+            self._last_error = f"{code}: {message}"
+        if req.future.done():
+            return
+        if req.kind == "order":
+            req.state.update({"status": "Error", "errorCode": code, "errorMessage": message})
+            req.future.set_result(dict(req.state))
+        else:
+            req.future.set_exception(IBKRRequestError(req_id, code, message))
+
+    def _on_next_valid_id(self, order_id: int) -> None:
+        with self._lock:
+            if self._next_order_id is None or order_id > self._next_order_id:
+                self._next_order_id = order_id
+        self._ready.set()
+
+    def _on_connection_closed(self, app: IBKRClient) -> None:
+        # EClient.disconnect() ruft connectionClosed() selbst auf – nur die aktive
+        # Verbindung zählt, sonst Rekursion über _drop().
+        with self._lock:
+            if app is not self._app:
+                return
+            self._disconnects += 1
+            self._last_error = "connection_closed"
+        self._drop(app, ConnectionError("IBKR-Verbindung geschlossen"))
+
+    def _append(self, req_id: int, row: Any) -> None:
+        with self._lock:
+            req = self._pending.get(req_id)
+        if req is not None:
+            req.rows.append(row)
+
+    def _finish(self, req_id: int) -> None:
+        with self._lock:
+            req = self._pending.pop(req_id, None)
+        if req is not None and not req.future.done():
+            req.future.set_result(req.rows)
+
+    def _update_order(self, order_id: int, data: Dict[str, Any]) -> None:
+        with self._lock:
+            req = self._orders.get(order_id)
+            if req is None:
+                return
+            req.state.update(data)
+            done = data.get("status") in self.ORDER_DONE_STATUS
+            if done:
+                self._orders.pop(order_id, None)
+        if done and not req.future.done():
+            req.future.set_result(dict(req.state))
+
+
+# ============================================================
+# Persistenter conid-Cache (SQLite, prozessübergreifend)
+# ============================================================
+
+_CONID_DB_PATH = os.getenv("IBKR_CONID_DB", "conids.db")
+_CONID_MAX_AGE_DAYS = float(os.getenv("IBKR_CONID_MAX_AGE_DAYS", "30"))
+_CONID_PRELOAD_BATCH = 40        # IB erlaubt ~50 API-Nachrichten/Sekunde
+_SQL_IN_CHUNK = 500              # SQLite-Limit für Platzhalter pro Statement
+
+
+class ConidCache:
+    """
+    Symbol → conid, einmal aufgelöst und in einer kleinen SQLite-Tabelle
+    abgelegt, die sich alle Prozesse und IBKRApi-Instanzen teilen.
+    Davor liegt ein Dict im Speicher, damit wiederholte Lookups keine
+    Datenbankabfrage kosten. Einträge älter als max_age_days werden
+    neu bei TWS angefragt (z.B. nach Ticker-Wechsel).
+    Ist die Datenbank nicht beschreibbar, läuft der Cache nur im Speicher weiter.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age_days: Optional[float] = None):
+        self.path = path or _CONID_DB_PATH
+        days = _CONID_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.max_age_seconds = days * 86400
+        self._mem: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._db_ok: Optional[bool] = None  # None = noch nicht initialisiert
+
+    def _connect(self) -> sqlite3.Connection:
+        """Neue Verbindung pro Aufruf – thread-safe, mehrere Prozesse via WAL."""
+        return sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+
+    def _ensure_db(self) -> bool:
+        if self._db_ok is not None:
+            return self._db_ok
+        with self._lock:
+            if self._db_ok is None:
+                try:
+                    with closing(self._connect()) as conn, conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS conids (
+                                symbol      TEXT    PRIMARY KEY,
+                                conid       INTEGER NOT NULL,
+                                updated_at  REAL    NOT NULL
+                            )
+                        """)
+                    self._db_ok = True
+                except sqlite3.Error as exc:
+                    print(f"[ConidCache] SQLite nicht verfügbar ({self.path}): {exc} – nur In-Memory")
+                    self._db_ok = False
+        return self._db_ok
+
+    def get(self, symbol: str) -> Optional[int]:
+        return self.get_many([symbol]).get(symbol.upper())
+
+    def get_many(self, symbols: List[str]) -> Dict[str, int]:
+        """Bekannte conids für symbols (Großschreibung) – Speicher zuerst, Rest per SQL IN (...)."""
+        wanted = list(dict.fromkeys(s.upper() for s in symbols))
+        with self._lock:
+            found = {s: self._mem[s] for s in wanted if s in self._mem}
+        missing = [s for s in wanted if s not in found]
+        if not missing or not self._ensure_db():
+            return found
+
+        cutoff = time.time() - self.max_age_seconds
+        loaded: Dict[str, int] = {}
+        try:
+            with closing(self._connect()) as conn:
+                for i in range(0, len(missing), _SQL_IN_CHUNK):
+                    chunk = missing[i:i + _SQL_IN_CHUNK]
+                    rows = conn.execute(
+                        f"SELECT symbol, conid FROM conids "
+                        f"WHERE symbol IN ({','.join('?' * len(chunk))}) AND updated_at >= ?",
+                        (*chunk, cutoff),
+                    ).fetchall()
+                    loaded.update({sym: int(conid) for sym, conid in rows})
+        except sqlite3.Error as exc:
+            print(f"[ConidCache] Lesefehler: {exc}")
+
+        with self._lock:
+            self._mem.update(loaded)
+        found.update(loaded)
+        return found
+
+    def put(self, symbol: str, conid: int) -> None:
+        self.put_many({symbol: conid})
+
+    def put_many(self, conids: Dict[str, int]) -> None:
+        """Schreibt alle Einträge in EINER Transaktion."""
+        if not conids:
+            return
+        entries = {s.upper(): int(c) for s, c in conids.items()}
+        with self._lock:
+            self._mem.update(entries)
+        if not self._ensure_db():
+            return
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO conids (symbol, conid, updated_at) VALUES (?, ?, ?)",
+                    [(sym, conid, now) for sym, conid in entries.items()],
+                )
+        except sqlite3.Error as exc:
+            print(f"[ConidCache] Schreibfehler: {exc}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        if self._ensure_db():
+            try:
+                with closing(self._connect()) as conn, conn:
+                    conn.execute("DELETE FROM conids")
+            except sqlite3.Error as exc:
+                print(f"[ConidCache] Löschen fehlgeschlagen: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        rows = None
+        if self._ensure_db():
+            try:
+                with closing(self._connect()) as conn:
+                    rows = conn.execute("SELECT COUNT(*) FROM conids").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            return {"path": self.path, "in_memory": len(self._mem), "on_disk": rows}
+
+
+# prozessweit geteilt – jede IBKRApi ohne eigenen Cache benutzt diese Instanz
+conid_cache = ConidCache()
 
 
 # ============================================================
@@ -91,49 +841,32 @@ class IBKRApi:
     _next_client_id = 7
     _client_id_lock = threading.Lock()
 
-    def __init__(self, host: str = "127.0.0.1", port: int = 7497, client_id: int = None):
+    def __init__(self, host: str = "127.0.0.1", port: int = 7497, client_id: int = None,
+                 conids: Optional[ConidCache] = None):
         """
         host/port: TWS oder IBKR Gateway
-        client_id: eine beliebige Zahl, die noch nicht verwendet wird
+        client_id: eigene Session mit dieser Client-ID; ohne Angabe wird die
+                   prozessweit geteilte Session für host/port benutzt.
+        conids:    conid-Cache; ohne Angabe der geteilte SQLite-Cache (IBKR_CONID_DB).
         """
         self.host = host
         self.port = port
         if client_id is None:
-            with IBKRApi._client_id_lock:
-                self.client_id = IBKRApi._next_client_id
-                IBKRApi._next_client_id += 1
+            self.session = IBKRSession.shared(host, port)
         else:
-            self.client_id = client_id
-        self._conid_cache: Dict[str, int] = {}  # symbol → conid
-
-    def _run_loop(self, app: IBKRClient):
-        app.run()
-
-    def _start_app(self) -> IBKRClient:
-        app = IBKRClient()
-        with IBKRApi._client_id_lock:
-            cid = IBKRApi._next_client_id
-            IBKRApi._next_client_id += 1
-        print(f"[IBKRApi] Verbinde zu TWS: host={self.host}, port={self.port}, client_id={cid}")
-        app.connect(self.host, self.port, cid)
-
-        thread = threading.Thread(target=self._run_loop, args=(app,), daemon=True)
-        thread.start()
-        # kleine Pause, damit die Verbindung steht
-        time.sleep(1.0)
-        return app
+            self.session = IBKRSession(host, port, client_id)
+        self.client_id = self.session.client_id
+        self.conids = conids or conid_cache  # symbol → conid, prozessübergreifend
+
+    def health(self) -> Dict[str, Any]:
+        """Verbindungsstatus der zugrunde liegenden IBKRSession."""
+        return self.session.health()
 
     # -------------------------------------------------------
     # 1) conid besorgen (mit Cache)
     # -------------------------------------------------------
-    def get_conid(self, symbol: str) -> int:
-        if symbol in self._conid_cache:
-            print(f"[IBKRApi] get_conid() – Cache hit für {symbol}: {self._conid_cache[symbol]}")
-            return self._conid_cache[symbol]
-
-        print(f"[IBKRApi] get_conid() für Symbol: {symbol}")
-        app = self._start_app()
-
+    @staticmethod
+    def _stock_contract(symbol: str) -> Contract:
         sym = symbol.upper()
 
         # --- Markt-Logik ----------------------------------------------------
@@ -163,76 +896,148 @@ class IBKRApi:
         else:
             # Fallback: erstmal USD probieren
             contract.currency = "USD"
+        return contract
 
-        # Zustand zurücksetzen
-        app.contract_details_received = False
-        app.conid = None
-
-        # Anfrage starten
-        app.reqContractDetails(1, contract)
-
-        # warten, bis contractDetails / contractDetailsEnd aufgerufen
-        timeout = 10.0
-        start = time.time()
-        while not app.contract_details_received and (time.time() - start) < timeout:
-            time.sleep(0.1)
+    def _submit_conid(self, symbol: str) -> concurrent.futures.Future:
+        contract = self._stock_contract(symbol)
+        return self.session.submit(
+            "contract_details", lambda app, req_id: app.reqContractDetails(req_id, contract)
+        )
 
-        if app.conid is None:
-            app.disconnect()
+    def _store_conid(self, symbol: str, conids: List[int]) -> int:
+        if not conids:
             raise RuntimeError(f"[IBKRApi] Keine conid für Symbol {symbol} erhalten.")
-
-        conid = app.conid
-        self._conid_cache[symbol] = conid
-        app.disconnect()
+        conid = conids[0]
+        self.conids.put(symbol, conid)
         print(f"[IBKRApi] get_conid() fertig – conid = {conid} (cached)")
         return conid
 
+    def get_conid(self, symbol: str) -> int:
+        cached = self.conids.get(symbol)
+        if cached is not None:
+            print(f"[IBKRApi] get_conid() – Cache hit für {symbol}: {cached}")
+            return cached
+
+        print(f"[IBKRApi] get_conid() für Symbol: {symbol}")
+        # blockiert genau bis contractDetailsEnd (oder error) den Request abschließt
+        future = self._submit_conid(symbol)
+        conids = self.session.wait(future, timeout=10.0, what=f"reqContractDetails({symbol})")
+        return self._store_conid(symbol, conids)
+
+    async def get_conid_async(self, symbol: str) -> int:
+        cached = await asyncio.to_thread(self.conids.get, symbol)
+        if cached is not None:
+            return cached
+        await asyncio.to_thread(self.session.ensure_connected)
+        future = self._submit_conid(symbol)
+        conids = await self.session.wait_async(future, timeout=10.0, what=f"reqContractDetails({symbol})")
+        return self._store_conid(symbol, conids)
+
+    def preload_conids(self, symbols: List[str], timeout: float = 10.0) -> Dict[str, int]:
+        """
+        Löst die conids eines ganzen Universums vorab auf.
+        Bekannte Symbole kommen mit einer SQL-Abfrage aus dem Cache; nur die
+        fehlenden gehen an TWS – gleichzeitig über die geteilte Session, in
+        Blöcken von _CONID_PRELOAD_BATCH pro Sekunde (IB-Nachrichtenlimit).
+        Neue conids werden in einer Transaktion gespeichert.
+        Symbole ohne Kontrakt (Fehler 200, Timeout) werden übersprungen.
+        Rückgabe: {SYMBOL: conid} für alle auflösbaren Symbole.
+        """
+        wanted = list(dict.fromkeys(s.upper() for s in symbols))
+        known = self.conids.get_many(wanted)
+        missing = [s for s in wanted if s not in known]
+        print(f"[IBKRApi] preload_conids(): {len(known)}/{len(wanted)} aus Cache, {len(missing)} bei TWS anfragen")
+        if not missing:
+            return known
+
+        resolved: Dict[str, int] = {}
+        failed: List[str] = []
+        for i in range(0, len(missing), _CONID_PRELOAD_BATCH):
+            started = time.monotonic()
+            chunk = missing[i:i + _CONID_PRELOAD_BATCH]
+            futures = {sym: self._submit_conid(sym) for sym in chunk}
+            for sym, future in futures.items():
+                try:
+                    conids = self.session.wait(future, timeout=timeout, what=f"reqContractDetails({sym})")
+                except (IBKRRequestError, RuntimeError) as exc:
+                    print(f"[IBKRApi] preload_conids(): {sym} übersprungen – {exc}")
+                    failed.append(sym)
+                    continue
+                if conids:
+                    resolved[sym] = conids[0]
+                else:
+                    failed.append(sym)
+            if i + _CONID_PRELOAD_BATCH < len(missing):
+                time.sleep(max(0.0, 1.0 - (time.monotonic() - started)))
+
+        self.conids.put_many(resolved)
+        print(f"[IBKRApi] preload_conids(): {len(resolved)} neu aufgelöst, {len(failed)} fehlgeschlagen")
+        known.update(resolved)
+        return known
+
     # -------------------------------------------------------
     # 2) Historische Daten abrufen
     # -------------------------------------------------------
-    def get_history(self, symbol: str, days: int = 90, bar_size: str = "1 day") -> List[Dict[str, Any]]:
-        """
-        Hol historische Daten über die Socket-API (nicht Client Portal HTTP).
-        bar_size z.B.: "1 day", "1 hour", "15 mins"
-        """
-        print(f"[IBKRApi] get_history() startet für {symbol}, days={days}, bar_size={bar_size}")
-        conid = self.get_conid(symbol)
-        print(f"[IBKRApi] get_history() – benutze conid={conid}")
+    def _submit_history(self, conid: int, days: int, bar_size: str) -> concurrent.futures.Future:
+        """Reiht den Request in den HistoricalPacer ein (IB-Pacing, Coalescing)."""
+        return self.session.history_pacer.submit(
+            key=(conid, days, bar_size, "TRADES", 1),
+            contract_key=conid,
+            send=lambda: self._send_history(conid, days, bar_size),
+        )
 
-        app = self._start_app()
+    def _history_timeout(self) -> float:
+        return 60.0 + self.session.history_pacer.estimate_seconds()
 
-        app.data = []
-        app.historical_data_finished = False
+    def history_throughput(self) -> Dict[str, Any]:
+        """Pacing-Status: Warteschlange, Durchsatz, geschätzte Restzeit."""
+        return self.session.history_pacer.stats()
 
+    def _send_history(self, conid: int, days: int, bar_size: str) -> concurrent.futures.Future:
         contract = Contract()
         contract.conId = conid
         contract.secType = "STK"
         contract.exchange = "SMART"
         contract.currency = "USD"
 
-        app.reqHistoricalData(
-            reqId=1,
-            contract=contract,
-            endDateTime="",
-            durationStr=f"{days} D",
-            barSizeSetting=bar_size,
-            whatToShow="TRADES",
-            useRTH=1,
-            formatDate=1,
-            keepUpToDate=False,
-            chartOptions=[],
+        return self.session.submit(
+            "historical_data",
+            lambda app, req_id: app.reqHistoricalData(
+                reqId=req_id,
+                contract=contract,
+                endDateTime="",
+                durationStr=f"{days} D",
+                barSizeSetting=bar_size,
+                whatToShow="TRADES",
+                useRTH=1,
+                formatDate=1,
+                keepUpToDate=False,
+                chartOptions=[],
+            ),
         )
 
-        timeout = 60.0
-        start = time.time()
-        while not app.historical_data_finished and (time.time() - start) < timeout:
-            time.sleep(0.2)
+    def get_history(self, symbol: str, days: int = 90, bar_size: str = "1 day") -> List[Dict[str, Any]]:
+        """
+        Hol historische Daten über die Socket-API (nicht Client Portal HTTP).
+        bar_size z.B.: "1 day", "1 hour", "15 mins"
+        """
+        print(f"[IBKRApi] get_history() startet für {symbol}, days={days}, bar_size={bar_size}")
+        conid = self.get_conid(symbol)
+        print(f"[IBKRApi] get_history() – benutze conid={conid}")
 
-        data = app.data
-        app.disconnect()
+        future = self._submit_history(conid, days, bar_size)
+        data = self.session.wait(future, timeout=self._history_timeout(), what=f"reqHistoricalData({symbol})")
         print(f"[IBKRApi] get_history() – Anzahl empfangener Bars: {len(data)}")
         return data
 
+    async def get_history_async(self, symbol: str, days: int = 90, bar_size: str = "1 day") -> List[Dict[str, Any]]:
+        """Awaitable get_history – viele Symbole per asyncio.gather über dieselbe Verbindung."""
+        conid = await self.get_conid_async(symbol)
+        future = self._submit_history(conid, days, bar_size)
+        data = await self.session.wait_async(future, timeout=self._history_timeout(), what=f"reqHistoricalData({symbol})")
+        print(f"[IBKRApi] get_history_async() – {symbol}: {len(data)} Bars")
+        return data
+
     # -------------------------------------------------------
     # 3) Order platzieren via TWS Socket
     # -------------------------------------------------------
@@ -247,20 +1052,6 @@ class IBKRApi:
     ) -> Dict[str, Any]:
         """Platziert eine Order via TWS Socket (Paper/Live)."""
         conid = self.get_conid(symbol)
-        app = self._start_app()
-
-        app.next_order_id = None
-        app.order_done = False
-        app.order_status_data = {}
-
-        app.reqIds(-1)
-        deadline = time.time() + 10.0
-        while app.next_order_id is None and time.time() < deadline:
-            time.sleep(0.1)
-
-        if app.next_order_id is None:
-            app.disconnect()
-            raise RuntimeError(f"[IBKRApi] nextValidId Timeout für {symbol}")
 
         contract = Contract()
         contract.conId = conid
@@ -276,18 +1067,17 @@ class IBKRApi:
         if order_type in {"LMT", "LIMIT"} and limit_price is not None:
             order.lmtPrice = round(float(limit_price), 2)
 
-        order_id = app.next_order_id
-        print(f"[IBKRApi] placeOrder: {side} {qty}x {symbol} "
-              f"(conid={conid}, orderId={order_id}, type={order_type})")
-        app.placeOrder(order_id, contract, order)
+        def _send(app: IBKRClient, order_id: int) -> None:
+            print(f"[IBKRApi] placeOrder: {side} {qty}x {symbol} "
+                  f"(conid={conid}, orderId={order_id}, type={order_type})")
+            app.placeOrder(order_id, contract, order)
 
-        deadline = time.time() + 15.0
-        while not app.order_done and time.time() < deadline:
-            time.sleep(0.2)
-
-        result = dict(app.order_status_data)
-        result.setdefault("orderId", order_id)
-        app.disconnect()
+        order_id, future = self.session.submit_order(_send)
+        try:
+            result = future.result(timeout=15.0)
+        except concurrent.futures.TimeoutError:
+            # Kein finaler Status innerhalb 15s – letzten bekannten Stand zurückgeben
+            result = self.session.release_order(order_id)
         print(f"[IBKRApi] place_order Ergebnis: {result}")
         return result
 
@@ -296,92 +1086,171 @@ class IBKRApi:
 # DataAgent – Wrapper, den dein Orchestrator nutzt
 # ============================================================
 
+_HISTORY_SOURCES = ("ibkr", "yfinance")
+
+# Historien-Quellen, z.B. HISTORY_PROVIDERS=ibkr,yfinance; Reihenfolge = Startreihenfolge,
+# danach entscheidet der Router nach gemessener Latenz / offenem Circuit
+HISTORY_PROVIDERS = [
+    p for p in (p.strip() for p in os.getenv("HISTORY_PROVIDERS", "yfinance").split(",")) if p in _HISTORY_SOURCES
+] or ["yfinance"]
+
+# EIN Router für alle DataAgents im Prozess: ein Provider mit offenem Circuit ist
+# für jeden Aufrufer offen, Latenzen aller Agents landen im selben Fenster.
+history_router = ProviderRouter(
+    "history", HISTORY_PROVIDERS + [p for p in _HISTORY_SOURCES if p not in HISTORY_PROVIDERS]
+)
+
+def _ib_bar_times(stamps: List[Any], default_tz: str = _HIST_DEFAULT_TZ) -> Tuple[np.ndarray, str]:
+    """
+    IB-Bar-Zeiten → (Epoch-Sekunden, Zeitzone).
+    "20240105" (Tagesbar, Mitternacht lokal) bzw. "20240105 09:30:00 US/Eastern" sind
+    Ortszeit der Börse: mit dem Suffix (sonst default_tz) lokalisieren, dann nach UTC.
+    """
+    import pandas as pd
+
+    parts = [str(s).split() for s in stamps]
+    tz = parts[0][2] if len(parts[0]) > 2 else default_tz
+    fmt = "%Y%m%d" if len(parts[0]) == 1 else "%Y%m%d %H:%M:%S"
+    local = pd.to_datetime([" ".join(p[:2]) for p in parts], format=fmt)
+    utc = local.tz_localize(tz).tz_convert("UTC").tz_localize(None)
+    return utc.values.astype("datetime64[s]").astype(np.int64), tz
+
+
 class DataAgent:
     """
     Höhere Abstraktion: liefert Marktdaten im einheitlichen Format:
     {
       "symbol": "...",
       "timeframe": "...",
-      "candles": [ {timestamp, open, high, low, close, volume}, ... ],
+      "candles": CandleFrame,   # Spalten-Arrays; frame[-1]["close"] wie bisher
       "orderbook": None,
       "meta": {...}
     }
+    Als List[Dict] serialisiert wird erst an der GPT/JSON-Grenze.
     """
 
-    def __init__(self, ibkr_api: Optional[IBKRApi] = None):
+    def __init__(self, ibkr_api: Optional[IBKRApi] = None, providers: Optional[List[str]] = None):
+        """providers: Teilmenge von HISTORY_PROVIDERS für diesen Agent; Health teilt er mit allen (history_router)."""
         self.api = ibkr_api or IBKRApi()
+        self._fetchers: Dict[str, Callable[[str, FetchPlan], CandleFrame]] = {
+            "ibkr": self._fetch_ibkr_history,
+            "yfinance": lambda symbol, plan: self._fetch_yfinance_history(symbol, plan.period, plan.interval),
+        }
+        self.providers = [p for p in (providers or HISTORY_PROVIDERS) if p in self._fetchers] or ["yfinance"]
+        self.router = history_router
+        # zuletzt geladene Serien je (SYMBOL, interval) – gröbere Timeframes werden daraus resampelt
+        self._frames = TTLCache(max_entries=2000, default_ttl=bar_store.BAR_STORE_MAX_AGE, name="data_agent_frames")
 
     def _map_timeframe_to_yfinance(self, timeframe: str) -> (str, str):
         """
         Mappt timeframe (z.B. "1D", "1H", "15m") auf yfinance period + interval.
+        Der Zeitraum folgt aus dem Lookback der registrierten Indikatoren (fetch_planner).
         """
-        tf = timeframe.lower()
-        if tf in ("1d", "d", "1day"):
-            return "1y", "1d"
-        if tf in ("1h", "60m", "60min"):
-            return "60d", "1h"
-        if tf in ("15m", "15min"):
-            return "60d", "15m"
-        if tf in ("5m", "5min"):
-            return "30d", "5m"
-        return "1y", "1d"
-
-    def _fetch_yfinance_history(self, symbol: str, period: str, interval: str) -> List[Dict[str, Any]]:
+        plan = fetch_planner.plan(timeframe)
+        return plan.period, plan.interval
+
+    def _fetch_ibkr_history(self, symbol: str, plan: FetchPlan) -> CandleFrame:
+        """
+        Historie über die TWS-Socket-API (IBKRApi.get_history).
+        IB liefert Ortszeit ("20240105" bzw. "20240105 09:30:00 US/Eastern") – siehe _ib_bar_times.
+        """
+        rows = self.api.get_history(symbol, days=plan.ibkr_days, bar_size=plan.ibkr_bar_size)
+        if not rows:
+            raise RuntimeError(f"[DataAgent] Keine Daten für {symbol} von IBKR erhalten.")
+        ts, tz = _ib_bar_times([row["timestamp"] for row in rows])
+        for row, epoch in zip(rows, ts.tolist()):
+            row["timestamp"] = epoch
+        return CandleFrame.from_records(rows, tz=tz)
+
+    def _fetch_yfinance_history(self, symbol: str, period: str, interval: str) -> CandleFrame:
         """
         Lädt historische Daten via yfinance (kostenlos, kein TWS nötig).
+        Läuft über den persistenten BarStore – nach dem ersten Abruf werden nur
+        noch die fehlenden Bars seit dem letzten gespeicherten Timestamp geladen.
         """
-        try:
-            import yfinance as yf
-        except ImportError:
-            raise RuntimeError("yfinance fehlt. Installiere: pip install yfinance")
+        print(f"[DataAgent] Lade {symbol} (period={period}, interval={interval})")
+        candles = bar_store.get_candles(symbol, period=period, interval=interval)
 
-        print(f"[DataAgent] Lade {symbol} von yfinance (period={period}, interval={interval})")
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period=period, interval=interval, auto_adjust=True)
-
-        if df.empty:
+        if not candles:
             raise RuntimeError(f"[DataAgent] Keine Daten für {symbol} von yfinance erhalten.")
 
-        df = df.reset_index()
-        date_col = "Datetime" if "Datetime" in df.columns else "Date"
-
-        candles = []
-        for _, row in df.iterrows():
-            candles.append({
-                "timestamp": str(row[date_col]),
-                "open": float(row["Open"]),
-                "high": float(row["High"]),
-                "low": float(row["Low"]),
-                "close": float(row["Close"]),
-                "volume": float(row["Volume"]),
-            })
         print(f"[DataAgent] {symbol}: {len(candles)} Kerzen geladen")
         return candles
 
+    def prefetch(self, symbols: List[str], timeframe: str = "1D") -> Dict[str, CandleFrame]:
+        """
+        Lädt eine ganze Watchlist vorab in wenigen Multi-Ticker-Requests (BarStore.prefetch).
+        Ergebnis {SYMBOL: CandleFrame} kann per fetch(..., candles=...) weitergereicht werden.
+        """
+        plan = fetch_planner.plan(timeframe)
+        print(f"[DataAgent] Prefetch {len(symbols)} Symbole (period={plan.period}, interval={plan.interval})")
+        frames = bar_store.prefetch(symbols, period=plan.period, interval=plan.interval)
+        for symbol, frame in frames.items():
+            self._frames.set((symbol.upper(), plan.interval), frame)
+        frames = {symbol: self._shape(frame, plan) for symbol, frame in frames.items()}
+        print(f"[DataAgent] Prefetch: {len(frames)}/{len(symbols)} Symbole geladen")
+        return frames
+
+    def preload_conids(self, symbols: List[str]) -> Dict[str, int]:
+        """IBKR-conids für eine Watchlist vorab auflösen (persistenter Cache, siehe IBKRApi.preload_conids)."""
+        return self.api.preload_conids(symbols)
+
+    @staticmethod
+    def _shape(frame: CandleFrame, plan: FetchPlan) -> CandleFrame:
+        """Geladene Serie ins Ziel-Raster bringen und auf die geplanten Bars kürzen."""
+        if plan.resampled:
+            frame = frame.resample(plan.seconds)
+        return frame.tail(plan.bars)
+
+    def _from_memory(self, symbol: str, plan: FetchPlan) -> Optional[Tuple[CandleFrame, str]]:
+        """
+        Serie aus dem Speicher: dasselbe Raster, oder ein feineres, das resampelt
+        genug Bars ergibt (erster Bucket kann angeschnitten sein → verworfen).
+        """
+        key = symbol.upper()
+        frame = self._frames.get((key, plan.interval))
+        if frame is not None:
+            shaped = self._shape(frame, plan)
+            if len(shaped) >= plan.bars:
+                return shaped, plan.interval
+        for interval in fetch_planner.finer_intervals(plan.timeframe):
+            frame = self._frames.get((key, interval))
+            if frame is None:
+                continue
+            coarse = frame.resample(plan.seconds)[1:]
+            if len(coarse) >= plan.bars:
+                return coarse.tail(plan.bars), interval
+        return None
+
     def fetch(self,
               symbol: str,
               asset_type: str = "stock",
               market_hint: str = "US",
-              timeframe: str = "1D") -> Dict[str, Any]:
-
+              timeframe: str = "1D",
+              candles: Optional[CandleFrame] = None,
+              bars: Optional[int] = None) -> Dict[str, Any]:
+        """
+        candles: bereits geladene Kerzen (z.B. aus prefetch) – dann kein eigener Download.
+        bars: benötigte Bars inkl. Aufwärmphase; Default aus fetch_planner (registrierte Lookbacks).
+        Zuerst Speicher (gleiches oder feineres, resampeltes Raster), dann Provider.
+        """
         if asset_type == "fx":
             raise NotImplementedError("FX ist noch nicht implementiert.")
 
-        period, interval = self._map_timeframe_to_yfinance(timeframe)
-        raw_bars = self._fetch_yfinance_history(symbol, period=period, interval=interval)
-
-        candles = []
-        for b in raw_bars:
-            candles.append(
-                {
-                    "timestamp": b["timestamp"],
-                    "open": float(b["open"]),
-                    "high": float(b["high"]),
-                    "low": float(b["low"]),
-                    "close": float(b["close"]),
-                    "volume": float(b["volume"]),
-                }
-            )
+        plan = fetch_planner.plan(timeframe, bars)
+        source = "yfinance"
+        interval = plan.interval
+        if candles is None or len(candles) == 0:
+            cached = self._from_memory(symbol, plan)
+            if cached is not None:
+                candles, interval = cached
+                source = "memory"
+            else:
+                # schnellster gesunder Provider; wirft er, kommt der nächste dran
+                routed = self.router.call(lambda provider: self._fetchers[provider](symbol, plan),
+                                          candidates=self.providers)
+                self._frames.set((symbol.upper(), plan.interval), routed.value)
+                candles, source = self._shape(routed.value, plan), routed.provider
 
         return {
             "symbol": symbol,
@@ -389,9 +1258,11 @@ class DataAgent:
             "candles": candles,
             "orderbook": None,
             "meta": {
-                "source_api": "yfinance",
+                "source_api": source,
                 "market": market_hint,
-                "period": period,
+                "period": plan.period,
+                "interval": interval,
+                "bars": len(candles),
             },
         }
 
@@ -1,15 +1,15 @@
 # DEF_GPT_AGENTS.py
 from typing import Dict, Any, Callable, List, Optional
+import asyncio
+import functools
 import json
-import time
 import threading
+import time
 import concurrent.futures
-try:
-  from openai import OpenAI  # type: ignore
-except ImportError:  # pragma: no cover - optional dependency
-  OpenAI = None  # type: ignore[assignment]
 
-client = OpenAI() if OpenAI is not None else None
+import gpt_cache
+import gpt_engine  # ein Event-Loop + HTTP-Pool + globales In-Flight-Limit für alle GPT-Requests
+import gpt_payload  # kompaktes JSON; CandleFrame → List[Dict] erst hier (GPT/JSON-Grenze)
 
 # Prompts (Kurzfassungen). Passe bei Bedarf an deine Logik an.
 PROMPTS: Dict[str, str] = {
@@ -18,7 +18,7 @@ PROMPTS: Dict[str, str] = {
 
     "regime_agent": """
 Du bist der Regime-Agent in einem Trading-System.
-Input: JSON mit {symbol, timeframe, candles[], meta, indicators}.
+Input: JSON mit {symbol, market_data: {timeframe, candles, summary, meta, indicators}}.
 Vorberechnete Indikatoren in market_data.indicators: adx, adx_strength, atr_14, atr_pct, ema_trend.
 Nutze diese Werte DIREKT (nicht selbst berechnen): adx > 25 = Trend, < 25 = Range; atr_pct für Volatilität.
 Aufgabe:
@@ -375,92 +375,153 @@ Antworte AUSSCHLIESSLICH mit JSON, ohne Fließtext außerhalb des JSON.
 
 }
 
+# Kompaktes Marktdaten-Format (gpt_payload) – gilt für alle Agents mit market_data
+_MARKET_DATA_FORMAT = """
+Format von market_data:
+- candles spaltenweise, älteste zuerst: {"t": [Zeit], "o": [Open], "h": [High], "l": [Low], "c": [Close], "v": [Volumen]}
+  (Index i = eine Kerze). Nur die für deine Aufgabe relevanten letzten Kerzen.
+- summary: Kennzahlen über die gesamte geladene Historie (bars, high/low mit Zeitpunkt,
+  ret_pct über 5/20/60 Kerzen, volatility_pct, avg_volume_20, last_volume_ratio).
+"""
+for _agent in gpt_payload.ANALYSIS_AGENTS:
+    PROMPTS[_agent] = PROMPTS[_agent].rstrip("\n") + "\n" + _MARKET_DATA_FORMAT
+
 
 # ============================================================
 #  GPT-Call-Helfer / Parallel-Runner
 # ============================================================
 
-def call_gpt_agent(agent_name: str, payload: Dict[str, Any],
-                   model: str = "gpt-4.1-mini", temperature: float = 0.1) -> Dict[str, Any]:
+async def call_gpt_agent_async(agent_name: str, payload: Dict[str, Any],
+                               model: str = "gpt-4.1-mini", temperature: float = 0.1,
+                               timeout: Optional[float] = None) -> Dict[str, Any]:
     """
-    Synchronous call helper. Liefert geparstes JSON oder ein Fehler-Dict.
+    Async-Kern (läuft im gpt_engine-Loop). Liefert geparstes JSON oder ein Fehler-Dict.
+    timeout: Sekunden für den API-Request (ab Slot-Zuteilung, Default GPT_REQUEST_TIMEOUT).
     """
     if agent_name not in PROMPTS:
         return {"error": "unknown_agent", "agent_name": agent_name}
-    if client is None:
-        return {
-            "error": "openai_missing",
-            "agent_name": agent_name,
-            "message": "openai package ist nicht installiert – `pip install openai`.",
-        }
+    try:
+        gpt_engine.engine.client()
+    except RuntimeError as e:
+        return {"error": "openai_missing", "agent_name": agent_name, "message": str(e)}
 
     system_prompt = PROMPTS[agent_name]
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user",  "content": json.dumps(payload)},
-    ]
 
-    try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            response_format={"type": "json_object"},
-        )
-    except Exception as e:
-        return {"error": "api_error", "exception": repr(e), "agent_name": agent_name}
+    async def request() -> Dict[str, Any]:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user",  "content": gpt_payload.encode(payload)},
+        ]
+        try:
+            resp = await gpt_engine.engine.complete(
+                model,
+                messages,
+                temperature,
+                timeout=timeout,
+                response_format={"type": "json_object"},
+            )
+        except Exception as e:
+            return {"error": "api_error", "exception": repr(e), "agent_name": agent_name}
 
-    try:
-        text = resp.choices[0].message.content
-    except Exception as e:
-        return {"error": "bad_response", "exception": repr(e), "raw": str(resp), "agent_name": agent_name}
+        try:
+            text = resp.choices[0].message.content
+        except Exception as e:
+            return {"error": "bad_response", "exception": repr(e), "raw": str(resp), "agent_name": agent_name}
 
-    try:
-        return json.loads(text)
-    except Exception:
-        return {"raw_text": text, "parse_error": True, "agent_name": agent_name}
+        try:
+            return json.loads(text)
+        except Exception:
+            return {"raw_text": text, "parse_error": True, "agent_name": agent_name}
 
-# Concurrency-Limit für GPT-Calls
-GPT_CONCURRENCY = 3
-_gpt_semaphore = threading.BoundedSemaphore(GPT_CONCURRENCY)
+    # identische Calls (Agent, Modell, Temperatur, Prompt, Payload) kommen aus dem Antwort-Cache
+    return await gpt_cache.cache.call_async(agent_name, model, temperature, system_prompt, payload, request)
 
-def safe_call_gpt_agent(agent_name: str,
-                        payload: Dict[str, Any],
-                        model: str = "gpt-4.1-mini",
-                        temperature: float = 0.1,
-                        retries: int = 2,
-                        backoff: float = 1.5) -> Dict[str, Any]:
+
+def call_gpt_agent(agent_name: str, payload: Dict[str, Any],
+                   model: str = "gpt-4.1-mini", temperature: float = 0.1) -> Dict[str, Any]:
+    """
+    Synchronous call helper. Liefert geparstes JSON oder ein Fehler-Dict.
+    """
+    return gpt_engine.engine.run(call_gpt_agent_async(agent_name, payload, model=model, temperature=temperature))
+
+# Concurrency-Limit für GPT-Calls: EIN globales Limit im gpt_engine-Loop (GPT_MAX_IN_FLIGHT)
+GPT_CONCURRENCY = gpt_engine.engine.max_in_flight
+
+async def safe_call_gpt_agent_async(agent_name: str,
+                                    payload: Dict[str, Any],
+                                    model: str = "gpt-4.1-mini",
+                                    temperature: float = 0.1,
+                                    retries: int = 2,
+                                    backoff: float = 1.5,
+                                    timeout: Optional[float] = None) -> Dict[str, Any]:
     """
-    Semaphore + einfacher Retry/Backoff um call_gpt_agent.
+    Einfacher Retry/Backoff um call_gpt_agent_async (Warten blockiert keinen Thread).
     """
     last_exc: Optional[Exception] = None
     for attempt in range(retries + 1):
         try:
-            with _gpt_semaphore:
-                return call_gpt_agent(agent_name, payload, model=model, temperature=temperature)
+            return await call_gpt_agent_async(agent_name, payload, model=model, temperature=temperature,
+                                              timeout=timeout)
         except Exception as e:
             last_exc = e
-            time.sleep(backoff * (2 ** attempt))
+            await asyncio.sleep(backoff * (2 ** attempt))
     return {"error": "gpt_call_failed", "exception": repr(last_exc), "agent_name": agent_name}
 
+def safe_call_gpt_agent(agent_name: str,
+                        payload: Dict[str, Any],
+                        model: str = "gpt-4.1-mini",
+                        temperature: float = 0.1,
+                        retries: int = 2,
+                        backoff: float = 1.5) -> Dict[str, Any]:
+    """
+    Globales In-Flight-Limit (gpt_engine) + einfacher Retry/Backoff um call_gpt_agent.
+    """
+    return gpt_engine.engine.run(safe_call_gpt_agent_async(
+        agent_name, payload, model=model, temperature=temperature, retries=retries, backoff=backoff,
+    ))
+
+# Fallback für beliebige callables in run_calls_parallel – ein Pool pro Prozess statt pro Aufruf
+_fallback_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_fallback_lock = threading.Lock()
+
+def _submit_fallback(fn: Callable[[], Any]) -> "concurrent.futures.Future[Any]":
+    global _fallback_pool
+    with _fallback_lock:
+        if _fallback_pool is None:
+            _fallback_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=GPT_CONCURRENCY, thread_name_prefix="gpt-fallback")
+    return _fallback_pool.submit(fn)
+
 def run_calls_parallel(
     callables: List[Callable[[], Any]],
     max_workers: int = GPT_CONCURRENCY,
     per_call_timeout: float | None = None,
 ) -> List[Any]:
     """
-    Führt mehrere callables parallel aus (ThreadPool).
-    Safety: cap max_workers an GPT_CONCURRENCY und Task-Anzahl.
+    Führt mehrere callables parallel aus.
+    partial(safe_call_gpt_agent, ...) läuft als Coroutine im gpt_engine-Loop – ohne eigenen
+    Thread, begrenzt nur durch das globale In-Flight-Limit. Andere callables laufen im
+    gemeinsamen Fallback-Pool. per_call_timeout ist eine Gesamt-Deadline pro Call ab Abgabe
+    (inkl. Warten auf einen Slot); danach liefert der Call {"error": "timeout", ...}, Engine-
+    Coroutinen werden abgebrochen, noch nicht gestartete Fallback-Jobs entfernt. max_workers
+    bleibt für Kompatibilität erhalten – die Parallelität regelt das globale Limit.
     """
-    max_workers = max(1, min(max_workers or GPT_CONCURRENCY, GPT_CONCURRENCY, len(callables) or 1))
+    futures: List["concurrent.futures.Future[Any]"] = []
+    for fn in callables:
+        if isinstance(fn, functools.partial) and fn.func is safe_call_gpt_agent:
+            futures.append(gpt_engine.engine.submit(safe_call_gpt_agent_async(*fn.args, **fn.keywords)))
+        else:
+            futures.append(_submit_fallback(fn))
+    deadline = None if per_call_timeout is None else time.monotonic() + per_call_timeout
+
     results: List[Any] = [None] * len(callables)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
-        future_to_idx = {ex.submit(fn): idx for idx, fn in enumerate(callables)}
-        for fut in concurrent.futures.as_completed(future_to_idx):
-            idx = future_to_idx[fut]
-            try:
-                res = fut.result(timeout=per_call_timeout)
-            except Exception as e:
-                res = {"error": repr(e)}
-            results[idx] = res
-    return results
\ No newline at end of file
+    for idx, fut in enumerate(futures):
+        try:
+            res = fut.result(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except concurrent.futures.TimeoutError as e:
+            fut.cancel()   # Engine-Future → Task im Loop wird gecancelt (gibt Slot/Warteplatz frei)
+            res = {"error": "timeout", "exception": repr(e), "timeout": per_call_timeout}
+        except Exception as e:
+            res = {"error": repr(e)}
+        results[idx] = res
+    return results
@@ -1,48 +1,59 @@
 """
 DEF_INDICATORS.py
 
-Berechnet technische Indikatoren aus OHLCV-Candles via pandas-ta.
+Berechnet technische Indikatoren aus OHLCV-Candles (NumPy-Kernels aus indicator_kernels,
+Formeln wie pandas-ta).
 Gibt ein flaches Dict zurück, das direkt in market_data["indicators"] gespeichert wird.
-
-Installation: pip install pandas pandas-ta
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Mapping, Optional, Union
 
-try:
-    import pandas as pd
-    import pandas_ta as ta
-    _AVAILABLE = True
-except ImportError:
-    _AVAILABLE = False
+import numpy as np
 
+import feature_frame
+import fetch_planner
+import indicator_kernels as kern
+import indicator_state
+import market_context
+import returns_matrix
+from candle_frame import CandleFrame, CandlePanel
 
-def _last(series) -> Optional[float]:
-    """Letzter nicht-NaN Wert einer Series, gerundet auf 4 Stellen."""
-    if series is None:
-        return None
-    try:
-        if hasattr(series, 'dropna'):
-            clean = series.dropna()
-        else:
-            clean = series
-        if len(clean) > 0:
-            val = clean.iloc[-1]
-            return round(float(val), 4)
-    except (ValueError, TypeError, AttributeError):
-        pass
-    return None
+# Längster Indikator: EMA200 (Aufwärmphase addiert fetch_planner)
+fetch_planner.register_lookback("indicators", 200)
+
+_last = kern.last
 
 
-def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
+def _kernel_values(frame: CandleFrame) -> Dict[str, Optional[float]]:
+    """Rohwerte zum letzten Bar, voll über die Serie gerechnet (geteilter FeatureFrame)."""
+    return feature_frame.get(frame).snapshot()
+
+
+def _state_values(symbol: str, timeframe: str, frame: CandleFrame) -> Dict[str, Optional[float]]:
+    """Rohwerte aus dem inkrementellen Zustand (nur neue Bars werden gerechnet)."""
+    raw = indicator_state.values(symbol, fetch_planner.parse_timeframe(timeframe).key, frame)
+    return {k: (round(v, 4) if v is not None and k != "last_vol" else v) for k, v in raw.items()}
+
+
+def compute_indicators(
+    candles: Union[CandleFrame, List[Dict[str, Any]]],
+    symbol: Optional[str] = None,
+    timeframe: Optional[str] = None,
+    features: Optional[feature_frame.FeatureFrame] = None,
+) -> Dict[str, Any]:
     """
     Berechnet: RSI, MACD, ATR, EMA(20/50/200), Bollinger Bands,
                Volume-Ratio, ADX, Stochastic.
 
     Args:
-        candles: Liste von Dicts mit Schlüsseln open/high/low/close/volume.
+        candles: CandleFrame oder Liste von Dicts mit Schlüsseln open/high/low/close/volume.
+        symbol, timeframe: wenn gesetzt (und INDICATOR_STATE_ENABLED), wird der
+            inkrementelle Zustand aus indicator_state genutzt statt voll zu rechnen.
+        features: bereits gebauter FeatureFrame dieser Candles (z.B. weil das
+            ML-Modell ihn ohnehin braucht) – Werte kommen aus seinem Snapshot,
+            indicator_state übernimmt sie als latest.
 
     Returns:
         Dict mit rohen Werten + abgeleiteten Signalen.
@@ -50,28 +61,31 @@ def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     n = len(candles)
 
-    if not _AVAILABLE:
-        return {
-            "error": "pandas-ta nicht installiert – pip install pandas pandas-ta",
-            "candle_count": n,
-        }
-
     if n < 20:
         return {"error": f"zu wenige Candles ({n} < 20)", "candle_count": n}
 
     try:
-        df = pd.DataFrame(candles)[["open", "high", "low", "close", "volume"]].astype(float)
+        frame = CandleFrame.coerce(candles)
     except Exception as exc:
         return {"error": f"DataFrame-Fehler: {exc}", "candle_count": n}
 
-    close = df["close"]
-    high  = df["high"]
-    low   = df["low"]
-    vol   = df["volume"]
+    if features is not None:
+        raw = features.snapshot()
+        if symbol and timeframe and indicator_state.INDICATOR_STATE_ENABLED:
+            indicator_state.remember(symbol, fetch_planner.parse_timeframe(timeframe).key, raw)
+    elif symbol and timeframe and indicator_state.INDICATOR_STATE_ENABLED:
+        raw = _state_values(symbol, timeframe, frame)
+    else:
+        raw = _kernel_values(frame)
+    return _derive(n, raw)
+
+
+def _derive(n: int, raw: Dict[str, Optional[float]]) -> Dict[str, Any]:
+    """Rohwerte → Ergebnis-Dict von compute_indicators inkl. abgeleiteter Signale."""
     result: Dict[str, Any] = {"candle_count": n}
 
     # ── RSI(14) ───────────────────────────────────────────────────────────────
-    rsi_val = _last(ta.rsi(close, length=14))
+    rsi_val = raw["rsi_14"]
     result["rsi_14"] = rsi_val
     if rsi_val is not None:
         result["rsi_zone"] = (
@@ -81,15 +95,13 @@ def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
         )
 
     # ── MACD(12,26,9) ─────────────────────────────────────────────────────────
-    macd_df = ta.macd(close, fast=12, slow=26, signal=9)
-    if macd_df is not None and not macd_df.empty:
-        cols = macd_df.columns.tolist()
-        macd_v = _last(macd_df[cols[0]])
-        macd_s = _last(macd_df[cols[2]])
+    macd_v = raw["macd_value"]
+    macd_s = raw["macd_signal"]
+    if macd_v is not None:
         result["macd_value"]  = macd_v
         result["macd_signal"] = macd_s
-        result["macd_hist"]   = _last(macd_df[cols[1]])
-        if macd_v is not None and macd_s is not None:
+        result["macd_hist"]   = raw["macd_hist"]
+        if macd_s is not None:
             result["macd_cross"] = (
                 "bullish" if macd_v > macd_s
                 else "bearish" if macd_v < macd_s
@@ -97,8 +109,8 @@ def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
             )
 
     # ── ATR(14) ───────────────────────────────────────────────────────────────
-    atr_val   = _last(ta.atr(high, low, close, length=14))
-    last_close = _last(close)
+    atr_val   = raw["atr_14"]
+    last_close = raw["last_close"]
     result["atr_14"]    = atr_val
     result["last_close"] = last_close
     if atr_val and last_close:
@@ -106,7 +118,7 @@ def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
 
     # ── EMAs (20 / 50 / 200) ─────────────────────────────────────────────────
     for p in (20, 50, 200):
-        result[f"ema_{p}"] = _last(ta.ema(close, length=p)) if n >= p else None
+        result[f"ema_{p}"] = raw[f"ema_{p}"]
 
     e20, e50, e200 = result.get("ema_20"), result.get("ema_50"), result.get("ema_200")
     if e20 and e50:
@@ -118,35 +130,25 @@ def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
         result["price_vs_ema20_pct"] = round((last_close - e20) / e20 * 100, 3)
 
     # ── Bollinger Bands(20, 2) ────────────────────────────────────────────────
-    bb = ta.bbands(close, length=20, std=2)
-    if bb is not None and not bb.empty:
-        cols = bb.columns.tolist()
-        result["bb_lower"]     = _last(bb[cols[0]])
-        result["bb_mid"]       = _last(bb[cols[1]])
-        result["bb_upper"]     = _last(bb[cols[2]])
-        result["bb_bandwidth"] = _last(bb[cols[3]])
-        result["bb_pct"]       = _last(bb[cols[4]])  # 0=unteres Band, 1=oberes Band
+    for key in ("bb_lower", "bb_mid", "bb_upper", "bb_bandwidth", "bb_pct"):
+        result[key] = raw[key]
 
     # ── Volume-Ratio (aktuell vs. MA20) ──────────────────────────────────────
-    vol_ma = _last(ta.sma(vol, length=20))
-    last_vol = float(vol.iloc[-1]) if len(vol) > 0 else None
+    vol_ma = raw["vol_ma"]
+    last_vol = raw["last_vol"]
     if vol_ma and last_vol and vol_ma > 0:
         result["volume_ratio"] = round(last_vol / vol_ma, 3)
 
     # ── ADX(14) – Trendstärke ────────────────────────────────────────────────
-    adx_df = ta.adx(high, low, close, length=14)
-    if adx_df is not None and not adx_df.empty:
-        adx_val = _last(adx_df[adx_df.columns[0]])
+    adx_val = raw["adx"]
+    if adx_val is not None:
         result["adx"] = adx_val
-        if adx_val is not None:
-            result["adx_strength"] = "strong" if adx_val > 25 else "weak"
+        result["adx_strength"] = "strong" if adx_val > 25 else "weak"
 
     # ── Stochastic(14, 3, 3) ─────────────────────────────────────────────────
-    stoch = ta.stoch(high, low, close, k=14, d=3, smooth_k=3)
-    if stoch is not None and not stoch.empty:
-        cols = stoch.columns.tolist()
-        sk = _last(stoch[cols[0]])
-        sd = _last(stoch[cols[1]])
+    sk = raw["stoch_k"]
+    sd = raw["stoch_d"]
+    if sk is not None or sd is not None:
         result["stoch_k"] = sk
         result["stoch_d"] = sd
         if sk is not None and sd is not None:
@@ -164,26 +166,82 @@ def compute_indicators(candles: List[Dict[str, Any]]) -> Dict[str, Any]:
     return result
 
 
+def compute_indicators_batch(
+    candles: Union[CandlePanel, Mapping[str, Union[CandleFrame, List[Dict[str, Any]]]]],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Indikatoren für ein ganzes Universum in einem Durchgang: jede Kennzahl wird
+    spaltenweise über die Matrix Zeit × Symbole gerechnet statt pro Symbol.
+
+    Args:
+        candles: CandlePanel oder Dict Symbol → Candles (wird per CandlePanel.from_frames ausgerichtet).
+
+    Returns:
+        Dict Symbol → Ergebnis wie compute_indicators(candles_des_symbols).
+    """
+    panel = candles if isinstance(candles, CandlePanel) else CandlePanel.from_frames(candles)
+    if not panel.symbols:
+        return {}
+
+    # Lücken (Symbol ohne Bar an einem Zeitpunkt) entfernen: jede Spalte endet mit ihrem letzten Bar
+    close = kern.pack_columns(panel.close)
+    high  = kern.pack_columns(panel.high)
+    low   = kern.pack_columns(panel.low)
+    vol   = kern.pack_columns(panel.volume)
+    counts = np.count_nonzero(~np.isnan(close), axis=0)
+
+    macd = kern.macd(close, fast=12, slow=26, signal=9)
+    bb = kern.bbands(close, 20, 2.0)
+    stoch = kern.stoch(high, low, close, k=14, d=3, smooth_k=3)
+    columns = {
+        "rsi_14":       kern.rsi(close, 14),
+        "macd_value":   macd["macd"],
+        "macd_signal":  macd["signal"],
+        "macd_hist":    macd["hist"],
+        "atr_14":       kern.atr(high, low, close, 14),
+        "last_close":   close,
+        "ema_20":       kern.ema(close, 20),
+        "ema_50":       kern.ema(close, 50),
+        "ema_200":      kern.ema(close, 200),
+        "bb_lower":     bb["lower"],
+        "bb_mid":       bb["mid"],
+        "bb_upper":     bb["upper"],
+        "bb_bandwidth": bb["bandwidth"],
+        "bb_pct":       bb["pct"],
+        "vol_ma":       kern.sma(vol, 20),
+        "adx":          kern.adx(high, low, close, 14)["adx"],
+        "stoch_k":      stoch["k"],
+        "stoch_d":      stoch["d"],
+    }
+    snapshot = {key: kern.last_valid(values).tolist() for key, values in columns.items()}
+    last_vol = vol[-1].tolist()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for j, symbol in enumerate(panel.symbols):
+        n = int(counts[j])
+        if n < 20:
+            results[symbol] = {"error": f"zu wenige Candles ({n} < 20)", "candle_count": n}
+            continue
+        raw = {key: (None if vals[j] != vals[j] else round(vals[j], 4)) for key, vals in snapshot.items()}
+        for p in (50, 200):
+            if n < p:
+                raw[f"ema_{p}"] = None
+        raw["last_vol"] = last_vol[j]
+        results[symbol] = _derive(n, raw)
+    return results
+
+
 # ── VIX Helper (für adaptive Trailing Stops) ──────────────────────────────────
 
 def get_vix_level(vix_value: Optional[float] = None) -> float:
     """
-    Fetches VIX level (or uses provided value) for adaptive ATR multipliers.
-    Falls back to yfinance if no value provided.
-    Returns: VIX value (default 20 if fetch fails)
+    VIX level for adaptive ATR multipliers (or the provided value).
+    Served from the shared market-context snapshot – no download per call.
+    Returns: VIX value (default 20 if no data)
     """
     if vix_value is not None:
         return float(vix_value)
-
-    try:
-        import yfinance as yf
-        vix = yf.Ticker("^VIX").history(period="1d")
-        if not vix.empty:
-            return float(vix["Close"].iloc[-1])
-    except Exception:
-        pass
-
-    return 20.0  # Neutral fallback
+    return market_context.snapshot().vix
 
 
 def get_adaptive_atr_multiplier(vix_value: float) -> float:
@@ -206,32 +264,17 @@ def get_adaptive_atr_multiplier(vix_value: float) -> float:
 
 def calculate_symbol_correlation(symbol_a: str, symbol_b: str, period: str = "60d") -> Optional[float]:
     """
-    Calculates Pearson correlation between two symbols over period.
+    Calculates Pearson correlation of daily returns between two symbols over period.
+    Looked up from the shared returns matrix; symbols not yet in it are loaded in one batch.
     Args:
         symbol_a, symbol_b: Ticker symbols (e.g., "AAPL", "MSFT")
         period: yfinance period (default "60d" for 60 days)
     Returns:
-        Correlation coefficient (-1 to 1) or None if calc fails
+        Correlation coefficient (-1 to 1) or None if fewer than 20 common days
     """
     try:
-        import yfinance as yf
-        import pandas as pd
-
-        df_a = yf.download(symbol_a, period=period, progress=False)["Close"]
-        df_b = yf.download(symbol_b, period=period, progress=False)["Close"]
-
-        # Align dates
-        df_a = df_a.pct_change().dropna()
-        df_b = df_b.pct_change().dropna()
-
-        # Align indices
-        common_idx = df_a.index.intersection(df_b.index)
-        if len(common_idx) < 20:  # Need enough data points
-            return None
-
-        corr = df_a[common_idx].corr(df_b[common_idx])
-        return float(corr) if pd.notna(corr) else None
-
+        returns_matrix.engine.ensure([symbol_a, symbol_b])
+        return returns_matrix.engine.correlation(symbol_a, symbol_b, window=returns_matrix.window_for(period))
     except Exception:
         return None
 
@@ -241,6 +284,7 @@ def calculate_symbol_correlation(symbol_a: str, symbol_b: str, period: str = "60
 def compute_market_regime() -> Dict[str, Any]:
     """
     Detects broad market regime (bull/bear/neutral) via SPY and QQQ EMA20 crosses.
+    Served from the shared market-context snapshot (refreshed in the background).
 
     Returns:
         {
@@ -249,76 +293,11 @@ def compute_market_regime() -> Dict[str, Any]:
             "qqq_vs_ema20": float (% price above/below EMA20),
             "vix": float (current VIX level)
         }
+        plus "error" if SPY/QQQ data is unavailable.
 
     Logic:
         - "bull":    SPY > EMA20 AND QQQ > EMA20
         - "bear":    SPY < EMA20 AND QQQ < EMA20
         - "neutral": Mixed or VIX > 25
     """
-    try:
-        import yfinance as yf
-        import pandas as pd
-
-        # Fetch SPY and QQQ (10d, daily) – enough to calculate EMA20
-        spy_data = yf.download("SPY", period="30d", interval="1d", progress=False)
-        qqq_data = yf.download("QQQ", period="30d", interval="1d", progress=False)
-
-        if spy_data.empty or qqq_data.empty:
-            return {
-                "regime": "neutral",
-                "spy_vs_ema20": 0.0,
-                "qqq_vs_ema20": 0.0,
-                "vix": get_vix_level(),
-                "error": "Could not fetch SPY/QQQ data",
-            }
-
-        # yfinance returns multi-index DataFrame: extract Series
-        spy_close_series = spy_data["Close"].iloc[:, 0] if isinstance(spy_data["Close"], pd.DataFrame) else spy_data["Close"]
-        qqq_close_series = qqq_data["Close"].iloc[:, 0] if isinstance(qqq_data["Close"], pd.DataFrame) else qqq_data["Close"]
-
-        # Compute EMA20 for both
-        spy_ema20 = _last(ta.ema(spy_close_series, length=20)) if _AVAILABLE else None
-        qqq_ema20 = _last(ta.ema(qqq_close_series, length=20)) if _AVAILABLE else None
-
-        spy_close = float(spy_close_series.iloc[-1])
-        qqq_close = float(qqq_close_series.iloc[-1])
-
-        # Calculate % difference from EMA20
-        spy_vs_ema20 = round((spy_close - spy_ema20) / spy_ema20 * 100, 3) if spy_ema20 else 0.0
-        qqq_vs_ema20 = round((qqq_close - qqq_ema20) / qqq_ema20 * 100, 3) if qqq_ema20 else 0.0
-
-        vix = get_vix_level()
-
-        # Classify regime
-        if spy_ema20 and qqq_ema20:
-            spy_above = spy_close > spy_ema20
-            qqq_above = qqq_close > qqq_ema20
-
-            if spy_above and qqq_above:
-                regime = "bull"
-            elif not spy_above and not qqq_above:
-                regime = "bear"
-            else:
-                regime = "neutral"
-        else:
-            regime = "neutral"
-
-        # Override to neutral if VIX is very high (uncertainty)
-        if vix > 25:
-            regime = "neutral"
-
-        return {
-            "regime": regime,
-            "spy_vs_ema20": spy_vs_ema20,
-            "qqq_vs_ema20": qqq_vs_ema20,
-            "vix": vix,
-        }
-
-    except Exception as exc:
-        return {
-            "regime": "neutral",
-            "spy_vs_ema20": 0.0,
-            "qqq_vs_ema20": 0.0,
-            "vix": get_vix_level(),
-            "error": str(exc),
-        }
+    return market_context.snapshot().regime()
@@ -19,15 +19,26 @@ from __future__ import annotations
 import json
 import logging
 import os
-import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 
+import feature_frame
+import fetch_planner
+import indicator_kernels as kern
+import market_context
+from candle_frame import CandleFrame
+
+Candles = Union[CandleFrame, List[Dict[str, Any]]]
+
 logger = logging.getLogger("MLSignalEngine")
 
 MODEL_DIR = os.getenv("ML_MODEL_DIR", "models")
 
+# Längstes Feature: EMA50 + Lag 20 (Aufwärmphase addiert fetch_planner)
+fetch_planner.register_lookback("ml_features", 70)
+
 # ── Sektor-Mapping ────────────────────────────────────────────────────────────
 
 _SECTOR_MAP: Dict[str, str] = {
@@ -53,27 +64,22 @@ def _get_sector_etf(symbol: str) -> str:
 # ── Markt-Kontext ─────────────────────────────────────────────────────────────
 
 def _build_market_ctx(
-    vix_candles: List[Dict],
-    spy_candles: List[Dict],
-    sector_candles: Optional[List[Dict]] = None,
+    vix_candles: Candles,
+    spy_candles: Candles,
+    sector_candles: Optional[Candles] = None,
 ) -> pd.DataFrame:
     """
     Baut Markt-Kontext DataFrame (Index = normalisiertes Datum).
     Spalten: vix_level, vix_change_5d, spy_ema_ratio, spy_vs_ema200_pct, sector_rel_5d
     """
-    try:
-        import pandas_ta as ta
-    except ImportError:
-        return pd.DataFrame()
-
     if not vix_candles or not spy_candles:
         return pd.DataFrame()
 
-    def _to_series(candles: List[Dict], col: str = "close") -> pd.Series:
-        df = pd.DataFrame(candles)[["timestamp", col]].copy()
-        df["date"] = pd.to_datetime(df["timestamp"], utc=True).dt.normalize().dt.tz_localize(None)
-        df = df.drop_duplicates("date").set_index("date").sort_index()
-        return df[col].astype(float)
+    def _to_series(candles: Candles, col: str = "close") -> pd.Series:
+        frame = CandleFrame.coerce(candles)
+        dates = pd.to_datetime(frame.ts, unit="s", utc=True).normalize().tz_localize(None)
+        s = pd.Series(frame[col], index=dates, name=col)
+        return s[~s.index.duplicated(keep="first")].sort_index()
 
     vix_c = _to_series(vix_candles)
     spy_c = _to_series(spy_candles)
@@ -84,22 +90,16 @@ def _build_market_ctx(
     ctx["vix_level"]     = vix_aligned
     ctx["vix_change_5d"] = vix_aligned.pct_change(5) * 100
 
-    ema20  = ta.ema(spy_c, length=20)
-    ema50  = ta.ema(spy_c, length=50)
-    ema200 = ta.ema(spy_c, length=200)
-
-    # Guard against None (pandas-ta returns None when series too short)
-    if ema20 is not None and ema50 is not None:
-        ema50_safe = ema50.replace(0, float("nan"))
-        ctx["spy_ema_ratio"] = (ema20 / ema50_safe).values
-    else:
-        ctx["spy_ema_ratio"] = float("nan")
+    # zu kurze Serien → NaN-Spalten (Kernels liefern dann nur NaN)
+    spy_v  = spy_c.to_numpy()
+    ema20  = kern.ema(spy_v, 20)
+    ema50  = kern.ema(spy_v, 50)
+    ema200 = kern.ema(spy_v, 200)
+    ema50[ema50 == 0] = np.nan
+    ema200[ema200 == 0] = np.nan
 
-    if ema200 is not None:
-        ema200_safe = ema200.replace(0, float("nan"))
-        ctx["spy_vs_ema200_pct"] = ((spy_c - ema200_safe) / ema200_safe * 100).values
-    else:
-        ctx["spy_vs_ema200_pct"] = float("nan")
+    ctx["spy_ema_ratio"] = ema20 / ema50
+    ctx["spy_vs_ema200_pct"] = (spy_v - ema200) / ema200 * 100
 
     spy_ret5 = spy_c.pct_change(5)
 
@@ -113,43 +113,24 @@ def _build_market_ctx(
     return ctx
 
 
-# ── Live-Marktkontext-Cache (für predict()) ───────────────────────────────────
+# ── Live-Marktkontext (für predict()) ─────────────────────────────────────────
 
-_CTX_CACHE: Dict[str, Any] = {}
-_CTX_TTL = 900  # 15 Minuten
+# Sektor-ETFs lädt der Markt-Kontext-Dienst zusammen mit VIX/SPY/QQQ
+market_context.register_symbols(sorted(set(_SECTOR_MAP.values())))
 
 
 def _fetch_live_market_ctx(sector_etf: str = "SPY") -> Optional[pd.DataFrame]:
-    """Lädt VIX + SPY + Sektor-ETF für letzte 3 Monate via yfinance, gecacht."""
-    cache_key = sector_etf
-    cached = _CTX_CACHE.get(cache_key)
-    if cached and (time.time() - cached["ts"]) < _CTX_TTL:
-        return cached["df"]
+    """Markt-Kontext aus dem aktuellen Snapshot; einmal pro Snapshot und Sektor gebaut."""
+    snap = market_context.snapshot()
+    return snap.derived(("ml_ctx", sector_etf), lambda s: _snapshot_market_ctx(s, sector_etf))
 
+
+def _snapshot_market_ctx(snap: "market_context.MarketSnapshot", sector_etf: str) -> Optional[pd.DataFrame]:
     try:
-        import yfinance as yf
-
-        def _yf_candles(ticker: str) -> List[Dict]:
-            df = yf.Ticker(ticker).history(period="3mo", interval="1d", auto_adjust=True)
-            if df is None or df.empty:
-                return []
-            df = df.reset_index()
-            ts_col = "Datetime" if "Datetime" in df.columns else "Date"
-            return [
-                {
-                    "timestamp": str(row[ts_col]),
-                    "close": float(row["Close"]),
-                }
-                for _, row in df.iterrows()
-            ]
-
-        vix_c = _yf_candles("^VIX")
-        spy_c = _yf_candles("SPY")
-        sec_c = _yf_candles(sector_etf) if sector_etf != "SPY" else None
-
-        ctx = _build_market_ctx(vix_c, spy_c, sec_c)
-        _CTX_CACHE[cache_key] = {"df": ctx, "ts": time.time()}
-        return ctx
+        vix_c = snap.series("^VIX")
+        spy_c = snap.series("SPY")
+        sec_c = snap.series(sector_etf) if sector_etf != "SPY" else None
+        return _build_market_ctx(vix_c, spy_c, sec_c)
 
     except Exception as exc:
         logger.warning("[ML] Live-Marktkontext Fehler: %s", exc)
@@ -159,63 +140,64 @@ def _fetch_live_market_ctx(sector_etf: str = "SPY") -> Optional[pd.DataFrame]:
 # ── Feature-Engineering ───────────────────────────────────────────────────────
 
 def _build_feature_df(
-    candles: List[Dict[str, Any]],
+    candles: Candles,
     market_ctx: Optional[pd.DataFrame] = None,
+    cache: bool = True,
+    features: Optional[feature_frame.FeatureFrame] = None,
 ) -> pd.DataFrame:
     """
     Baut stationäre Feature-Matrix aus OHLCV-Candles + optionalem Markt-Kontext.
     Keine Rohpreise oder absolute EMA-Werte — nur Ratios und %.
+    Indikatoren kommen aus dem geteilten FeatureFrame (einmal pro Candle-Serie gerechnet);
+    features: vom Aufrufer bereits gebauter Frame; cache=False für Trainingsserien.
     """
-    try:
-        import pandas_ta as ta
-    except ImportError:
-        raise RuntimeError("pandas-ta fehlt: pip install pandas-ta")
+    ff = features if features is not None else feature_frame.get(candles, cache=cache)
+    df = ff.derived("ml_base", _ml_base_features).copy()
+
+    # ── Markt-Kontext einmergen ───────────────────────────────────────────────
+    if market_ctx is not None and not market_ctx.empty:
+        try:
+            df["_date"] = df["timestamp"].dt.tz_convert("UTC").dt.normalize().dt.tz_localize(None)
+            df = df.merge(market_ctx, left_on="_date", right_index=True, how="left")
+            df = df.drop(columns=["_date"])
+        except Exception as exc:
+            logger.warning("[ML] market_ctx merge fehlgeschlagen: %s", exc)
 
-    df = pd.DataFrame(candles).copy()
-    df[["open", "high", "low", "close", "volume"]] = \
-        df[["open", "high", "low", "close", "volume"]].astype(float)
+    return df
 
-    c = df["close"]
-    h = df["high"]
-    l = df["low"]
-    v = df["volume"]
+
+def _ml_base_features(ff: feature_frame.FeatureFrame) -> pd.DataFrame:
+    """Features ohne Markt-Kontext (wird pro FeatureFrame gemerkt)."""
+    frame = ff.frame
+    ind = ff.series
+    df = frame.to_dataframe()
+    c = frame.close
 
     # ── Indikatoren ───────────────────────────────────────────────────────────
-    df["rsi"] = ta.rsi(c, length=14)
+    df["rsi"] = ind["rsi_14"]
 
-    macd_df = ta.macd(c, fast=12, slow=26, signal=9)
-    if macd_df is not None and not macd_df.empty:
-        cols = macd_df.columns.tolist()
-        df["macd"]      = macd_df[cols[0]]
-        df["macd_sig"]  = macd_df[cols[2]]
-        df["macd_hist"] = macd_df[cols[1]]
+    df["macd"]      = ind["macd_value"]
+    df["macd_sig"]  = ind["macd_signal"]
+    df["macd_hist"] = ind["macd_hist"]
 
-    atr = ta.atr(h, l, c, length=14)
-    df["atr_pct"] = atr / c * 100
+    df["atr_pct"] = ind["atr_14"] / c * 100
 
-    ema20  = ta.ema(c, length=20)
-    ema50  = ta.ema(c, length=50)
+    ema20  = ind["ema_20"]
+    ema50  = ind["ema_50"]
     df["ema_ratio"]       = ema20 / ema50
     df["price_ema20_pct"] = (c - ema20) / ema20 * 100
 
-    bb = ta.bbands(c, length=20, std=2)
-    if bb is not None and not bb.empty:
-        cols = bb.columns.tolist()
-        df["bb_pct"] = bb[cols[4]]
-        df["bb_bw"]  = bb[cols[3]]
+    df["bb_pct"] = ind["bb_pct"]
+    df["bb_bw"]  = ind["bb_bandwidth"]
 
-    vol_ma = ta.sma(v, length=20)
-    df["vol_ratio"] = v / vol_ma
+    df["vol_ratio"] = ind["vol_ratio"]
 
-    adx_df = ta.adx(h, l, c, length=14)
-    if adx_df is not None and not adx_df.empty:
-        df["adx"] = adx_df[adx_df.columns[0]]
+    df["adx"] = ind["adx"]
 
-    stoch = ta.stoch(h, l, c, k=14, d=3, smooth_k=3)
-    if stoch is not None and not stoch.empty:
-        cols = stoch.columns.tolist()
-        df["stoch_k"] = stoch[cols[0]]
-        df["stoch_d"] = stoch[cols[1]]
+    df["stoch_k"] = ind["stoch_k"]
+    df["stoch_d"] = ind["stoch_d"]
+
+    c = df["close"]
 
     # ── Vergangene Returns ────────────────────────────────────────────────────
     for n in [1, 3, 5, 10, 20]:
@@ -229,19 +211,10 @@ def _build_feature_df(
 
     # ── Kalender-Effekte ──────────────────────────────────────────────────────
     try:
-        df["day_of_week"] = pd.to_datetime(df["timestamp"]).dt.dayofweek
+        df["day_of_week"] = df["timestamp"].dt.dayofweek
     except Exception:
         df["day_of_week"] = 0
 
-    # ── Markt-Kontext einmergen ───────────────────────────────────────────────
-    if market_ctx is not None and not market_ctx.empty:
-        try:
-            df["_date"] = pd.to_datetime(df["timestamp"], utc=True).dt.normalize().dt.tz_localize(None)
-            df = df.merge(market_ctx, left_on="_date", right_index=True, how="left")
-            df = df.drop(columns=["_date"])
-        except Exception as exc:
-            logger.warning("[ML] market_ctx merge fehlgeschlagen: %s", exc)
-
     return df
 
 
@@ -270,7 +243,7 @@ class MLSignalEngine:
 
     def train(
         self,
-        symbols_candles: Dict[str, List[Dict]],
+        symbols_candles: Dict[str, Candles],
         market_ctx_by_sector: Optional[Dict[str, pd.DataFrame]] = None,
         forward_days: int = 5,
         min_return: float = 0.01,
@@ -279,7 +252,7 @@ class MLSignalEngine:
         Trainiert XGBoost auf mehreren Symbolen gleichzeitig.
 
         Args:
-            symbols_candles:      {symbol: candles_list}
+            symbols_candles:      {symbol: CandleFrame | candles_list}
             market_ctx_by_sector: {sector_etf: ctx_df} — optional, aus TRAIN_MODEL.py
             forward_days:         Vorhersage-Horizont (Tage)
             min_return:           Mindest-Return für positives Label
@@ -304,7 +277,7 @@ class MLSignalEngine:
                 if ctx is None:
                     ctx = market_ctx_by_sector.get("SPY")
 
-            df = _build_feature_df(candles, market_ctx=ctx)
+            df = _build_feature_df(candles, market_ctx=ctx, cache=False)
             df["target"] = (
                 df["close"].shift(-forward_days) > df["close"] * (1 + min_return)
             ).astype(int)
@@ -399,8 +372,16 @@ class MLSignalEngine:
 
     # ── Prediction ────────────────────────────────────────────────────────────
 
-    def predict(self, candles: List[Dict[str, Any]], symbol: str = "") -> Dict[str, Any]:
-        """Liefert Signal-Dict — Drop-in-Ersatz für signal_scanner_agent."""
+    def predict(
+        self,
+        candles: Candles,
+        symbol: str = "",
+        features: Optional[feature_frame.FeatureFrame] = None,
+    ) -> Dict[str, Any]:
+        """
+        Liefert Signal-Dict — Drop-in-Ersatz für signal_scanner_agent.
+        features: FeatureFrame der Candles, aus dem auch compute_indicators gelesen hat.
+        """
         if self.model is None:
             return {
                 "short_term_signal": "none", "confidence": 0.0,
@@ -421,7 +402,7 @@ class MLSignalEngine:
             sector_etf = _get_sector_etf(symbol) if symbol else "SPY"
             market_ctx = _fetch_live_market_ctx(sector_etf)
 
-            df  = _build_feature_df(candles, market_ctx=market_ctx)
+            df  = _build_feature_df(candles, market_ctx=market_ctx, features=features)
             # Nur Spalten verwenden die das Modell kennt
             available = [c for c in self.feature_cols if c in df.columns]
             missing   = [c for c in self.feature_cols if c not in df.columns]
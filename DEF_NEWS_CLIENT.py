@@ -1,10 +1,11 @@
 import os
-import requests
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 
 from dotenv import load_dotenv
 
+import http_client
+
 # .env laden, damit FINNHUB_API_KEY / SERPAPI_API_KEY verfügbar sind
 load_dotenv()
 
@@ -116,7 +117,7 @@ class NewsClient:
             "token": self.finnhub_api_key,
         }
 
-        resp = requests.get(url, params=params, timeout=10)
+        resp = http_client.get(url, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
 
@@ -166,7 +167,7 @@ class NewsClient:
             "num": limit,
         }
 
-        resp = requests.get(url, params=params, timeout=10)
+        resp = http_client.get(url, params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
 
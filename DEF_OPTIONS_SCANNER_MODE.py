@@ -14,6 +14,7 @@ from trading_agents_with_gpt import ExecutionAgent
 from DEF_GPT_AGENTS import safe_call_gpt_agent
 from DEF_OPTIONS_AGENT import OptionsAgent
 from DEF_INDICATORS import compute_market_regime
+from gpt_payload import MarketPayload
 import position_monitor as _pm_module
 
 # Eigene Instanzen für den Options-Scanner
@@ -58,17 +59,20 @@ def _process_options_symbol(
         # Synthese-Input vorbereiten (vereinfacht für Options)
         from DEF_INDICATORS import compute_indicators
 
-        indicators = compute_indicators(candles)
+        indicators = compute_indicators(candles, symbol=symbol, timeframe=timeframe)
         market_data["indicators"] = indicators
 
         market_meta = dict(market_data.get("meta") or {})
         market_meta["atr_14"] = indicators.get("atr_14")
         market_meta["atr_pct"] = indicators.get("atr_pct")
 
+        # Kompakte Marktdaten (spaltenweise Candles, kurzes Fenster, Kennzahlen) für beide Agents
+        compact_market_data = MarketPayload(market_data).for_agent("synthese_agent", symbol)["market_data"]
+
         # Minimal synthese for options context
         synthese_input = {
             "symbol": symbol,
-            "market_data": market_data,
+            "market_data": compact_market_data,
             "market_meta": market_meta,
             "indicators": indicators,
             "market_regime": market_regime.get("regime", "neutral"),
@@ -79,7 +83,7 @@ def _process_options_symbol(
 
         signal_input = {
             "symbol": symbol,
-            "market_data": market_data,
+            "market_data": compact_market_data,
             "market_meta": market_meta,
             "indicators": indicators,
             "timeframe": timeframe,
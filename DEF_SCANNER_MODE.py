@@ -6,18 +6,24 @@ from typing import List, Dict, Any, Optional
 from functools import partial
 
 from DEF_DATA_AGENT import DataAgent
+from candle_frame import CandleFrame
 from trading_agents_with_gpt import (
     ExecutionAgent,
     _map_timeframe_to_ibkr,
 )
-from DEF_GPT_AGENTS import run_calls_parallel, safe_call_gpt_agent, GPT_CONCURRENCY
+from DEF_GPT_AGENTS import run_calls_parallel, safe_call_gpt_agent
 from DEF_NEWS_CLIENT import NewsClient
 from DEF_OPTIONS_AGENT import OptionsAgent
 from universe_manager import load_universe, combine_universes, manager as universe_manager
 
 from risk import compute_position_size, compute_kelly_size, CircuitBreaker
-from DEF_INDICATORS import compute_indicators, compute_market_regime
+from DEF_INDICATORS import compute_indicators, compute_indicators_batch, compute_market_regime
+import feature_frame
+import fetch_planner
+from gpt_payload import ANALYSIS_AGENTS, agent_payloads
+import indicator_state
 import position_monitor as _pm_module
+import returns_matrix
 
 # Eigene Instanzen NUR für den Scanner
 _data_agent = DataAgent()
@@ -48,8 +54,14 @@ def _process_symbol(
     market_hint: str,
     auto_execute: bool,
     market_regime: Optional[Dict[str, Any]] = None,
+    candles: Optional[CandleFrame] = None,
+    indicators: Optional[Dict[str, Any]] = None,
 ) -> Optional[Dict[str, Any]]:
-    """Verarbeitet ein einzelnes Symbol vollständig. Thread-safe."""
+    """
+    Verarbeitet ein einzelnes Symbol vollständig. Thread-safe.
+    candles: vorab geladene Kerzen aus dem Prefetch (sonst lädt der DataAgent selbst).
+    indicators: dazu im Batch berechnete Indikatoren (nur zusammen mit candles gültig).
+    """
     if market_regime is None:
         market_regime = {}
     try:
@@ -86,12 +98,19 @@ def _process_symbol(
             timeframe=timeframe,
             asset_type=asset_type,
             market_hint=market_hint,
+            candles=candles,
         )
 
+        from_batch = indicators is not None and candles is not None
         candles = market_data.get("candles") or []
 
-        # Indikatoren berechnen und einbetten
-        indicators = compute_indicators(candles)
+        # Mit ML-Modell: EIN FeatureFrame pro Symbol/Timeframe – Indikatoren und predict lesen daraus
+        from DEF_ML_SIGNAL import _engine as _ml_engine
+        features = feature_frame.get(candles) if _ml_engine.is_loaded and len(candles) else None
+
+        # Indikatoren berechnen (sofern nicht schon im Batch) und einbetten
+        if not from_batch:
+            indicators = compute_indicators(candles, symbol=symbol, timeframe=timeframe, features=features)
         market_data["indicators"] = indicators
 
         # market_meta aufbauen
@@ -132,17 +151,18 @@ def _process_symbol(
         # News-Agent
         news_output = safe_call_gpt_agent("news_agent", {"symbol": symbol, "recent_news": recent_news})
 
-        # Analyse-Agents parallel
+        # Analyse-Agents parallel – jeder bekommt nur sein Candle-Fenster (kompakt, im Token-Budget)
+        payloads = agent_payloads(symbol, market_data, ANALYSIS_AGENTS)
         agent_tasks = [
-            partial(safe_call_gpt_agent, "regime_agent",        {"symbol": symbol, "market_data": market_data}),
-            partial(safe_call_gpt_agent, "trend_dow_agent",     {"symbol": symbol, "market_data": market_data}),
-            partial(safe_call_gpt_agent, "sr_formations_agent", {"symbol": symbol, "market_data": market_data}),
-            partial(safe_call_gpt_agent, "momentum_agent",      {"symbol": symbol, "market_data": market_data}),
-            partial(safe_call_gpt_agent, "volume_oi_agent",     {"symbol": symbol, "market_data": market_data}),
-            partial(safe_call_gpt_agent, "candlestick_agent",   {"symbol": symbol, "market_data": market_data}),
-            partial(safe_call_gpt_agent, "intermarket_agent",   {"symbol": symbol, "market_data": market_data}),
+            partial(safe_call_gpt_agent, "regime_agent",        payloads["regime_agent"]),
+            partial(safe_call_gpt_agent, "trend_dow_agent",     payloads["trend_dow_agent"]),
+            partial(safe_call_gpt_agent, "sr_formations_agent", payloads["sr_formations_agent"]),
+            partial(safe_call_gpt_agent, "momentum_agent",      payloads["momentum_agent"]),
+            partial(safe_call_gpt_agent, "volume_oi_agent",     payloads["volume_oi_agent"]),
+            partial(safe_call_gpt_agent, "candlestick_agent",   payloads["candlestick_agent"]),
+            partial(safe_call_gpt_agent, "intermarket_agent",   payloads["intermarket_agent"]),
         ]
-        agent_results = run_calls_parallel(agent_tasks, max_workers=min(GPT_CONCURRENCY, 3), per_call_timeout=20.0)
+        agent_results = run_calls_parallel(agent_tasks, per_call_timeout=20.0)
 
         regime_output      = agent_results[0] or {"error": "no_result"}
         trend_output       = agent_results[1] or {"error": "no_result"}
@@ -167,9 +187,9 @@ def _process_symbol(
         synthese_output = safe_call_gpt_agent("synthese_agent", synth_input) or {"error": "no_result"}
 
         # Signal — ML zuerst, GPT als Fallback
-        from DEF_ML_SIGNAL import _engine as _ml_engine
-        if _ml_engine.is_loaded and candles:
-            signal_output = _ml_engine.predict(candles, symbol=symbol) or {"error": "ml_prediction_failed"}
+        if features is not None:
+            signal_output = (_ml_engine.predict(candles, symbol=symbol, features=features)
+                             or {"error": "ml_prediction_failed"})
         else:
             signal_output = safe_call_gpt_agent(
                 "signal_scanner_agent",
@@ -420,6 +440,33 @@ def run_scanner_mode(
     vix = market_regime.get("vix", 20.0)
     print(f"[Scanner] Market Regime: {regime.upper()} | SPY vs EMA20: {spy_vs:+.2f}% | VIX: {vix:.2f}")
 
+    # Prefetch: ganze Watchlist in wenigen Multi-Ticker-Requests laden,
+    # damit die Worker-Threads nur noch Indikatoren + GPT machen.
+    prefetched: Dict[str, CandleFrame] = {}
+    if asset_type != "fx":
+        try:
+            prefetched = _data_agent.prefetch(watchlist, timeframe=timeframe)
+        except Exception as exc:
+            print(f"[Scanner] Prefetch fehlgeschlagen ({exc}) – lade pro Symbol.")
+
+    # Indikatoren für alle vorab geladenen Symbole in einem vektorisierten Durchgang
+    batch_indicators: Dict[str, Dict[str, Any]] = {}
+    if prefetched:
+        try:
+            batch_indicators = compute_indicators_batch(prefetched)
+        except Exception as exc:
+            print(f"[Scanner] Batch-Indikatoren fehlgeschlagen ({exc}) – rechne pro Symbol.")
+        tf_key = fetch_planner.parse_timeframe(timeframe).key
+        for sym, ind in batch_indicators.items():
+            if "error" not in ind:
+                indicator_state.remember(sym, tf_key, ind)
+        # Tages-Candles speisen die Returns-Matrix → Korrelations-Check vor der Order ist ein Lookup
+        if tf_key == "1d":
+            try:
+                returns_matrix.engine.update(prefetched)
+            except Exception as exc:
+                print(f"[Scanner] Returns-Matrix-Update fehlgeschlagen: {exc}")
+
     print(f"[Scanner] Starte: {len(watchlist)} Symbole, {workers} parallele Threads")
 
     setups: List[Dict[str, Any]] = []
@@ -428,6 +475,8 @@ def run_scanner_mode(
             pool.submit(
                 _process_symbol,
                 symbol, account_info, timeframe, asset_type, market_hint, auto_execute, market_regime,
+                prefetched.get(symbol.upper()),
+                batch_indicators.get(symbol.upper()),
             ): symbol
             for symbol in watchlist
         }
@@ -230,6 +230,8 @@ def start():
 
     # Monitor starten (Hintergrund-Thread für SL/TP-Überwachung)
     if _pm_module.monitor and not (_pm_module.monitor._thread and _pm_module.monitor._thread.is_alive()):
+        import price_stream
+        price_stream.start_stream()   # No-op ohne PRICE_STREAM_ENABLED=1
         _pm_module.monitor.start()
         print("[Monitor] Positions-Überwachung gestartet.")
 
@@ -18,6 +18,8 @@ from typing import Dict, List, Any, Optional
 
 import pandas as pd
 
+from candle_frame import CandleFrame
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s  %(levelname)s  %(message)s")
 logger = logging.getLogger("TrainModel")
 
@@ -55,34 +57,11 @@ _CONTEXT_SECTOR_ETFS: List[str] = [
 
 # ── Daten laden ───────────────────────────────────────────────────────────────
 
-def _fetch_candles(symbol: str, period: str, interval: str) -> List[Dict[str, Any]]:
-    """Lädt OHLCV-Candles via yfinance."""
-    try:
-        import yfinance as yf
-    except ImportError:
-        raise RuntimeError("yfinance fehlt: pip install yfinance")
-
-    df = yf.Ticker(symbol).history(period=period, interval=interval, auto_adjust=True)
-    if df is None or df.empty:
-        return []
-
-    df = df.reset_index()
-    ts_col = "Datetime" if "Datetime" in df.columns else "Date"
-    candles = []
-    for _, row in df.iterrows():
-        try:
-            ts_str = row[ts_col].isoformat()
-        except Exception:
-            ts_str = str(row[ts_col])
-        candles.append({
-            "timestamp": ts_str,
-            "open":   float(row["Open"]),
-            "high":   float(row["High"]),
-            "low":    float(row["Low"]),
-            "close":  float(row["Close"]),
-            "volume": float(row.get("Volume", 0)),
-        })
-    return candles
+def _fetch_candles(symbol: str, period: str, interval: str) -> CandleFrame:
+    """Lädt OHLCV-Candles via yfinance (über den persistenten BarStore) als CandleFrame."""
+    import bar_store
+
+    return bar_store.get_candles(symbol, period=period, interval=interval)
 
 
 def _fetch_market_contexts(
@@ -138,7 +117,7 @@ def main(argv: Optional[List[str]] = None) -> None:
     logger.info("Lade %d Symbole (%s, %s) …", len(symbols), args.period, args.interval)
 
     # ── Symbol-Daten laden ────────────────────────────────────────────────────
-    symbols_candles: Dict[str, List[Dict[str, Any]]] = {}
+    symbols_candles: Dict[str, CandleFrame] = {}
     for sym in symbols:
         candles = _fetch_candles(sym, period=args.period, interval=args.interval)
         if candles:
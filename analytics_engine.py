@@ -10,6 +10,9 @@ from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from enum import Enum
 
+import feature_frame
+import indicator_kernels as kern
+
 # Import existing indicators module
 try:
     from DEF_INDICATORS import compute_indicators, compute_market_regime
@@ -182,7 +185,7 @@ class AnalyticsEngine:
 
         if compute_indicators is None:
             self.logger.warning(
-                "DEF_INDICATORS not available; install pandas and pandas-ta"
+                "DEF_INDICATORS not available; using indicator kernels directly"
             )
 
     def analyze(
@@ -320,33 +323,37 @@ class AnalyticsEngine:
         self,
         candles: List[Dict[str, float]],
     ) -> TechnicalIndicators:
-        """Minimal indicator computation without pandas-ta"""
+        """Indicator computation directly on the NumPy kernels (no DEF_INDICATORS needed)"""
         indicators = TechnicalIndicators(candle_count=len(candles))
 
         if len(candles) < 20:
             return indicators
 
-        closes = [c["close"] for c in candles]
-        highs = [c["high"] for c in candles]
-        lows = [c["low"] for c in candles]
-
-        # Simple SMA (not EMA, but close enough for fallback)
-        indicators.ema_20 = sum(closes[-20:]) / 20 if len(closes) >= 20 else closes[-1]
-        indicators.ema_50 = sum(closes[-50:]) / 50 if len(closes) >= 50 else closes[-1]
-        indicators.ema_200 = sum(closes[-200:]) / 200 if len(closes) >= 200 else closes[-1]
-
-        # Bollinger Bands (20-period SMA ± 2 std)
-        sma_20 = indicators.ema_20
-        variance = sum((c - sma_20) ** 2 for c in closes[-20:]) / 20
-        std = variance ** 0.5
-        indicators.bb_mid = sma_20
-        indicators.bb_upper = sma_20 + 2 * std
-        indicators.bb_lower = sma_20 - 2 * std
-
-        # ATR (simplified: average of (high-low))
-        ranges = [h - l for h, l in zip(highs[-14:], lows[-14:])]
-        indicators.atr_14 = sum(ranges) / len(ranges) if ranges else 0
-        indicators.atr_pct = (indicators.atr_14 / closes[-1] * 100) if closes[-1] > 0 else 0
+        ff = feature_frame.get(candles)
+        close, series = ff.frame.close, ff.series
+        last = kern.last
+
+        indicators.rsi_14 = last(series["rsi_14"])
+        indicators.ema_20 = last(series["ema_20"])
+        indicators.ema_50 = last(series["ema_50"])
+        indicators.ema_200 = last(series["ema_200"])
+
+        indicators.bb_mid = last(series["bb_mid"])
+        indicators.bb_upper = last(series["bb_upper"])
+        indicators.bb_lower = last(series["bb_lower"])
+        indicators.bb_pct_b = last(series["bb_pct"])
+
+        indicators.atr_14 = last(series["atr_14"])
+        if indicators.atr_14 is not None and close[-1] > 0:
+            indicators.atr_pct = indicators.atr_14 / float(close[-1]) * 100
+
+        indicators.macd = last(series["macd_value"])
+        indicators.macd_signal = last(series["macd_signal"])
+        indicators.macd_histogram = last(series["macd_hist"])
+        indicators.adx = last(series["adx"])
+        indicators.stoch_k = last(series["stoch_k"])
+        indicators.stoch_d = last(series["stoch_d"])
+        indicators.volume_ratio = last(series["vol_ratio"])
 
         return indicators
 
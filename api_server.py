@@ -19,6 +19,10 @@ from typing import Dict, Any, List, Optional
 from flask import Flask, jsonify, request
 from dotenv import load_dotenv
 
+import price_stream
+import quote_service
+import rate_limit
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -48,16 +52,11 @@ def _json_response(data: Any, status: str = "ok") -> dict:
 
 
 def _get_current_price(symbol: str) -> Optional[float]:
-    """Fetch current price via yfinance."""
-    try:
-        import yfinance as yf
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(period="1d")
-        if not hist.empty:
-            return float(hist["Close"].iloc[-1])
-    except Exception as e:
-        logger.warning(f"Could not fetch price for {symbol}: {e}")
-    return None
+    """Current price via the shared QuoteService (short-lived cache, batched snapshots)."""
+    price = quote_service.get_price(symbol)
+    if price is None:
+        logger.warning(f"Could not fetch price for {symbol}")
+    return price
 
 
 # ── Routes ────────────────────────────────────────────────────────────────
@@ -79,6 +78,11 @@ def get_positions():
         rows = cursor.fetchall()
         conn.close()
 
+        # one snapshot request for all open positions; the stream (if enabled) follows them
+        symbols = [row["symbol"] for row in rows]
+        price_stream.follow(symbols, owner="api")
+        quote_service.get_prices(symbols)
+
         positions = []
         for row in rows:
             symbol = row["symbol"]
@@ -387,10 +391,17 @@ def health():
         return jsonify(_json_response({"error": str(e)}, status="error")), 500
 
 
+@app.route("/api/rate-limits", methods=["GET"])
+def rate_limits():
+    """GET /api/rate-limits - Per-provider token buckets: queue waits, 429s, current rate."""
+    return jsonify(_json_response(rate_limit.stats()))
+
+
 # ── Main ───────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
     logger.info(f"Starting Trading API on 0.0.0.0:{API_PORT} (HTTP)")
     logger.info(f"Database: {DB_PATH}")
+    price_stream.start_stream()
 
     app.run(host="0.0.0.0", port=API_PORT, debug=False, threaded=True)
@@ -0,0 +1,499 @@
+"""
+bar_store.py
+
+Persistenter, inkrementeller OHLCV-Speicher für alle Candle-Loader.
+
+Pro (symbol, interval) liegt eine spaltenorientierte NumPy-Datei auf der Platte
+(structured array: ts/open/high/low/close/volume, ts = Epoch-Sekunden UTC),
+die per Memory-Map gelesen wird. Beim nächsten Zugriff wird nur das Delta seit
+dem letzten gespeicherten Bar nachgeladen statt der kompletten Historie.
+
+Nutzer:
+  - DEF_DATA_AGENT.DataAgent._fetch_yfinance_history
+  - BACKTEST.fetch_candles_yfinance   (→ scheduler.job_backtest)
+  - TRAIN_MODEL._fetch_candles
+  - market_context.MarketContextService (VIX/SPY/QQQ/Sektor-ETFs)
+
+Konfiguration via .env:
+  BAR_STORE_DIR              data/bars   Ablageort der .npy/.json Dateien
+  BAR_STORE_MAX_AGE_SECONDS  300         So lange gilt ein Symbol als frisch (kein HTTP)
+  BAR_STORE_BATCH_SIZE       100         Ticker pro Multi-Ticker-Request in prefetch()
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import rate_limit
+from candle_frame import CandleFrame
+
+logger = logging.getLogger("BarStore")
+
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR", os.path.join("data", "bars"))
+BAR_STORE_MAX_AGE = int(os.getenv("BAR_STORE_MAX_AGE_SECONDS", "300"))
+BAR_STORE_BATCH_SIZE = int(os.getenv("BAR_STORE_BATCH_SIZE", "100"))
+
+BAR_DTYPE = np.dtype([
+    ("ts",     "<i8"),
+    ("open",   "<f8"),
+    ("high",   "<f8"),
+    ("low",    "<f8"),
+    ("close",  "<f8"),
+    ("volume", "<f8"),
+])
+
+# Relative Abweichung, ab der ein überlappender (abgeschlossener) Bar als
+# revidiert gilt – z.B. nach Dividenden-/Split-Adjustierung durch auto_adjust.
+_REVISION_TOLERANCE = 1e-4
+
+
+# ── Zeit-Helper ───────────────────────────────────────────────────────────────
+
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+
+
+def _period_to_timedelta(period: str) -> Optional[timedelta]:
+    """yfinance-Period ("90d", "3mo", "2y", "max", "ytd") → timedelta. None = max."""
+    p = (period or "").strip().lower()
+    if p == "max":
+        return None
+    if p == "ytd":
+        now = datetime.now(timezone.utc)
+        return now - datetime(now.year, 1, 1, tzinfo=timezone.utc)
+    m = _PERIOD_RE.match(p)
+    if not m:
+        raise ValueError(f"Unbekannte Period: {period!r}")
+    n, unit = int(m.group(1)), m.group(2)
+    days = {"d": 1, "wk": 7, "mo": 31, "y": 366}[unit]
+    return timedelta(days=n * days)
+
+
+def _index_to_epoch(index) -> np.ndarray:
+    """DatetimeIndex (tz-aware oder naive=UTC) → int64 Epoch-Sekunden."""
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return np.asarray(index.values.astype("datetime64[s]").astype(np.int64))
+
+
+def _safe_name(symbol: str) -> str:
+    """Dateiname für Symbole wie "^VIX", "SIE.DE", "BRK-B"."""
+    return re.sub(r"[^A-Za-z0-9]", "_", symbol.upper())
+
+
+# ── yfinance-Download (einziger Netzwerkpfad) ─────────────────────────────────
+
+def _download_yfinance(
+    symbol: str,
+    interval: str,
+    period: Optional[str] = None,
+    start: Optional[datetime] = None,
+) -> Tuple[np.ndarray, Optional[str]]:
+    """
+    Lädt Bars via yfinance und gibt (structured array, Zeitzone der Börse) zurück.
+    Entweder period ODER start angeben.
+    """
+    try:
+        import yfinance as yf
+    except ImportError:
+        raise RuntimeError("yfinance fehlt. Installiere: pip install yfinance")
+
+    kwargs: Dict[str, Any] = {"interval": interval, "auto_adjust": True}
+    if start is not None:
+        kwargs["start"] = start
+    else:
+        kwargs["period"] = period or "1y"
+
+    rate_limit.acquire("yfinance")
+    df = yf.Ticker(symbol).history(**kwargs)
+    if df is None or df.empty:
+        return np.empty(0, dtype=BAR_DTYPE), None
+
+    tz = str(df.index.tz) if getattr(df.index, "tz", None) is not None else None
+    return _df_to_bars(df), tz
+
+
+def _download_yfinance_batch(
+    symbols: List[str],
+    interval: str,
+    period: Optional[str] = None,
+    start: Optional[datetime] = None,
+) -> Dict[str, Tuple[np.ndarray, Optional[str]]]:
+    """
+    Lädt mehrere Symbole in EINEM yf.download-Request.
+    Gibt {symbol: (bars, tz)} zurück; Symbole ohne Daten fehlen im Ergebnis.
+    """
+    try:
+        import yfinance as yf
+    except ImportError:
+        raise RuntimeError("yfinance fehlt. Installiere: pip install yfinance")
+    import pandas as pd
+
+    kwargs: Dict[str, Any] = {
+        "interval": interval, "auto_adjust": True, "group_by": "ticker",
+        "threads": True, "progress": False, "ignore_tz": False,
+    }
+    if start is not None:
+        kwargs["start"] = start
+    else:
+        kwargs["period"] = period or "1y"
+
+    rate_limit.acquire("yfinance")
+    df = yf.download(list(symbols), **kwargs)
+    if df is None or df.empty:
+        return {}
+
+    tz = str(df.index.tz) if getattr(df.index, "tz", None) is not None else None
+    multi = isinstance(df.columns, pd.MultiIndex)
+    out: Dict[str, Tuple[np.ndarray, Optional[str]]] = {}
+    for sym in symbols:
+        if multi:
+            if sym not in df.columns.get_level_values(0):
+                continue
+            sub = df[sym]
+        else:
+            sub = df
+        sub = sub.dropna(subset=["Close"])
+        if not sub.empty:
+            out[sym] = (_df_to_bars(sub), tz)
+    return out
+
+
+def _df_to_bars(df) -> np.ndarray:
+    """yfinance-DataFrame (Open/High/Low/Close/Volume) → structured array."""
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars["ts"] = _index_to_epoch(df.index)
+    bars["open"] = df["Open"].to_numpy(dtype=np.float64)
+    bars["high"] = df["High"].to_numpy(dtype=np.float64)
+    bars["low"] = df["Low"].to_numpy(dtype=np.float64)
+    bars["close"] = df["Close"].to_numpy(dtype=np.float64)
+    if "Volume" in df.columns:
+        bars["volume"] = df["Volume"].fillna(0.0).to_numpy(dtype=np.float64)
+    else:
+        bars["volume"] = 0.0
+    return bars
+
+
+# ── BarStore ──────────────────────────────────────────────────────────────────
+
+class BarStore:
+    """
+    Öffentliche API:
+      get_bars(symbol, period, interval)    → structured array (aktualisiert, geschnitten)
+      get_candles(symbol, period, interval) → CandleFrame (Spalten-Arrays, siehe candle_frame.py)
+      prefetch(symbols, period, interval)   → {symbol: CandleFrame} via Multi-Ticker-Requests
+      load(symbol, interval)                → gespeicherte Bars ohne Netzwerk (oder None)
+      clear(symbol=None, interval=None)     → Dateien löschen
+    """
+
+    def __init__(self, root: Optional[str] = None, max_age_seconds: int = BAR_STORE_MAX_AGE) -> None:
+        self.root = Path(root or BAR_STORE_DIR)
+        self.max_age_seconds = max_age_seconds
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # ── Pfade / Locks ─────────────────────────────────────────────────────────
+
+    def _paths(self, symbol: str, interval: str) -> Tuple[Path, Path]:
+        base = self.root / interval / _safe_name(symbol)
+        return base.with_suffix(".npy"), base.with_suffix(".json")
+
+    def _lock_for(self, symbol: str, interval: str) -> threading.Lock:
+        key = (symbol.upper(), interval)
+        with self._locks_guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    # ── Persistenz ────────────────────────────────────────────────────────────
+
+    def _read_meta(self, symbol: str, interval: str) -> Dict[str, Any]:
+        _, meta_path = self._paths(symbol, interval)
+        try:
+            return json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, symbol: str, interval: str) -> Optional[np.ndarray]:
+        """Gespeicherte Bars (memory-mapped, read-only) oder None."""
+        npy_path, _ = self._paths(symbol, interval)
+        if not npy_path.exists():
+            return None
+        try:
+            return np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError) as exc:
+            logger.warning("[BarStore] %s/%s nicht lesbar (%s) – wird neu geladen.", symbol, interval, exc)
+            return None
+
+    def _write(self, symbol: str, interval: str, bars: np.ndarray, meta: Dict[str, Any]) -> None:
+        """Atomar schreiben (tmp + os.replace), damit parallele Prozesse nie halbe Dateien lesen."""
+        npy_path, meta_path = self._paths(symbol, interval)
+        npy_path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_npy = npy_path.with_name(f"{npy_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npy")
+        with open(tmp_npy, "wb") as f:
+            np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+        os.replace(tmp_npy, npy_path)
+
+        tmp_meta = meta_path.with_name(f"{meta_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.json")
+        tmp_meta.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_meta, meta_path)
+
+    def clear(self, symbol: Optional[str] = None, interval: Optional[str] = None) -> None:
+        pattern_dir = self.root / interval if interval else self.root
+        if not pattern_dir.exists():
+            return
+        glob = f"{_safe_name(symbol)}.*" if symbol else "*"
+        for path in pattern_dir.rglob(glob):
+            if path.is_file():
+                path.unlink()
+
+    # ── Merge ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _merge(stored: np.ndarray, delta: np.ndarray) -> np.ndarray:
+        """Ersetzt alles ab dem ersten Delta-Bar durch das Delta (letzter Bar kann partiell sein)."""
+        if len(delta) == 0:
+            return np.array(stored, dtype=BAR_DTYPE)
+        keep = stored[stored["ts"] < delta["ts"][0]]
+        merged = np.concatenate([keep, delta])
+        _, idx = np.unique(merged["ts"], return_index=True)
+        return merged[idx]
+
+    @staticmethod
+    def _is_revised(stored: np.ndarray, delta: np.ndarray) -> bool:
+        """True, wenn ein bereits abgeschlossener Bar im Delta anders aussieht (Adjustierung)."""
+        if len(stored) < 2 or len(delta) == 0:
+            return False
+        ref = stored[-2]
+        hit = delta[delta["ts"] == ref["ts"]]
+        if len(hit) == 0:
+            return False
+        old, new = float(ref["close"]), float(hit["close"][0])
+        return old != 0.0 and abs(new - old) / abs(old) > _REVISION_TOLERANCE
+
+    # ── Aktualisieren ─────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _wanted_start(period: str, now: float) -> Optional[int]:
+        span = _period_to_timedelta(period)
+        return None if span is None else int(now - span.total_seconds())
+
+    @staticmethod
+    def _covers(stored: Optional[np.ndarray], meta: Dict[str, Any], wanted_start: Optional[int]) -> bool:
+        """True, wenn die gespeicherten Bars das angefragte Zeitfenster abdecken."""
+        covered_from = meta.get("covered_from")  # None = "max"
+        return (
+            stored is not None and len(stored) > 0 and "covered_from" in meta
+            and (covered_from is None or (wanted_start is not None and covered_from <= wanted_start))
+        )
+
+    def _is_fresh(self, meta: Dict[str, Any], now: float) -> bool:
+        return (now - float(meta.get("fetched_at", 0))) < self.max_age_seconds
+
+    @staticmethod
+    def _anchor(stored: np.ndarray) -> int:
+        """Delta ab dem vorletzten Bar: der vorletzte dient als Revisions-Check,
+        der letzte kann noch unvollständig gewesen sein."""
+        return int(stored["ts"][-2] if len(stored) >= 2 else stored["ts"][-1])
+
+    def _apply_delta(
+        self,
+        symbol: str,
+        interval: str,
+        stored: np.ndarray,
+        meta: Dict[str, Any],
+        delta: np.ndarray,
+        delta_tz: Optional[str],
+        wanted_start: Optional[int],
+        now: float,
+    ) -> Optional[np.ndarray]:
+        """Delta einmergen und schreiben. None = Historie revidiert → Vollabruf nötig."""
+        if self._is_revised(stored, delta):
+            logger.info("[BarStore] %s/%s: Historie revidiert – lade komplett neu.", symbol, interval)
+            return None
+        bars = self._merge(np.asarray(stored), delta)
+        covered_from = meta.get("covered_from")
+        if covered_from is not None and wanted_start is not None:
+            covered_from = min(covered_from, wanted_start)
+        self._write(symbol, interval, bars,
+                    {"tz": meta.get("tz") or delta_tz, "fetched_at": now, "covered_from": covered_from})
+        logger.info("[BarStore] %s/%s: +%d Delta-Bars", symbol, interval, len(delta))
+        return bars
+
+    def _apply_full(
+        self,
+        symbol: str,
+        interval: str,
+        bars: np.ndarray,
+        tz: Optional[str],
+        wanted_start: Optional[int],
+        now: float,
+        period: str,
+    ) -> Dict[str, Any]:
+        meta = {"tz": tz, "fetched_at": now, "covered_from": wanted_start}
+        self._write(symbol, interval, bars, meta)
+        logger.info("[BarStore] %s/%s: %d Bars komplett geladen (period=%s)", symbol, interval, len(bars), period)
+        return meta
+
+    def _refresh(self, symbol: str, period: str, interval: str) -> Tuple[np.ndarray, Dict[str, Any]]:
+        now = time.time()
+        wanted_start = self._wanted_start(period, now)
+
+        stored = self.load(symbol, interval)
+        meta = self._read_meta(symbol, interval)
+        covers_window = self._covers(stored, meta, wanted_start)
+
+        if covers_window and self._is_fresh(meta, now):
+            return np.asarray(stored), meta
+
+        if covers_window:
+            try:
+                delta, delta_tz = _download_yfinance(
+                    symbol, interval,
+                    start=datetime.fromtimestamp(self._anchor(stored), tz=timezone.utc),
+                )
+                bars = self._apply_delta(symbol, interval, stored, meta, delta, delta_tz, wanted_start, now)
+                if bars is not None:
+                    return bars, self._read_meta(symbol, interval)
+            except Exception as exc:
+                logger.warning("[BarStore] %s/%s Delta-Fehler (%s) – lade komplett.", symbol, interval, exc)
+
+        bars, tz = _download_yfinance(symbol, interval, period=period)
+        if len(bars) == 0:
+            # Nichts Neues – vorhandene Daten bleiben gültig
+            return (np.asarray(stored) if stored is not None else bars), meta
+        meta = self._apply_full(symbol, interval, bars, tz or meta.get("tz"), wanted_start, now, period)
+        return bars, meta
+
+    @staticmethod
+    def _slice(bars: np.ndarray, period: str) -> np.ndarray:
+        span = _period_to_timedelta(period)
+        if span is None or len(bars) == 0:
+            return bars
+        cutoff = int(time.time() - span.total_seconds())
+        return bars[bars["ts"] >= cutoff]
+
+    def get_bars(self, symbol: str, period: str = "1y", interval: str = "1d") -> np.ndarray:
+        """Aktualisiert (Delta) und liefert die Bars des angefragten Zeitfensters."""
+        with self._lock_for(symbol, interval):
+            bars, _ = self._refresh(symbol, period, interval)
+        return self._slice(bars, period)
+
+    # ── Bulk-Prefetch ─────────────────────────────────────────────────────────
+
+    def prefetch(
+        self,
+        symbols: List[str],
+        period: str = "1y",
+        interval: str = "1d",
+        chunk_size: int = BAR_STORE_BATCH_SIZE,
+    ) -> Dict[str, CandleFrame]:
+        """
+        Aktualisiert viele Symbole mit wenigen Multi-Ticker-Requests statt einem pro Symbol.
+
+        Frische Symbole werden übersprungen, Symbole mit Historie bekommen ein
+        gemeinsames Delta, alle übrigen einen gemeinsamen Vollabruf (je chunk_size
+        Ticker pro Request). Liefert {symbol: CandleFrame} für alle Symbole mit Daten;
+        fehlende Symbole kann der Aufrufer einzeln per get_candles nachladen.
+        """
+        now = time.time()
+        wanted_start = self._wanted_start(period, now)
+        unique = list(dict.fromkeys(s.upper() for s in symbols if s))
+        chunk_size = max(1, chunk_size)
+
+        delta_syms: List[str] = []
+        full_syms: List[str] = []
+        for sym in unique:
+            stored = self.load(sym, interval)
+            meta = self._read_meta(sym, interval)
+            if self._covers(stored, meta, wanted_start):
+                if not self._is_fresh(meta, now):
+                    delta_syms.append(sym)
+            else:
+                full_syms.append(sym)
+
+        for i in range(0, len(delta_syms), chunk_size):
+            chunk = delta_syms[i:i + chunk_size]
+            anchors = {}
+            for sym in chunk:
+                stored = self.load(sym, interval)
+                if stored is not None and len(stored):
+                    anchors[sym] = self._anchor(stored)
+            if not anchors:
+                continue
+            try:
+                result = _download_yfinance_batch(
+                    list(anchors), interval,
+                    start=datetime.fromtimestamp(min(anchors.values()), tz=timezone.utc),
+                )
+            except Exception as exc:
+                logger.warning("[BarStore] Batch-Delta-Fehler (%s) – lade %d Symbole komplett.", exc, len(anchors))
+                result = {}
+            for sym in anchors:
+                with self._lock_for(sym, interval):
+                    stored = self.load(sym, interval)
+                    meta = self._read_meta(sym, interval)
+                    hit = result.get(sym)
+                    if stored is None or hit is None or \
+                            self._apply_delta(sym, interval, stored, meta, hit[0], hit[1], wanted_start, now) is None:
+                        full_syms.append(sym)
+
+        for i in range(0, len(full_syms), chunk_size):
+            chunk = full_syms[i:i + chunk_size]
+            try:
+                result = _download_yfinance_batch(chunk, interval, period=period)
+            except Exception as exc:
+                logger.warning("[BarStore] Batch-Fehler (%s) für %d Symbole.", exc, len(chunk))
+                continue
+            for sym, (bars, tz) in result.items():
+                with self._lock_for(sym, interval):
+                    tz = self._read_meta(sym, interval).get("tz") or tz
+                    self._apply_full(sym, interval, bars, tz, wanted_start, now, period)
+
+        frames: Dict[str, CandleFrame] = {}
+        for sym in unique:
+            bars = self.load(sym, interval)
+            if bars is None or len(bars) == 0:
+                continue
+            tz = self._read_meta(sym, interval).get("tz")
+            frame = CandleFrame.from_bars(self._slice(np.asarray(bars), period), tz)
+            if len(frame):
+                frames[sym] = frame
+        logger.info("[BarStore] Prefetch %s: %d/%d Symbole (%d Delta, %d Voll)",
+                    interval, len(frames), len(unique), len(delta_syms), len(full_syms))
+        return frames
+
+    def get_candles(self, symbol: str, period: str = "1y", interval: str = "1d") -> CandleFrame:
+        """Wie get_bars, aber als CandleFrame inkl. Börsen-Zeitzone."""
+        bars = self.get_bars(symbol, period=period, interval=interval)
+        tz = self._read_meta(symbol, interval).get("tz")
+        return CandleFrame.from_bars(bars, tz)
+
+
+def bars_to_candles(bars: np.ndarray, tz: Optional[str] = None) -> List[Dict[str, Any]]:
+    """structured array → List[Dict] (timestamp, open, high, low, close, volume)."""
+    return CandleFrame.from_bars(bars, tz).to_records()
+
+
+# ── Modul-Singleton ───────────────────────────────────────────────────────────
+
+store = BarStore()
+
+
+def get_candles(symbol: str, period: str = "1y", interval: str = "1d") -> CandleFrame:
+    return store.get_candles(symbol, period=period, interval=interval)
+
+
+def prefetch(symbols: List[str], period: str = "1y", interval: str = "1d") -> Dict[str, CandleFrame]:
+    return store.prefetch(symbols, period=period, interval=interval)
@@ -0,0 +1,362 @@
+"""
+candle_frame.py
+
+Spaltenorientierter Candle-Container (struct of arrays) für die gesamte Pipeline.
+
+Statt List[Dict] mit String-Timestamps hält CandleFrame je ein NumPy-Array pro
+Spalte: ts (int64 Epoch-Sekunden UTC) + open/high/low/close/volume (float64),
+dazu die Börsen-Zeitzone. Indikatoren, ML-Features und Backtest bauen ihren
+DataFrame direkt aus den Arrays – ohne Dict-Zeilen und ohne Timestamp-Parsing.
+
+Kompatibilität zum alten Format (List[Dict]):
+  len(frame), bool(frame)      → Anzahl Bars
+  frame[-1]["close"]           → einzelner Bar als Dict
+  frame["close"]               → Spalte als ndarray
+  frame[-50:]                  → CandleFrame (View, keine Kopie)
+  for c in frame: ...          → Dicts (langsam, nur für Altcode)
+
+In List[Dict] umgewandelt wird nur noch an der GPT/JSON-Grenze (to_records()).
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def _format_timestamps(ts: np.ndarray, tz: Optional[str]) -> List[str]:
+    """Epoch-Sekunden → Strings wie str(pd.Timestamp) in Börsen-Zeitzone."""
+    import pandas as pd
+
+    idx = pd.to_datetime(ts, unit="s", utc=True)
+    if tz:
+        idx = idx.tz_convert(tz)
+    return [str(t) for t in idx]
+
+
+def _to_epoch(values: Sequence[Any]) -> np.ndarray:
+    """Timestamps (str, datetime, pd.Timestamp, Epoch-Zahl) → int64 Epoch-Sekunden."""
+    import pandas as pd
+
+    if len(values) and isinstance(values[0], (int, float, np.integer, np.floating)):
+        return np.asarray(values, dtype=np.int64)
+    idx = pd.to_datetime(list(values), utc=True)
+    return np.asarray(idx.tz_localize(None).values.astype("datetime64[s]").astype(np.int64))
+
+
+class CandleFrame:
+    """
+    OHLCV-Candles als Spalten-Arrays.
+
+    Konstruktoren:
+      from_bars(bars, tz)        structured array aus bar_store
+      from_records(candles, tz)  List[Dict] oder Objekte mit Attributen (data_fetcher.Candle)
+      from_dataframe(df)         DataFrame mit DatetimeIndex oder "timestamp"-Spalte
+      coerce(candles)            beliebiges der obigen Formate (CandleFrame wird durchgereicht)
+    """
+
+    __slots__ = ("ts", "open", "high", "low", "close", "volume", "tz")
+
+    def __init__(
+        self,
+        ts: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        tz: Optional[str] = None,
+    ) -> None:
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+        self.tz = tz
+        n = len(self.ts)
+        for name in COLUMNS:
+            if len(getattr(self, name)) != n:
+                raise ValueError(f"CandleFrame: Spalte {name!r} hat {len(getattr(self, name))} statt {n} Werte")
+
+    # ── Konstruktoren ─────────────────────────────────────────────────────────
+
+    @classmethod
+    def empty(cls, tz: Optional[str] = None) -> "CandleFrame":
+        z = np.empty(0, dtype=np.float64)
+        return cls(np.empty(0, dtype=np.int64), z, z, z, z, z, tz=tz)
+
+    @classmethod
+    def from_bars(cls, bars: np.ndarray, tz: Optional[str] = None) -> "CandleFrame":
+        """structured array (ts/open/high/low/close/volume) → CandleFrame (kopiert aus der Memory-Map)."""
+        return cls(
+            np.ascontiguousarray(bars["ts"]),
+            *(np.ascontiguousarray(bars[name]) for name in COLUMNS),
+            tz=tz,
+        )
+
+    @classmethod
+    def from_records(cls, candles: Sequence[Any], tz: Optional[str] = None) -> "CandleFrame":
+        """List[Dict] oder Liste von Objekten mit timestamp/open/high/low/close/volume."""
+        if len(candles) == 0:
+            return cls.empty(tz)
+
+        def get(c: Any, key: str, default: Any = None) -> Any:
+            return c.get(key, default) if isinstance(c, dict) else getattr(c, key, default)
+
+        cols = {
+            name: np.fromiter((get(c, name, 0.0 if name == "volume" else None) for c in candles),
+                              dtype=np.float64, count=len(candles))
+            for name in COLUMNS
+        }
+        stamps = [get(c, "timestamp") for c in candles]
+        if stamps[0] is None:
+            ts = np.arange(len(candles), dtype=np.int64)
+        else:
+            ts = _to_epoch(stamps)
+            tzinfo = getattr(stamps[0], "tzinfo", None)
+            if tz is None and tzinfo is not None:
+                tz = str(tzinfo)
+        return cls(ts, tz=tz, **cols)
+
+    @classmethod
+    def from_dataframe(cls, df, tz: Optional[str] = None) -> "CandleFrame":
+        """DataFrame (Spalten open..volume, beliebige Groß-/Kleinschreibung) → CandleFrame."""
+        import pandas as pd
+
+        lower = {str(c).lower(): c for c in df.columns}
+        if "timestamp" in lower:
+            col = df[lower["timestamp"]]
+            col_tz = getattr(col.dtype, "tz", None)
+            if tz is None and col_tz is not None:
+                tz = str(col_tz)
+            idx = pd.DatetimeIndex(pd.to_datetime(col, utc=True))
+        else:
+            idx = pd.DatetimeIndex(df.index)
+        if tz is None and idx.tz is not None:
+            tz = str(idx.tz)
+        if idx.tz is not None:
+            idx = idx.tz_convert("UTC").tz_localize(None)
+        ts = idx.values.astype("datetime64[s]").astype(np.int64)
+        cols = {
+            name: (df[lower[name]].to_numpy(dtype=np.float64) if name in lower
+                   else np.zeros(len(df), dtype=np.float64))
+            for name in COLUMNS
+        }
+        return cls(ts, tz=tz, **cols)
+
+    @classmethod
+    def coerce(cls, candles: Any) -> "CandleFrame":
+        """Nimmt CandleFrame, List[Dict], List[Candle] oder DataFrame an."""
+        if isinstance(candles, cls):
+            return candles
+        if candles is None:
+            return cls.empty()
+        if hasattr(candles, "columns"):
+            return cls.from_dataframe(candles)
+        return cls.from_records(list(candles))
+
+    # ── Sequenz-Protokoll (kompatibel zu List[Dict]) ─────────────────────────
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __getitem__(self, key: Union[int, slice, str, np.ndarray]):
+        if isinstance(key, str):
+            if key == "timestamp":
+                return self.timestamps()
+            if key not in COLUMNS and key != "ts":
+                raise KeyError(key)
+            return getattr(self, key)
+        if isinstance(key, (int, np.integer)):
+            return self.row(int(key))
+        return CandleFrame(
+            self.ts[key], self.open[key], self.high[key], self.low[key],
+            self.close[key], self.volume[key], tz=self.tz,
+        )
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_records())
+
+    def __repr__(self) -> str:
+        return f"CandleFrame(n={len(self)}, tz={self.tz!r})"
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Einzelner Bar als Dict im alten Candle-Format."""
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("CandleFrame index out of range")
+        rec: Dict[str, Any] = {"timestamp": _format_timestamps(self.ts[i:i + 1], self.tz)[0]}
+        for name in COLUMNS:
+            rec[name] = float(getattr(self, name)[i])
+        return rec
+
+    def tail(self, n: int) -> "CandleFrame":
+        return self[-n:] if n > 0 else self[:0]
+
+    def resample(self, seconds: int) -> "CandleFrame":
+        """
+        Zu gröberen Bars zusammenfassen (open=erster, high=max, low=min, close=letzter,
+        volume=Summe); Timestamp = erster Bar des Buckets.
+
+        Intraday-Buckets beginnen am ersten Bar jedes Handelstags (1h → 4h: 9:30–13:30,
+        13:30–16:00), Tages-Buckets nach Börsendatum, Wochen-Buckets ab Montag.
+        """
+        n = len(self)
+        if n == 0:
+            return self
+        local = self.ts.copy()
+        if self.tz:
+            idx = self.datetime_index().tz_localize(None)
+            local = np.asarray(idx.values.astype("datetime64[s]").astype(np.int64))
+
+        day = local // 86400
+        if seconds >= 7 * 86400:
+            keys = (day + 3) // (seconds // 86400)   # 1970-01-01 war ein Donnerstag
+        elif seconds >= 86400:
+            keys = day // (seconds // 86400)
+        else:
+            day_start = np.r_[True, day[1:] != day[:-1]]
+            first = np.maximum.accumulate(np.where(day_start, np.arange(n), 0))
+            keys = day * 86400 + (local - local[first]) // seconds
+
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], n] - 1
+        return CandleFrame(
+            self.ts[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            np.add.reduceat(self.volume, starts),
+            tz=self.tz,
+        )
+
+    # ── Konvertierung ─────────────────────────────────────────────────────────
+
+    def timestamps(self) -> List[str]:
+        return _format_timestamps(self.ts, self.tz)
+
+    def datetime_index(self):
+        """tz-aware DatetimeIndex in Börsen-Zeitzone (UTC, falls unbekannt)."""
+        import pandas as pd
+
+        idx = pd.to_datetime(self.ts, unit="s", utc=True)
+        return idx.tz_convert(self.tz) if self.tz else idx
+
+    def to_dataframe(self, with_timestamp: bool = True):
+        """DataFrame mit float-Spalten open..volume (+ tz-aware "timestamp"), RangeIndex."""
+        import pandas as pd
+
+        data: Dict[str, Any] = {}
+        if with_timestamp:
+            data["timestamp"] = self.datetime_index()
+        for name in COLUMNS:
+            data[name] = getattr(self, name)
+        return pd.DataFrame(data)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """List[Dict] – nur für die GPT/JSON-Grenze."""
+        if len(self) == 0:
+            return []
+        stamps = self.timestamps()
+        cols = {name: getattr(self, name).tolist() for name in COLUMNS}
+        return [
+            {
+                "timestamp": stamps[i],
+                "open":   cols["open"][i],
+                "high":   cols["high"][i],
+                "low":    cols["low"][i],
+                "close":  cols["close"][i],
+                "volume": cols["volume"][i],
+            }
+            for i in range(len(stamps))
+        ]
+
+
+class CandlePanel:
+    """
+    OHLCV eines ganzen Universums als Matrix: Zeilen = gemeinsame Zeitachse
+    (Vereinigung aller Timestamps), Spalten = Symbole. Fehlende Bars sind NaN.
+
+    Grundlage für Querschnitts-Berechnungen (Indikatoren aller Symbole in einem
+    Durchgang) statt einer Pipeline pro Symbol.
+    """
+
+    __slots__ = ("symbols", "ts", "open", "high", "low", "close", "volume", "tz")
+
+    def __init__(
+        self,
+        symbols: Sequence[str],
+        ts: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        tz: Optional[str] = None,
+    ) -> None:
+        self.symbols = list(symbols)
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+        self.tz = tz
+        shape = (len(self.ts), len(self.symbols))
+        for name in COLUMNS:
+            if getattr(self, name).shape != shape:
+                raise ValueError(f"Spalte {name} hat Form {getattr(self, name).shape}, erwartet {shape}")
+
+    @classmethod
+    def from_frames(cls, frames: Mapping[str, Any], bars: Optional[int] = None) -> "CandlePanel":
+        """
+        Dict Symbol → Candles (beliebiges coerce-Format) auf eine Zeitachse legen.
+        bars: nur die letzten bars Zeilen der gemeinsamen Achse behalten.
+        """
+        coerced = {sym: CandleFrame.coerce(c) for sym, c in frames.items()}
+        coerced = {sym: f for sym, f in coerced.items() if len(f)}
+        symbols = list(coerced)
+        ts = np.unique(np.concatenate([f.ts for f in coerced.values()])) if coerced else np.empty(0, np.int64)
+        if bars is not None:
+            ts = ts[-bars:] if bars > 0 else ts[:0]
+        cols = {name: np.full((len(ts), len(symbols)), np.nan) for name in COLUMNS}
+        for j, frame in enumerate(coerced.values()):
+            rows = np.searchsorted(ts, frame.ts)
+            keep = rows < len(ts)
+            keep[keep] = ts[rows[keep]] == frame.ts[keep]   # vor dem bars-Fenster → verworfen
+            for name in COLUMNS:
+                cols[name][rows[keep], j] = getattr(frame, name)[keep]
+        tz = next((f.tz for f in coerced.values() if f.tz), None)
+        return cls(symbols, ts, tz=tz, **cols)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __repr__(self) -> str:
+        return f"CandlePanel(bars={len(self)}, symbols={len(self.symbols)}, tz={self.tz!r})"
+
+    def frame(self, symbol: str) -> CandleFrame:
+        """Serie eines Symbols ohne Lücken-Zeilen."""
+        j = self.symbols.index(symbol)
+        valid = ~np.isnan(self.close[:, j])
+        return CandleFrame(
+            self.ts[valid], *(getattr(self, name)[valid, j] for name in COLUMNS), tz=self.tz,
+        )
+
+
+def json_default(obj: Any) -> Any:
+    """json.dumps(..., default=json_default): CandleFrame und NumPy-Werte serialisierbar machen."""
+    if isinstance(obj, CandleFrame):
+        return obj.to_records()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -4,15 +4,23 @@ Handles OHLCV candles, implied volatility, and current prices with caching.
 """
 
 import os
+import asyncio
 import logging
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Any
+from typing import Awaitable, Dict, List, Optional, Any, Tuple, TypeVar
 from dataclasses import dataclass
 import requests
-from functools import lru_cache
+from functools import lru_cache, partial
 import time
 
+from candle_frame import CandleFrame
+from ttl_cache import TTLCache
+import http_client
+import quote_service
+
 # ============================================================
 # Data Classes
 # ============================================================
@@ -79,40 +87,78 @@ class IVData:
         }
 
 
+# Max. symbols per multi-symbol bars request (keeps the query string short)
+BARS_BATCH_SIZE = int(os.getenv("ALPACA_BARS_BATCH_SIZE", "100"))
+# Alpaca caps bars per page across ALL symbols of a multi-symbol request
+BARS_PAGE_LIMIT = 10000
+# Cache bounds (entries / estimated bytes, 0 = no byte budget)
+CACHE_MAX_ENTRIES = int(os.getenv("DATA_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", "0"))
+# Max. concurrent HTTP requests of the async fetch engine
+FETCH_CONCURRENCY = int(os.getenv("DATA_FETCH_CONCURRENCY", "16"))
+
+# kind → (Alpaca timeframe, duration of one bar, cache TTL seconds)
+BAR_KINDS = {
+    "hourly": ("1Hour", timedelta(hours=1), 300),   # 5-min cache
+    "daily": ("1Day", timedelta(days=1), 3600),     # 1-hour cache
+}
+
+T = TypeVar("T")
+
+
+def _run_sync(coro: Awaitable[T]) -> T:
+    """Run a coroutine to completion from synchronous code.
+
+    Uses asyncio.run; when the caller already runs an event loop, the
+    coroutine gets its own loop in a helper thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+def _parse_bar(bar: Dict[str, Any]) -> Candle:
+    """Convert one Alpaca bar dict (t/o/h/l/c/v) to a Candle"""
+    # Handle both ISO and numeric timestamp formats
+    if isinstance(bar.get("t"), str):
+        ts = datetime.fromisoformat(bar["t"].replace("Z", "+00:00"))
+    else:
+        ts = datetime.fromtimestamp(bar["t"], tz=timezone.utc)
+
+    return Candle(
+        timestamp=ts,
+        open=float(bar["o"]),
+        high=float(bar["h"]),
+        low=float(bar["l"]),
+        close=float(bar["c"]),
+        volume=int(bar.get("v", 0)),
+    )
+
+
 # ============================================================
 # Caching Layer
 # ============================================================
 
-class CacheManager:
-    """Simple TTL-based cache for market data"""
+class CacheManager(TTLCache):
+    """Bounded, thread-safe LRU + TTL cache for market data
 
-    def __init__(self):
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    Limits come from DATA_CACHE_MAX_ENTRIES / DATA_CACHE_MAX_BYTES (0 = no byte
+    budget). Hit/miss/eviction counters are exposed via DataFetcher.get_cache_status.
+    """
 
-    def get(self, key: str, ttl_seconds: int = 3600) -> Optional[Any]:
-        """Retrieve cached value if not expired"""
-        if key not in self.cache:
-            return None
-
-        entry = self.cache[key]
-        age = time.time() - entry["timestamp"]
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        super().__init__(
+            max_entries=max_entries or CACHE_MAX_ENTRIES,
+            max_bytes=max_bytes or CACHE_MAX_BYTES or None,
+            name="data_fetcher",
+        )
 
-        if age > ttl_seconds:
-            del self.cache[key]
-            return None
-
-        return entry["value"]
-
-    def set(self, key: str, value: Any) -> None:
-        """Store value with current timestamp"""
-        self.cache[key] = {
-            "value": value,
-            "timestamp": time.time(),
-        }
-
-    def clear(self) -> None:
-        """Clear all cache"""
-        self.cache.clear()
+    def get(self, key: str, ttl_seconds: Optional[float] = 3600) -> Optional[Any]:
+        """Retrieve cached value if not expired"""
+        return super().get(key, ttl_seconds)
 
 
 # ============================================================
@@ -120,9 +166,22 @@ class CacheManager:
 # ============================================================
 
 class DataFetcher:
-    """Fetches OHLCV, IV, and market data from Alpaca"""
-
-    def __init__(self):
+    """Fetches OHLCV, IV, and market data from Alpaca
+
+    Every endpoint has a synchronous method and an ``*_async`` variant.
+    Both go through the pooled ``http_client`` "market-data" session
+    (keep-alive, per-host connection limit). The async variants add a
+    worker pool of ``max_concurrency`` threads, so at most that many HTTP
+    calls are in flight; retries wait with ``asyncio.sleep`` instead of
+    blocking. ``fetch_symbol`` / ``fetch_all_symbols`` are thin synchronous
+    wrappers around the async engine.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        quotes: Optional["quote_service.QuoteService"] = None,
+    ):
         self.api_key = os.getenv("APCA_API_KEY_ID")
         self.secret_key = os.getenv("APCA_API_SECRET_KEY")
 
@@ -145,291 +204,526 @@ class DataFetcher:
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.INFO)
 
-    # -------- Hourly Candles (last 72 hours) --------
-    def fetch_hourly_candles(
+        # Pooled keep-alive session shared with every other DataFetcher; retries
+        # stay in _get_json / _get_json_async (logged, asyncio-friendly)
+        self.max_concurrency = max_concurrency or FETCH_CONCURRENCY
+        self._http = http_client.get_session(
+            "market-data",
+            retries=0,
+            pool_maxsize=max(http_client.HTTP_POOL_MAXSIZE, FETCH_CONCURRENCY),
+        )
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._http_lock = threading.Lock()
+
+        # Shared in-process quote service (one snapshot request for many symbols)
+        self.quotes = quotes or quote_service.quotes
+
+    # -------- HTTP Transport --------
+    def _get_json(
         self,
-        symbol: str,
-        limit: int = 72,
+        url: str,
+        what: str,
+        params: Optional[Dict[str, Any]] = None,
         retry_count: int = 3,
-    ) -> Optional[List[Candle]]:
-        """Fetch last 72 hours of hourly candles from Alpaca"""
-        cache_key = f"hourly_candles:{symbol}"
-        cached = self.cache.get(cache_key, ttl_seconds=300)  # 5-min cache
-        if cached is not None:
-            return cached
-
-        end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(hours=limit)
-
-        # Use v2/stocks endpoint for stock bars
-        url = f"{self.DATA_BASE_URL}/v2/stocks/bars"
-        params = {
-            "symbols": symbol,
-            "timeframe": "1Hour",
-            "start": start_time.isoformat().replace("+00:00", "Z"),
-            "end": end_time.isoformat().replace("+00:00", "Z"),
-            "limit": limit,
-            "adjustment": "all",
-            "feed": "iex",  # Use free IEX data feed
-        }
-
+    ) -> Optional[Dict[str, Any]]:
+        """GET with retries (blocking); None after retry_count failures"""
         for attempt in range(retry_count):
             try:
-                response = requests.get(
+                response = self._http.get(
                     url,
                     headers=self.headers,
                     params=params,
                     timeout=10,
                 )
                 response.raise_for_status()
-                data = response.json()
-
-                bars = data.get("bars", {}).get(symbol, [])
-                if not bars:
-                    self.logger.info(f"No hourly candles returned for {symbol}")
-                    return []
-
-                candles = []
-                for bar in bars:
-                    # Handle both ISO and numeric timestamp formats
-                    if isinstance(bar.get("t"), str):
-                        ts = datetime.fromisoformat(bar["t"].replace("Z", "+00:00"))
-                    else:
-                        ts = datetime.fromtimestamp(bar["t"], tz=timezone.utc)
-
-                    candle = Candle(
-                        timestamp=ts,
-                        open=float(bar["o"]),
-                        high=float(bar["h"]),
-                        low=float(bar["l"]),
-                        close=float(bar["c"]),
-                        volume=int(bar.get("v", 0)),
-                    )
-                    candles.append(candle)
-
-                self.cache.set(cache_key, candles)
-                self.logger.info(
-                    f"Fetched {len(candles)} hourly candles for {symbol}"
-                )
-                return candles
+                return response.json()
 
             except requests.exceptions.RequestException as e:
                 self.logger.warning(
-                    f"Attempt {attempt + 1}/{retry_count}: Failed to fetch hourly candles "
-                    f"for {symbol}: {e}"
+                    f"Attempt {attempt + 1}/{retry_count}: Failed to fetch {what}: {e}"
                 )
                 if attempt < retry_count - 1:
                     time.sleep(1 + attempt)
-                continue
 
-        self.logger.error(f"Failed to fetch hourly candles for {symbol} after {retry_count} retries")
         return None
 
-    # -------- Daily Candles (last 365 days, cached) --------
-    def fetch_daily_candles(
+    def _async_transport(self) -> Tuple[requests.Session, ThreadPoolExecutor]:
+        """Shared keep-alive session and worker pool for the async engine"""
+        with self._http_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix="data-fetch",
+                )
+            return self._http, self._pool
+
+    async def _get_json_async(
         self,
-        symbol: str,
-        limit: int = 365,
+        url: str,
+        what: str,
+        params: Optional[Dict[str, Any]] = None,
         retry_count: int = 3,
-    ) -> Optional[List[Candle]]:
-        """Fetch last 365 days of daily candles from Alpaca (cached for 1 hour)"""
-        cache_key = f"daily_candles:{symbol}"
-        cached = self.cache.get(cache_key, ttl_seconds=3600)  # 1-hour cache
-        if cached is not None:
-            return cached
+    ) -> Optional[Dict[str, Any]]:
+        """GET with retries on the shared session; waiting does not block other requests"""
+        session, pool = self._async_transport()
+        loop = asyncio.get_running_loop()
+        request = partial(session.get, url, headers=self.headers, params=params, timeout=10)
 
+        for attempt in range(retry_count):
+            try:
+                response = await loop.run_in_executor(pool, request)
+                response.raise_for_status()
+                return response.json()
+
+            except requests.exceptions.RequestException as e:
+                self.logger.warning(
+                    f"Attempt {attempt + 1}/{retry_count}: Failed to fetch {what}: {e}"
+                )
+                if attempt < retry_count - 1:
+                    await asyncio.sleep(1 + attempt)
+
+        return None
+
+    def close(self) -> None:
+        """Release the async engine's worker threads (the pooled session is shared)"""
+        with self._http_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    # -------- Candles (shared by hourly/daily) --------
+    def _bars_request(
+        self,
+        kind: str,
+        symbols: List[str],
+        limit: int,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """URL + params for /v2/stocks/bars over the last `limit` bars of `kind`"""
+        timeframe, step, _ = BAR_KINDS[kind]
         end_time = datetime.now(timezone.utc)
-        start_time = end_time - timedelta(days=limit)
+        start_time = end_time - step * limit
 
         # Use v2/stocks endpoint for stock bars
         url = f"{self.DATA_BASE_URL}/v2/stocks/bars"
         params = {
-            "symbols": symbol,
-            "timeframe": "1Day",
+            "symbols": ",".join(symbols),
+            "timeframe": timeframe,
             "start": start_time.isoformat().replace("+00:00", "Z"),
             "end": end_time.isoformat().replace("+00:00", "Z"),
             "limit": limit,
             "adjustment": "all",
             "feed": "iex",  # Use free IEX data feed
         }
+        return url, params
 
-        for attempt in range(retry_count):
-            try:
-                response = requests.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=10,
-                )
-                response.raise_for_status()
-                data = response.json()
-
-                bars = data.get("bars", {}).get(symbol, [])
-                if not bars:
-                    self.logger.info(f"No daily candles returned for {symbol}")
-                    return []
-
-                candles = []
-                for bar in bars:
-                    # Handle both ISO and numeric timestamp formats
-                    if isinstance(bar.get("t"), str):
-                        ts = datetime.fromisoformat(bar["t"].replace("Z", "+00:00"))
-                    else:
-                        ts = datetime.fromtimestamp(bar["t"], tz=timezone.utc)
-
-                    candle = Candle(
-                        timestamp=ts,
-                        open=float(bar["o"]),
-                        high=float(bar["h"]),
-                        low=float(bar["l"]),
-                        close=float(bar["c"]),
-                        volume=int(bar.get("v", 0)),
-                    )
-                    candles.append(candle)
-
-                self.cache.set(cache_key, candles)
-                self.logger.info(
-                    f"Fetched {len(candles)} daily candles for {symbol}"
-                )
-                return candles
+    def _cached_candles(self, kind: str, symbol: str) -> Optional[List[Candle]]:
+        return self.cache.get(f"{kind}_candles:{symbol}", ttl_seconds=BAR_KINDS[kind][2])
 
-            except requests.exceptions.RequestException as e:
-                self.logger.warning(
-                    f"Attempt {attempt + 1}/{retry_count}: Failed to fetch daily candles "
-                    f"for {symbol}: {e}"
-                )
-                if attempt < retry_count - 1:
-                    time.sleep(1 + attempt)
-                continue
+    def _store_candles(self, kind: str, symbol: str, data: Dict[str, Any]) -> List[Candle]:
+        """Parse a single-symbol bars response and cache it"""
+        bars = data.get("bars", {}).get(symbol, [])
+        if not bars:
+            self.logger.info(f"No {kind} candles returned for {symbol}")
+            return []
 
-        self.logger.error(f"Failed to fetch daily candles for {symbol} after {retry_count} retries")
-        return None
+        candles = [_parse_bar(bar) for bar in bars]
+        self.cache.set(f"{kind}_candles:{symbol}", candles)
+        self.logger.info(f"Fetched {len(candles)} {kind} candles for {symbol}")
+        return candles
+
+    def _fetch_candles(self, kind: str, symbol: str, limit: int, retry_count: int) -> Optional[List[Candle]]:
+        cached = self._cached_candles(kind, symbol)
+        if cached is not None:
+            return cached
+
+        def _load() -> Optional[List[Candle]]:
+            url, params = self._bars_request(kind, [symbol], limit)
+            data = self._get_json(url, f"{kind} candles for {symbol}", params, retry_count)
+            if data is None:
+                self.logger.error(f"Failed to fetch {kind} candles for {symbol} after {retry_count} retries")
+                return None
+            return self._store_candles(kind, symbol, data)
+
+        # concurrent misses for the same symbol share one request
+        return self.cache.single_flight(f"{kind}_candles:{symbol}", _load)
+
+    async def _fetch_candles_async(self, kind: str, symbol: str, limit: int, retry_count: int) -> Optional[List[Candle]]:
+        cached = self._cached_candles(kind, symbol)
+        if cached is not None:
+            return cached
+
+        async def _load() -> Optional[List[Candle]]:
+            url, params = self._bars_request(kind, [symbol], limit)
+            data = await self._get_json_async(url, f"{kind} candles for {symbol}", params, retry_count)
+            if data is None:
+                self.logger.error(f"Failed to fetch {kind} candles for {symbol} after {retry_count} retries")
+                return None
+            return self._store_candles(kind, symbol, data)
+
+        return await self.cache.single_flight_async(f"{kind}_candles:{symbol}", _load)
+
+    # -------- Hourly Candles (last 72 hours) --------
+    def fetch_hourly_candles(
+        self,
+        symbol: str,
+        limit: int = 72,
+        retry_count: int = 3,
+    ) -> Optional[List[Candle]]:
+        """Fetch last 72 hours of hourly candles from Alpaca (cached 5 minutes)"""
+        return self._fetch_candles("hourly", symbol, limit, retry_count)
+
+    async def fetch_hourly_candles_async(
+        self,
+        symbol: str,
+        limit: int = 72,
+        retry_count: int = 3,
+    ) -> Optional[List[Candle]]:
+        return await self._fetch_candles_async("hourly", symbol, limit, retry_count)
+
+    # -------- Daily Candles (last 365 days, cached) --------
+    def fetch_daily_candles(
+        self,
+        symbol: str,
+        limit: int = 365,
+        retry_count: int = 3,
+    ) -> Optional[List[Candle]]:
+        """Fetch last 365 days of daily candles from Alpaca (cached for 1 hour)"""
+        return self._fetch_candles("daily", symbol, limit, retry_count)
+
+    async def fetch_daily_candles_async(
+        self,
+        symbol: str,
+        limit: int = 365,
+        retry_count: int = 3,
+    ) -> Optional[List[Candle]]:
+        return await self._fetch_candles_async("daily", symbol, limit, retry_count)
 
     # -------- Implied Volatility (1-hour cache) --------
+    def _iv_request(self, symbol: str) -> str:
+        return f"{self.BASE_URL}/v1/marketdata/etfs/{symbol}/snapshot"
+
+    def _store_iv(self, symbol: str, data: Optional[Dict[str, Any]]) -> float:
+        if data is None:
+            self.logger.warning(f"Failed to fetch IV for {symbol}, using default 0.25")
+            return 0.25
+
+        # Extract IV from option chain if available
+        if "option_chain" in data:
+            iv = data["option_chain"].get("iv", 0.25)
+        else:
+            # Fallback: use previous or default
+            iv = 0.25
+
+        self.cache.set(f"iv:{symbol}", iv)
+        self.logger.info(f"Fetched IV for {symbol}: {iv:.4f}")
+        return iv
+
     def fetch_iv(
         self,
         symbol: str,
         retry_count: int = 3,
     ) -> Optional[float]:
         """Fetch implied volatility for symbol (cached 1 hour)"""
-        cache_key = f"iv:{symbol}"
-        cached = self.cache.get(cache_key, ttl_seconds=3600)  # 1-hour cache
+        cached = self.cache.get(f"iv:{symbol}", ttl_seconds=3600)  # 1-hour cache
         if cached is not None:
             return cached
 
-        url = f"{self.BASE_URL}/v1/marketdata/etfs/{symbol}/snapshot"
+        def _load() -> float:
+            data = self._get_json(self._iv_request(symbol), f"IV for {symbol}", retry_count=retry_count)
+            return self._store_iv(symbol, data)
 
-        for attempt in range(retry_count):
-            try:
-                response = requests.get(
-                    url,
-                    headers=self.headers,
-                    timeout=10,
-                )
-                response.raise_for_status()
-                data = response.json()
-
-                # Extract IV from option chain if available
-                if "option_chain" in data:
-                    iv = data["option_chain"].get("iv", 0.25)
-                else:
-                    # Fallback: use previous or default
-                    iv = 0.25
+        return self.cache.single_flight(f"iv:{symbol}", _load)
 
-                self.cache.set(cache_key, iv)
-                self.logger.info(f"Fetched IV for {symbol}: {iv:.4f}")
-                return iv
+    async def fetch_iv_async(
+        self,
+        symbol: str,
+        retry_count: int = 3,
+    ) -> Optional[float]:
+        cached = self.cache.get(f"iv:{symbol}", ttl_seconds=3600)
+        if cached is not None:
+            return cached
 
-            except requests.exceptions.RequestException as e:
-                self.logger.warning(
-                    f"Attempt {attempt + 1}/{retry_count}: Failed to fetch IV "
-                    f"for {symbol}: {e}"
-                )
-                if attempt < retry_count - 1:
-                    time.sleep(1 + attempt)
-                continue
+        async def _load() -> float:
+            data = await self._get_json_async(self._iv_request(symbol), f"IV for {symbol}", retry_count=retry_count)
+            return self._store_iv(symbol, data)
 
-        self.logger.warning(f"Failed to fetch IV for {symbol}, using default 0.25")
-        return 0.25
+        return await self.cache.single_flight_async(f"iv:{symbol}", _load)
 
     # -------- Current Market Price --------
+    def _quote_request(self, symbol: str) -> str:
+        return f"{self.BASE_URL}/v1/marketdata/stocks/{symbol}/latest/quote"
+
+    def _parse_quote(self, symbol: str, data: Optional[Dict[str, Any]]) -> Optional[MarketData]:
+        if data is None:
+            self.logger.error(f"Failed to fetch current price for {symbol}")
+            return None
+
+        quote = data.get("quote", {})
+        market_data = MarketData(
+            symbol=symbol,
+            price=float(quote.get("ap", quote.get("bp", 0))),  # ask price or bid price
+            bid=float(quote.get("bp", 0)),
+            ask=float(quote.get("ap", 0)),
+            bid_size=int(quote.get("bs", 0)),
+            ask_size=int(quote.get("as", 0)),
+            timestamp=datetime.now(timezone.utc),
+        )
+
+        self.logger.info(
+            f"Fetched price for {symbol}: ${market_data.price:.2f} "
+            f"(bid: ${market_data.bid:.2f}, ask: ${market_data.ask:.2f})"
+        )
+        return market_data
+
     def fetch_current_price(
         self,
         symbol: str,
         retry_count: int = 3,
     ) -> Optional[MarketData]:
         """Fetch current bid/ask/price for symbol"""
-        url = f"{self.BASE_URL}/v1/marketdata/stocks/{symbol}/latest/quote"
+        data = self._get_json(self._quote_request(symbol), f"current price for {symbol}", retry_count=retry_count)
+        return self._parse_quote(symbol, data)
 
-        for attempt in range(retry_count):
-            try:
-                response = requests.get(
-                    url,
-                    headers=self.headers,
-                    timeout=10,
-                )
-                response.raise_for_status()
-                data = response.json().get("quote", {})
-
-                market_data = MarketData(
-                    symbol=symbol,
-                    price=float(data.get("ap", data.get("bp", 0))),  # ask price or bid price
-                    bid=float(data.get("bp", 0)),
-                    ask=float(data.get("ap", 0)),
-                    bid_size=int(data.get("bs", 0)),
-                    ask_size=int(data.get("as", 0)),
-                    timestamp=datetime.now(timezone.utc),
-                )
+    async def fetch_current_price_async(
+        self,
+        symbol: str,
+        retry_count: int = 3,
+    ) -> Optional[MarketData]:
+        data = await self._get_json_async(
+            self._quote_request(symbol), f"current price for {symbol}", retry_count=retry_count
+        )
+        return self._parse_quote(symbol, data)
 
-                self.logger.info(
-                    f"Fetched price for {symbol}: ${market_data.price:.2f} "
-                    f"(bid: ${market_data.bid:.2f}, ask: ${market_data.ask:.2f})"
-                )
-                return market_data
+    # -------- Multi-Symbol Bars (batched) --------
+    def fetch_hourly_candles_batch(
+        self,
+        symbols: List[str],
+        limit: int = 72,
+        retry_count: int = 3,
+    ) -> Dict[str, List[Candle]]:
+        """Hourly candles for many symbols via multi-symbol requests (same cache keys as fetch_hourly_candles)"""
+        return self._fetch_bars_batch("hourly", symbols, limit, retry_count)
 
-            except requests.exceptions.RequestException as e:
-                self.logger.warning(
-                    f"Attempt {attempt + 1}/{retry_count}: Failed to fetch current price "
-                    f"for {symbol}: {e}"
-                )
-                if attempt < retry_count - 1:
-                    time.sleep(1 + attempt)
-                continue
+    def fetch_daily_candles_batch(
+        self,
+        symbols: List[str],
+        limit: int = 365,
+        retry_count: int = 3,
+    ) -> Dict[str, List[Candle]]:
+        """Daily candles for many symbols via multi-symbol requests (same cache keys as fetch_daily_candles)"""
+        return self._fetch_bars_batch("daily", symbols, limit, retry_count)
+
+    def _split_cached(self, kind: str, symbols: List[str]) -> Tuple[Dict[str, List[Candle]], List[List[str]]]:
+        """Cached candles + remaining symbols in chunks of BARS_BATCH_SIZE"""
+        cached: Dict[str, List[Candle]] = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            candles = self._cached_candles(kind, symbol)
+            if candles is not None:
+                cached[symbol] = candles
+            else:
+                missing.append(symbol)
+        chunks = [missing[i:i + BARS_BATCH_SIZE] for i in range(0, len(missing), BARS_BATCH_SIZE)]
+        return cached, chunks
+
+    def _store_batch(
+        self,
+        kind: str,
+        chunk: List[str],
+        limit: int,
+        bars_by_symbol: Optional[Dict[str, List[Dict[str, Any]]]],
+        retry_count: int,
+    ) -> Dict[str, List[Candle]]:
+        """Fan a merged multi-symbol response back into the per-symbol cache keys"""
+        if bars_by_symbol is None:
+            self.logger.error(
+                f"Failed to fetch {kind} bars for {len(chunk)} symbols "
+                f"({chunk[0]}..{chunk[-1]}) after {retry_count} retries"
+            )
+            return {}
+
+        results: Dict[str, List[Candle]] = {}
+        for symbol in chunk:
+            bars = bars_by_symbol.get(symbol, [])
+            candles = [_parse_bar(bar) for bar in bars[-limit:]]
+            results[symbol] = candles
+            if candles:
+                self.cache.set(f"{kind}_candles:{symbol}", candles)
+
+        self.logger.info(
+            f"Fetched {kind} bars for {len(chunk)} symbols in one batch "
+            f"({sum(len(b) for b in bars_by_symbol.values())} bars)"
+        )
+        return results
 
-        self.logger.error(f"Failed to fetch current price for {symbol}")
-        return None
+    def _fetch_bars_batch(
+        self,
+        kind: str,
+        symbols: List[str],
+        limit: int,
+        retry_count: int = 3,
+    ) -> Dict[str, List[Candle]]:
+        """Fetch bars for many symbols with few requests
+
+        Cached symbols are served from cache. The rest is requested in chunks of
+        BARS_BATCH_SIZE via the comma-separated ``symbols`` parameter, following
+        ``next_page_token`` until the chunk is complete. Results are fanned back
+        into the per-symbol cache keys (``<kind>_candles:<symbol>``).
+
+        Returns candles for every symbol of a successful chunk (empty list if
+        Alpaca had no bars). Symbols of failed chunks are left out so callers
+        can fall back to the single-symbol methods.
+        """
+        results, chunks = self._split_cached(kind, symbols)
+        for chunk in chunks:
+            url, params = self._bars_request(kind, chunk, limit)
+            params["limit"] = BARS_PAGE_LIMIT
+            bars_by_symbol = self._get_all_bar_pages(url, params, retry_count)
+            results.update(self._store_batch(kind, chunk, limit, bars_by_symbol, retry_count))
+        return results
+
+    async def _fetch_bars_batch_async(
+        self,
+        kind: str,
+        symbols: List[str],
+        limit: int,
+        retry_count: int = 3,
+    ) -> Dict[str, List[Candle]]:
+        """Like _fetch_bars_batch, with all chunks in flight concurrently"""
+        results, chunks = self._split_cached(kind, symbols)
+
+        async def _chunk(chunk: List[str]) -> Dict[str, List[Candle]]:
+            url, params = self._bars_request(kind, chunk, limit)
+            params["limit"] = BARS_PAGE_LIMIT
+            bars_by_symbol = await self._get_all_bar_pages_async(url, params, retry_count)
+            return self._store_batch(kind, chunk, limit, bars_by_symbol, retry_count)
+
+        for part in await asyncio.gather(*(_chunk(chunk) for chunk in chunks)):
+            results.update(part)
+        return results
+
+    @staticmethod
+    def _merge_bar_page(merged: Dict[str, List[Dict[str, Any]]], data: Dict[str, Any]) -> Optional[str]:
+        """Add one page to merged; returns next_page_token"""
+        # A symbol's bars can continue on the next page
+        for symbol, bars in (data.get("bars") or {}).items():
+            merged.setdefault(symbol, []).extend(bars)
+        return data.get("next_page_token")
+
+    def _get_all_bar_pages(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        retry_count: int,
+    ) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Follow next_page_token and merge pages into {symbol: [bar, ...]}; None on failure"""
+        merged: Dict[str, List[Dict[str, Any]]] = {}
+        page_params = dict(params)
+        while True:
+            data = self._get_json(url, f"bars page for {params['symbols']}", page_params, retry_count)
+            if data is None:
+                return None
+            page_token = self._merge_bar_page(merged, data)
+            if not page_token:
+                return merged
+            page_params = {**params, "page_token": page_token}
+
+    async def _get_all_bar_pages_async(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        retry_count: int,
+    ) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        merged: Dict[str, List[Dict[str, Any]]] = {}
+        page_params = dict(params)
+        while True:
+            data = await self._get_json_async(url, f"bars page for {params['symbols']}", page_params, retry_count)
+            if data is None:
+                return None
+            page_token = self._merge_bar_page(merged, data)
+            if not page_token:
+                return merged
+            page_params = {**params, "page_token": page_token}
 
     # -------- Batch Operations --------
-    def fetch_all_symbols(
+    async def fetch_all_symbols_async(
         self,
         symbols: List[str],
     ) -> Dict[str, Dict[str, Any]]:
-        """Fetch hourly + daily candles + IV for all symbols"""
-        results = {}
+        """Fetch hourly + daily candles + IV + price for all symbols concurrently
 
-        for symbol in symbols:
-            hourly = self.fetch_hourly_candles(symbol)
-            daily = self.fetch_daily_candles(symbol)
-            iv = self.fetch_iv(symbol)
-            price = self.fetch_current_price(symbol)
+        Bars for all symbols are loaded with batched multi-symbol requests;
+        symbols whose batch failed fall back to the single-symbol fetch.
+        Prices come from one QuoteService snapshot; symbols it cannot price
+        and IV lookups run concurrently, bounded by max_concurrency.
+        """
+        _, pool = self._async_transport()
+        loop = asyncio.get_running_loop()
+        hourly_batch, daily_batch, snapshot = await asyncio.gather(
+            self._fetch_bars_batch_async("hourly", symbols, 72),
+            self._fetch_bars_batch_async("daily", symbols, 365),
+            loop.run_in_executor(pool, self.quotes.get_quotes, list(symbols)),
+        )
+
+        async def _from_batch(batch: Dict[str, List[Candle]], kind: str, symbol: str) -> Optional[List[Candle]]:
+            if symbol in batch:
+                return batch[symbol]
+            return await self._fetch_candles_async(kind, symbol, 72 if kind == "hourly" else 365, 3)
+
+        async def _price(symbol: str) -> Optional[MarketData]:
+            quote = snapshot.get(symbol.upper())
+            if quote is None:
+                return await self.fetch_current_price_async(symbol)
+            return MarketData(
+                symbol=symbol,
+                price=quote.price,
+                bid=quote.bid,
+                ask=quote.ask,
+                bid_size=quote.bid_size,
+                ask_size=quote.ask_size,
+                timestamp=quote.timestamp or datetime.now(timezone.utc),
+            )
 
-            results[symbol] = {
+        async def _one(symbol: str) -> Dict[str, Any]:
+            hourly, daily, iv, price = await asyncio.gather(
+                _from_batch(hourly_batch, "hourly", symbol),
+                _from_batch(daily_batch, "daily", symbol),
+                self.fetch_iv_async(symbol),
+                _price(symbol),
+            )
+            return {
                 "symbol": symbol,
-                "hourly_candles": hourly or [],
-                "daily_candles": daily or [],
+                "hourly_candles": self.candles_to_frame(hourly or []),
+                "daily_candles": self.candles_to_frame(daily or []),
                 "iv": iv,
                 "price": price.to_dict() if price else None,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             }
 
-        return results
+        unique = list(dict.fromkeys(symbols))
+        entries = await asyncio.gather(*(_one(symbol) for symbol in unique))
+        return dict(zip(unique, entries))
 
-    def fetch_symbol(self, symbol: str) -> Dict[str, Any]:
-        """Fetch all data for single symbol"""
-        hourly = self.fetch_hourly_candles(symbol)
-        daily = self.fetch_daily_candles(symbol)
-        iv = self.fetch_iv(symbol)
-        price = self.fetch_current_price(symbol)
+    def fetch_all_symbols(
+        self,
+        symbols: List[str],
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch hourly + daily candles + IV for all symbols
+
+        Thin wrapper around fetch_all_symbols_async. Candles are returned as
+        CandleFrame (columnar arrays), which compute_indicators /
+        AnalyticsEngine consume directly.
+        """
+        return _run_sync(self.fetch_all_symbols_async(symbols))
+
+    async def fetch_symbol_async(self, symbol: str) -> Dict[str, Any]:
+        """Fetch all data for single symbol (all four requests concurrently)"""
+        hourly, daily, iv, price = await asyncio.gather(
+            self.fetch_hourly_candles_async(symbol),
+            self.fetch_daily_candles_async(symbol),
+            self.fetch_iv_async(symbol),
+            self.fetch_current_price_async(symbol),
+        )
 
         return {
             "symbol": symbol,
@@ -440,6 +734,10 @@ class DataFetcher:
             "timestamp": datetime.now(timezone.utc).isoformat(),
         }
 
+    def fetch_symbol(self, symbol: str) -> Dict[str, Any]:
+        """Fetch all data for single symbol (wrapper around fetch_symbol_async)"""
+        return _run_sync(self.fetch_symbol_async(symbol))
+
     # -------- Cache Management --------
     def clear_cache(self) -> None:
         """Clear all cached data"""
@@ -447,13 +745,17 @@ class DataFetcher:
         self.logger.info("Cache cleared")
 
     def get_cache_status(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        return {
-            "size": len(self.cache.cache),
-            "entries": list(self.cache.cache.keys()),
-        }
+        """Get cache statistics (size, hit/miss/eviction counters, keys)"""
+        status = self.cache.stats()
+        status["entries"] = self.cache.keys()
+        return status
 
     # -------- Format Conversion --------
+    @staticmethod
+    def candles_to_frame(candles: List[Candle]) -> CandleFrame:
+        """Convert Candle objects to a columnar CandleFrame (UTC timestamps)"""
+        return CandleFrame.from_records(candles, tz="UTC")
+
     @staticmethod
     def candles_to_indicators_format(candles: List[Candle]) -> List[Dict[str, float]]:
         """Convert Candle objects to format expected by DEF_INDICATORS.compute_indicators
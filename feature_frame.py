@@ -0,0 +1,133 @@
+"""
+feature_frame.py
+
+Gemeinsamer Feature-Frame pro Candle-Serie – einmal gerechnet, von allen geteilt.
+
+Im Scan-Pfad rechnen sonst drei Stellen dieselben Indikatoren über dieselben
+Candles: compute_indicators (Snapshot), MLSignalEngine.predict (_build_feature_df)
+und AnalyticsEngine.analyze. FeatureFrame hält alle Indikator-Serien einer Serie
+(RSI, MACD, ATR, EMA 20/50/200, Bollinger, Volumen, ADX, Stochastic) und leitet
+daraus ab, was die Konsumenten brauchen:
+
+  snapshot()                Rohwerte zum letzten Bar (Grundlage von compute_indicators)
+  derived(name, build)      beliebige Ableitung, einmal pro Frame gebaut (z.B. ML-Basis-Features)
+
+get(candles) memoisiert per Inhalts-Hash (Länge, letzter Timestamp, Digest über
+ts + OHLCV): gleiche Candles → derselbe FeatureFrame, egal ob als CandleFrame,
+List[Dict] oder DataFrame übergeben und egal welches Symbol/Timeframe sie tragen.
+
+Konfiguration via .env:
+  FEATURE_CACHE_MAX_ENTRIES    512
+  FEATURE_CACHE_TTL_SECONDS    900
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+import indicator_kernels as kern
+from candle_frame import COLUMNS, CandleFrame
+from ttl_cache import TTLCache
+
+FEATURE_CACHE_MAX_ENTRIES = int(os.getenv("FEATURE_CACHE_MAX_ENTRIES", "512"))
+FEATURE_CACHE_TTL_SECONDS = float(os.getenv("FEATURE_CACHE_TTL_SECONDS", "900"))
+
+_cache = TTLCache(
+    max_entries=FEATURE_CACHE_MAX_ENTRIES,
+    default_ttl=FEATURE_CACHE_TTL_SECONDS,
+    name="feature_frames",
+)
+
+
+def content_key(frame: CandleFrame) -> Tuple[int, int, str]:
+    """(Bars, letzter Timestamp, Digest über ts + OHLCV) – identisch für inhaltsgleiche Serien."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(frame.ts).data)
+    for name in COLUMNS:
+        digest.update(np.ascontiguousarray(getattr(frame, name)).data)
+    last_ts = int(frame.ts[-1]) if len(frame) else 0
+    return len(frame), last_ts, digest.hexdigest()
+
+
+class FeatureFrame:
+    """Indikator-Serien einer Candle-Serie (Arrays gleicher Länge wie frame)."""
+
+    __slots__ = ("frame", "series", "_derived", "_lock")
+
+    def __init__(self, frame: CandleFrame) -> None:
+        self.frame = frame
+        close, high, low, vol = frame.close, frame.high, frame.low, frame.volume
+        macd = kern.macd(close, fast=12, slow=26, signal=9)
+        bb = kern.bbands(close, 20, 2.0)
+        stoch = kern.stoch(high, low, close, k=14, d=3, smooth_k=3)
+        vol_ma = kern.sma(vol, 20)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vol_ratio = vol / vol_ma
+        self.series: Dict[str, np.ndarray] = {
+            "rsi_14":       kern.rsi(close, 14),
+            "macd_value":   macd["macd"],
+            "macd_signal":  macd["signal"],
+            "macd_hist":    macd["hist"],
+            "atr_14":       kern.atr(high, low, close, 14),
+            "ema_20":       kern.ema(close, 20),
+            "ema_50":       kern.ema(close, 50),
+            "ema_200":      kern.ema(close, 200),
+            "bb_lower":     bb["lower"],
+            "bb_mid":       bb["mid"],
+            "bb_upper":     bb["upper"],
+            "bb_bandwidth": bb["bandwidth"],
+            "bb_pct":       bb["pct"],
+            "vol_ma":       vol_ma,
+            "vol_ratio":    vol_ratio,
+            "adx":          kern.adx(high, low, close, 14)["adx"],
+            "stoch_k":      stoch["k"],
+            "stoch_d":      stoch["d"],
+        }
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def derived(self, name: str, build: Callable[["FeatureFrame"], Any]) -> Any:
+        """build(self) einmal pro Frame ausführen und das Ergebnis unter name merken."""
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+            return self._derived[name]
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Rohwerte zum letzten Bar, gerundet wie compute_indicators (letzter gültiger Wert)."""
+        return dict(self.derived("snapshot", _snapshot))
+
+
+def _snapshot(ff: FeatureFrame) -> Dict[str, Optional[float]]:
+    frame = ff.frame
+    raw = {key: kern.last(values) for key, values in ff.series.items() if key != "vol_ratio"}
+    raw["last_close"] = kern.last(frame.close)
+    raw["last_vol"] = float(frame.volume[-1]) if len(frame) else None
+    return raw
+
+
+def get(candles: Any, cache: bool = True) -> FeatureFrame:
+    """
+    FeatureFrame für candles (beliebiges CandleFrame.coerce-Format).
+    cache=False für einmalige große Serien (Training), die den Cache nur verdrängen würden.
+    """
+    frame = CandleFrame.coerce(candles)
+    if not cache:
+        return FeatureFrame(frame)
+    return _cache.get_or_load(content_key(frame), lambda: FeatureFrame(frame))
+
+
+def stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+def clear() -> None:
+    _cache.clear()
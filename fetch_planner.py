@@ -0,0 +1,190 @@
+"""
+fetch_planner.py
+
+Lookback-bewusste Abrufplanung für den DataAgent.
+
+Statt fester Zeiträume (1y Daily, 60d Stunden, ...) wird pro Request nur so viel
+Historie angefragt, wie die registrierten Konsumenten brauchen:
+
+- Indikator-/Feature-Module melden ihren längsten Lookback in Bars an
+  (register_lookback("indicators", 200) für EMA200). Benötigt wird das Maximum
+  plus FETCH_WARMUP_BARS Aufwärm-Bars (EMA200 → 250 Bars).
+- Bars → Kalendertage über Bars pro Handelstag (US-Session 6,5h), Wochenenden
+  und Feiertags-Puffer; gekappt auf das, was der Provider liefert (yfinance
+  15m/5m max. 60 Tage).
+- Timeframes, die yfinance nicht nativ liefert (4h), werden aus
+  der nächstfeineren Serie resampelt (CandleFrame.resample). Liegt eine feinere
+  Serie schon im Speicher, wird daraus abgeleitet statt erneut geladen.
+
+Nutzung:
+  from fetch_planner import plan, register_lookback
+  register_lookback("indicators", 200)
+  p = plan("1h")   # FetchPlan(timeframe="1h", interval="1h", bars=250, days=56, ...)
+
+Konfiguration via .env:
+  FETCH_WARMUP_BARS     50    zusätzliche Bars für das Einschwingen von EMAs & Co.
+  FETCH_MIN_BARS        60    Untergrenze, auch wenn sich niemand registriert hat
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger("FetchPlanner")
+
+FETCH_WARMUP_BARS = int(os.getenv("FETCH_WARMUP_BARS", "50"))
+FETCH_MIN_BARS = int(os.getenv("FETCH_MIN_BARS", "60"))
+
+# Ohne Registrierung konservativ wie bisher: längster eingebauter Indikator (EMA200)
+DEFAULT_LOOKBACK = 200
+SESSION_MINUTES = 390            # US-Regular-Session 9:30–16:00
+HOLIDAY_SLACK_DAYS = 5           # Puffer für Feiertage / halbe Tage
+
+
+@dataclass(frozen=True)
+class Timeframe:
+    """Ein Bar-Raster und wie man es bei den Providern bekommt."""
+
+    key: str
+    seconds: int
+    yf_interval: Optional[str]      # None = nicht nativ → aus source resampeln
+    ibkr_bar_size: Optional[str]
+    source: Optional[str] = None    # feineres Raster für das Resampling
+    max_days: Optional[int] = None  # Provider-Limit (yfinance Intraday)
+
+    @property
+    def bars_per_day(self) -> float:
+        """Bars pro Handelstag (Wochen-Bar = 5 Handelstage)."""
+        if self.seconds >= 7 * 86400:
+            return 0.2
+        if self.seconds >= 86400:
+            return 1.0
+        return math.ceil(SESSION_MINUTES * 60 / self.seconds)
+
+
+TIMEFRAMES: Dict[str, Timeframe] = {
+    "5m": Timeframe("5m", 300, "5m", "5 mins", max_days=60),
+    "15m": Timeframe("15m", 900, "15m", "15 mins", max_days=60),
+    "30m": Timeframe("30m", 1800, "30m", "30 mins", max_days=60),
+    "1h": Timeframe("1h", 3600, "1h", "1 hour", max_days=730),
+    "4h": Timeframe("4h", 14400, None, None, source="1h", max_days=730),
+    "1d": Timeframe("1d", 86400, "1d", "1 day"),
+    "1wk": Timeframe("1wk", 7 * 86400, "1wk", "1 week", source="1d"),
+}
+
+_ALIASES = {
+    "d": "1d", "1day": "1d",
+    "60m": "1h", "60min": "1h", "1hour": "1h",
+    "15min": "15m", "5min": "5m", "30min": "30m",
+    "240m": "4h", "4hour": "4h",
+    "w": "1wk", "1w": "1wk", "week": "1wk",
+}
+
+
+def parse_timeframe(timeframe: str) -> Timeframe:
+    """"1D", "1H", "15min", "4h", ... → Timeframe; Unbekanntes → Daily (wie bisher)."""
+    key = (timeframe or "").strip().lower()
+    key = _ALIASES.get(key, key)
+    if key not in TIMEFRAMES:
+        logger.debug("[FetchPlanner] Unbekannter Timeframe %r – nutze 1d", timeframe)
+        key = "1d"
+    return TIMEFRAMES[key]
+
+
+# ── Lookback-Registry ─────────────────────────────────────────────────────────
+
+_lookbacks: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def register_lookback(name: str, bars: int) -> None:
+    """Konsument name braucht mindestens bars Bars (ohne Aufwärmphase)."""
+    with _lock:
+        _lookbacks[name] = int(bars)
+
+
+def lookbacks() -> Dict[str, int]:
+    with _lock:
+        return dict(_lookbacks)
+
+
+def required_bars() -> int:
+    """Max. registrierter Lookback + Aufwärm-Bars."""
+    with _lock:
+        longest = max(_lookbacks.values(), default=DEFAULT_LOOKBACK)
+    return max(FETCH_MIN_BARS, longest + FETCH_WARMUP_BARS)
+
+
+# ── Plan ──────────────────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class FetchPlan:
+    """
+    timeframe: gewünschtes Raster; interval: tatsächlich geladenes Raster
+    (≠ timeframe → per CandleFrame.resample zusammengefasst).
+    bars: Bars im Ziel-Raster; days: Kalendertage, die dafür geladen werden.
+    """
+
+    timeframe: str
+    interval: str
+    seconds: int
+    bars: int
+    days: int
+
+    @property
+    def resampled(self) -> bool:
+        return self.interval != self.timeframe
+
+    @property
+    def period(self) -> str:
+        """yfinance-/BarStore-Period."""
+        return f"{self.days}d"
+
+    @property
+    def ibkr_bar_size(self) -> str:
+        return TIMEFRAMES[self.interval].ibkr_bar_size or "1 day"
+
+    @property
+    def ibkr_days(self) -> int:
+        # "N D" ist bei IB auf 365 Tage begrenzt
+        return min(self.days, 365)
+
+
+def calendar_days(bars: int, tf: Timeframe) -> int:
+    """Kalendertage, die bars Bars im Raster tf sicher enthalten."""
+    trading_days = math.ceil(bars / tf.bars_per_day)
+    days = math.ceil(trading_days * 7 / 5) + HOLIDAY_SLACK_DAYS
+    return min(days, tf.max_days) if tf.max_days else days
+
+
+def plan(timeframe: str, bars: Optional[int] = None) -> FetchPlan:
+    """
+    Abrufplan für timeframe. bars: explizite Anzahl (inkl. Aufwärmphase),
+    sonst required_bars().
+    """
+    tf = parse_timeframe(timeframe)
+    bars = bars or required_bars()
+    source = TIMEFRAMES[tf.source] if tf.yf_interval is None and tf.source else tf
+    return FetchPlan(
+        timeframe=tf.key,
+        interval=source.key,
+        seconds=tf.seconds,
+        bars=bars,
+        days=calendar_days(bars, tf),
+    )
+
+
+def finer_intervals(timeframe: str) -> List[str]:
+    """Feinere Raster, aus denen sich timeframe resampeln lässt (gröbstes zuerst)."""
+    tf = parse_timeframe(timeframe)
+    finer = [t for t in TIMEFRAMES.values() if t.seconds < tf.seconds and tf.seconds % t.seconds == 0
+             and t.yf_interval is not None]
+    # Wochen aus Tagen, Tage nicht aus Intraday (Session-Lücken, Pre-/Post-Market)
+    if tf.seconds >= 86400:
+        finer = [t for t in finer if t.seconds >= 86400]
+    return [t.key for t in sorted(finer, key=lambda t: -t.seconds)]
@@ -0,0 +1,293 @@
+"""
+gpt_cache.py
+
+Inhaltsadressierter Antwort-Cache für GPT-Agenten-Calls.
+
+call_gpt_agent schickte bisher jeden Aufruf an OpenAI, auch wenn Agent, Modell,
+Prompt und Payload byte-identisch zu einem früheren Call waren – mit Tages-Candles
+passiert das im Lauf eines Handelstags ständig, ebenso beim erneuten Ausführen
+des Single-Symbol-Modus.
+
+- Key: SHA-256 über Agent, Modell, Temperatur, System-Prompt (= Prompt-Version)
+  und kanonisiertes Payload-JSON (sortierte Keys, kompakte Separatoren).
+- Speicher: kleines Dict-LRU im Prozess (TTLCache) vor einer SQLite-Tabelle, die
+  sich alle Prozesse teilen (WAL). Ist die Datenbank nicht beschreibbar, läuft der
+  Cache nur im Speicher weiter.
+- TTL pro Agent: GPT_CACHE_TTL_SECONDS als Default, Overrides über GPT_CACHE_TTLS
+  (news_agent ist ab Werk kürzer). TTL 0 = Agent wird nie gecacht.
+- Gleichzeitige identische Calls warten auf EINE Antwort (single-flight).
+- Gespeichert werden nur erfolgreiche Antworten (kein "error", kein "parse_error").
+
+Konfiguration via .env:
+  GPT_CACHE_ENABLED         1
+  GPT_CACHE_DB              gpt_cache.db
+  GPT_CACHE_TTL_SECONDS     28800     Default-TTL (ein Handelstag)
+  GPT_CACHE_TTLS            Overrides "agent=sekunden,...", z.B. handels_agent=0
+  GPT_CACHE_MEMORY_ENTRIES  1024
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from candle_frame import json_default
+from ttl_cache import TTLCache
+
+logger = logging.getLogger("GptCache")
+
+GPT_CACHE_ENABLED = os.getenv("GPT_CACHE_ENABLED", "1") == "1"
+GPT_CACHE_DB = os.getenv("GPT_CACHE_DB", "gpt_cache.db")
+GPT_CACHE_TTL_SECONDS = float(os.getenv("GPT_CACHE_TTL_SECONDS", "28800"))
+GPT_CACHE_MEMORY_ENTRIES = int(os.getenv("GPT_CACHE_MEMORY_ENTRIES", "1024"))
+
+# News ändern sich innerhalb eines Tages – kürzer als die Candle-basierten Agenten
+DEFAULT_AGENT_TTLS: Dict[str, float] = {
+    "news_agent": 1800.0,
+}
+
+_PURGE_EVERY = 200   # abgelaufene Zeilen alle N Schreibvorgänge löschen
+
+
+def _parse_ttls(raw: str) -> Dict[str, float]:
+    """"news_agent=900,handels_agent=0" → {"news_agent": 900.0, "handels_agent": 0.0}"""
+    ttls: Dict[str, float] = {}
+    for part in raw.split(","):
+        name, _, seconds = part.strip().partition("=")
+        if not name or not seconds:
+            continue
+        try:
+            ttls[name.strip()] = float(seconds)
+        except ValueError:
+            logger.warning("[GptCache] Ungültiger GPT_CACHE_TTLS-Eintrag: %s", part)
+    return ttls
+
+
+def canonical_payload(payload: Any) -> str:
+    """Kompaktes JSON mit sortierten Keys – gleiche Inhalte → gleicher String."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=json_default)
+
+
+def cache_key(agent_name: str, model: str, temperature: float, system_prompt: str, payload: Any) -> str:
+    head = json.dumps([agent_name, model, float(temperature), system_prompt], ensure_ascii=False)
+    digest = hashlib.sha256(head.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(canonical_payload(payload).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cacheable(result: Any) -> bool:
+    return isinstance(result, dict) and "error" not in result and not result.get("parse_error")
+
+
+class GptResponseCache:
+    """
+    Speicher + SQLite, TTL pro Agent, single-flight für identische Calls.
+
+    call(agent, model, temperature, system_prompt, payload, request)
+      → gecachte Antwort oder request() (Ergebnis wird gespeichert, falls erfolgreich)
+    call_async(...)  dasselbe mit einer Coroutine als request (gpt_engine)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = GPT_CACHE_DB,
+        default_ttl: float = GPT_CACHE_TTL_SECONDS,
+        agent_ttls: Optional[Dict[str, float]] = None,
+        memory_entries: int = GPT_CACHE_MEMORY_ENTRIES,
+        enabled: bool = GPT_CACHE_ENABLED,
+    ) -> None:
+        self.path = path
+        self.enabled = enabled
+        self.default_ttl = default_ttl
+        self.agent_ttls = dict(DEFAULT_AGENT_TTLS)
+        self.agent_ttls.update(_parse_ttls(os.getenv("GPT_CACHE_TTLS", "")) if agent_ttls is None else agent_ttls)
+        self._mem = TTLCache(max_entries=memory_entries, name="gpt_responses")
+        self._lock = threading.Lock()
+        self._db_ok: Optional[bool] = None if path else False
+        self._writes = 0
+        # Metriken
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._requests = 0
+
+    def ttl_for(self, agent_name: str) -> float:
+        return self.agent_ttls.get(agent_name, self.default_ttl)
+
+    # ── SQLite ────────────────────────────────────────────────────────────────
+
+    def _connect(self) -> sqlite3.Connection:
+        """Neue Verbindung pro Aufruf – thread-safe, mehrere Prozesse via WAL."""
+        return sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+
+    def _ensure_db(self) -> bool:
+        if self._db_ok is not None:
+            return self._db_ok
+        with self._lock:
+            if self._db_ok is None:
+                try:
+                    with closing(self._connect()) as conn, conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS gpt_responses (
+                                key         TEXT    PRIMARY KEY,
+                                agent       TEXT    NOT NULL,
+                                model       TEXT    NOT NULL,
+                                response    TEXT    NOT NULL,
+                                created_at  REAL    NOT NULL
+                            )
+                        """)
+                    self._db_ok = True
+                except sqlite3.Error as exc:
+                    logger.warning("[GptCache] SQLite nicht verfügbar (%s): %s – nur In-Memory", self.path, exc)
+                    self._db_ok = False
+        return self._db_ok
+
+    def _db_get(self, key: str, ttl: float) -> Optional[Tuple[Dict[str, Any], float]]:
+        """(Antwort, created_at) oder None, wenn nicht vorhanden / älter als ttl."""
+        if not self._ensure_db():
+            return None
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT response, created_at FROM gpt_responses WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - ttl),
+                ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("[GptCache] Lesefehler: %s", exc)
+            return None
+        return (json.loads(row[0]), float(row[1])) if row else None
+
+    def _db_put(self, key: str, agent_name: str, model: str, result: Dict[str, Any]) -> None:
+        if not self._ensure_db():
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO gpt_responses (key, agent, model, response, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, agent_name, model, json.dumps(result, ensure_ascii=False), time.time()),
+                )
+                self._writes += 1
+                if self._writes % _PURGE_EVERY == 0:
+                    self._purge(conn)
+        except sqlite3.Error as exc:
+            logger.warning("[GptCache] Schreibfehler: %s", exc)
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        """Zeilen löschen, die für jeden Agenten abgelaufen sind."""
+        longest = max([self.default_ttl, *self.agent_ttls.values()])
+        conn.execute("DELETE FROM gpt_responses WHERE created_at < ?", (time.time() - longest,))
+
+    # ── Aufruf ────────────────────────────────────────────────────────────────
+
+    def call(
+        self,
+        agent_name: str,
+        model: str,
+        temperature: float,
+        system_prompt: str,
+        payload: Any,
+        request: Callable[[], Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        ttl = self.ttl_for(agent_name)
+        if not self.enabled or ttl <= 0:
+            self._requests += 1
+            return request()
+
+        key = cache_key(agent_name, model, temperature, system_prompt, payload)
+        hit = self._mem.get(key)
+        if hit is not None:
+            self._memory_hits += 1
+            return copy.deepcopy(hit)
+
+        def load() -> Dict[str, Any]:
+            stored = self._from_row(key, ttl, self._db_get(key, ttl))
+            if stored is not None:
+                return stored
+            self._requests += 1
+            result = request()
+            if cacheable(result):
+                self._db_put(key, agent_name, model, result)
+                self._mem.set(key, result, ttl_seconds=ttl)
+            return result
+
+        # Kopie: Aufrufer dürfen ihr Ergebnis verändern, ohne den Cache zu treffen
+        return copy.deepcopy(self._mem.single_flight(key, load))
+
+    async def call_async(
+        self,
+        agent_name: str,
+        model: str,
+        temperature: float,
+        system_prompt: str,
+        payload: Any,
+        request: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Wie call() für Coroutinen (gpt_engine-Loop); SQLite läuft in einem Worker-Thread."""
+        ttl = self.ttl_for(agent_name)
+        if not self.enabled or ttl <= 0:
+            self._requests += 1
+            return await request()
+
+        key = cache_key(agent_name, model, temperature, system_prompt, payload)
+        hit = self._mem.get(key)
+        if hit is not None:
+            self._memory_hits += 1
+            return copy.deepcopy(hit)
+
+        async def load() -> Dict[str, Any]:
+            stored = self._from_row(key, ttl, await asyncio.to_thread(self._db_get, key, ttl))
+            if stored is not None:
+                return stored
+            self._requests += 1
+            result = await request()
+            if cacheable(result):
+                await asyncio.to_thread(self._db_put, key, agent_name, model, result)
+                self._mem.set(key, result, ttl_seconds=ttl)
+            return result
+
+        return copy.deepcopy(await self._mem.single_flight_async(key, load))
+
+    def _from_row(self, key: str, ttl: float, row: Optional[Tuple[Dict[str, Any], float]]) -> Optional[Dict[str, Any]]:
+        """DB-Treffer in den Speicher übernehmen – mit Restlaufzeit, nicht voller TTL ab jetzt."""
+        if row is None:
+            return None
+        self._disk_hits += 1
+        stored, created_at = row
+        self._mem.set(key, stored, ttl_seconds=max(0.0, ttl - (time.time() - created_at)))
+        return stored
+
+    def clear(self) -> None:
+        self._mem.clear()
+        if self._ensure_db():
+            try:
+                with closing(self._connect()) as conn, conn:
+                    conn.execute("DELETE FROM gpt_responses")
+            except sqlite3.Error as exc:
+                logger.warning("[GptCache] Löschen fehlgeschlagen: %s", exc)
+
+    def stats(self) -> Dict[str, Any]:
+        mem = self._mem.stats()
+        return {
+            "enabled": self.enabled,
+            "memory_entries": mem["size"],
+            "memory_hits": self._memory_hits,
+            "disk_hits": self._disk_hits,
+            "requests": self._requests,
+            "shared_inflight": mem["shared_loads"],
+            "db": self.path if self._db_ok else None,
+        }
+
+
+# prozessweit geteilt
+cache = GptResponseCache()
@@ -0,0 +1,208 @@
+"""
+gpt_engine.py
+
+Asynchrone Ausführung aller GPT-Requests: ein Event-Loop, ein HTTP-Pool, ein
+globales In-Flight-Limit.
+
+Bisher waren die GPT-Calls verschachtelte Thread-Pools: run_scanner_mode mit 4
+Worker-Threads, jeder rief run_calls_parallel auf, das pro Symbol einen neuen
+ThreadPoolExecutor startete – begrenzt durch eine Modul-Semaphore mit 3 Slots.
+Die meisten Threads warteten blockiert, und Pools wurden pro Symbol auf- und
+abgebaut.
+
+GptEngine betreibt stattdessen:
+- einen Event-Loop in einem Daemon-Thread (beim ersten Aufruf gestartet),
+- einen AsyncOpenAI-Client über einen httpx-Pool (HTTP/2, wenn das Paket h2
+  installiert ist; sonst Keep-Alive über HTTP/1.1),
+- eine asyncio.Semaphore als einziges globales Limit für laufende Requests
+  (GPT_MAX_IN_FLIGHT) – über alle Scanner-Threads, Modi und Agents hinweg.
+
+Synchrone Aufrufer (safe_call_gpt_agent, run_calls_parallel) reichen Coroutinen
+per submit()/run() ein; run_calls_parallel startet keine eigenen Threads mehr.
+
+Konfiguration via .env:
+  GPT_MAX_IN_FLIGHT          8      gleichzeitige Requests an OpenAI (prozessweit)
+  GPT_REQUEST_TIMEOUT        60     Sekunden pro Request
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger("GptEngine")
+
+GPT_MAX_IN_FLIGHT = int(os.getenv("GPT_MAX_IN_FLIGHT", "8"))
+GPT_REQUEST_TIMEOUT = float(os.getenv("GPT_REQUEST_TIMEOUT", "60"))
+
+T = TypeVar("T")
+
+
+def _default_client(max_in_flight: int, timeout: float) -> Any:
+    """AsyncOpenAI über einen gemeinsamen httpx-Pool (HTTP/2 falls h2 installiert)."""
+    try:
+        import httpx
+        from openai import AsyncOpenAI  # type: ignore
+    except ImportError as exc:
+        raise RuntimeError("openai package ist nicht installiert – `pip install openai`.") from exc
+    try:
+        import h2  # type: ignore  # noqa: F401
+
+        http2 = True
+    except ImportError:
+        http2 = False
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    http = httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+    logger.info("[GptEngine] AsyncOpenAI-Client (%s, %d Verbindungen)", "HTTP/2" if http2 else "HTTP/1.1",
+                max_in_flight)
+    return AsyncOpenAI(http_client=http)
+
+
+class GptEngine:
+    """
+    submit(coro) → concurrent.futures.Future (aus beliebigem Thread)
+    run(coro)    → Ergebnis (blockiert nur den aufrufenden Thread)
+    complete(model, messages, temperature)   Coroutine: ein Chat-Request unter dem globalen Limit
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = GPT_MAX_IN_FLIGHT,
+        timeout: float = GPT_REQUEST_TIMEOUT,
+        client_factory: Callable[[int, float], Any] = _default_client,
+    ) -> None:
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self._client_factory = client_factory
+        self._client: Any = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        # Metriken (nur im Loop-Thread verändert)
+        self._in_flight = 0
+        self._peak = 0
+        self._waiting = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_total = 0.0
+
+    # ── Loop ──────────────────────────────────────────────────────────────────
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="gpt-engine", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Awaitable[T]) -> "concurrent.futures.Future[T]":
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        if self._thread is not None and threading.current_thread() is self._thread:
+            raise RuntimeError("GptEngine.run() im Engine-Loop – dort direkt awaiten")
+        return self.submit(coro).result(timeout)
+
+    def gather(self, coros: List[Awaitable[Any]]) -> List[Any]:
+        """Mehrere Coroutinen gleichzeitig; Exceptions landen als Wert in der Ergebnisliste."""
+        async def _all() -> List[Any]:
+            return await asyncio.gather(*coros, return_exceptions=True)
+        return self.run(_all())
+
+    # ── Requests ──────────────────────────────────────────────────────────────
+
+    def client(self) -> Any:
+        """AsyncOpenAI-Client (lazy); RuntimeError, wenn openai nicht installiert ist."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._client_factory(self.max_in_flight, self.timeout)
+        return self._client
+
+    async def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Chat-Completion unter dem globalen In-Flight-Limit; timeout gilt ab Slot-Zuteilung."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        client = self.client()
+        queued = time.monotonic()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._wait_total += time.monotonic() - queued
+        self._in_flight += 1
+        self._peak = max(self._peak, self._in_flight)
+        try:
+            resp = await asyncio.wait_for(
+                client.chat.completions.create(model=model, messages=messages, temperature=temperature, **kwargs),
+                timeout or self.timeout,
+            )
+            self._completed += 1
+            return resp
+        except BaseException:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    # ── Status ────────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        done = self._completed + self._failed
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "peak_in_flight": self._peak,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "failed": self._failed,
+            "wait_avg_s": round(self._wait_total / done, 3) if done else 0.0,
+            "running": self._loop is not None,
+        }
+
+    def close(self) -> None:
+        """Client schließen und Loop beenden (Tests / Shutdown)."""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._client
+            self._loop = self._thread = self._client = None
+            self._semaphore = None
+        if loop is None:
+            return
+        if client is not None and hasattr(client, "close"):
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), loop).result(5)
+            except Exception as exc:
+                logger.debug("[GptEngine] Client schließen: %s", exc)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+        loop.close()
+
+
+# prozessweit geteilt
+engine = GptEngine()
@@ -0,0 +1,219 @@
+"""
+gpt_payload.py
+
+Kompakte, token-budgetierte Payloads für die GPT-Analyse-Agents.
+
+Bisher bekam jeder der 7 Analyse-Agents das komplette market_data-Objekt: jede
+Kerze als JSON-Dict mit voller Float-Präzision und ISO-Timestamp – mehrere
+tausend Prompt-Tokens pro Agent und Symbol. Prompt-Tokens bestimmen die Latenz
+pro Call und wie viele Symbole pro Minute analysiert werden können.
+
+MarketPayload(market_data) bereitet einmal pro Symbol vor:
+- Candles spaltenweise: {"t": [...], "o": [...], "h": [...], "l": [...], "c": [...], "v": [...]},
+  Preise auf ~5 signifikante Stellen gerundet, Volumen ganzzahlig, Zeit als
+  Datum (Tagesbars) bzw. "YYYY-MM-DD HH:MM" (Intraday) in Börsen-Zeitzone.
+- summary: Kennzahlen über die gesamte geladene Historie (Hoch/Tief mit Datum,
+  Renditen über 5/20/60 Bars, Volatilität, Durchschnittsvolumen), damit gekürzte
+  Candles keine Information über den Gesamtverlauf verlieren.
+
+for_agent(agent) schneidet auf das Fenster, das der Agent braucht (AGENT_WINDOWS),
+und prüft das Token-Budget mit einer lokalen Schätzung (tiktoken, falls
+installiert, sonst ~3 Zeichen pro Token). Passt die Payload nicht, wird das
+Fenster halbiert bis MIN_BARS; reicht auch das nicht, gehen nur summary +
+Indikatoren raus.
+
+Konfiguration via .env:
+  GPT_PAYLOAD_TOKEN_BUDGET   2500    Default-Budget pro Agent (Payload ohne System-Prompt)
+  GPT_PAYLOAD_BUDGETS        Overrides "agent=tokens,..."
+  GPT_PAYLOAD_WINDOWS        Overrides "agent=bars,..."
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from candle_frame import CandleFrame, json_default
+
+logger = logging.getLogger("GptPayload")
+
+GPT_PAYLOAD_TOKEN_BUDGET = int(os.getenv("GPT_PAYLOAD_TOKEN_BUDGET", "2500"))
+MIN_BARS = 10
+CHARS_PER_TOKEN = 3.0   # Fallback-Schätzung für JSON mit vielen Zahlen
+
+# Letzte N Bars, die der jeweilige Agent für seine Aufgabe braucht
+DEFAULT_AGENT_WINDOWS: Dict[str, int] = {
+    "regime_agent":        60,
+    "trend_dow_agent":     120,
+    "sr_formations_agent": 120,
+    "momentum_agent":      40,
+    "volume_oi_agent":     40,
+    "candlestick_agent":   15,
+    "intermarket_agent":   60,
+    "synthese_agent":      30,
+}
+DEFAULT_WINDOW = 60
+
+# Agents, die market_data (Candles + Indikatoren) bekommen
+ANALYSIS_AGENTS = [
+    "regime_agent", "trend_dow_agent", "sr_formations_agent", "momentum_agent",
+    "volume_oi_agent", "candlestick_agent", "intermarket_agent",
+]
+
+
+def _parse_ints(raw: str, env_name: str) -> Dict[str, int]:
+    """"momentum_agent=30,candlestick_agent=10" → {"momentum_agent": 30, ...}"""
+    values: Dict[str, int] = {}
+    for part in raw.split(","):
+        name, _, value = part.strip().partition("=")
+        if not name or not value:
+            continue
+        try:
+            values[name.strip()] = int(value)
+        except ValueError:
+            logger.warning("[GptPayload] Ungültiger %s-Eintrag: %s", env_name, part)
+    return values
+
+
+AGENT_WINDOWS = {**DEFAULT_AGENT_WINDOWS, **_parse_ints(os.getenv("GPT_PAYLOAD_WINDOWS", ""), "GPT_PAYLOAD_WINDOWS")}
+AGENT_BUDGETS = _parse_ints(os.getenv("GPT_PAYLOAD_BUDGETS", ""), "GPT_PAYLOAD_BUDGETS")
+
+_encoder: Any = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token-Anzahl von text: tiktoken (o200k_base, GPT-4o/4.1) falls installiert, sonst Zeichen/3."""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken  # type: ignore
+
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def encode(payload: Any) -> str:
+    """So wie call_gpt_agent die Payload verschickt (kompaktes JSON)."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=json_default)
+
+
+def price_decimals(price: float) -> int:
+    """Nachkommastellen für ~5 signifikante Stellen (150.23 → 2, 1.0842 → 4, 61234 → 0)."""
+    if not price or not math.isfinite(price):
+        return 2
+    return int(min(6, max(0, 4 - math.floor(math.log10(abs(price))))))
+
+
+def _round_list(values: np.ndarray, decimals: int) -> List[Any]:
+    if decimals == 0:
+        return [None if math.isnan(v) else int(v) for v in np.round(values).tolist()]
+    return [None if math.isnan(v) else v for v in np.round(values, decimals).tolist()]
+
+
+def _pct(a: float, b: float) -> Optional[float]:
+    return round((a / b - 1.0) * 100, 2) if b else None
+
+
+class MarketPayload:
+    """Einmal pro Symbol kodierte Candles + Kennzahlen; for_agent() liefert die Payload pro Agent."""
+
+    def __init__(self, market_data: Dict[str, Any]) -> None:
+        self.market_data = market_data
+        frame = CandleFrame.coerce(market_data.get("candles") or [])
+        self.frame = frame
+        self.bars = len(frame)
+        if not self.bars:
+            self.columns: Dict[str, List[Any]] = {}
+            self.summary: Dict[str, Any] = {}
+            return
+
+        dec = price_decimals(float(frame.close[-1]))
+        self.columns = {
+            "t": self._times(frame),
+            "o": _round_list(frame.open, dec),
+            "h": _round_list(frame.high, dec),
+            "l": _round_list(frame.low, dec),
+            "c": _round_list(frame.close, dec),
+            "v": _round_list(frame.volume, 0),
+        }
+        self.summary = self._summary(frame, dec)
+
+    @staticmethod
+    def _times(frame: CandleFrame) -> List[str]:
+        import pandas as pd
+
+        idx = pd.to_datetime(frame.ts, unit="s", utc=True)
+        if frame.tz:
+            idx = idx.tz_convert(frame.tz)
+        daily = len(frame) < 2 or float(np.median(np.diff(frame.ts))) >= 86400 - 3600
+        return list(idx.strftime("%Y-%m-%d" if daily else "%Y-%m-%d %H:%M"))
+
+    def _summary(self, frame: CandleFrame, dec: int) -> Dict[str, Any]:
+        close, vol = frame.close, frame.volume
+        last = float(close[-1])
+        hi, lo = int(np.nanargmax(frame.high)), int(np.nanargmin(frame.low))
+        summary: Dict[str, Any] = {
+            "bars": self.bars,
+            "from": self.columns["t"][0],
+            "to": self.columns["t"][-1],
+            "last_close": round(last, dec),
+            "high": round(float(frame.high[hi]), dec),
+            "high_t": self.columns["t"][hi],
+            "low": round(float(frame.low[lo]), dec),
+            "low_t": self.columns["t"][lo],
+            "ret_pct": {str(n): _pct(last, float(close[-n - 1])) for n in (5, 20, 60) if self.bars > n},
+        }
+        if self.bars > 2:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rets = np.diff(close[-21:]) / close[-21:-1]
+            summary["volatility_pct"] = round(float(np.nanstd(rets, ddof=1)) * 100, 3)
+        avg_vol = float(np.nanmean(vol[-20:]))
+        summary["avg_volume_20"] = int(round(avg_vol))
+        summary["last_volume_ratio"] = round(float(vol[-1]) / avg_vol, 2) if avg_vol else None
+        return summary
+
+    def _payload(self, symbol: str, bars: Optional[int]) -> Dict[str, Any]:
+        md = self.market_data
+        out: Dict[str, Any] = {
+            "symbol": md.get("symbol", symbol),
+            "timeframe": md.get("timeframe"),
+            "meta": md.get("meta") or {},
+            "indicators": md.get("indicators") or {},
+            "summary": self.summary,
+        }
+        if bars:
+            out["candles"] = {key: col[-bars:] for key, col in self.columns.items()}
+        return {"symbol": symbol, "market_data": out}
+
+    def for_agent(self, agent_name: str, symbol: str, budget: Optional[int] = None) -> Dict[str, Any]:
+        """Payload {"symbol", "market_data"} mit dem Candle-Fenster des Agenten, innerhalb des Token-Budgets."""
+        budget = budget or AGENT_BUDGETS.get(agent_name, GPT_PAYLOAD_TOKEN_BUDGET)
+        bars = min(AGENT_WINDOWS.get(agent_name, DEFAULT_WINDOW), self.bars)
+        while True:
+            payload = self._payload(symbol, bars)
+            tokens = estimate_tokens(encode(payload))
+            if tokens <= budget or not bars:
+                break
+            bars = bars // 2 if bars // 2 >= MIN_BARS else 0
+        if tokens > budget:
+            logger.warning("[GptPayload] %s/%s: %d Tokens auch ohne Candles über Budget %d",
+                           symbol, agent_name, tokens, budget)
+        elif bars < min(AGENT_WINDOWS.get(agent_name, DEFAULT_WINDOW), self.bars):
+            logger.info("[GptPayload] %s/%s: Fenster auf %d Bars gekürzt (%d Tokens, Budget %d)",
+                        symbol, agent_name, bars, tokens, budget)
+        return payload
+
+
+def agent_payloads(symbol: str, market_data: Dict[str, Any], agents: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Payloads für mehrere Agents aus einer gemeinsamen Kodierung."""
+    encoded = MarketPayload(market_data)
+    return {agent: encoded.for_agent(agent, symbol) for agent in agents}
@@ -0,0 +1,223 @@
+"""
+http_client.py
+
+Gemeinsame HTTP-Schicht für alle REST-Clients (Alpaca, Finnhub, SerpAPI, IBKR, ...).
+
+Statt pro Aufruf requests.get/post (neue TCP+TLS-Verbindung je Request) nutzen
+alle Aufrufer benannte, prozessweit geteilte Sessions mit Keep-Alive-Pool:
+
+- Verbindungs-Pool pro Host, begrenzt auf HTTP_POOL_MAXSIZE gleichzeitige
+  Verbindungen (pool_block → weitere Threads warten auf eine freie Verbindung);
+  einzelne Hosts abweichend über HTTP_HOST_LIMITS, z.B. "finnhub.io=4".
+- Default-Timeout (connect, read), wenn der Aufrufer keinen angibt.
+- Retry-Policy, die für Order-POSTs sicher ist: idempotente Methoden (GET, PUT,
+  DELETE, ...) werden bei Verbindungs-, Lese- und 5xx-Fehlern wiederholt;
+  POST/PATCH nur, wenn die Verbindung gar nicht zustande kam – der Request hat
+  den Server dann nie erreicht, eine Order kann also nicht doppelt platziert werden.
+- Rate-Limits (rate_limit): vor jedem Request ein Token aus dem Bucket des
+  Providers (per Host zugeordnet). 429 drosselt den Bucket für ALLE Threads
+  (Retry-After wird respektiert) und der Request wird danach wiederholt –
+  auch POST, denn ein 429 wurde vom Server nicht verarbeitet.
+
+Nutzung:
+  import http_client
+  resp = http_client.get(url, params=..., headers=...)
+  session = http_client.get_session("ibkr", verify=False)
+
+Konfiguration via .env:
+  HTTP_TIMEOUT            10     Read-Timeout in Sekunden
+  HTTP_CONNECT_TIMEOUT    3.05   Connect-Timeout in Sekunden
+  HTTP_RETRY_TOTAL        3      Wiederholungen (siehe oben)
+  HTTP_RETRY_BACKOFF      0.4    Backoff-Faktor zwischen Wiederholungen
+  HTTP_POOL_MAXSIZE       16     max. Verbindungen pro Host
+  HTTP_HOST_LIMITS        -      Host-Overrides "host=n,host=n"
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import rate_limit
+
+logger = logging.getLogger("HttpClient")
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_RETRY_TOTAL = int(os.getenv("HTTP_RETRY_TOTAL", "3"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.4"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))
+_POOL_HOSTS = 32  # Anzahl gehaltener Host-Pools pro Adapter
+
+RETRY_STATUS = (500, 502, 503, 504)  # 429 behandelt der Rate-Limiter
+IDEMPOTENT_METHODS = frozenset({"HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"})
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+def _parse_host_limits(raw: str) -> Dict[str, int]:
+    """"finnhub.io=4, data.alpaca.markets=16" → {"finnhub.io": 4, ...}"""
+    limits: Dict[str, int] = {}
+    for part in raw.split(","):
+        host, _, n = part.strip().partition("=")
+        if host and n.strip().isdigit():
+            limits[host.strip().lower()] = int(n)
+    return limits
+
+
+HTTP_HOST_LIMITS = _parse_host_limits(os.getenv("HTTP_HOST_LIMITS", ""))
+
+
+def retry_policy(total: Optional[int] = None, backoff: Optional[float] = None) -> Retry:
+    """
+    Idempotente Methoden: Verbindungs-, Lese- und 5xx-Fehler.
+    Nicht-idempotente (POST, PATCH): nur Verbindungsaufbau-Fehler.
+    Nach ausgeschöpften Status-Retries kommt die letzte Response zurück (kein Raise),
+    Aufrufer prüfen resp.ok wie bisher.
+    """
+    total = HTTP_RETRY_TOTAL if total is None else total
+    return Retry(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        other=0,
+        backoff_factor=HTTP_RETRY_BACKOFF if backoff is None else backoff,
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=IDEMPOTENT_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class PooledSession(requests.Session):
+    """requests.Session mit Host-Pools, Default-Timeout und Request-Zähler pro Host."""
+
+    def __init__(
+        self,
+        name: str,
+        timeout: Optional[Timeout] = None,
+        retries: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        host_limits: Optional[Dict[str, int]] = None,
+    ) -> None:
+        super().__init__()
+        self.name = name
+        self.timeout: Timeout = timeout if timeout is not None else (HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT)
+        self.pool_maxsize = pool_maxsize or HTTP_POOL_MAXSIZE
+        self._retry = retry_policy(retries)
+        # 429-Wiederholungen folgen demselben Budget – retries=0 heißt: gar nicht wiederholen
+        self._throttle_retries = HTTP_RETRY_TOTAL if retries is None else max(0, retries)
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+        adapter = self._adapter(self.pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        # längeres Präfix gewinnt → eigener Pool für Hosts mit abweichendem Limit
+        for host, limit in (HTTP_HOST_LIMITS if host_limits is None else host_limits).items():
+            host_adapter = self._adapter(limit)
+            self.mount(f"https://{host}", host_adapter)
+            self.mount(f"http://{host}", host_adapter)
+
+    def _adapter(self, maxsize: int) -> HTTPAdapter:
+        return HTTPAdapter(
+            pool_connections=_POOL_HOSTS,
+            pool_maxsize=maxsize,
+            pool_block=True,
+            max_retries=self._retry,
+        )
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        with self._lock:
+            self._counts[urlsplit(url).hostname or "?"] += 1
+
+        provider = rate_limit.provider_for_url(url)
+        for attempt in range(self._throttle_retries + 1):
+            rate_limit.acquire(provider)
+            resp = super().request(method, url, **kwargs)
+            if resp.status_code != 429:
+                rate_limit.report(provider, resp.status_code)
+                return resp
+            rate_limit.report(provider, 429, rate_limit.parse_retry_after(resp.headers.get("Retry-After")))
+            if attempt < self._throttle_retries:
+                resp.close()
+        return resp
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pool_maxsize": self.pool_maxsize,
+                "timeout": self.timeout,
+                "requests_by_host": dict(self._counts),
+            }
+
+
+_sessions: Dict[str, PooledSession] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(
+    name: str = "default",
+    *,
+    timeout: Optional[Timeout] = None,
+    retries: Optional[int] = None,
+    pool_maxsize: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+    verify: Optional[bool] = None,
+) -> PooledSession:
+    """
+    Benannte, prozessweit geteilte Session. Die Optionen gelten nur beim ersten
+    Aufruf für einen Namen; danach wird dieselbe Session zurückgegeben.
+    """
+    with _sessions_lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = PooledSession(name, timeout=timeout, retries=retries, pool_maxsize=pool_maxsize)
+            if headers:
+                session.headers.update(headers)
+            if verify is not None:
+                session.verify = verify
+            _sessions[name] = session
+            logger.debug("[HttpClient] Session '%s' angelegt (Pool %d/Host).", name, session.pool_maxsize)
+        return session
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return get_session().get(url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return get_session().post(url, **kwargs)
+
+
+def delete(url: str, **kwargs: Any) -> requests.Response:
+    return get_session().delete(url, **kwargs)
+
+
+def close_all() -> None:
+    """Alle Sessions schließen (Verbindungen freigeben); get_session() legt neu an."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    with _sessions_lock:
+        sessions = dict(_sessions)
+    return {name: s.stats() for name, s in sessions.items()}
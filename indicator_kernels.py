@@ -0,0 +1,283 @@
+"""
+indicator_kernels.py
+
+Vektorisierte Indikator-Kernels auf NumPy-Arrays – gemeinsame Basis für
+DEF_INDICATORS, BACKTEST, DEF_ML_SIGNAL und AnalyticsEngine.
+
+Die Formeln folgen pandas-ta (Defaults), damit Werte und Signale gleich bleiben:
+  rsi       Wilder: RMA der Gewinne / Verluste
+  ema       SMA-Seed über die ersten n Werte, danach rekursiv (adjust=False)
+  rma       ewm(alpha=1/n, adjust=True, min_periods=n)
+  atr       RMA der True Range (erster Bar ohne Vortag → NaN)
+  bbands    SMA ± k·σ (ddof=0), Bandbreite in %, %B
+  adx       +DI/-DI/ADX über RMA
+  stoch     %K (SMA-geglättet) / %D
+Alle Kernels liefern Arrays gleicher Länge, vorne mit NaN aufgefüllt.
+
+Neben 1-D-Serien akzeptieren alle Kernels auch 2-D-Panels (Zeit × Symbole) und
+rechnen spaltenweise in einem Durchgang. Jede Spalte beginnt mit ihrem ersten
+gültigen Wert (führende NaN = Symbol hat noch keine Historie); Lücken innerhalb
+einer Spalte vorher per pack_columns entfernen.
+
+Kein DataFrame/Series pro Indikator und kein pandas-ta-Import beim Start.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+_EPS = float(np.finfo(float).eps)
+
+
+def _f64(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def _started(x: np.ndarray) -> np.ndarray:
+    """Maske: Zeile liegt vor oder auf dem ersten gültigen Wert der Spalte."""
+    return np.cumsum(~np.isnan(x), axis=0) <= 1
+
+
+def pack_columns(x: np.ndarray) -> np.ndarray:
+    """Gültige Werte jeder Spalte ans Ende schieben (Reihenfolge bleibt), NaN nach vorn."""
+    order = np.argsort(~np.isnan(x), axis=0, kind="stable")
+    return np.take_along_axis(x, order, axis=0)
+
+
+def last_valid(values) -> np.ndarray:
+    """Letzter nicht-NaN Wert pro Spalte eines 2-D-Panels (NaN wenn keiner)."""
+    arr = _f64(values)
+    rows = np.where(~np.isnan(arr), np.arange(len(arr))[:, None], -1).max(axis=0)
+    out = arr[np.maximum(rows, 0), np.arange(arr.shape[1])]
+    out[rows < 0] = np.nan
+    return out
+
+
+def last(values, digits: Optional[int] = 4) -> Optional[float]:
+    """Letzter nicht-NaN Wert (gerundet), None wenn keiner existiert."""
+    arr = _f64(values)
+    valid = np.flatnonzero(~np.isnan(arr))
+    if len(valid) == 0:
+        return None
+    val = float(arr[valid[-1]])
+    return round(val, digits) if digits is not None else val
+
+
+def _first_valid(x: np.ndarray) -> int:
+    valid = np.flatnonzero(~np.isnan(x))
+    return int(valid[0]) if len(valid) else len(x)
+
+
+def _ewm(x: np.ndarray, alpha: float, adjust: bool, min_periods: int = 0) -> np.ndarray:
+    """Exponentiell gewichteter Mittelwert wie pandas ewm(...).mean() (ignore_na=False)."""
+    out = np.full(len(x), np.nan)
+    old_wt_factor = 1.0 - alpha
+    new_wt = 1.0 if adjust else alpha
+    weighted = math.nan
+    old_wt = 1.0
+    nobs = 0
+    for i, cur in enumerate(x.tolist()):
+        is_obs = cur == cur
+        nobs += is_obs
+        if weighted == weighted:
+            old_wt *= old_wt_factor
+            if is_obs:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+                old_wt = old_wt + new_wt if adjust else 1.0
+        elif is_obs:
+            weighted = cur
+        if nobs >= min_periods:
+            out[i] = weighted
+    return out
+
+
+def _ewm_2d(x: np.ndarray, alpha: float, adjust: bool, min_periods: int = 0) -> np.ndarray:
+    """_ewm spaltenweise: Schleife über die Zeit, vektorisiert (in-place) über die Symbole."""
+    out = np.empty(x.shape)
+    obs = ~np.isnan(x)
+    old_wt_factor = 1.0 - alpha
+    new_wt = 1.0 if adjust else alpha
+    weighted = np.full(x.shape[1], np.nan)
+    old_wt = np.ones(x.shape[1])
+    blended = np.empty(x.shape[1])
+    for i in range(len(x)):
+        cur, is_obs = x[i], obs[i]
+        has = ~np.isnan(weighted)
+        np.multiply(old_wt, old_wt_factor, out=old_wt, where=has)
+        step = has & is_obs
+        np.multiply(old_wt, weighted, out=blended)
+        blended += new_wt * cur
+        blended /= old_wt + new_wt
+        np.copyto(weighted, blended, where=step & (weighted != cur))
+        if adjust:
+            np.add(old_wt, new_wt, out=old_wt, where=step)
+        else:
+            np.copyto(old_wt, 1.0, where=step)
+        np.copyto(weighted, cur, where=is_obs & ~has)
+        out[i] = weighted
+    out[np.cumsum(obs, axis=0) < min_periods] = np.nan
+    return out
+
+
+def _ewm_any(x: np.ndarray, alpha: float, adjust: bool, min_periods: int = 0) -> np.ndarray:
+    if x.ndim == 2:
+        return _ewm_2d(x, alpha, adjust, min_periods)
+    return _ewm(x, alpha, adjust, min_periods)
+
+
+# ── Gleitende Durchschnitte ───────────────────────────────────────────────────
+
+def sma(values, n: int) -> np.ndarray:
+    """Einfacher gleitender Durchschnitt; Fenster mit NaN → NaN."""
+    x = _f64(values)
+    out = np.full(x.shape, np.nan)
+    if n <= 0 or len(x) < n:
+        return out
+    out[n - 1:] = sliding_window_view(x, n, axis=0).mean(axis=-1)
+    return out
+
+
+def rolling_std(values, n: int, ddof: int = 0) -> np.ndarray:
+    x = _f64(values)
+    out = np.full(x.shape, np.nan)
+    if n <= 0 or len(x) < n:
+        return out
+    out[n - 1:] = sliding_window_view(x, n, axis=0).std(axis=-1, ddof=ddof)
+    return out
+
+
+def rolling_min(values, n: int) -> np.ndarray:
+    x = _f64(values)
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n > 0:
+        out[n - 1:] = sliding_window_view(x, n, axis=0).min(axis=-1)
+    return out
+
+
+def rolling_max(values, n: int) -> np.ndarray:
+    x = _f64(values)
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n > 0:
+        out[n - 1:] = sliding_window_view(x, n, axis=0).max(axis=-1)
+    return out
+
+
+def ema(values, n: int) -> np.ndarray:
+    """EMA mit SMA-Seed; führende NaN (z.B. MACD-Linie) werden übersprungen."""
+    x = _f64(values)
+    if x.ndim == 2:
+        return _ema_2d(x, n)
+    out = np.full(len(x), np.nan)
+    start = _first_valid(x)
+    if n <= 0 or len(x) - start < n:
+        return out
+    seeded = x[start:].copy()
+    seeded[n - 1] = seeded[:n].sum() / n
+    seeded[:n - 1] = np.nan
+    out[start:] = _ewm(seeded, 2.0 / (n + 1), adjust=False)
+    return out
+
+
+def _ema_2d(x: np.ndarray, n: int) -> np.ndarray:
+    """ema spaltenweise; Seed liegt pro Spalte beim n-ten gültigen Wert."""
+    if n <= 0:
+        return np.full(x.shape, np.nan)
+    count = np.cumsum(~np.isnan(x), axis=0)
+    seeded = np.where(count > n, x, np.nan)
+    seed_row = count == n
+    seed_row &= np.cumsum(seed_row, axis=0) == 1   # nur die erste Zeile mit count == n
+    seeded[seed_row] = sma(x, n)[seed_row]
+    return _ewm_2d(seeded, 2.0 / (n + 1), adjust=False)
+
+
+def rma(values, n: int) -> np.ndarray:
+    """Wilder's Moving Average (RMA)."""
+    return _ewm_any(_f64(values), 1.0 / n, adjust=True, min_periods=n)
+
+
+# ── Indikatoren ───────────────────────────────────────────────────────────────
+
+def rsi(close, n: int = 14) -> np.ndarray:
+    c = _f64(close)
+    diff = np.full(c.shape, np.nan)
+    diff[1:] = np.diff(c, axis=0)
+    gain = rma(np.where(diff < 0, 0.0, diff), n)
+    loss = rma(np.where(diff > 0, 0.0, diff), n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100.0 * gain / (gain + np.abs(loss))
+
+
+def macd(close, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+    """{"macd", "signal", "hist"}"""
+    line = ema(close, fast) - ema(close, slow)
+    sig = ema(line, signal)
+    return {"macd": line, "signal": sig, "hist": line - sig}
+
+
+def true_range(high, low, close) -> np.ndarray:
+    h, l, c = _f64(high), _f64(low), _f64(close)
+    tr = np.full(c.shape, np.nan)
+    if len(c) > 1:
+        prev = c[:-1]
+        tr[1:] = np.fmax(h[1:] - l[1:], np.fmax(np.abs(h[1:] - prev), np.abs(l[1:] - prev)))
+    tr[_started(c)] = np.nan   # erster Bar jeder Serie hat keinen Vortag
+    return tr
+
+
+def atr(high, low, close, n: int = 14) -> np.ndarray:
+    return rma(true_range(high, low, close), n)
+
+
+def bbands(close, n: int = 20, k: float = 2.0) -> Dict[str, np.ndarray]:
+    """{"lower", "mid", "upper", "bandwidth", "pct"} – bandwidth in %, pct 0=unteres Band."""
+    c = _f64(close)
+    mid = sma(c, n)
+    dev = k * rolling_std(c, n, ddof=0)
+    lower, upper = mid - dev, mid + dev
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "lower": lower,
+            "mid": mid,
+            "upper": upper,
+            "bandwidth": 100.0 * (upper - lower) / mid,
+            "pct": (c - lower) / (upper - lower),
+        }
+
+
+def adx(high, low, close, n: int = 14) -> Dict[str, np.ndarray]:
+    """{"adx", "dmp", "dmn"} (+DI / -DI)"""
+    h, l = _f64(high), _f64(low)
+    up = np.full(h.shape, np.nan)
+    dn = np.full(h.shape, np.nan)
+    up[1:] = h[1:] - h[:-1]
+    dn[1:] = l[:-1] - l[1:]
+    pos = np.where((up > dn) & (up > 0), up, 0.0)
+    neg = np.where((dn > up) & (dn > 0), dn, 0.0)
+    pos[np.isnan(up)] = neg[np.isnan(dn)] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = 100.0 / atr(h, l, close, n)
+        dmp = k * rma(pos, n)
+        dmn = k * rma(neg, n)
+        dx = 100.0 * np.abs(dmp - dmn) / (dmp + dmn)
+    return {"adx": rma(dx, n), "dmp": dmp, "dmn": dmn}
+
+
+def stoch(high, low, close, k: int = 14, d: int = 3, smooth_k: int = 3) -> Dict[str, np.ndarray]:
+    """{"k", "d"}"""
+    lowest, highest = rolling_min(low, k), rolling_max(high, k)
+    span = highest - lowest
+    span = span + _EPS * np.any(span == 0, axis=0)   # pro Serie wie pandas-ta
+    raw = 100.0 * (_f64(close) - lowest) / span
+    stoch_k = sma(raw, smooth_k)
+    return {"k": stoch_k, "d": sma(stoch_k, d)}
+
+
+def volume_ratio(volume, n: int = 20) -> np.ndarray:
+    v = _f64(volume)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return v / sma(v, n)
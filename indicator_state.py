@@ -0,0 +1,498 @@
+"""
+indicator_state.py
+
+Inkrementeller Indikator-Zustand pro (Symbol, Timeframe).
+
+compute_indicators rechnet sonst bei jedem Scan alle Indikatoren über die
+komplette Historie (250+ Bars), obwohl seit dem letzten Scan meist nur ein Bar
+dazugekommen ist. IndicatorState hält stattdessen die Rekursions-Zustände
+(EMA 20/50/200, MACD, Wilder-RSI/ATR/ADX) und kurze Fenster (Bollinger 20,
+Stochastic 14/3/3, Volumen 20) und rechnet pro neuem Bar in O(1) weiter.
+
+- Abgeschlossene Bars werden fest übernommen ("committed"); der letzte Bar einer
+  Serie kann noch laufen und wird nur hypothetisch angewendet (peek) – beim
+  nächsten Aufruf zählt sein dann aktueller Stand.
+- Revision: passt der letzte übernommene Bar nicht mehr zur gelieferten Serie
+  (Dividenden-/Split-Adjustierung, Lücke, anderer Ausschnitt), wird der Zustand
+  automatisch aus der Serie neu aufgebaut.
+- Persistenz: JSON pro Schlüssel unter INDICATOR_STATE_DIR, geschrieben per
+  flush() (spätestens alle INDICATOR_STATE_FLUSH_SECONDS und beim Beenden).
+
+Die Rekursionen entsprechen indicator_kernels (pandas-ta-Formeln). Werte stimmen
+mit den Kernels über dieselbe Historie überein; bei gleitendem Ausschnitt ist
+der Zustand sogar genauer (EMA-Seed liegt weiter zurück).
+
+Konfiguration via .env:
+  INDICATOR_STATE_ENABLED          1     0 = compute_indicators rechnet immer voll
+  INDICATOR_STATE_DIR              data/indicators
+  INDICATOR_STATE_FLUSH_SECONDS    60
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from candle_frame import CandleFrame
+
+logger = logging.getLogger("IndicatorState")
+
+INDICATOR_STATE_ENABLED = os.getenv("INDICATOR_STATE_ENABLED", "1") == "1"
+INDICATOR_STATE_DIR = os.getenv("INDICATOR_STATE_DIR", os.path.join("data", "indicators"))
+INDICATOR_STATE_FLUSH_SECONDS = float(os.getenv("INDICATOR_STATE_FLUSH_SECONDS", "60"))
+
+STATE_VERSION = 1
+_REVISION_TOLERANCE = 1e-4   # wie bar_store: relative Abweichung des Schlusskurses
+_NAN = math.nan
+
+
+# ── Bausteine ─────────────────────────────────────────────────────────────────
+
+class _Ewm:
+    """Ein Schritt von pandas ewm(...).mean() (ignore_na=False), wie indicator_kernels._ewm."""
+
+    __slots__ = ("alpha", "adjust", "min_periods", "weighted", "old_wt", "nobs")
+
+    def __init__(self, alpha: float, adjust: bool, min_periods: int = 0) -> None:
+        self.alpha = alpha
+        self.adjust = adjust
+        self.min_periods = min_periods
+        self.weighted = _NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def _step(self, x: float) -> Tuple[float, float, int]:
+        weighted, old_wt, nobs = self.weighted, self.old_wt, self.nobs
+        is_obs = x == x
+        nobs += is_obs
+        if weighted == weighted:
+            old_wt *= 1.0 - self.alpha
+            if is_obs:
+                new_wt = 1.0 if self.adjust else self.alpha
+                if weighted != x:
+                    weighted = (old_wt * weighted + new_wt * x) / (old_wt + new_wt)
+                old_wt = old_wt + new_wt if self.adjust else 1.0
+        elif is_obs:
+            weighted = x
+        return weighted, old_wt, nobs
+
+    def _value(self, weighted: float, nobs: int) -> float:
+        return weighted if nobs >= self.min_periods else _NAN
+
+    def update(self, x: float) -> float:
+        self.weighted, self.old_wt, self.nobs = self._step(x)
+        return self._value(self.weighted, self.nobs)
+
+    def peek(self, x: float) -> float:
+        weighted, _, nobs = self._step(x)
+        return self._value(weighted, nobs)
+
+    def to_dict(self) -> List[Any]:
+        return [self.weighted, self.old_wt, self.nobs]
+
+    def load(self, data: List[Any]) -> None:
+        self.weighted, self.old_wt, self.nobs = float(data[0]), float(data[1]), int(data[2])
+
+
+class _Ema:
+    """EMA mit SMA-Seed über die ersten n gültigen Werte (führende NaN übersprungen)."""
+
+    __slots__ = ("n", "seed", "ewm")
+
+    def __init__(self, n: int) -> None:
+        self.n = n
+        self.seed: List[float] = []
+        self.ewm = _Ewm(2.0 / (n + 1), adjust=False)
+
+    def _seeded(self) -> bool:
+        return self.ewm.weighted == self.ewm.weighted
+
+    def update(self, x: float) -> float:
+        if self._seeded():
+            return self.ewm.update(x)
+        if x != x:
+            return _NAN
+        self.seed.append(x)
+        if len(self.seed) < self.n:
+            return _NAN
+        value = self.ewm.update(sum(self.seed) / self.n)
+        self.seed = []
+        return value
+
+    def peek(self, x: float) -> float:
+        if self._seeded():
+            return self.ewm.peek(x)
+        if x != x or len(self.seed) + 1 < self.n:
+            return _NAN
+        return self.ewm.peek((sum(self.seed) + x) / self.n)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seed": self.seed, "ewm": self.ewm.to_dict()}
+
+    def load(self, data: Dict[str, Any]) -> None:
+        self.seed = [float(v) for v in data["seed"]]
+        self.ewm.load(data["ewm"])
+
+
+class _Window:
+    """Die letzten n Werte."""
+
+    __slots__ = ("n", "values")
+
+    def __init__(self, n: int) -> None:
+        self.n = n
+        self.values: Deque[float] = deque(maxlen=n)
+
+    def update(self, x: float) -> Tuple[float, ...]:
+        self.values.append(x)
+        return tuple(self.values)
+
+    def peek(self, x: float) -> Tuple[float, ...]:
+        vals = tuple(self.values) + (x,)
+        return vals[-self.n:]
+
+    def to_dict(self) -> List[float]:
+        return list(self.values)
+
+    def load(self, data: List[float]) -> None:
+        self.values = deque((float(v) for v in data), maxlen=self.n)
+
+
+def _mean(vals: Tuple[float, ...], n: int) -> float:
+    return sum(vals) / n if len(vals) == n else _NAN
+
+
+def _std(vals: Tuple[float, ...], n: int) -> float:
+    m = _mean(vals, n)
+    return math.sqrt(sum((v - m) ** 2 for v in vals) / n) if m == m else _NAN
+
+
+def _div(a: float, b: float) -> float:
+    try:
+        return a / b
+    except ZeroDivisionError:
+        return _NAN if a == 0 or a != a else math.copysign(math.inf, a)
+
+
+# ── Zustand ───────────────────────────────────────────────────────────────────
+
+class IndicatorState:
+    """
+    Zustand aller Indikatoren von compute_indicators für eine Bar-Serie.
+
+    append(o, h, l, c, v)  Bar fest übernehmen, liefert die Werte nach diesem Bar
+    peek(o, h, l, c, v)    Werte, falls dieser Bar als nächster käme (ohne Änderung)
+    """
+
+    _EMAS = ("ema20", "ema50", "ema200", "macd_fast", "macd_slow", "macd_signal")
+    _EWMS = ("rsi_gain", "rsi_loss", "atr", "dm_pos", "dm_neg", "adx")
+    _WINDOWS = ("closes", "highs", "lows", "raw_k", "stoch_k", "volumes")
+
+    def __init__(self) -> None:
+        self.ts: Optional[int] = None
+        self.prev: Optional[Tuple[float, float, float]] = None   # (high, low, close) des letzten Bars
+        self.bars = 0
+        self.ema20, self.ema50, self.ema200 = _Ema(20), _Ema(50), _Ema(200)
+        self.macd_fast, self.macd_slow, self.macd_signal = _Ema(12), _Ema(26), _Ema(9)
+        self.rsi_gain = _Ewm(1 / 14, adjust=True, min_periods=14)
+        self.rsi_loss = _Ewm(1 / 14, adjust=True, min_periods=14)
+        self.atr = _Ewm(1 / 14, adjust=True, min_periods=14)
+        self.dm_pos = _Ewm(1 / 14, adjust=True, min_periods=14)
+        self.dm_neg = _Ewm(1 / 14, adjust=True, min_periods=14)
+        self.adx = _Ewm(1 / 14, adjust=True, min_periods=14)
+        self.closes, self.volumes = _Window(20), _Window(20)
+        self.highs, self.lows = _Window(14), _Window(14)
+        self.raw_k, self.stoch_k = _Window(3), _Window(3)
+
+    def _step(self, high: float, low: float, close: float, volume: float, commit: bool) -> Dict[str, float]:
+        def op(component: Any, x: float) -> Any:
+            return component.update(x) if commit else component.peek(x)
+
+        if self.prev is None:
+            diff = tr = up = dn = _NAN
+        else:
+            ph, pl, pc = self.prev
+            diff = close - pc
+            tr = max(high - low, abs(high - pc), abs(low - pc))
+            up, dn = high - ph, pl - low
+
+        # RSI (Wilder)
+        gain = op(self.rsi_gain, diff if diff != diff or diff > 0 else 0.0)
+        loss = op(self.rsi_loss, diff if diff != diff or diff < 0 else 0.0)
+        rsi = _div(100.0 * gain, gain + abs(loss))
+
+        # MACD
+        line = op(self.macd_fast, close) - op(self.macd_slow, close)
+        signal = op(self.macd_signal, line)
+
+        # ATR / ADX
+        atr = op(self.atr, tr)
+        pos = _NAN if up != up else (up if up > dn and up > 0 else 0.0)
+        neg = _NAN if dn != dn else (dn if dn > up and dn > 0 else 0.0)
+        k = _div(100.0, atr)
+        dmp, dmn = k * op(self.dm_pos, pos), k * op(self.dm_neg, neg)
+        adx = op(self.adx, _div(100.0 * abs(dmp - dmn), dmp + dmn))
+
+        # Bollinger(20, 2)
+        closes = op(self.closes, close)
+        mid, dev = _mean(closes, 20), 2.0 * _std(closes, 20)
+        lower, upper = mid - dev, mid + dev
+
+        # Stochastic(14, 3, 3)
+        highs, lows = op(self.highs, high), op(self.lows, low)
+        if len(highs) == 14:
+            hh, ll = max(highs), min(lows)
+            raw = 100.0 * (close - ll) / ((hh - ll) or 2.220446049250313e-16)
+        else:
+            raw = _NAN
+        stoch_k = _mean(op(self.raw_k, raw), 3)
+        stoch_d = _mean(op(self.stoch_k, stoch_k), 3)
+
+        vol_ma = _mean(op(self.volumes, volume), 20)
+
+        if commit:
+            self.prev = (high, low, close)
+            self.bars += 1
+
+        return {
+            "rsi_14": rsi,
+            "macd_value": line,
+            "macd_signal": signal,
+            "macd_hist": line - signal,
+            "atr_14": atr,
+            "last_close": close,
+            "ema_20": op(self.ema20, close),
+            "ema_50": op(self.ema50, close),
+            "ema_200": op(self.ema200, close),
+            "bb_lower": lower,
+            "bb_mid": mid,
+            "bb_upper": upper,
+            "bb_bandwidth": _div(100.0 * (upper - lower), mid),
+            "bb_pct": _div(close - lower, upper - lower),
+            "vol_ma": vol_ma,
+            "last_vol": volume,
+            "adx": adx,
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+        }
+
+    def append(self, ts: int, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        values = self._step(high, low, close, volume, commit=True)
+        self.ts = int(ts)
+        return values
+
+    def peek(self, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        return self._step(high, low, close, volume, commit=False)
+
+    # ── Abgleich mit einer Serie ──────────────────────────────────────────────
+
+    def position_in(self, frame: CandleFrame) -> Optional[int]:
+        """
+        Index des zuletzt übernommenen Bars in frame, wenn der Zustand dort nahtlos
+        weiterrechnen kann (Bar vorhanden, Schlusskurs unverändert, nicht der letzte Bar).
+        """
+        if self.ts is None or self.prev is None or len(frame) < 2:
+            return None
+        ts = frame.ts
+        idx = int(ts.searchsorted(self.ts))
+        if idx >= len(frame) - 1 or int(ts[idx]) != self.ts:
+            return None
+        old, new = self.prev[2], float(frame.close[idx])
+        if old != new and (old == 0.0 or abs(new - old) / abs(old) > _REVISION_TOLERANCE):
+            return None
+        return idx
+
+    # ── Persistenz ────────────────────────────────────────────────────────────
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"version": STATE_VERSION, "ts": self.ts, "prev": self.prev, "bars": self.bars}
+        for name in self._EMAS + self._EWMS + self._WINDOWS:
+            data[name] = getattr(self, name).to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IndicatorState":
+        if data.get("version") != STATE_VERSION:
+            raise ValueError(f"Zustands-Version {data.get('version')} != {STATE_VERSION}")
+        state = cls()
+        state.ts = data["ts"]
+        state.prev = tuple(data["prev"]) if data["prev"] is not None else None
+        state.bars = int(data["bars"])
+        for name in cls._EMAS + cls._EWMS + cls._WINDOWS:
+            getattr(state, name).load(data[name])
+        return state
+
+
+def _clean(values: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """NaN/inf → None."""
+    return {k: (v if v is not None and math.isfinite(v) else None) for k, v in values.items()}
+
+
+def _safe_name(symbol: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]", "_", symbol.upper())
+
+
+# ── Engine ────────────────────────────────────────────────────────────────────
+
+class IndicatorEngine:
+    """
+    Zustände pro (SYMBOL, timeframe), lazy von Platte geladen.
+
+    values(symbol, timeframe, frame) → Roh-Indikatorwerte zum letzten Bar von frame
+    latest(symbol, timeframe)        → zuletzt berechnete Werte (ohne Rechnen / I/O)
+    remember(symbol, timeframe, v)   → extern berechnete Werte als latest übernehmen
+    flush()                          → geänderte Zustände schreiben
+    """
+
+    def __init__(self, root: Optional[str] = None, persist: bool = True) -> None:
+        self.root = Path(root or INDICATOR_STATE_DIR)
+        self.persist = persist
+        self._states: Dict[Tuple[str, str], Optional[IndicatorState]] = {}
+        self._latest: Dict[Tuple[str, str], Dict[str, Optional[float]]] = {}
+        self._dirty: set = set()
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+        self._last_flush = time.monotonic()
+        # Metriken
+        self._calls = 0
+        self._appended = 0
+        self._rebuilds = 0
+
+    def _path(self, key: Tuple[str, str]) -> Path:
+        return self.root / key[1] / f"{_safe_name(key[0])}.json"
+
+    def _lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _load(self, key: Tuple[str, str]) -> Optional[IndicatorState]:
+        if key in self._states:
+            return self._states[key]
+        state = None
+        if self.persist:
+            try:
+                state = IndicatorState.from_dict(json.loads(self._path(key).read_text(encoding="utf-8")))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError, KeyError, TypeError) as exc:
+                logger.info("[IndicatorState] %s/%s nicht lesbar (%s) – baue neu auf.", key[0], key[1], exc)
+        self._states[key] = state
+        return state
+
+    def values(self, symbol: str, timeframe: str, frame: CandleFrame) -> Dict[str, Optional[float]]:
+        """Werte zum letzten Bar von frame; übernimmt alle Bars davor fest in den Zustand."""
+        key = (symbol.upper(), timeframe)
+        n = len(frame)
+        if n == 0:
+            return {}
+        with self._lock_for(key):
+            state = self._load(key)
+            idx = state.position_in(frame) if state is not None else None
+            if idx is None:
+                state = IndicatorState()
+                start = 0
+                self._rebuilds += 1
+            else:
+                start = idx + 1
+
+            high, low, close, volume, ts = frame.high, frame.low, frame.close, frame.volume, frame.ts
+            for i in range(start, n - 1):
+                state.append(int(ts[i]), float(high[i]), float(low[i]), float(close[i]), float(volume[i]))
+            values = _clean(state.peek(float(high[-1]), float(low[-1]), float(close[-1]), float(volume[-1])))
+
+            with self._guard:
+                self._states[key] = state
+                self._latest[key] = values
+                self._calls += 1
+                self._appended += max(0, n - 1 - start)
+                if n - 1 > start:
+                    self._dirty.add(key)
+        if self.persist and time.monotonic() - self._last_flush >= INDICATOR_STATE_FLUSH_SECONDS:
+            self.flush()
+        return values
+
+    def latest(self, symbol: str, timeframe: str) -> Optional[Dict[str, Optional[float]]]:
+        with self._guard:
+            return self._latest.get((symbol.upper(), timeframe))
+
+    def remember(self, symbol: str, timeframe: str, values: Dict[str, Any]) -> None:
+        """Anderswo berechnete Werte (z.B. compute_indicators_batch) als latest hinterlegen."""
+        with self._guard:
+            self._latest[(symbol.upper(), timeframe)] = dict(values)
+
+    def flush(self) -> int:
+        """Geänderte Zustände atomar schreiben; Anzahl geschriebener Dateien."""
+        with self._guard:
+            dirty, self._dirty = self._dirty, set()
+            self._last_flush = time.monotonic()
+        if not self.persist:
+            return 0
+        written = 0
+        for key in dirty:
+            with self._lock_for(key):
+                state = self._states.get(key)
+                if state is None:
+                    continue
+                path = self._path(key)
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+                    tmp.write_text(json.dumps(state.to_dict()), encoding="utf-8")
+                    os.replace(tmp, path)
+                    written += 1
+                except OSError as exc:
+                    logger.warning("[IndicatorState] %s/%s nicht gespeichert: %s", key[0], key[1], exc)
+        return written
+
+    def clear(self, symbols: Optional[Iterable[str]] = None) -> None:
+        """Zustände verwerfen (Speicher + Platte) – alle oder nur für symbols."""
+        wanted = None if symbols is None else {s.upper() for s in symbols}
+        with self._guard:
+            keys = [k for k in set(self._states) | set(self._latest) if wanted is None or k[0] in wanted]
+            for key in keys:
+                self._states.pop(key, None)
+                self._latest.pop(key, None)
+                self._dirty.discard(key)
+        if self.persist and self.root.exists():
+            for path in self.root.rglob("*.json"):
+                if wanted is None or path.stem in {_safe_name(s) for s in wanted}:
+                    path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._guard:
+            return {
+                "states": sum(1 for s in self._states.values() if s is not None),
+                "calls": self._calls,
+                "appended_bars": self._appended,
+                "rebuilds": self._rebuilds,
+                "dirty": len(self._dirty),
+            }
+
+
+# prozessweit geteilt
+engine = IndicatorEngine()
+atexit.register(engine.flush)
+
+
+def values(symbol: str, timeframe: str, frame: CandleFrame) -> Dict[str, Optional[float]]:
+    return engine.values(symbol, timeframe, frame)
+
+
+def latest(symbol: str, timeframe: str) -> Optional[Dict[str, Optional[float]]]:
+    return engine.latest(symbol, timeframe)
+
+
+def remember(symbol: str, timeframe: str, values: Dict[str, Any]) -> None:
+    engine.remember(symbol, timeframe, values)
@@ -0,0 +1,270 @@
+"""
+market_context.py
+
+Ein Dienst für Index-/Markt-Kontextdaten (VIX, SPY, QQQ, Sektor-ETFs).
+
+Bisher lud jeder Konsument selbst: get_vix_level bei jedem Aufruf ^VIX,
+compute_market_regime SPY + QQQ + VIX pro Scan und pro /api/market-regime-Request,
+DEF_ML_SIGNAL VIX + SPY erneut für jeden Sektor-ETF. Jetzt aktualisiert ein
+Hintergrund-Thread alle Serien einmal pro Intervall (ein Multi-Ticker-Request
+über bar_store.prefetch) und veröffentlicht einen unveränderlichen
+MarketSnapshot. Konsumenten lesen nur noch den aktuellen Snapshot – der
+Index-Traffic hängt nicht mehr von Scans, Positionen oder Dashboard-Aufrufen ab.
+
+- register_symbols(...) meldet zusätzliche Serien an (DEF_ML_SIGNAL: Sektor-ETFs);
+  sie sind ab dem nächsten Refresh im Snapshot.
+- snapshot() startet den Refresh-Loop beim ersten Aufruf und lädt dann einmal
+  synchron. Schlägt ein Refresh fehl, bleibt der letzte Snapshot gültig; ohne
+  jeden Snapshot gibt es einen neutralen Fallback (VIX 20, Regime neutral).
+- Ableitungen, die viele Konsumenten teilen (ML-Kontext pro Sektor), hängen am
+  Snapshot (snapshot.derived) und werden einmal pro Refresh gebaut.
+
+Konfiguration via .env:
+  MARKET_CONTEXT_REFRESH_SECONDS   300
+  MARKET_CONTEXT_PERIOD            1y     Historie pro Serie (EMA200 von SPY braucht ~1 Jahr)
+  MARKET_CONTEXT_SYMBOLS           ^VIX,SPY,QQQ
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+import indicator_kernels as kern
+from candle_frame import CandleFrame
+
+logger = logging.getLogger("MarketContext")
+
+MARKET_CONTEXT_REFRESH_SECONDS = float(os.getenv("MARKET_CONTEXT_REFRESH_SECONDS", "300"))
+MARKET_CONTEXT_PERIOD = os.getenv("MARKET_CONTEXT_PERIOD", "1y")
+MARKET_CONTEXT_SYMBOLS = [
+    s.strip().upper() for s in os.getenv("MARKET_CONTEXT_SYMBOLS", "^VIX,SPY,QQQ").split(",") if s.strip()
+]
+
+DEFAULT_VIX = 20.0   # neutraler Fallback wie bisher in get_vix_level
+
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """Stand aller Kontext-Serien zu einem Zeitpunkt (Arrays schreibgeschützt)."""
+
+    updated_at: float
+    candles: Dict[str, CandleFrame]
+    error: Optional[str] = None
+    _derived: Dict[Hashable, Any] = field(default_factory=dict, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def series(self, symbol: str) -> Optional[CandleFrame]:
+        return self.candles.get(symbol.upper())
+
+    def last_close(self, symbol: str) -> Optional[float]:
+        frame = self.series(symbol)
+        return float(frame.close[-1]) if frame is not None and len(frame) else None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.updated_at
+
+    @property
+    def vix(self) -> float:
+        value = self.last_close("^VIX")
+        return value if value is not None else DEFAULT_VIX
+
+    def derived(self, key: Hashable, build: Callable[["MarketSnapshot"], Any]) -> Any:
+        """build(self) einmal pro Snapshot ausführen und unter key merken."""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+    def regime(self) -> Dict[str, Any]:
+        """Markt-Regime wie compute_market_regime (SPY/QQQ vs. EMA20, VIX-Override)."""
+        return dict(self.derived("regime", _regime))
+
+
+def _vs_ema20(frame: Optional[CandleFrame]) -> Optional[float]:
+    """% Abstand des letzten Schlusskurses zur EMA20; None ohne ausreichende Historie."""
+    if frame is None or len(frame) == 0:
+        return None
+    ema20 = kern.last(kern.ema(frame.close, 20))
+    if not ema20:
+        return None
+    return (float(frame.close[-1]) - ema20) / ema20 * 100
+
+
+def _regime(snap: MarketSnapshot) -> Dict[str, Any]:
+    spy = _vs_ema20(snap.series("SPY"))
+    qqq = _vs_ema20(snap.series("QQQ"))
+    vix = snap.vix
+    result: Dict[str, Any] = {
+        "spy_vs_ema20": round(spy, 3) if spy is not None else 0.0,
+        "qqq_vs_ema20": round(qqq, 3) if qqq is not None else 0.0,
+        "vix": vix,
+    }
+    if spy is None or qqq is None:
+        result["regime"] = "neutral"
+        result["error"] = snap.error or "Could not fetch SPY/QQQ data"
+        return result
+
+    if spy > 0 and qqq > 0:
+        regime = "bull"
+    elif spy < 0 and qqq < 0:
+        regime = "bear"
+    else:
+        regime = "neutral"
+    # Hohe Unsicherheit → neutral
+    if vix > 25:
+        regime = "neutral"
+    result["regime"] = regime
+    return result
+
+
+def _download(symbols: List[str], period: str) -> Dict[str, CandleFrame]:
+    import bar_store
+
+    return bar_store.prefetch(symbols, period=period, interval="1d")
+
+
+class MarketContextService:
+    """
+    Hält den aktuellen MarketSnapshot und aktualisiert ihn im Hintergrund.
+
+    snapshot() → aktueller Snapshot (startet den Loop beim ersten Aufruf)
+    refresh()  → sofort neu laden (synchron), liefert den neuen Snapshot
+    start() / stop()
+    """
+
+    def __init__(
+        self,
+        symbols: Iterable[str] = MARKET_CONTEXT_SYMBOLS,
+        refresh_seconds: float = MARKET_CONTEXT_REFRESH_SECONDS,
+        period: str = MARKET_CONTEXT_PERIOD,
+        loader: Callable[[List[str], str], Dict[str, CandleFrame]] = _download,
+    ) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.period = period
+        self._loader = loader
+        self._symbols: List[str] = list(dict.fromkeys(s.upper() for s in symbols))
+        self._snapshot: Optional[MarketSnapshot] = None
+        self._lock = threading.Lock()            # Symbol-Liste / Snapshot-Tausch
+        self._refresh_lock = threading.Lock()    # nur ein Refresh gleichzeitig
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Metriken
+        self._refreshes = 0
+        self._failures = 0
+
+    def register_symbols(self, symbols: Iterable[str]) -> None:
+        with self._lock:
+            for sym in symbols:
+                sym = sym.upper()
+                if sym not in self._symbols:
+                    self._symbols.append(sym)
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return list(self._symbols)
+
+    def refresh(self, max_age: Optional[float] = None) -> MarketSnapshot:
+        """
+        Alle Serien laden und als neuen Snapshot veröffentlichen.
+        max_age: nur laden, wenn der aktuelle Snapshot älter ist.
+        """
+        requested = time.time()
+        with self._refresh_lock:
+            with self._lock:
+                current = self._snapshot
+            if current is not None and (
+                current.updated_at >= requested   # während des Wartens hat ein anderer Thread geladen
+                or (max_age is not None and current.age < max_age)
+            ):
+                return current
+            symbols = self.symbols()
+            try:
+                frames = self._loader(symbols, self.period)
+                for frame in frames.values():
+                    for arr in (frame.ts, frame.open, frame.high, frame.low, frame.close, frame.volume):
+                        arr.flags.writeable = False
+                missing = [s for s in symbols if s not in frames]
+                snap = MarketSnapshot(
+                    updated_at=time.time(),
+                    candles=dict(frames),
+                    error=f"keine Daten für {', '.join(missing)}" if missing else None,
+                )
+                self._refreshes += 1
+                if missing:
+                    logger.warning("[MarketContext] Keine Daten für %s", ", ".join(missing))
+            except Exception as exc:
+                self._failures += 1
+                logger.warning("[MarketContext] Refresh fehlgeschlagen: %s", exc)
+                with self._lock:
+                    if self._snapshot is not None:
+                        return self._snapshot
+                snap = MarketSnapshot(updated_at=time.time(), candles={}, error=str(exc))
+            with self._lock:
+                self._snapshot = snap
+            return snap
+
+    def snapshot(self) -> MarketSnapshot:
+        with self._lock:
+            snap = self._snapshot
+        if self._thread is None:
+            self.start()
+        if snap is None:
+            with self._lock:
+                snap = self._snapshot
+            if snap is None:
+                snap = self.refresh(max_age=self.refresh_seconds)
+        return snap
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                snap = self._snapshot
+            if snap is None or snap.age >= self.refresh_seconds:
+                self.refresh(max_age=self.refresh_seconds)
+                continue
+            self._stop.wait(max(1.0, self.refresh_seconds - snap.age))
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="market-context", daemon=True)
+        self._thread.start()
+        logger.info("[MarketContext] Refresh-Loop gestartet (%d Serien, alle %.0fs)",
+                    len(self.symbols()), self.refresh_seconds)
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snap = self._snapshot
+        return {
+            "symbols": len(self.symbols()),
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "age_seconds": round(snap.age, 1) if snap else None,
+            "running": self._thread is not None,
+        }
+
+
+# prozessweit geteilt
+service = MarketContextService()
+
+
+def register_symbols(symbols: Iterable[str]) -> None:
+    service.register_symbols(symbols)
+
+
+def snapshot() -> MarketSnapshot:
+    return service.snapshot()
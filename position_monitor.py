@@ -4,9 +4,15 @@ position_monitor.py
 Verwaltet offene Positionen in SQLite und schließt sie automatisch
 wenn Stop-Loss oder Take-Profit erreicht wird.
 
-Preisquellen (Fallback-Kette):
-  1. Finnhub /quote  (FINNHUB_API_KEY)
-  2. Alpaca Data API (ALPACA_API_KEY + ALPACA_API_SECRET)
+Preisquellen (quote_service, ein Snapshot-Request für alle offenen Positionen):
+  - Alpaca Multi-Symbol-Snapshot (APCA_API_KEY_ID + APCA_API_SECRET_KEY)
+  - Finnhub /quote  (FINNHUB_API_KEY)
+    Reihenfolge nach gemessener Latenz/Circuit-Status (provider_router)
+  - yfinance (Fallback)
+
+Streaming-Modus (PRICE_STREAM_ENABLED=1): price_stream abonniert die offenen
+Positionen per WebSocket, Preise kommen ohne HTTP aus dem Preisbuch und der
+Check-Loop läuft im kürzeren Intervall PRICE_STREAM_CHECK_SECONDS.
 """
 
 import json
@@ -18,9 +24,15 @@ import time
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
-import requests
 from dotenv import load_dotenv
 
+import fetch_planner
+import http_client
+import indicator_state
+import price_stream
+import quote_service
+import returns_matrix
+
 load_dotenv()
 
 logger = logging.getLogger("PositionMonitor")
@@ -34,6 +46,16 @@ position_events_logger.setLevel(logging.INFO)
 
 DB_PATH = os.getenv("POSITION_DB_PATH", "positions.db")
 TRAILING_ATR_MULT = float(os.getenv("TRAILING_STOP_ATR_MULT", "2.0"))
+# 1 = Trailing-ATR aus dem inkrementellen Indikator-Zustand des letzten Scans statt ATR beim Entry
+TRAILING_STOP_LIVE_ATR = os.getenv("TRAILING_STOP_LIVE_ATR", "0") == "1"
+TRAILING_STOP_ATR_TIMEFRAME = os.getenv("TRAILING_STOP_ATR_TIMEFRAME", "1d")
+
+
+def _live_atr(symbol: str) -> Optional[float]:
+    """ATR(14) aus dem Indikator-Zustand des letzten Scans (Timeframe wie dort normalisiert, "1D" → "1d")."""
+    tf_key = fetch_planner.parse_timeframe(TRAILING_STOP_ATR_TIMEFRAME).key
+    return (indicator_state.latest(symbol, tf_key) or {}).get("atr_14")
+
 
 # ── DB-Helpers ────────────────────────────────────────────────────────────────
 
@@ -198,7 +220,7 @@ class PositionMonitor:
         }
 
         try:
-            resp = requests.get(f"{base_url}/v2/positions", headers=headers, timeout=10)
+            resp = http_client.get(f"{base_url}/v2/positions", headers=headers, timeout=10)
             resp.raise_for_status()
             alpaca_positions = resp.json()
         except Exception as e:
@@ -238,13 +260,8 @@ class PositionMonitor:
         return synced
 
     def update_correlation_matrix(self) -> None:
-        """Aktualisiert die Korrelationsmatrix basierend auf historischen Daten."""
+        """Aktualisiert die Korrelationsmatrix der offenen Positionen aus der gemeinsamen Returns-Matrix."""
         try:
-            import yfinance as yf
-            from datetime import timedelta
-
-            # Hole alle offenen Positionen
-            open_symbols = []
             with _connect() as conn:
                 rows = conn.execute(
                     "SELECT DISTINCT symbol FROM positions WHERE status='open'"
@@ -254,44 +271,26 @@ class PositionMonitor:
             if len(open_symbols) < 2:
                 return
 
-            # Lade 90 Tage Daten für alle Symbole
-            end = datetime.now(timezone.utc)
-            start = end - timedelta(days=90)
-
-            data = {}
-            for symbol in open_symbols:
-                try:
-                    df = yf.download(symbol, start=start, end=end, progress=False)
-                    if not df.empty:
-                        data[symbol] = df["Close"].pct_change()
-                except Exception as e:
-                    logger.warning(f"[Correlation] Fehler beim Download {symbol}: {e}")
-                    continue
-
-            if len(data) < 2:
+            # fehlende/veraltete Symbole in einem Batch nachladen, dann vektorisiert aus den Fenstersummen
+            returns_matrix.engine.ensure(open_symbols)
+            symbols, correlations = returns_matrix.engine.matrix(open_symbols)
+            if len(symbols) < 2:
                 return
 
-            # Berechne Korrelationen
-            import pandas as pd
-            df_returns = pd.DataFrame(data)
-            correlations = df_returns.corr()
-
-            # Speichere in DB
+            now = datetime.now(timezone.utc).isoformat()
             with _connect() as conn:
-                for i, sym_a in enumerate(open_symbols):
-                    for sym_b in open_symbols[i+1:]:
-                        corr_value = float(correlations.loc[sym_a, sym_b])
-
-                        # Upsert
+                for i, sym_a in enumerate(symbols):
+                    for j in range(i + 1, len(symbols)):
+                        corr_value = float(correlations[i, j])
                         conn.execute("""
                             INSERT OR REPLACE INTO correlation_matrix
                             (symbol_a, symbol_b, correlation, calculated_at)
                             VALUES (?, ?, ?, ?)
-                        """, (sym_a, sym_b, corr_value, datetime.now(timezone.utc).isoformat()))
+                        """, (sym_a, symbols[j], None if corr_value != corr_value else corr_value, now))
 
                 conn.commit()
 
-            logger.info(f"[Correlation] Matrix aktualisiert für {len(open_symbols)} Symbole")
+            logger.info(f"[Correlation] Matrix aktualisiert für {len(symbols)} Symbole")
         except Exception as e:
             logger.warning(f"[Correlation] Fehler: {e}")
 
@@ -364,7 +363,7 @@ class PositionMonitor:
 
                     # Direct Alpaca API call (no execution_agent dependency)
                     try:
-                        resp = requests.post(
+                        resp = http_client.post(
                             f"{os.getenv('ALPACA_BASE_URL', 'https://paper-api.alpaca.markets')}/v2/orders",
                             headers={
                                 "APCA-API-KEY-ID": self._alpaca_key,
@@ -450,7 +449,7 @@ class PositionMonitor:
                     reduce_qty = max(1, int(qty * 0.30))
 
                     try:
-                        resp = requests.post(
+                        resp = http_client.post(
                             f"{os.getenv('ALPACA_BASE_URL', 'https://paper-api.alpaca.markets')}/v2/orders",
                             headers={
                                 "APCA-API-KEY-ID": self._alpaca_key,
@@ -534,7 +533,7 @@ class PositionMonitor:
                 reduce_qty = max(1, int(qty * 0.25))  # 25% reduzieren
 
                 try:
-                    requests.post(
+                    http_client.post(
                         f"{os.getenv('ALPACA_BASE_URL', 'https://paper-api.alpaca.markets')}/v2/orders",
                         headers={
                             "APCA-API-KEY-ID": self._alpaca_key,
@@ -803,10 +802,16 @@ class PositionMonitor:
         if not open_pos:
             return []
 
-        # Get VIX once per check cycle
+        # VIX aus dem Markt-Kontext-Snapshot (kein Download pro Check)
         vix_level = get_vix_level()
         atr_mult_adaptive = get_adaptive_atr_multiplier(vix_level)
 
+        # Stream-Abos folgen den offenen Positionen; alle übrigen Preise mit einem
+        # Snapshot-Request vorladen – _get_price trifft danach Preisbuch bzw. Cache
+        symbols = [p["symbol"] for p in open_pos]
+        price_stream.follow(symbols, owner="positions")
+        quote_service.get_prices(symbols)
+
         actions: List[Dict[str, Any]] = []
         for pos in open_pos:
             symbol = pos["symbol"]
@@ -820,6 +825,8 @@ class PositionMonitor:
             entry = float(pos.get("entry_price") or 0.0)
             tp = pos.get("take_profit")
             atr_14 = pos.get("atr_14")
+            if TRAILING_STOP_LIVE_ATR:
+                atr_14 = _live_atr(symbol) or atr_14
             qty = float(pos.get("quantity") or 0.0)
             reason = None
 
@@ -995,7 +1002,9 @@ class PositionMonitor:
     def close_all_open(self, reason: str = "manual") -> List[Dict[str, Any]]:
         """Schließt alle offenen Positionen (z.B. vor Börsenschluss)."""
         results: List[Dict[str, Any]] = []
-        for pos in self.get_open_positions():
+        open_pos = self.get_open_positions()
+        quote_service.get_prices([p["symbol"] for p in open_pos])
+        for pos in open_pos:
             price = self._get_price(pos["symbol"])
             if price is None:
                 logger.warning("[PositionMonitor] Kein Preis für %s – überspringe.", pos["symbol"])
@@ -1038,6 +1047,8 @@ class PositionMonitor:
             logger.warning("[PositionMonitor] Läuft bereits.")
             return
         self.sync_from_alpaca()  # Load Alpaca positions on startup
+        # Stream gehört dem Aufrufer (scheduler/MAIN_USER_AGENT); hier nur die eigenen Abos
+        price_stream.follow([p["symbol"] for p in self.get_open_positions()], owner="positions")
         self._stop_event.clear()
         self._thread = threading.Thread(
             target=self._loop, daemon=True, name="PositionMonitor"
@@ -1049,15 +1060,24 @@ class PositionMonitor:
         self._stop_event.set()
         if self._thread:
             self._thread.join(timeout=15)
+        price_stream.unfollow("positions")
         logger.info("[PositionMonitor] Gestoppt.")
 
+    def _wait_seconds(self) -> float:
+        """Im Streaming-Modus kostet ein Check kein HTTP → kürzeres Intervall."""
+        if price_stream.is_active():
+            return min(self.check_interval, price_stream.STREAM_CHECK_SECONDS)
+        return self.check_interval
+
     def _loop(self) -> None:
-        iteration = 0
+        last_sync = 0.0
         last_daily_rebalance = None
         while not self._stop_event.is_set():
             try:
-                if iteration % 15 == 0:
+                # Alpaca-Sync alle 15 Standard-Intervalle (unabhängig vom Streaming-Takt)
+                if time.time() - last_sync >= 15 * self.check_interval:
                     self.sync_from_alpaca()
+                    last_sync = time.time()
 
                 # Daily rebalancing (sector concentration + correlation hedge + position sizes + worst performer)
                 today = datetime.now().date()
@@ -1079,59 +1099,13 @@ class PositionMonitor:
                     )
             except Exception as exc:
                 logger.error("[PositionMonitor] Fehler im Check-Loop: %s", exc)
-            iteration += 1
-            self._stop_event.wait(self.check_interval)
+            self._stop_event.wait(self._wait_seconds())
 
     # ── Preisfetcher ──────────────────────────────────────────────────────────
 
     def _get_price(self, symbol: str) -> Optional[float]:
-        """Finnhub → Alpaca → yfinance (fallback)."""
-        # 1) Finnhub
-        if self._finnhub_key:
-            try:
-                resp = requests.get(
-                    "https://finnhub.io/api/v1/quote",
-                    params={"symbol": symbol, "token": self._finnhub_key},
-                    timeout=5,
-                )
-                if resp.ok:
-                    price = resp.json().get("c")
-                    if price and float(price) > 0:
-                        return float(price)
-            except Exception:
-                pass
-
-        # 2) Alpaca
-        if self._alpaca_key and self._alpaca_secret:
-            try:
-                resp = requests.get(
-                    f"https://data.alpaca.markets/v2/stocks/{symbol}/quotes/latest",
-                    headers={
-                        "APCA-API-KEY-ID": self._alpaca_key,
-                        "APCA-API-SECRET-KEY": self._alpaca_secret,
-                    },
-                    timeout=5,
-                )
-                if resp.ok:
-                    price = resp.json().get("quote", {}).get("ap")
-                    if price and float(price) > 0:
-                        return float(price)
-            except Exception:
-                pass
-
-        # 3) yfinance (fallback für autonome VPS operation)
-        try:
-            import yfinance as yf
-            df = yf.download(symbol, period="1d", progress=False, timeout=10)
-            if not df.empty:
-                last_close = df["Close"].iloc[-1]
-                price = float(last_close) if last_close is not None else None
-                if price and price > 0:
-                    return price
-        except Exception:
-            pass
-
-        return None
+        """Preisbuch (Streaming) → Alpaca-Snapshot → Finnhub → yfinance über den gemeinsamen QuoteService."""
+        return quote_service.get_price(symbol)
 
 
 # ── OptionsPositionMonitor ────────────────────────────────────────────────────
@@ -1160,7 +1134,7 @@ class OptionsPositionMonitor:
         }
 
         try:
-            resp = requests.get(f"{base_url}/v2/positions", headers=headers, timeout=10)
+            resp = http_client.get(f"{base_url}/v2/positions", headers=headers, timeout=10)
             resp.raise_for_status()
             positions = resp.json()
         except Exception as e:
@@ -1223,6 +1197,9 @@ class OptionsPositionMonitor:
                 "SELECT * FROM options_positions WHERE status='open'"
             ).fetchall()
 
+        # ein Snapshot-Request für alle offenen Kontrakte
+        quote_service.quotes.get_option_prices([row["option_symbol"] for row in rows])
+
         actions = []
         for row in rows:
             pos = dict(row)
@@ -1337,41 +1314,8 @@ class OptionsPositionMonitor:
         )
 
     def _get_option_price(self, option_symbol: str) -> Optional[float]:
-        """Holt aktuellen Preis für Options-Symbol."""
-        # Finnhub
-        if self._finnhub_key:
-            try:
-                resp = requests.get(
-                    "https://finnhub.io/api/v1/quote",
-                    params={"symbol": option_symbol, "token": self._finnhub_key},
-                    timeout=5,
-                )
-                if resp.ok:
-                    price = resp.json().get("c")
-                    if price and float(price) > 0:
-                        return float(price)
-            except Exception:
-                pass
-
-        # Alpaca
-        if self._alpaca_key and self._alpaca_secret:
-            try:
-                resp = requests.get(
-                    f"https://data.alpaca.markets/v2/options/snapshots/{option_symbol}",
-                    headers={
-                        "APCA-API-KEY-ID": self._alpaca_key,
-                        "APCA-API-SECRET-KEY": self._alpaca_secret,
-                    },
-                    timeout=5,
-                )
-                if resp.ok:
-                    price = resp.json().get("snapshot", {}).get("last_quote", {}).get("ap")
-                    if price and float(price) > 0:
-                        return float(price)
-            except Exception:
-                pass
-
-        return None
+        """Holt aktuellen Preis für Options-Symbol (QuoteService, Alpaca-Snapshot → Finnhub)."""
+        return quote_service.quotes.get_option_price(option_symbol)
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
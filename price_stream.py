@@ -0,0 +1,558 @@
+"""
+price_stream.py
+
+Optionaler Streaming-Modus für Echtzeit-Preise.
+
+PriceStream abonniert einen Trades/Quotes-WebSocket (Alpaca-Market-Data-
+Protokoll) und pflegt ein In-Memory-Preisbuch (PriceBook) mit last/bid/ask/
+high/low pro Symbol. Preis-Konsumenten (PositionMonitor, api_server,
+DataFetcher – alle über quote_service) lesen frische Ticks direkt aus dem Buch,
+ohne Netzwerk-Latenz; nur Symbole ohne frischen Tick gehen noch per HTTP raus.
+
+Die Abos folgen automatisch den offenen Positionen: jeder Konsument meldet
+seine Symbole per follow(symbols, owner=...) an, abonniert wird die Vereinigung.
+Beim Beenden meldet er sich per unfollow(owner) ab. Starten und Stoppen des
+geteilten Streams (start_stream/stop_stream) ist Sache seines Besitzers
+(scheduler, api_server, MAIN_USER_AGENT), nicht der einzelnen Konsumenten.
+
+Offline-Test: ReplayServer ist ein lokaler WebSocket-Server mit demselben
+Protokoll, der aufgezeichnete (JSONL, siehe PRICE_STREAM_RECORD) oder
+synthetische Ticks streamt:
+
+  python price_stream.py --symbols AAPL,MSFT --port 8765 [--file ticks.jsonl]
+  PRICE_STREAM_ENABLED=1 PRICE_STREAM_URL=ws://127.0.0.1:8765 python scheduler.py
+
+Benötigt: pip install websockets
+
+Konfiguration via .env:
+  PRICE_STREAM_ENABLED        0
+  PRICE_STREAM_URL            wss://stream.data.alpaca.markets/v2/iex
+  PRICE_STREAM_MAX_AGE        15    Sekunden, so lange gilt ein Tick als frisch
+  PRICE_STREAM_CHECK_SECONDS  5     Prüfintervall des PositionMonitor im Streaming-Modus
+  PRICE_STREAM_RECORD         -     JSONL-Datei, in die empfangene Ticks geschrieben werden
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+logger = logging.getLogger("PriceStream")
+
+STREAM_ENABLED = os.getenv("PRICE_STREAM_ENABLED", "0") == "1"
+STREAM_URL = os.getenv("PRICE_STREAM_URL", "wss://stream.data.alpaca.markets/v2/iex")
+STREAM_MAX_AGE = float(os.getenv("PRICE_STREAM_MAX_AGE", "15"))
+STREAM_CHECK_SECONDS = float(os.getenv("PRICE_STREAM_CHECK_SECONDS", "5"))
+
+
+def _require_websockets():
+    try:
+        import websockets.sync.client  # noqa: F401
+        import websockets.sync.server  # noqa: F401
+    except ImportError:
+        raise RuntimeError("websockets fehlt. Installiere: pip install websockets")
+    import websockets
+    return websockets
+
+
+# ── Preisbuch ─────────────────────────────────────────────────────────────────
+
+@dataclass
+class BookEntry:
+    """Letzter Stand eines Symbols; high/low seit Beginn des Abos."""
+    symbol: str
+    last: float = 0.0
+    bid: float = 0.0
+    ask: float = 0.0
+    high: float = 0.0
+    low: float = 0.0
+    volume: float = 0.0
+    ticks: int = 0
+    updated_at: float = 0.0   # time.time() des letzten Ticks
+
+    @property
+    def price(self) -> float:
+        """Last Trade, sonst Quote-Mitte."""
+        if self.last > 0:
+            return self.last
+        if self.bid > 0 and self.ask > 0:
+            return (self.bid + self.ask) / 2
+        return self.ask or self.bid
+
+    def age(self) -> float:
+        return time.time() - self.updated_at
+
+
+class PriceBook:
+    """Thread-sicheres last/bid/ask/high/low-Buch pro Symbol."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[str, BookEntry] = {}
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[BookEntry], None]] = []
+
+    def update_trade(self, symbol: str, price: float, size: float = 0.0) -> None:
+        if price <= 0:
+            return
+        with self._lock:
+            e = self._entries.get(symbol) or BookEntry(symbol=symbol, high=price, low=price)
+            e.last = price
+            e.high = max(e.high, price)
+            e.low = min(e.low, price) if e.low > 0 else price
+            e.volume += size
+            e.ticks += 1
+            e.updated_at = time.time()
+            self._entries[symbol] = e
+            snapshot = replace(e)
+        self._notify(snapshot)
+
+    def update_quote(self, symbol: str, bid: float, ask: float) -> None:
+        with self._lock:
+            e = self._entries.get(symbol) or BookEntry(symbol=symbol)
+            e.bid = bid or e.bid
+            e.ask = ask or e.ask
+            e.ticks += 1
+            e.updated_at = time.time()
+            self._entries[symbol] = e
+            snapshot = replace(e)
+        self._notify(snapshot)
+
+    def apply(self, message: Dict[str, Any]) -> None:
+        """Eine Alpaca-Stream-Nachricht (T=t Trade, T=q Quote, T=b Bar) einarbeiten."""
+        kind, symbol = message.get("T"), message.get("S")
+        if not symbol:
+            return
+        if kind == "t":
+            self.update_trade(symbol, float(message.get("p") or 0), float(message.get("s") or 0))
+        elif kind == "q":
+            self.update_quote(symbol, float(message.get("bp") or 0), float(message.get("ap") or 0))
+        elif kind == "b":
+            self.update_trade(symbol, float(message.get("c") or 0), float(message.get("v") or 0))
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[BookEntry]:
+        """Kopie des Eintrags oder None (auch wenn älter als max_age)."""
+        with self._lock:
+            e = self._entries.get(symbol)
+            if e is None or (max_age is not None and e.age() > max_age):
+                return None
+            return replace(e)
+
+    def last_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        e = self.get(symbol, max_age)
+        return e.price if e and e.price > 0 else None
+
+    def prices(self, symbols: Iterable[str], max_age: Optional[float] = None) -> Dict[str, float]:
+        out = {}
+        for sym in symbols:
+            price = self.last_price(sym, max_age)
+            if price is not None:
+                out[sym] = price
+        return out
+
+    def drop(self, symbols: Iterable[str]) -> None:
+        with self._lock:
+            for sym in symbols:
+                self._entries.pop(sym, None)
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return sorted(self._entries)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                sym: {"price": e.price, "bid": e.bid, "ask": e.ask, "high": e.high, "low": e.low,
+                      "ticks": e.ticks, "age_seconds": round(e.age(), 3)}
+                for sym, e in self._entries.items()
+            }
+
+    def add_listener(self, callback: Callable[[BookEntry], None]) -> None:
+        """callback(entry) nach jedem Tick (aus dem Stream-Thread – kurz halten)."""
+        self._listeners.append(callback)
+
+    def _notify(self, entry: BookEntry) -> None:
+        for cb in list(self._listeners):
+            try:
+                cb(entry)
+            except Exception as exc:
+                logger.debug("[PriceBook] Listener-Fehler: %s", exc)
+
+
+# ── Stream-Client ─────────────────────────────────────────────────────────────
+
+class PriceStream:
+    """
+    Hintergrund-Thread: verbindet sich mit dem WebSocket, authentifiziert sich,
+    abonniert trades+quotes der gewünschten Symbole und schreibt alle Ticks ins
+    PriceBook. Verbindungsabbrüche → Reconnect mit Backoff und vollem Re-Subscribe.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        book: Optional[PriceBook] = None,
+        record_path: Optional[str] = None,
+    ) -> None:
+        self.url = url or STREAM_URL
+        self.book = book or PriceBook()
+        self.record_path = record_path if record_path is not None else os.getenv("PRICE_STREAM_RECORD")
+        self._wanted: Dict[str, Set[str]] = {}   # owner → Symbole
+        self._wanted_all: Set[str] = set()
+        self._subscribed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._messages = 0
+        self._reconnects = 0
+        self._last_error: Optional[str] = None
+
+    # ── Steuerung ────────────────────────────────────────────────────────────
+
+    def start(self) -> "PriceStream":
+        _require_websockets()
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="PriceStream")
+        self._thread.start()
+        logger.info("[PriceStream] Gestartet: %s", self.url)
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._changed.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._connected.clear()
+
+    def follow(self, symbols: Iterable[str], owner: str = "default") -> None:
+        """Gewünschte Symbole eines Konsumenten setzen; abonniert wird die Vereinigung aller Owner."""
+        with self._lock:
+            self._wanted[owner] = {s.upper() for s in symbols}
+            self._wanted_all = set().union(*self._wanted.values())
+        self._changed.set()
+
+    def unfollow(self, owner: str) -> None:
+        """Symbole eines Konsumenten abmelden; die der übrigen Owner bleiben abonniert."""
+        with self._lock:
+            self._wanted.pop(owner, None)
+            self._wanted_all = set().union(*self._wanted.values())
+        self._changed.set()
+
+    def wanted(self) -> Set[str]:
+        return set(self._wanted_all)
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout: float = 10.0) -> bool:
+        return self._connected.wait(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscribed = sorted(self._subscribed)
+        return {
+            "url": self.url,
+            "connected": self.is_connected,
+            "subscribed": subscribed,
+            "messages": self._messages,
+            "reconnects": self._reconnects,
+            "last_error": self._last_error,
+        }
+
+    # ── Thread ───────────────────────────────────────────────────────────────
+
+    def _run(self) -> None:
+        websockets = _require_websockets()
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with websockets.sync.client.connect(self.url, open_timeout=10, close_timeout=2) as ws:
+                    self._handshake(ws)
+                    self._connected.set()
+                    backoff = 1.0
+                    with self._lock:
+                        self._subscribed = set()
+                    self._changed.set()
+                    self._pump(ws)
+            except Exception as exc:
+                self._last_error = str(exc)
+                if not self._stop.is_set():
+                    logger.warning("[PriceStream] Verbindung verloren: %s – Reconnect in %.0fs", exc, backoff)
+            finally:
+                self._connected.clear()
+            if self._stop.wait(backoff):
+                break
+            self._reconnects += 1
+            backoff = min(backoff * 2, 30.0)
+
+    def _handshake(self, ws) -> None:
+        """connected → auth → authenticated (Alpaca-Protokoll)."""
+        self._handle(ws.recv(timeout=10))
+        ws.send(json.dumps({
+            "action": "auth",
+            "key": os.getenv("APCA_API_KEY_ID", ""),
+            "secret": os.getenv("APCA_API_SECRET_KEY", ""),
+        }))
+        reply = json.loads(ws.recv(timeout=10))
+        if not any(m.get("T") == "success" and m.get("msg") == "authenticated" for m in reply):
+            raise RuntimeError(f"Auth fehlgeschlagen: {reply}")
+
+    def _pump(self, ws) -> None:
+        while not self._stop.is_set():
+            if self._changed.is_set():
+                self._changed.clear()
+                self._sync_subscriptions(ws)
+            try:
+                raw = ws.recv(timeout=0.5)
+            except TimeoutError:
+                continue
+            self._handle(raw)
+
+    def _sync_subscriptions(self, ws) -> None:
+        wanted = self.wanted()
+        with self._lock:
+            add = sorted(wanted - self._subscribed)
+            remove = sorted(self._subscribed - wanted)
+            self._subscribed = wanted
+        if add:
+            ws.send(json.dumps({"action": "subscribe", "trades": add, "quotes": add}))
+        if remove:
+            ws.send(json.dumps({"action": "unsubscribe", "trades": remove, "quotes": remove}))
+            self.book.drop(remove)
+        if add or remove:
+            logger.info("[PriceStream] Abos: +%s -%s", add, remove)
+
+    def _handle(self, raw: Any) -> None:
+        messages = json.loads(raw)
+        if isinstance(messages, dict):
+            messages = [messages]
+        wanted = self._wanted_all
+        for msg in messages:
+            kind = msg.get("T")
+            # Ticks, die noch vor einem unsubscribe unterwegs waren, verwerfen
+            if kind in ("t", "q", "b") and msg.get("S") in wanted:
+                self._messages += 1
+                self.book.apply(msg)
+            elif kind == "error":
+                logger.warning("[PriceStream] Fehler vom Server: %s", msg)
+        if self.record_path:
+            self._record(messages)
+
+    def _record(self, messages: List[Dict[str, Any]]) -> None:
+        ticks = [m for m in messages if m.get("T") in ("t", "q", "b")]
+        if not ticks:
+            return
+        with open(self.record_path, "a", encoding="utf-8") as f:
+            for m in ticks:
+                f.write(json.dumps(m) + "\n")
+
+
+# ── Replay-Server (lokale Stand-in-Quelle) ───────────────────────────────────
+
+def synthetic_ticks(
+    symbols: Iterable[str],
+    start_prices: Optional[Dict[str, float]] = None,
+    volatility: float = 0.0005,
+    seed: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Endloser Random-Walk: abwechselnd Quote und Trade je Symbol (Alpaca-Nachrichtenformat)."""
+    rng = random.Random(seed)
+    prices = {s.upper(): (start_prices or {}).get(s.upper(), 100.0) for s in symbols}
+    for sym in itertools.cycle(sorted(prices)):
+        p = prices[sym] = max(0.01, prices[sym] * (1 + rng.gauss(0, volatility)))
+        spread = max(0.01, p * 0.0002)
+        ts = datetime.now(timezone.utc).isoformat()
+        yield {"T": "q", "S": sym, "bp": round(p - spread / 2, 4), "ap": round(p + spread / 2, 4), "t": ts}
+        yield {"T": "t", "S": sym, "p": round(p, 4), "s": rng.randint(1, 500), "t": ts}
+
+
+def load_ticks(path: str) -> List[Dict[str, Any]]:
+    """Aufgezeichnete Ticks (JSONL, eine Nachricht pro Zeile, z.B. aus PRICE_STREAM_RECORD)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class ReplayServer:
+    """
+    Lokaler WebSocket-Server im Alpaca-Protokoll für Offline-Tests.
+
+    ticks:  Nachrichten (Liste/Iterator) – z.B. load_ticks(...) oder synthetic_ticks(...);
+            Standard: synthetische Ticks für die abonnierten Symbole.
+    rate:   Ticks pro Sekunde (0 = so schnell wie möglich)
+    loop:   aufgezeichnete Ticks endlos wiederholen
+    Gesendet werden nur Ticks für Symbole, die der Client abonniert hat.
+    """
+
+    def __init__(
+        self,
+        ticks: Optional[Iterable[Dict[str, Any]]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate: float = 200.0,
+        loop: bool = True,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.loop = loop
+        self.seed = seed
+        self._ticks = list(ticks) if ticks is not None else None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self) -> "ReplayServer":
+        websockets = _require_websockets()
+        self._server = websockets.sync.server.serve(self._handler, self.host, self.port)
+        self.port = self._server.socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="ReplayServer")
+        self._thread.start()
+        logger.info("[ReplayServer] Läuft auf %s", self.url)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _source(self, subscribed: Set[str]) -> Iterator[Dict[str, Any]]:
+        if self._ticks is None:
+            return synthetic_ticks(sorted(subscribed) or ["SPY"], seed=self.seed)
+        return itertools.cycle(self._ticks) if self.loop else iter(self._ticks)
+
+    def _handler(self, ws) -> None:
+        ws.send(json.dumps([{"T": "success", "msg": "connected"}]))
+        json.loads(ws.recv(timeout=10))  # auth – jeder Schlüssel wird akzeptiert
+        ws.send(json.dumps([{"T": "success", "msg": "authenticated"}]))
+
+        subscribed: Set[str] = set()
+        source: Optional[Iterator[Dict[str, Any]]] = None
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        try:
+            while True:
+                # Steuer-Nachrichten (subscribe/unsubscribe) ohne Blockieren lesen
+                try:
+                    ctrl = json.loads(ws.recv(timeout=interval if subscribed else 0.5))
+                except TimeoutError:
+                    ctrl = None
+                if ctrl:
+                    changed = set(ctrl.get("trades", [])) | set(ctrl.get("quotes", []))
+                    if ctrl.get("action") == "subscribe":
+                        subscribed |= changed
+                    elif ctrl.get("action") == "unsubscribe":
+                        subscribed -= changed
+                    ws.send(json.dumps([{"T": "subscription", "trades": sorted(subscribed),
+                                         "quotes": sorted(subscribed)}]))
+                    if self._ticks is None:
+                        source = None   # synthetische Quelle für neue Symbolmenge
+                if not subscribed:
+                    continue
+                if source is None:
+                    source = self._source(subscribed)
+                tick = next(source, None)
+                if tick is None:
+                    return
+                if tick.get("S") in subscribed:
+                    ws.send(json.dumps([tick]))
+                    self.sent += 1
+        except Exception:
+            return   # Client getrennt
+
+
+# ── Prozessweite Instanz ─────────────────────────────────────────────────────
+
+book = PriceBook()
+_stream: Optional[PriceStream] = None
+_stream_lock = threading.Lock()
+
+
+def start_stream(url: Optional[str] = None) -> Optional[PriceStream]:
+    """Startet den geteilten Stream, falls PRICE_STREAM_ENABLED=1 (oder url angegeben)."""
+    global _stream
+    if not (STREAM_ENABLED or url):
+        return None
+    with _stream_lock:
+        if _stream is None:
+            try:
+                _stream = PriceStream(url=url, book=book).start()
+            except RuntimeError as exc:
+                logger.error("[PriceStream] Nicht gestartet: %s", exc)
+                return None
+        return _stream
+
+
+def stop_stream() -> None:
+    global _stream
+    with _stream_lock:
+        if _stream is not None:
+            _stream.stop()
+            _stream = None
+
+
+def is_active() -> bool:
+    return _stream is not None and _stream.is_connected
+
+
+def follow(symbols: Iterable[str], owner: str = "default") -> None:
+    """Abos an die Symbole eines Konsumenten anpassen (No-op ohne laufenden Stream)."""
+    if _stream is not None:
+        _stream.follow(symbols, owner)
+
+
+def unfollow(owner: str) -> None:
+    """Abos eines Konsumenten abmelden, ohne den geteilten Stream zu stoppen."""
+    if _stream is not None:
+        _stream.unfollow(owner)
+
+
+def fresh_price(symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+    """Preis aus dem Buch, wenn der Stream läuft und der Tick frisch ist."""
+    if not is_active():
+        return None
+    return book.last_price(symbol.upper(), STREAM_MAX_AGE if max_age is None else max_age)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokaler Replay-Server für PriceStream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--file", help="JSONL-Aufzeichnung (sonst synthetische Ticks)")
+    parser.add_argument("--rate", type=float, default=50.0, help="Ticks pro Sekunde")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = ReplayServer(
+        ticks=load_ticks(args.file) if args.file else None,
+        host=args.host, port=args.port, rate=args.rate,
+    ).start()
+    print(f"Replay-Server läuft: {server.url}  (Strg+C beendet)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,338 @@
+"""
+provider_router.py
+
+Latenz-basiertes Routing zwischen gleichwertigen Datenquellen (Quotes:
+Alpaca/Finnhub, Historie: IBKR/yfinance) statt fester Fallback-Reihenfolge.
+
+Pro Provider wird ein rollierendes Fenster der letzten Aufrufe geführt
+(Latenz je Request-Einheit, Erfolg). Daraus:
+- Ranking: gesunde Provider nach erwarteter Latenz = p50 × Kosten des Aufrufs
+  (z.B. 1 Snapshot-Request vs. 1 Request je Symbol), verteuert um die
+  Fehlerquote. Provider ohne Messwerte werden mit der besten bekannten p50
+  geschätzt (bei Gleichstand gilt die Konfigurationsreihenfolge) und so ab und
+  zu neu vermessen; Messwerte verfallen nach PROVIDER_SAMPLE_TTL Sekunden.
+- Circuit pro Provider: nach PROVIDER_CIRCUIT_FAILURES Fehlern in Folge (oder
+  Fehlerquote >= 50 % im Fenster) wird der Provider PROVIDER_CIRCUIT_COOLDOWN
+  Sekunden übersprungen; danach darf genau ein Probe-Aufruf durch (half-open).
+- Hedging (optional, PROVIDER_HEDGE=1): braucht der schnellste Provider länger
+  als seine eigene p95, läuft parallel derselbe Aufruf beim nächsten Provider;
+  das erste brauchbare Ergebnis gewinnt.
+
+Nicht zu verwechseln mit risk.CircuitBreaker (Trading-Stopp nach Verlusten).
+
+Ein Router pro Zweck und Prozess, damit alle Aufrufer denselben Circuit- und
+Latenz-Zustand sehen:
+  - quote_service.QuoteService (Aktien- und Options-Quotes, Singleton quotes)
+  - DEF_DATA_AGENT.history_router (Historie, von allen DataAgents geteilt)
+
+Konfiguration via .env:
+  PROVIDER_HEDGE               0     Hedged Requests bei p95-Überschreitung
+  PROVIDER_WINDOW              100   Aufrufe im rollierenden Fenster
+  PROVIDER_CIRCUIT_FAILURES    5     Fehler in Folge bis der Circuit öffnet
+  PROVIDER_CIRCUIT_COOLDOWN    30    Sekunden offen, danach ein Probe-Aufruf
+  PROVIDER_SAMPLE_TTL          600   Sekunden, nach denen Messwerte verfallen
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from weakref import WeakValueDictionary
+
+logger = logging.getLogger("ProviderRouter")
+
+PROVIDER_HEDGE = os.getenv("PROVIDER_HEDGE", "0") == "1"
+PROVIDER_WINDOW = int(os.getenv("PROVIDER_WINDOW", "100"))
+PROVIDER_CIRCUIT_FAILURES = int(os.getenv("PROVIDER_CIRCUIT_FAILURES", "5"))
+PROVIDER_CIRCUIT_COOLDOWN = float(os.getenv("PROVIDER_CIRCUIT_COOLDOWN", "30"))
+PROVIDER_SAMPLE_TTL = float(os.getenv("PROVIDER_SAMPLE_TTL", "600"))
+
+ERROR_RATE_OPEN = 0.5      # Fehlerquote im Fenster, ab der der Circuit öffnet …
+ERROR_RATE_MIN_SAMPLES = 10  # … sofern genug Messwerte vorliegen
+HEDGE_MIN_SAMPLES = 20     # p95 erst ab so vielen Erfolgen belastbar
+
+# Name → Router (schwach referenziert, nur für stats())
+_routers: "WeakValueDictionary[str, ProviderRouter]" = WeakValueDictionary()
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider-hedge")
+        return _hedge_pool
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Routed(NamedTuple):
+    """Ergebnis von ProviderRouter.call: Gewinner, Wert, alle versuchten Provider."""
+    provider: str
+    value: Any
+    attempted: List[str]
+
+
+class AllProvidersFailed(RuntimeError):
+    def __init__(self, router: str, attempted: List[str], last_error: Optional[BaseException]):
+        super().__init__(f"{router}: alle Provider fehlgeschlagen ({', '.join(attempted) or '-'}): {last_error}")
+        self.attempted = attempted
+        self.last_error = last_error
+
+
+class ProviderHealth:
+    """Rollierendes Fenster + Circuit-Zustand eines Providers."""
+
+    def __init__(self, name: str, window: int) -> None:
+        self.name = name
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window)  # (Zeitpunkt, Latenz, ok)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.calls = 0
+        self.failures = 0
+        self.hedged = 0
+
+    def add(self, latency: float, ok: bool) -> None:
+        self._samples.append((time.time(), latency, ok))
+
+    def prune(self, max_age: float) -> None:
+        cutoff = time.time() - max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def latencies(self) -> List[float]:
+        return [lat for _, lat, ok in self._samples if ok]
+
+    def p50(self) -> Optional[float]:
+        return _percentile(self.latencies(), 0.5)
+
+    def error_rate(self) -> float:
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def score(self, units: float = 1.0, baseline: float = 0.0) -> float:
+        """Erwartete Latenz für units Request-Einheiten inkl. Fehler-Aufschlag (ohne Messwert: baseline)."""
+        p50 = self.p50()
+        return (baseline if p50 is None else p50) * units * (1.0 + 2.0 * self.error_rate())
+
+    def p95(self) -> Optional[float]:
+        lat = self.latencies()
+        return _percentile(lat, 0.95) if len(lat) >= HEDGE_MIN_SAMPLES else None
+
+
+class ProviderRouter:
+    """
+    Routet Aufrufe über die Provider eines Zwecks (z.B. "quotes").
+
+    call(fn): fn(provider) für den besten gesunden Provider; Exception → nächster.
+    ranked(): aktuelle Reihenfolge; record(): Messwert von außen melden.
+    cost(provider): Request-Einheiten, die der Aufruf bei diesem Provider kostet (Default 1).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        providers: Iterable[str],
+        window: Optional[int] = None,
+        failure_threshold: Optional[int] = None,
+        cooldown_seconds: Optional[float] = None,
+        hedge: Optional[bool] = None,
+    ) -> None:
+        self.name = name
+        self.providers = list(providers)
+        self.failure_threshold = failure_threshold or PROVIDER_CIRCUIT_FAILURES
+        self.cooldown_seconds = PROVIDER_CIRCUIT_COOLDOWN if cooldown_seconds is None else cooldown_seconds
+        self.hedge = PROVIDER_HEDGE if hedge is None else hedge
+        self._health = {p: ProviderHealth(p, window or PROVIDER_WINDOW) for p in self.providers}
+        self._lock = threading.Lock()
+        _routers[name] = self
+
+    # ── Ranking / Circuit ────────────────────────────────────────────────────
+
+    def _available(self, h: ProviderHealth, now: float) -> bool:
+        """Circuit geschlossen, oder Cooldown vorbei und noch keine Probe unterwegs."""
+        if h.opened_at is None:
+            return True
+        return now - h.opened_at >= self.cooldown_seconds and not h.probing
+
+    def ranked(
+        self,
+        candidates: Optional[Iterable[str]] = None,
+        cost: Optional[Callable[[str], float]] = None,
+    ) -> List[str]:
+        """Gesunde Provider nach Score; sind alle offen, die Konfigurationsreihenfolge (besser als nichts)."""
+        wanted = None if candidates is None else set(candidates)
+        allowed = [p for p in self.providers if wanted is None or p in wanted]
+        now = time.time()
+        with self._lock:
+            healthy = [p for p in allowed if self._available(self._health[p], now)]
+            if not healthy:
+                return list(allowed)
+            for p in healthy:
+                self._health[p].prune(PROVIDER_SAMPLE_TTL)
+            known = [p50 for p50 in (self._health[p].p50() for p in healthy) if p50 is not None]
+            baseline = min(known, default=0.0)
+            return sorted(healthy, key=lambda p: self._health[p].score(cost(p) if cost else 1.0, baseline))
+
+    def _begin(self, provider: str) -> bool:
+        """
+        Half-open: der erste Aufruf nach dem Cooldown ist die Probe. Prüfen und
+        Belegen passieren unter einem Lock – False, wenn bereits ein anderer
+        Aufrufer probt (dieser Provider wird dann übersprungen).
+        """
+        with self._lock:
+            h = self._health[provider]
+            if h.opened_at is None or time.time() - h.opened_at < self.cooldown_seconds:
+                return True
+            if h.probing:
+                return False
+            h.probing = True
+            return True
+
+    def record(self, provider: str, latency: float, ok: bool) -> None:
+        with self._lock:
+            h = self._health[provider]
+            h.calls += 1
+            h.add(latency, ok)
+            if ok:
+                h.consecutive_failures = 0
+                if h.opened_at is not None:
+                    logger.info("[ProviderRouter] %s/%s: Circuit wieder geschlossen", self.name, provider)
+                    h._samples.clear()
+                    h.add(latency, ok)
+                h.opened_at = None
+                h.probing = False
+                return
+
+            h.failures += 1
+            h.consecutive_failures += 1
+            too_many = h.consecutive_failures >= self.failure_threshold
+            bad_rate = len(h._samples) >= ERROR_RATE_MIN_SAMPLES and h.error_rate() >= ERROR_RATE_OPEN
+            if h.probing or too_many or bad_rate:
+                if h.opened_at is None or h.probing:
+                    logger.warning(
+                        "[ProviderRouter] %s/%s: Circuit offen für %.0fs (%d Fehler in Folge, Quote %.0f%%)",
+                        self.name, provider, self.cooldown_seconds, h.consecutive_failures, h.error_rate() * 100,
+                    )
+                h.opened_at = time.time()
+                h.probing = False
+
+    # ── Aufruf ───────────────────────────────────────────────────────────────
+
+    def _timed(self, provider: str, fn: Callable[[str], Any], units: float = 1.0) -> Any:
+        """fn(provider) ausführen und Latenz je Request-Einheit aufzeichnen (nach _begin)."""
+        start = time.perf_counter()
+        try:
+            value = fn(provider)
+        except BaseException:
+            self.record(provider, (time.perf_counter() - start) / units, ok=False)
+            raise
+        self.record(provider, (time.perf_counter() - start) / units, ok=True)
+        return value
+
+    def call(
+        self,
+        fn: Callable[[str], Any],
+        candidates: Optional[Iterable[str]] = None,
+        cost: Optional[Callable[[str], float]] = None,
+    ) -> Routed:
+        """
+        fn(provider) beim besten Provider; wirft fn, kommt der nächste dran.
+        Mit Hedging startet der zweitbeste parallel, sobald der erste seine p95 überschreitet.
+        AllProvidersFailed, wenn keiner liefert.
+        """
+        units = (lambda p: max(1.0, float(cost(p)))) if cost else (lambda p: 1.0)
+        order = self.ranked(candidates, units)
+        attempted: List[str] = []
+        last_error: Optional[BaseException] = None
+
+        if self.hedge and len(order) > 1:
+            with self._lock:
+                p95 = self._health[order[0]].p95()
+            if p95 is not None and self._begin(order[0]):
+                routed, last_error = self._hedged(fn, order[0], order[1], p95 * units(order[0]), attempted, units)
+                if routed is not None:
+                    return routed
+                order = order[2:]
+
+        for provider in order:
+            if not self._begin(provider):
+                continue
+            attempted.append(provider)
+            try:
+                return Routed(provider, self._timed(provider, fn, units(provider)), attempted)
+            except Exception as exc:
+                last_error = exc
+                logger.debug("[ProviderRouter] %s/%s fehlgeschlagen: %s", self.name, provider, exc)
+        raise AllProvidersFailed(self.name, attempted, last_error)
+
+    def _hedged(
+        self,
+        fn: Callable[[str], Any],
+        primary: str,
+        backup: str,
+        delay: float,
+        attempted: List[str],
+        units: Callable[[str], float],
+    ) -> Tuple[Optional[Routed], Optional[BaseException]]:
+        pool = _pool()
+        attempted.append(primary)
+        futures: Dict[Future, str] = {pool.submit(self._timed, primary, fn, units(primary)): primary}
+        done, _ = wait(futures, timeout=delay)
+        if (not done or next(iter(done)).exception() is not None) and self._begin(backup):
+            attempted.append(backup)
+            futures[pool.submit(self._timed, backup, fn, units(backup))] = backup
+            if not done:
+                with self._lock:
+                    self._health[backup].hedged += 1
+
+        last_error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                exc = future.exception()
+                if exc is None:
+                    return Routed(futures[future], future.result(), attempted), None
+                last_error = exc
+        return None, last_error
+
+    # ── Status ───────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            out = {}
+            for p, h in self._health.items():
+                lat = h.latencies()
+                out[p] = {
+                    "state": "closed" if h.opened_at is None
+                    else ("half_open" if now - h.opened_at >= self.cooldown_seconds else "open"),
+                    "calls": h.calls,
+                    "failures": h.failures,
+                    "error_rate": round(h.error_rate(), 3),
+                    # je Request-Einheit
+                    "p50_ms": round(_percentile(lat, 0.5) * 1000, 1) if lat else None,
+                    "p95_ms": round(_percentile(lat, 0.95) * 1000, 1) if lat else None,
+                    "hedged": h.hedged,
+                }
+            return out
+
+
+def stats() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Status aller lebenden Router (pro Name der zuletzt angelegte)."""
+    return {name: r.stats() for name, r in list(_routers.items())}
@@ -0,0 +1,399 @@
+"""
+quote_service.py
+
+Gemeinsamer In-Process-Quote-Service für alle Preisabfragen.
+
+Statt pro Symbol einzeln (und pro Aufrufer erneut) Finnhub/Alpaca/yfinance
+abzufragen, holt der Service Preise für viele Symbole mit EINEM Snapshot-
+Request und hält sie für ein kurzes Frische-Fenster im Speicher.
+
+Quellen (pro Abruf nur für die noch fehlenden Symbole):
+  - Alpaca Multi-Symbol-Snapshot  /v2/stocks/snapshots?symbols=A,B,...
+    (Optionen: /v1beta1/options/snapshots?symbols=...)
+  - Finnhub /quote                pro Symbol (FINNHUB_API_KEY)
+  Reihenfolge bestimmt provider_router: schnellster gesunder Provider (erwartete
+  Latenz je Request × Anzahl nötiger Requests), Provider mit offenem Circuit
+  werden übersprungen; fehlende Symbole gehen an den nächsten Provider.
+  - yfinance                      ein Multi-Ticker-Download (nur Aktien), zuletzt
+
+Fragen mehrere Threads gleichzeitig nach demselben Symbol, läuft genau ein
+Abruf; die anderen warten auf dessen Ergebnis (request coalescing).
+
+Läuft der Streaming-Modus (price_stream, PRICE_STREAM_ENABLED=1), kommen
+Aktienpreise mit frischem Tick direkt aus dem In-Memory-Preisbuch – ohne HTTP.
+
+Nutzer:
+  - position_monitor.PositionMonitor._get_price / check_positions
+  - position_monitor.OptionsPositionMonitor._get_option_price
+  - api_server._get_current_price / get_positions
+  - data_fetcher.DataFetcher.fetch_all_symbols
+
+Konfiguration via .env:
+  QUOTE_MAX_AGE_SECONDS  5     So lange gilt ein Preis als frisch
+  QUOTE_BATCH_SIZE       200   Symbole pro Snapshot-Request
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+import http_client
+import price_stream
+from provider_router import AllProvidersFailed, ProviderRouter
+from ttl_cache import TTLCache
+
+logger = logging.getLogger("QuoteService")
+
+QUOTE_MAX_AGE_SECONDS = float(os.getenv("QUOTE_MAX_AGE_SECONDS", "5"))
+QUOTE_BATCH_SIZE = int(os.getenv("QUOTE_BATCH_SIZE", "200"))
+_WAIT_TIMEOUT = 60.0  # Obergrenze für das Warten auf einen fremden Abruf
+
+
+@dataclass
+class Quote:
+    """Letzter Preis (last trade, sonst Ask) plus Bid/Ask eines Symbols."""
+    symbol: str
+    price: float
+    bid: float = 0.0
+    ask: float = 0.0
+    bid_size: int = 0
+    ask_size: int = 0
+    source: str = ""
+    timestamp: datetime = None  # type: ignore[assignment]
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["timestamp"] = self.timestamp.isoformat() if self.timestamp else None
+        return d
+
+
+def _positive(value: Any) -> Optional[float]:
+    try:
+        f = float(value)
+    except (TypeError, ValueError):
+        return None
+    return f if f > 0 else None
+
+
+class QuoteService:
+    """
+    Preise für viele Symbole mit wenigen HTTP-Requests.
+
+    get_price / get_prices          Aktien/ETFs
+    get_quote / get_quotes          wie oben, mit Bid/Ask/Quelle
+    get_option_price / get_option_prices   OCC-Optionssymbole
+    """
+
+    def __init__(self, max_age_seconds: Optional[float] = None, batch_size: Optional[int] = None) -> None:
+        self.max_age_seconds = QUOTE_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+        self.batch_size = batch_size or QUOTE_BATCH_SIZE
+
+        self._cache = TTLCache(max_entries=5000, default_ttl=self.max_age_seconds, name="quotes")
+        self._stock_router = ProviderRouter("stock_quotes", ["alpaca", "finnhub"])
+        self._option_router = ProviderRouter("option_quotes", ["alpaca", "finnhub"])
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._requests = 0
+        self._coalesced = 0
+
+    # ── Öffentliche API ──────────────────────────────────────────────────────
+
+    def get_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        """{SYMBOL: Quote} für alle auflösbaren Symbole."""
+        symbols = [s.upper() for s in symbols]
+        streamed = self._stream_quotes(symbols)
+        rest = [s for s in symbols if s not in streamed]
+        if rest:
+            streamed.update(self._resolve(rest, "stk", self._fetch_stock_quotes))
+        return streamed
+
+    def get_quote(self, symbol: str) -> Optional[Quote]:
+        return self.get_quotes([symbol]).get(symbol.upper())
+
+    def get_prices(self, symbols: List[str]) -> Dict[str, float]:
+        return {sym: q.price for sym, q in self.get_quotes(symbols).items()}
+
+    def get_price(self, symbol: str) -> Optional[float]:
+        quote = self.get_quote(symbol)
+        return quote.price if quote else None
+
+    def get_option_prices(self, option_symbols: List[str]) -> Dict[str, float]:
+        quotes = self._resolve([s.upper() for s in option_symbols], "opt", self._fetch_option_quotes)
+        return {sym: q.price for sym, q in quotes.items()}
+
+    def get_option_price(self, option_symbol: str) -> Optional[float]:
+        return self.get_option_prices([option_symbol]).get(option_symbol.upper())
+
+    def invalidate(self, symbol: Optional[str] = None) -> None:
+        if symbol is None:
+            self._cache.clear()
+        else:
+            for kind in ("stk", "opt"):
+                self._cache.delete((kind, symbol.upper()))
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self._cache.stats()
+        with self._lock:
+            return {
+                "http_requests": self._requests,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._inflight),
+                "max_age_seconds": self.max_age_seconds,
+                "cached": cache["size"],
+                "hits": cache["hits"],
+                "misses": cache["misses"],
+                "providers": {"stock": self._stock_router.stats(), "option": self._option_router.stats()},
+            }
+
+    # ── Coalescing ───────────────────────────────────────────────────────────
+
+    def _resolve(
+        self,
+        symbols: List[str],
+        kind: str,
+        fetch: Callable[[List[str]], Dict[str, Quote]],
+    ) -> Dict[str, Quote]:
+        """
+        Frische Preise aus dem Cache; fehlende holt dieser Thread in einem
+        Batch-Abruf – außer ein anderer Thread lädt das Symbol gerade, dann
+        wird auf dessen Ergebnis gewartet.
+        """
+        results: Dict[str, Quote] = {}
+        waiting: Dict[str, Future] = {}
+        mine: List[str] = []
+
+        with self._lock:
+            for sym in dict.fromkeys(symbols):
+                cached = self._cache.get((kind, sym))
+                if cached is not None:
+                    results[sym] = cached
+                    continue
+                flight_key = f"{kind}:{sym}"
+                future = self._inflight.get(flight_key)
+                if future is None:
+                    future = self._inflight[flight_key] = Future()
+                    mine.append(sym)
+                else:
+                    self._coalesced += 1
+                waiting[sym] = future
+
+        if mine:
+            try:
+                fetched = fetch(mine)
+            except Exception as exc:
+                logger.warning("[QuoteService] Abruf für %d Symbole fehlgeschlagen: %s", len(mine), exc)
+                fetched = {}
+            for sym in mine:
+                quote = fetched.get(sym)
+                if quote is not None:
+                    self._cache.set((kind, sym), quote)
+                with self._lock:
+                    future = self._inflight.pop(f"{kind}:{sym}")
+                future.set_result(quote)
+
+        for sym, future in waiting.items():
+            try:
+                quote = future.result(timeout=_WAIT_TIMEOUT)
+            except Exception:
+                quote = None
+            if quote is not None:
+                results[sym] = quote
+        return results
+
+    # ── Quellen ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _stream_quotes(symbols: List[str]) -> Dict[str, Quote]:
+        """Frische Ticks aus dem Preisbuch des laufenden Streams (sonst leer)."""
+        if not price_stream.is_active():
+            return {}
+        quotes: Dict[str, Quote] = {}
+        for sym in symbols:
+            entry = price_stream.book.get(sym, max_age=price_stream.STREAM_MAX_AGE)
+            if entry is not None and entry.price > 0:
+                quotes[sym] = Quote(
+                    symbol=sym, price=entry.price, bid=entry.bid, ask=entry.ask, source="stream",
+                    timestamp=datetime.fromtimestamp(entry.updated_at, timezone.utc),
+                )
+        return quotes
+
+    # Zugangsdaten erst beim Abruf lesen – Importeure rufen load_dotenv() ggf. später auf.
+
+    @property
+    def data_url(self) -> str:
+        return os.getenv("ALPACA_DATA_URL", "https://data.alpaca.markets")
+
+    @property
+    def _finnhub_key(self) -> Optional[str]:
+        return os.getenv("FINNHUB_API_KEY")
+
+    @property
+    def _alpaca_key(self) -> Optional[str]:
+        return os.getenv("APCA_API_KEY_ID") or os.getenv("ALPACA_API_KEY")
+
+    @property
+    def _alpaca_secret(self) -> Optional[str]:
+        return os.getenv("APCA_API_SECRET_KEY") or os.getenv("ALPACA_API_SECRET")
+
+    def _alpaca_headers(self) -> Dict[str, str]:
+        return {"APCA-API-KEY-ID": self._alpaca_key, "APCA-API-SECRET-KEY": self._alpaca_secret}
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        with self._lock:
+            self._requests += 1
+        return http_client.get(url, timeout=kwargs.pop("timeout", 5), **kwargs)
+
+    def _fetch_stock_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        fetchers: Dict[str, Callable[[List[str]], Dict[str, Quote]]] = {}
+        if self._alpaca_key and self._alpaca_secret:
+            fetchers["alpaca"] = lambda syms: self._alpaca_snapshots(syms, "/v2/stocks/snapshots", None)
+        if self._finnhub_key:
+            fetchers["finnhub"] = self._finnhub_quotes
+        quotes = self._routed(self._stock_router, symbols, fetchers)
+        missing = [s for s in symbols if s not in quotes]
+        if missing:
+            quotes.update(self._yfinance_quotes(missing))
+        return quotes
+
+    def _fetch_option_quotes(self, option_symbols: List[str]) -> Dict[str, Quote]:
+        fetchers: Dict[str, Callable[[List[str]], Dict[str, Quote]]] = {}
+        if self._alpaca_key and self._alpaca_secret:
+            fetchers["alpaca"] = lambda syms: self._alpaca_snapshots(
+                syms, "/v1beta1/options/snapshots", "snapshots")
+        if self._finnhub_key:
+            fetchers["finnhub"] = self._finnhub_quotes
+        return self._routed(self._option_router, option_symbols, fetchers)
+
+    def _routed(
+        self,
+        router: ProviderRouter,
+        symbols: List[str],
+        fetchers: Dict[str, Callable[[List[str]], Dict[str, Quote]]],
+    ) -> Dict[str, Quote]:
+        """Bester Provider zuerst; Symbole, die er nicht kennt, gehen an den nächsten."""
+        quotes: Dict[str, Quote] = {}
+        candidates = list(fetchers)
+        while candidates:
+            missing = [s for s in symbols if s not in quotes]
+            if not missing:
+                break
+            # Kosten in Requests: Snapshot bündelt batch_size Symbole, Finnhub fragt einzeln
+            cost = {"alpaca": -(-len(missing) // self.batch_size), "finnhub": len(missing)}
+            try:
+                routed = router.call(lambda p: fetchers[p](missing), candidates, cost=cost.get)
+            except AllProvidersFailed as exc:
+                logger.warning("[QuoteService] %s", exc)
+                break
+            quotes.update(routed.value)
+            candidates = [p for p in candidates if p not in routed.attempted]
+        return quotes
+
+    def _alpaca_snapshots(self, symbols: List[str], path: str, wrapper: Optional[str]) -> Dict[str, Quote]:
+        """
+        Ein Request pro batch_size Symbole; wrapper = Key, unter dem die Snapshots liegen (Optionen).
+        Scheitern alle Requests, wird geworfen (zählt im Router als Fehler des Providers).
+        """
+        quotes: Dict[str, Quote] = {}
+        errors: List[str] = []
+        for i in range(0, len(symbols), self.batch_size):
+            chunk = symbols[i:i + self.batch_size]
+            try:
+                resp = self._get(
+                    f"{self.data_url}{path}",
+                    params={"symbols": ",".join(chunk)},
+                    headers=self._alpaca_headers(),
+                )
+                if not resp.ok:
+                    logger.warning("[QuoteService] Alpaca-Snapshot HTTP %s", resp.status_code)
+                    errors.append(f"HTTP {resp.status_code}")
+                    continue
+                data = resp.json() or {}
+            except Exception as exc:
+                logger.warning("[QuoteService] Alpaca-Snapshot Fehler: %s", exc)
+                errors.append(str(exc))
+                continue
+
+            snapshots = data.get(wrapper, {}) if wrapper else data
+            for sym, snap in (snapshots or {}).items():
+                quote = self._from_alpaca_snapshot(sym.upper(), snap or {})
+                if quote is not None:
+                    quotes[quote.symbol] = quote
+        if symbols and len(errors) == -(-len(symbols) // self.batch_size):
+            raise RuntimeError(f"Alpaca-Snapshot fehlgeschlagen: {errors[-1]}")
+        return quotes
+
+    @staticmethod
+    def _from_alpaca_snapshot(symbol: str, snap: Dict[str, Any]) -> Optional[Quote]:
+        trade = snap.get("latestTrade") or {}
+        q = snap.get("latestQuote") or {}
+        bid, ask = _positive(q.get("bp")) or 0.0, _positive(q.get("ap")) or 0.0
+        price = _positive(trade.get("p")) or ask or bid
+        if not price:
+            return None
+        return Quote(
+            symbol=symbol, price=price, bid=bid, ask=ask,
+            bid_size=int(q.get("bs") or 0), ask_size=int(q.get("as") or 0),
+            source="alpaca", timestamp=datetime.now(timezone.utc),
+        )
+
+    def _finnhub_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        """Finnhub kennt keinen Multi-Symbol-Quote → ein Request je Symbol (nur Rest-Symbole)."""
+        quotes: Dict[str, Quote] = {}
+        failed = 0
+        for sym in symbols:
+            try:
+                resp = self._get(
+                    "https://finnhub.io/api/v1/quote",
+                    params={"symbol": sym, "token": self._finnhub_key},
+                )
+                price = _positive(resp.json().get("c")) if resp.ok else None
+                failed += 0 if resp.ok else 1
+            except Exception:
+                price = None
+                failed += 1
+            if price:
+                quotes[sym] = Quote(symbol=sym, price=price, source="finnhub",
+                                    timestamp=datetime.now(timezone.utc))
+        if symbols and failed == len(symbols):
+            raise RuntimeError(f"Finnhub: alle {failed} Requests fehlgeschlagen")
+        return quotes
+
+    def _yfinance_quotes(self, symbols: List[str]) -> Dict[str, Quote]:
+        """Letzter Schlusskurs aus einem Multi-Ticker-Download (Fallback für autonome VPS operation)."""
+        import bar_store
+
+        try:
+            with self._lock:
+                self._requests += 1
+            batch = bar_store._download_yfinance_batch(symbols, "1d", period="5d")
+        except Exception as exc:
+            logger.debug("[QuoteService] yfinance Fehler: %s", exc)
+            return {}
+
+        quotes: Dict[str, Quote] = {}
+        for sym, (bars, _tz) in batch.items():
+            price = _positive(bars["close"][-1]) if len(bars) else None
+            if price:
+                quotes[sym.upper()] = Quote(symbol=sym.upper(), price=price, source="yfinance",
+                                            timestamp=datetime.now(timezone.utc))
+        return quotes
+
+
+# prozessweit geteilt
+quotes = QuoteService()
+
+
+def get_price(symbol: str) -> Optional[float]:
+    return quotes.get_price(symbol)
+
+
+def get_prices(symbols: List[str]) -> Dict[str, float]:
+    return quotes.get_prices(symbols)
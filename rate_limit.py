@@ -0,0 +1,276 @@
+"""
+rate_limit.py
+
+Prozessweite Rate-Limit-Registry: ein Token-Bucket pro Provider (Finnhub,
+SerpAPI, Alpaca Data/Trading, yfinance, IBKR, ...), geteilt von Scanner-Threads,
+Monitor-Thread und API-Server-Handlern.
+
+- acquire(provider) wartet, bis ein Token frei ist (gleichmäßige Rate statt
+  Burst → 429 → Strafpause).
+- Adaptiv (AIMD): ein 429 halbiert die effektive Rate des Providers und sperrt
+  den Bucket für Retry-After Sekunden; jede erfolgreiche Antwort hebt die Rate
+  wieder schrittweise Richtung Konfiguration an.
+- stats(): Wartezeiten (Summe/Max/Anzahl), 429-Zähler und aktuelle Rate pro Bucket.
+
+HTTP-Requests über http_client werden automatisch per Host dem Provider
+zugeordnet (provider_for_url); yfinance-Aufrufe rufen acquire("yfinance") selbst.
+
+Konfiguration via .env:
+  RATE_LIMITS        Overrides "provider=requests/sekunden[:burst],..."
+                     z.B. "finnhub=30/60:5,alpaca_data=10000/60:50"
+  RATE_LIMIT_HOSTS   zusätzliche Host-Zuordnungen "host=provider,..."
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("RateLimit")
+
+# Provider → (Requests, pro Sekunden, Burst). Orientiert an den Free-/Standard-Tarifen.
+DEFAULT_LIMITS: Dict[str, Tuple[float, float, int]] = {
+    "alpaca_data": (200, 60, 10),
+    "alpaca_trading": (200, 60, 10),
+    "finnhub": (60, 60, 10),
+    "serpapi": (1, 1, 3),
+    "yfinance": (2, 1, 5),
+    "ibkr": (10, 1, 10),
+    "tradier": (60, 60, 10),
+    "oanda": (100, 1, 20),
+}
+
+DEFAULT_HOSTS: Dict[str, str] = {
+    "data.alpaca.markets": "alpaca_data",
+    "api.alpaca.markets": "alpaca_trading",
+    "paper-api.alpaca.markets": "alpaca_trading",
+    "finnhub.io": "finnhub",
+    "serpapi.com": "serpapi",
+    "api.tradier.com": "tradier",
+    "sandbox.tradier.com": "tradier",
+    "api-fxtrade.oanda.com": "oanda",
+    "api-fxpractice.oanda.com": "oanda",
+}
+
+# Hosts aus diesen URLs gehören zum jeweiligen Provider (z.B. lokales IBKR-Gateway)
+_URL_ENV_PROVIDERS = {
+    "IBKR_BASE_URL": "ibkr",
+    "ALPACA_BASE_URL": "alpaca_trading",
+    "ALPACA_DATA_URL": "alpaca_data",
+    "TRADIER_BASE_URL": "tradier",
+    "OANDA_BASE_URL": "oanda",
+}
+
+MIN_RATE_FACTOR = 0.1     # tiefer drosselt ein 429 nie
+RECOVERY_STEP = 0.05      # Anhebung des Faktors pro erfolgreicher Antwort
+DEFAULT_PENALTY = 1.0     # Sperre in Sekunden bei 429 ohne Retry-After
+
+
+class TokenBucket:
+    """
+    Token-Bucket mit rate Tokens/Sekunde und Kapazität burst.
+    Thread-sicher; Wartende schlafen außerhalb des Locks.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1) -> None:
+        self.name = name
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._factor = 1.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        # Metriken
+        self._acquired = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._throttled = 0
+
+    @property
+    def effective_rate(self) -> float:
+        return self.rate * self._factor
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.effective_rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> float:
+        """
+        Blockiert bis tokens verfügbar sind; gibt die Wartezeit zurück.
+        Mit timeout: TimeoutError, wenn das Warten länger dauern würde.
+        """
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= tokens:
+                    self._tokens -= tokens
+                    waited = now - start
+                    self._acquired += 1
+                    if waited > 0.001:
+                        self._waited += 1
+                        self._wait_total += waited
+                        self._wait_max = max(self._wait_max, waited)
+                    return waited
+                else:
+                    wait = (tokens - self._tokens) / self.effective_rate
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                raise TimeoutError(f"Rate-Limit {self.name}: Wartezeit > {timeout}s")
+            time.sleep(wait)
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        """429 erhalten: Rate halbieren, Bucket leeren und bis Retry-After sperren."""
+        with self._lock:
+            self._throttled += 1
+            self._factor = max(MIN_RATE_FACTOR, self._factor * 0.5)
+            self._tokens = 0.0
+            penalty = retry_after if retry_after is not None else DEFAULT_PENALTY
+            self._blocked_until = max(self._blocked_until, time.monotonic() + penalty)
+            factor = self._factor
+        logger.warning(
+            "[RateLimit] %s: 429 – Rate auf %.0f%% gesenkt, Pause %.1fs",
+            self.name, factor * 100, penalty,
+        )
+
+    def on_success(self) -> None:
+        if self._factor < 1.0:
+            with self._lock:
+                self._factor = min(1.0, self._factor + RECOVERY_STEP)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate_per_s": round(self.rate, 4),
+                "effective_rate_per_s": round(self.effective_rate, 4),
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "acquired": self._acquired,
+                "waited": self._waited,
+                "wait_total_s": round(self._wait_total, 3),
+                "wait_max_s": round(self._wait_max, 3),
+                "wait_avg_s": round(self._wait_total / self._waited, 3) if self._waited else 0.0,
+                "throttled": self._throttled,
+            }
+
+
+def _parse_limits(raw: str) -> Dict[str, Tuple[float, float, int]]:
+    """"finnhub=30/60:5" → {"finnhub": (30, 60, 5)}; ungültige Einträge werden ignoriert."""
+    limits: Dict[str, Tuple[float, float, int]] = {}
+    for part in raw.split(","):
+        name, _, spec = part.strip().partition("=")
+        if not name or not spec:
+            continue
+        try:
+            spec, _, burst = spec.partition(":")
+            count, _, per = spec.partition("/")
+            limits[name.strip()] = (float(count), float(per or 1), int(burst or 1))
+        except ValueError:
+            logger.warning("[RateLimit] Ungültiger RATE_LIMITS-Eintrag: %s", part)
+    return limits
+
+
+def _parse_hosts(raw: str) -> Dict[str, str]:
+    hosts: Dict[str, str] = {}
+    for part in raw.split(","):
+        host, _, provider = part.strip().partition("=")
+        if host and provider:
+            hosts[host.strip().lower()] = provider.strip()
+    return hosts
+
+
+class RateLimitRegistry:
+    """Buckets pro Provider, lazy aus DEFAULT_LIMITS + RATE_LIMITS angelegt."""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float, int]]] = None) -> None:
+        self._limits = limits
+        self._hosts: Optional[Dict[str, str]] = None
+        self._buckets: Dict[str, Optional[TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    # Konfiguration erst beim ersten Zugriff lesen – Importeure rufen load_dotenv() ggf. später auf
+    def _config(self) -> Dict[str, Tuple[float, float, int]]:
+        if self._limits is None:
+            self._limits = {**DEFAULT_LIMITS, **_parse_limits(os.getenv("RATE_LIMITS", ""))}
+        return self._limits
+
+    def _host_map(self) -> Dict[str, str]:
+        if self._hosts is None:
+            hosts = dict(DEFAULT_HOSTS)
+            for env, provider in _URL_ENV_PROVIDERS.items():
+                host = urlsplit(os.getenv(env, "")).hostname
+                if host:
+                    hosts[host.lower()] = provider
+            hosts.update(_parse_hosts(os.getenv("RATE_LIMIT_HOSTS", "")))
+            self._hosts = hosts
+        return self._hosts
+
+    def provider_for_url(self, url: str) -> Optional[str]:
+        host = (urlsplit(url).hostname or "").lower()
+        return self._host_map().get(host)
+
+    def bucket(self, provider: Optional[str]) -> Optional[TokenBucket]:
+        """Bucket des Providers; None für unbekannte Provider (= unbegrenzt)."""
+        if provider is None:
+            return None
+        with self._lock:
+            if provider not in self._buckets:
+                cfg = self._config().get(provider)
+                self._buckets[provider] = TokenBucket(provider, cfg[0] / cfg[1], cfg[2]) if cfg else None
+            return self._buckets[provider]
+
+    def acquire(self, provider: Optional[str], timeout: Optional[float] = None) -> float:
+        bucket = self.bucket(provider)
+        return bucket.acquire(timeout=timeout) if bucket else 0.0
+
+    def report(self, provider: Optional[str], status_code: int, retry_after: Optional[float] = None) -> None:
+        """Antwort-Status zurückmelden: 429 drosselt, alles andere erholt."""
+        bucket = self.bucket(provider)
+        if bucket is None:
+            return
+        if status_code == 429:
+            bucket.on_throttled(retry_after)
+        else:
+            bucket.on_success()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            buckets = {name: b for name, b in self._buckets.items() if b is not None}
+        return {name: b.stats() for name, b in buckets.items()}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After-Header in Sekunden (nur die Sekunden-Form; HTTP-Datum → None)."""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+# prozessweit geteilt
+registry = RateLimitRegistry()
+
+
+def acquire(provider: Optional[str], timeout: Optional[float] = None) -> float:
+    return registry.acquire(provider, timeout)
+
+
+def provider_for_url(url: str) -> Optional[str]:
+    return registry.provider_for_url(url)
+
+
+def report(provider: Optional[str], status_code: int, retry_after: Optional[float] = None) -> None:
+    registry.report(provider, status_code, retry_after)
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return registry.stats()
@@ -0,0 +1,367 @@
+"""
+returns_matrix.py
+
+Ausgerichtete Tages-Renditen für Universum + offene Positionen und rollierende
+Korrelationen daraus – ohne Download pro Symbolpaar.
+
+Bisher lud calculate_symbol_correlation pro Aufruf zwei komplette Historien,
+ExecutionAgent._check_correlation_with_positions rief das pro offener Position
+für jede neue Order auf, und PositionMonitor.update_correlation_matrix lud jedes
+Symbol einzeln. ReturnsMatrix hält stattdessen:
+
+- closes: Matrix Tage × Symbole (Vereinigung aller Handelstage, NaN = kein Bar),
+  die letzten CORRELATION_HISTORY Tage; Renditen pro Symbol auf seiner eigenen
+  Serie (wie pct_change), danach auf die gemeinsame Achse gelegt.
+- Rollierende Summen über CORRELATION_WINDOW Tage für alle Paare gleichzeitig
+  (n, Σx, Σx², Σxy nur über Tage, an denen beide Symbole handeln). Kommt ein
+  neuer Tag dazu oder ändert sich der laufende Tag, wird nur die Differenz der
+  Fenster-Zeilen als Rang-1-Update eingerechnet – O(1) pro Paar statt neu zu
+  summieren. Alle CORRELATION_WINDOW Updates (und bei neuen Symbolen) wird voll
+  neu gerechnet, damit sich keine Rundungsfehler aufsummieren.
+- Persistenz der Kurse als .npz unter RETURNS_MATRIX_PATH (Summen werden beim
+  Laden neu aufgebaut).
+
+Pre-Trade-Check = Lookup: correlation(a, b) / max_correlation(symbol, others).
+Fehlende oder veraltete Symbole lädt ensure() gesammelt über bar_store.prefetch –
+synchron nur die angefragten; die übrigen veralteten Symbole (z.B. das ganze
+Universum aus dem letzten Scan) frischt ein Hintergrund-Thread nach, damit der
+Order-Pfad nicht auf hunderte Downloads wartet.
+
+Konfiguration via .env:
+  CORRELATION_WINDOW          42     Renditen im Fenster (≈ 60 Kalendertage)
+  CORRELATION_MIN_PERIODS     20     weniger gemeinsame Tage → keine Korrelation
+  CORRELATION_HISTORY         130    gespeicherte Tage (für abweichende Fenster)
+  CORRELATION_MAX_AGE_SECONDS 3600   danach gilt ein Symbol als veraltet (Delta-Nachladen)
+  RETURNS_MATRIX_PATH         data/returns_matrix.npz
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from candle_frame import CandleFrame
+
+logger = logging.getLogger("ReturnsMatrix")
+
+CORRELATION_WINDOW = int(os.getenv("CORRELATION_WINDOW", "42"))
+CORRELATION_MIN_PERIODS = int(os.getenv("CORRELATION_MIN_PERIODS", "20"))
+CORRELATION_HISTORY = int(os.getenv("CORRELATION_HISTORY", "130"))
+CORRELATION_MAX_AGE = float(os.getenv("CORRELATION_MAX_AGE_SECONDS", "3600"))
+RETURNS_MATRIX_PATH = os.getenv("RETURNS_MATRIX_PATH", os.path.join("data", "returns_matrix.npz"))
+
+_DAY = 86400
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+_PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 30, "y": 365}
+
+
+def window_for(period: str) -> int:
+    """yfinance-Period ("60d", "3mo") → Anzahl Handelstage (≈ 5/7 der Kalendertage)."""
+    m = _PERIOD_RE.match(period or "")
+    if not m:
+        return CORRELATION_WINDOW
+    return max(2, int(m.group(1)) * _PERIOD_DAYS[m.group(2)] * 5 // 7)
+
+
+def _download(symbols: List[str], period: str) -> Dict[str, CandleFrame]:
+    import bar_store
+
+    return bar_store.prefetch(symbols, period=period, interval="1d")
+
+
+def _returns(closes: np.ndarray) -> np.ndarray:
+    """Renditen pro Spalte gegen den letzten gültigen Vortag (NaN-Zeilen = kein Bar)."""
+    valid = ~np.isnan(closes)
+    rows = np.arange(len(closes))[:, None]
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    prev_row = np.full(closes.shape, -1)
+    prev_row[1:] = last_valid[:-1]
+    cols = np.broadcast_to(np.arange(closes.shape[1]), closes.shape)
+    prev = np.where(prev_row >= 0, closes[np.maximum(prev_row, 0), cols], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(valid, closes / prev - 1.0, np.nan)
+
+
+def _corr_from_sums(n, sx, sxx, sxy, min_periods: int) -> np.ndarray:
+    """Pearson aus paarweisen Summen (sx[i, j] = Σ x_i über gemeinsame Tage von i und j)."""
+    sy, syy = sx.T, sxx.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = n * sxy - sx * sy
+        var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+        corr = cov / np.sqrt(var)
+    corr[(n < min_periods) | ~(var > 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+class ReturnsMatrix:
+    """
+    update(frames)                       Tages-Candles einspielen (Scanner-Prefetch, ensure)
+    ensure(symbols)                      fehlende/veraltete Symbole gesammelt nachladen
+    refresh(max_age)                     alle veralteten Symbole nachladen (refresh_async: im Hintergrund)
+    correlation(a, b, window=None)       Lookup (None bei zu wenig gemeinsamen Tagen)
+    max_correlation(symbol, others)      (höchste Korrelation, Symbol) für den Pre-Trade-Check
+    matrix(symbols=None)                 (Symbole, N×N-Matrix)
+    """
+
+    def __init__(
+        self,
+        window: int = CORRELATION_WINDOW,
+        history: int = CORRELATION_HISTORY,
+        min_periods: int = CORRELATION_MIN_PERIODS,
+        path: Optional[str] = RETURNS_MATRIX_PATH,
+        loader: Callable[[List[str], str], Dict[str, CandleFrame]] = _download,
+    ) -> None:
+        self.window = window
+        self.history = max(history, window) + 1   # +1: Vortag für die erste Rendite
+        self.min_periods = min_periods
+        self.path = Path(path) if path else None
+        self._loader = loader
+        self._lock = threading.RLock()
+        self.symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.days = np.empty(0, dtype=np.int64)
+        self.closes = np.empty((0, 0))
+        self._returns = np.empty((0, 0))
+        self._sums: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = None
+        self._win_days = np.empty(0, dtype=np.int64)
+        self._win_rows = np.empty((0, 0))
+        self._since_rebuild = 0
+        self._updated_at = 0.0
+        self._symbol_at: Dict[str, float] = {}
+        self._refresher: Optional[threading.Thread] = None
+        self._loaded = False
+        # Metriken
+        self._full = 0
+        self._incremental = 0
+        self._background = 0
+
+    # ── Persistenz ────────────────────────────────────────────────────────────
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                symbols = [str(s) for s in data["symbols"]]
+                days, closes = data["days"].astype(np.int64), data["closes"].astype(np.float64)
+                updated_at = float(data["updated_at"])
+                symbol_at = data["symbol_at"].astype(np.float64) if "symbol_at" in data.files else \
+                    np.full(len(symbols), updated_at)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.info("[ReturnsMatrix] %s nicht lesbar (%s) – starte leer.", self.path, exc)
+            return
+        self._set(symbols, days, closes)
+        self._updated_at = updated_at
+        self._symbol_at = dict(zip(symbols, symbol_at.tolist()))
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.npz")
+            np.savez(tmp, symbols=np.array(self.symbols, dtype=str), days=self.days,
+                     closes=self.closes, updated_at=np.float64(self._updated_at),
+                     symbol_at=np.array([self._symbol_at.get(s, 0.0) for s in self.symbols]))
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            logger.warning("[ReturnsMatrix] Speichern fehlgeschlagen: %s", exc)
+
+    # ── Aktualisierung ────────────────────────────────────────────────────────
+
+    def _set(self, symbols: List[str], days: np.ndarray, closes: np.ndarray) -> None:
+        """Neue Kursmatrix übernehmen; Fenster-Summen inkrementell oder voll nachziehen."""
+        same_symbols = symbols == self.symbols
+        self.symbols = symbols
+        self._index = {s: i for i, s in enumerate(symbols)}
+        self.days, self.closes = days, closes
+        self._returns = _returns(closes)
+        win_days, win_rows = days[-self.window:], self._returns[-self.window:]
+
+        if same_symbols and self._sums is not None and self._since_rebuild < self.window:
+            old = {int(d): i for i, d in enumerate(self._win_days)}
+            new = {int(d): i for i, d in enumerate(win_days)}
+            removed = [self._win_rows[i] for d, i in old.items()
+                       if d not in new or not np.array_equal(self._win_rows[i], win_rows[new[d]], equal_nan=True)]
+            added = [win_rows[i] for d, i in new.items()
+                     if d not in old or not np.array_equal(self._win_rows[old[d]], win_rows[i], equal_nan=True)]
+            if len(removed) + len(added) < self.window:
+                for row in removed:
+                    self._apply_row(row, -1.0)
+                for row in added:
+                    self._apply_row(row, 1.0)
+                self._since_rebuild += len(removed) + len(added)
+                self._incremental += 1
+                self._win_days, self._win_rows = win_days, win_rows
+                return
+
+        x0 = np.nan_to_num(win_rows, nan=0.0)
+        m = (~np.isnan(win_rows)).astype(np.float64)
+        self._sums = (m.T @ m, x0.T @ m, (x0 * x0).T @ m, x0.T @ x0)
+        self._win_days, self._win_rows = win_days, win_rows
+        self._since_rebuild = 0
+        self._full += 1
+
+    def _apply_row(self, row: np.ndarray, sign: float) -> None:
+        """Rang-1-Update der paarweisen Summen um einen Tag (sign=+1 hinzu, -1 heraus)."""
+        m = (~np.isnan(row)).astype(np.float64)
+        x0 = np.nan_to_num(row, nan=0.0)
+        n, sx, sxx, sxy = self._sums
+        n += sign * np.outer(m, m)
+        sx += sign * np.outer(x0, m)
+        sxx += sign * np.outer(x0 * x0, m)
+        sxy += sign * np.outer(x0, x0)
+
+    def update(self, frames: Mapping[str, Any]) -> None:
+        """Tages-Candles {Symbol: Candles} einspielen (neue Symbole, neue Tage, revidierter letzter Bar)."""
+        coerced = {s.upper(): CandleFrame.coerce(f) for s, f in frames.items()}
+        coerced = {s: f for s, f in coerced.items() if len(f)}
+        if not coerced:
+            return
+        with self._lock:
+            self._load()
+            symbols = self.symbols + [s for s in coerced if s not in self._index]
+            index = {s: i for i, s in enumerate(symbols)}
+            days = np.union1d(self.days, np.concatenate([f.ts // _DAY for f in coerced.values()]))
+            days = days[-self.history:]
+            closes = np.full((len(days), len(symbols)), np.nan)
+            if len(self.days):
+                rows = np.searchsorted(days, self.days)
+                keep = rows < len(days)
+                keep[keep] = days[rows[keep]] == self.days[keep]
+                closes[rows[keep], :len(self.symbols)] = self.closes[keep]
+            for sym, frame in coerced.items():
+                j = index[sym]
+                fdays = frame.ts // _DAY
+                rows = np.searchsorted(days, fdays)
+                keep = rows < len(days)
+                keep[keep] = days[rows[keep]] == fdays[keep]
+                closes[rows[keep], j] = frame.close[keep]
+            self._set(symbols, days, closes)
+            self._updated_at = time.time()
+            self._symbol_at.update(dict.fromkeys(coerced, self._updated_at))
+            self._save()
+
+    def _stale(self, symbols: Iterable[str], max_age: float) -> List[str]:
+        cutoff = time.time() - max_age
+        return [s for s in symbols if self._symbol_at.get(s, 0.0) < cutoff]
+
+    def _fetch(self, symbols: List[str]) -> None:
+        period = f"{math.ceil(self.history * 7 / 5) + 10}d"
+        try:
+            frames = self._loader(symbols, period)
+        except Exception as exc:
+            logger.warning("[ReturnsMatrix] Laden von %d Symbolen fehlgeschlagen: %s", len(symbols), exc)
+            return
+        self.update(frames)
+
+    def ensure(self, symbols: Iterable[str], max_age: float = CORRELATION_MAX_AGE) -> None:
+        """
+        Fehlende oder veraltete Symbole aus symbols gesammelt nachladen (synchron).
+        Sind weitere bekannte Symbole veraltet, frischt refresh_async sie im Hintergrund auf.
+        """
+        wanted = list(dict.fromkeys(s.upper() for s in symbols if s))
+        with self._lock:
+            self._load()
+            to_load = self._stale(wanted, max_age)
+            others_stale = bool(self._stale((s for s in self.symbols if s not in wanted), max_age))
+        if to_load:
+            self._fetch(to_load)
+        if others_stale:
+            self.refresh_async(max_age)
+
+    def refresh(self, max_age: float = CORRELATION_MAX_AGE) -> int:
+        """Alle bekannten, veralteten Symbole gesammelt nachladen; Anzahl angefragter Symbole."""
+        with self._lock:
+            self._load()
+            to_load = self._stale(self.symbols, max_age)
+        if to_load:
+            self._fetch(to_load)
+        return len(to_load)
+
+    def refresh_async(self, max_age: float = CORRELATION_MAX_AGE) -> Optional[threading.Thread]:
+        """refresh() in einem Daemon-Thread; läuft schon einer, passiert nichts."""
+        with self._lock:
+            if self._refresher is not None and self._refresher.is_alive():
+                return None
+            self._refresher = threading.Thread(target=self.refresh, args=(max_age,),
+                                               name="returns-matrix-refresh", daemon=True)
+            self._background += 1
+            self._refresher.start()
+            return self._refresher
+
+    # ── Abfragen ──────────────────────────────────────────────────────────────
+
+    def matrix(self, symbols: Optional[Iterable[str]] = None) -> Tuple[List[str], np.ndarray]:
+        """Korrelationsmatrix über das Standard-Fenster (unbekannte Symbole werden weggelassen)."""
+        with self._lock:
+            self._load()
+            names = self.symbols if symbols is None else \
+                [s for s in dict.fromkeys(x.upper() for x in symbols) if s in self._index]
+            if self._sums is None or not names:
+                return names, np.empty((len(names), len(names)))
+            idx = np.array([self._index[s] for s in names])
+            sub = [a[np.ix_(idx, idx)] for a in self._sums]
+        corr = _corr_from_sums(*sub, self.min_periods)
+        np.fill_diagonal(corr, 1.0)
+        return names, corr
+
+    def correlation(self, a: str, b: str, window: Optional[int] = None) -> Optional[float]:
+        """Korrelation der Tagesrenditen; window ≠ Standard wird aus der gespeicherten Historie gerechnet."""
+        a, b = a.upper(), b.upper()
+        with self._lock:
+            self._load()
+            if a not in self._index or b not in self._index:
+                return None
+            i, j = self._index[a], self._index[b]
+            if i == j:
+                return 1.0
+            if window is None or window == self.window:
+                if self._sums is None:
+                    return None
+                sums = [s[np.ix_([i, j], [i, j])] for s in self._sums]
+            else:
+                rows = self._returns[-window:][:, [i, j]]
+                x0 = np.nan_to_num(rows, nan=0.0)
+                m = (~np.isnan(rows)).astype(np.float64)
+                sums = [m.T @ m, x0.T @ m, (x0 * x0).T @ m, x0.T @ x0]
+        value = float(_corr_from_sums(*sums, self.min_periods)[0, 1])
+        return None if math.isnan(value) else value
+
+    def max_correlation(self, symbol: str, others: Iterable[str]) -> Tuple[Optional[float], Optional[str]]:
+        """Höchste Korrelation von symbol zu others (ohne sich selbst) und das zugehörige Symbol."""
+        best: Tuple[Optional[float], Optional[str]] = (None, None)
+        for other in others:
+            if other.upper() == symbol.upper():
+                continue
+            corr = self.correlation(symbol, other)
+            if corr is not None and (best[0] is None or corr > best[0]):
+                best = (corr, other)
+        return best
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "symbols": len(self.symbols),
+                "days": len(self.days),
+                "window": self.window,
+                "full_rebuilds": self._full,
+                "incremental_updates": self._incremental,
+                "background_refreshes": self._background,
+                "age_seconds": round(time.time() - self._updated_at, 1) if self._updated_at else None,
+            }
+
+
+# prozessweit geteilt
+engine = ReturnsMatrix()
@@ -69,6 +69,7 @@ UNIVERSES = _env_list("SCHEDULER_UNIVERSE", "sp500")
 TIMEFRAME = os.getenv("SCHEDULER_TIMEFRAME", "1D")
 AUTO_EXECUTE = os.getenv("SCHEDULER_AUTO_EXECUTE", "0") == "1"
 FLATTEN_INTRADAY = os.getenv("SCHEDULER_FLATTEN_INTRADAY", "0") == "1"
+PRELOAD_CONIDS = os.getenv("IBKR_PRELOAD_CONIDS", "0") == "1"
 
 # Options Trading (separate, independent)
 OPTIONS_ENABLED = os.getenv("OPTIONS_ENABLED", "0") == "1"
@@ -88,6 +89,18 @@ def _build_account_info() -> dict:
 
 # ── Job-Funktionen ────────────────────────────────────────────────────────────
 
+def preload_conids() -> None:
+    """Löst beim Start die IBKR-conids des Universums auf (persistenter SQLite-Cache)."""
+    _, _, universe_manager, _pm = _lazy_imports()
+    try:
+        from DEF_SCANNER_MODE import _data_agent
+        symbols = universe_manager.get(*UNIVERSES)
+        conids = _data_agent.preload_conids(symbols)
+        logger.info("conid-Preload: %d/%d Symbole aufgelöst.", len(conids), len(symbols))
+    except Exception as exc:
+        logger.warning("conid-Preload fehlgeschlagen: %s", exc)
+
+
 def job_scan(market: str) -> None:
     """Läuft zur Marktöffnung: Scanner über konfigurierte Universen."""
     run_scanner_mode, format_scanner_results, universe_manager, _pm = _lazy_imports()
@@ -120,6 +133,15 @@ def job_scan(market: str) -> None:
         )
         format_scanner_results(result)
 
+        import gpt_cache
+        import gpt_engine
+        g, c = gpt_engine.engine.stats(), gpt_cache.cache.stats()
+        logger.info(
+            "[Job] GPT: %d Requests | Peak in-flight %d/%d | Ø Wartezeit %.2fs | Cache-Treffer %d",
+            g["completed"] + g["failed"], g["peak_in_flight"], g["max_in_flight"], g["wait_avg_s"],
+            c["memory_hits"] + c["disk_hits"],
+        )
+
         if _pm.monitor:
             s = _pm.monitor.stats()
             logger.info(
@@ -369,6 +391,8 @@ class TradingScheduler:
 
     def start(self) -> None:
         _, _, _, _pm = _lazy_imports()
+        import price_stream
+        price_stream.start_stream()   # No-op ohne PRICE_STREAM_ENABLED=1
         if _pm.monitor:
             _pm.monitor.start()
             logger.info("Position-Monitor gestartet.")
@@ -378,6 +402,12 @@ class TradingScheduler:
                 _pm.options_monitor.start()
                 logger.info("Options-Monitor gestartet.")
 
+        if PRELOAD_CONIDS:
+            preload_conids()
+
+        import market_context
+        market_context.service.start()
+
         logger.info(
             "Scheduler läuft. Märkte=%s | Universen=%s | Auto-Execute=%s | Flatten=%s | Options=%s",
             MARKETS, UNIVERSES, AUTO_EXECUTE, FLATTEN_INTRADAY, OPTIONS_ENABLED,
@@ -391,6 +421,12 @@ class TradingScheduler:
             _pm.monitor.stop()
         if OPTIONS_ENABLED and _pm.options_monitor:
             _pm.options_monitor.stop()
+        import price_stream
+        price_stream.stop_stream()
+        import market_context
+        market_context.service.stop()
+        import gpt_engine
+        gpt_engine.engine.close()
         self._sched.shutdown(wait=False)
         logger.info("Scheduler gestoppt.")
 
@@ -0,0 +1,222 @@
+"""
+Unit Tests for BarStore Module
+Tests delta fetching, revision detection, period slicing and persistence
+"""
+
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import bar_store
+from bar_store import BAR_DTYPE, BarStore, bars_to_candles
+
+DAY = 86400
+
+
+def _make_bars(start_ts: int, n: int, base: float = 100.0) -> np.ndarray:
+    bars = np.empty(n, dtype=BAR_DTYPE)
+    bars["ts"] = start_ts + np.arange(n) * DAY
+    bars["close"] = base + np.arange(n, dtype=float)
+    bars["open"] = bars["close"] - 0.5
+    bars["high"] = bars["close"] + 1.0
+    bars["low"] = bars["close"] - 1.0
+    bars["volume"] = 1_000_000.0
+    return bars
+
+
+class TestBarStore(unittest.TestCase):
+    """Test incremental on-disk bar store"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BarStore(root=self.tmp.name, max_age_seconds=0)
+        today = int(time.time()) // DAY * DAY
+        self.start = today - 99 * DAY
+        self.history = _make_bars(self.start, 100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _fake_download(self, history):
+        calls = []
+
+        def _dl(symbol, interval, period=None, start=None):
+            calls.append({"period": period, "start": start})
+            if start is not None:
+                return history[history["ts"] >= int(start.timestamp())], "UTC"
+            return history, "UTC"
+
+        return _dl, calls
+
+    def test_first_call_full_download(self):
+        """Empty store triggers one full-period download"""
+        dl, calls = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            bars = self.store.get_bars("AAPL", period="1y", interval="1d")
+
+        self.assertEqual(len(bars), 100)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0]["period"], "1y")
+
+    def test_second_call_fetches_delta_only(self):
+        """Subsequent calls only request bars from the stored tail"""
+        dl, calls = self._fake_download(self.history[:98])
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            self.store.get_bars("AAPL", period="1y", interval="1d")
+
+        dl, calls = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            bars = self.store.get_bars("AAPL", period="1y", interval="1d")
+
+        self.assertEqual(len(calls), 1)
+        self.assertIsNotNone(calls[0]["start"])
+        self.assertEqual(len(bars), 100)
+        self.assertTrue(np.all(np.diff(bars["ts"]) > 0))
+
+    def test_fresh_store_skips_network(self):
+        """Within max_age no HTTP request is made"""
+        store = BarStore(root=self.tmp.name, max_age_seconds=3600)
+        dl, calls = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            store.get_bars("AAPL", period="1y", interval="1d")
+            store.get_bars("AAPL", period="90d", interval="1d")
+
+        self.assertEqual(len(calls), 1)
+
+    def test_revised_history_triggers_full_reload(self):
+        """A changed, already closed bar (dividend adjustment) forces a full reload"""
+        dl, _ = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            self.store.get_bars("AAPL", period="1y", interval="1d")
+
+        adjusted = self.history.copy()
+        adjusted["close"] *= 0.98
+        dl, calls = self._fake_download(adjusted)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            bars = self.store.get_bars("AAPL", period="1y", interval="1d")
+
+        self.assertEqual(len(calls), 2)
+        self.assertIsNotNone(calls[0]["start"])
+        self.assertEqual(calls[1]["period"], "1y")
+        np.testing.assert_allclose(bars["close"], adjusted["close"])
+
+    def test_longer_period_backfills(self):
+        """Requesting a longer window than stored triggers a full download"""
+        dl, calls = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            self.store.get_bars("AAPL", period="90d", interval="1d")
+            self.store.get_bars("AAPL", period="2y", interval="1d")
+
+        self.assertEqual([c["period"] for c in calls], ["90d", "2y"])
+
+    def test_period_slicing(self):
+        """Returned bars are limited to the requested window"""
+        dl, _ = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            bars = self.store.get_bars("AAPL", period="30d", interval="1d")
+
+        self.assertLessEqual(len(bars), 31)
+        self.assertEqual(bars["ts"][-1], self.history["ts"][-1])
+
+    def test_get_candles_format(self):
+        """Rows of the CandleFrame keep the established dict format"""
+        dl, _ = self._fake_download(self.history)
+        with patch.object(bar_store, "_download_yfinance", side_effect=dl):
+            candles = self.store.get_candles("^VIX", period="1y", interval="1d")
+
+        self.assertEqual(len(candles), 100)
+        self.assertEqual(set(candles[0]), {"timestamp", "open", "high", "low", "close", "volume"})
+        self.assertEqual(candles[-1]["close"], float(self.history["close"][-1]))
+
+    def test_empty_download(self):
+        """No data returns an empty result instead of raising"""
+        empty = np.empty(0, dtype=BAR_DTYPE)
+        with patch.object(bar_store, "_download_yfinance", return_value=(empty, None)):
+            self.assertEqual(len(self.store.get_candles("XXXX", period="1y", interval="1d")), 0)
+
+    def test_bars_to_candles_timezone(self):
+        """Timestamps are rendered in the exchange timezone"""
+        candles = bars_to_candles(self.history[:1], "America/New_York")
+        self.assertTrue(candles[0]["timestamp"].endswith(("-04:00", "-05:00")))
+
+
+class TestBarStorePrefetch(unittest.TestCase):
+    """Test chunked multi-ticker prefetch"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BarStore(root=self.tmp.name, max_age_seconds=0)
+        today = int(time.time()) // DAY * DAY
+        self.history = _make_bars(today - 99 * DAY, 100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _fake_batch(self, available):
+        calls = []
+
+        def _dl(symbols, interval, period=None, start=None):
+            calls.append({"symbols": list(symbols), "period": period, "start": start})
+            out = {}
+            for sym in symbols:
+                if sym not in available:
+                    continue
+                bars = self.history
+                if start is not None:
+                    bars = bars[bars["ts"] >= int(start.timestamp())]
+                out[sym] = (bars, "America/New_York")
+            return out
+
+        return _dl, calls
+
+    def test_prefetch_chunks_requests(self):
+        """Empty store → one full request per chunk instead of one per symbol"""
+        symbols = [f"S{i}" for i in range(5)]
+        dl, calls = self._fake_batch(set(symbols))
+        with patch.object(bar_store, "_download_yfinance_batch", side_effect=dl), \
+                patch.object(bar_store, "_download_yfinance") as single:
+            frames = self.store.prefetch(symbols, period="1y", interval="1d", chunk_size=2)
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sorted(frames), symbols)
+        self.assertEqual(len(frames["S0"]), 100)
+        self.assertEqual(frames["S0"].tz, "America/New_York")
+        single.assert_not_called()
+
+    def test_prefetch_delta_and_fresh(self):
+        """Stored symbols get one shared delta request; fresh ones none at all"""
+        dl, _ = self._fake_batch({"AAA", "BBB"})
+        with patch.object(bar_store, "_download_yfinance_batch", side_effect=dl):
+            self.store.prefetch(["AAA", "BBB"], period="1y", interval="1d")
+
+        dl, calls = self._fake_batch({"AAA", "BBB"})
+        with patch.object(bar_store, "_download_yfinance_batch", side_effect=dl):
+            frames = self.store.prefetch(["AAA", "BBB"], period="1y", interval="1d")
+        self.assertEqual(len(calls), 1)
+        self.assertIsNotNone(calls[0]["start"])
+        self.assertEqual(len(frames["AAA"]), 100)
+
+        fresh = BarStore(root=self.tmp.name, max_age_seconds=3600)
+        dl, calls = self._fake_batch({"AAA", "BBB"})
+        with patch.object(bar_store, "_download_yfinance_batch", side_effect=dl):
+            fresh.prefetch(["AAA", "BBB"], period="1y", interval="1d")
+        self.assertEqual(calls, [])
+
+    def test_prefetch_missing_symbol(self):
+        """Symbols without data are left out for per-symbol fallback"""
+        dl, _ = self._fake_batch({"AAA"})
+        with patch.object(bar_store, "_download_yfinance_batch", side_effect=dl):
+            frames = self.store.prefetch(["AAA", "NODATA"], period="1y", interval="1d")
+        self.assertEqual(list(frames), ["AAA"])
+
+    def test_prefetch_batch_error(self):
+        """A failing batch request does not raise"""
+        with patch.object(bar_store, "_download_yfinance_batch", side_effect=RuntimeError("boom")):
+            self.assertEqual(self.store.prefetch(["AAA"], period="1y", interval="1d"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
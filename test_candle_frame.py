@@ -0,0 +1,170 @@
+"""
+Unit Tests for CandleFrame Module
+Tests columnar construction, list-of-dict compatibility and JSON serialization
+"""
+
+import json
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from candle_frame import CandleFrame, CandlePanel, json_default
+from data_fetcher import Candle
+
+
+def _records(n: int = 30):
+    start = pd.Timestamp("2026-03-02", tz="America/New_York")
+    return [
+        {
+            "timestamp": str(start + pd.Timedelta(days=i)),
+            "open": 100.0 + i,
+            "high": 101.0 + i,
+            "low": 99.0 + i,
+            "close": 100.5 + i,
+            "volume": 1_000_000.0 + i,
+        }
+        for i in range(n)
+    ]
+
+
+class TestCandleFrame(unittest.TestCase):
+    """Test CandleFrame container"""
+
+    def setUp(self):
+        self.records = _records()
+        self.frame = CandleFrame.from_records(self.records, tz="America/New_York")
+
+    def test_columns_are_arrays(self):
+        """Columns are contiguous float64 / int64 arrays"""
+        self.assertEqual(self.frame.close.dtype, np.float64)
+        self.assertEqual(self.frame.ts.dtype, np.int64)
+        self.assertEqual(len(self.frame), 30)
+        np.testing.assert_array_equal(self.frame["close"], [r["close"] for r in self.records])
+
+    def test_records_round_trip(self):
+        """to_records reproduces the original dicts including timestamp strings"""
+        self.assertEqual(self.frame.to_records(), self.records)
+
+    def test_list_compatibility(self):
+        """Indexing, slicing, truthiness and iteration behave like List[Dict]"""
+        self.assertTrue(self.frame)
+        self.assertFalse(CandleFrame.empty())
+        self.assertEqual(self.frame[-1], self.records[-1])
+        self.assertEqual(self.frame[0]["open"], 100.0)
+        tail = self.frame[-5:]
+        self.assertIsInstance(tail, CandleFrame)
+        self.assertEqual(len(tail), 5)
+        self.assertEqual([c["close"] for c in tail], [r["close"] for r in self.records[-5:]])
+        with self.assertRaises(IndexError):
+            self.frame[30]
+
+    def test_coerce(self):
+        """coerce passes CandleFrame through and converts other formats"""
+        self.assertIs(CandleFrame.coerce(self.frame), self.frame)
+        df = self.frame.to_dataframe()
+        from_df = CandleFrame.coerce(df)
+        np.testing.assert_array_equal(from_df.ts, self.frame.ts)
+        self.assertEqual(from_df.tz, "America/New_York")
+
+    def test_from_candle_objects(self):
+        """data_fetcher.Candle objects convert without dicts"""
+        ts = datetime(2026, 4, 30, 14, tzinfo=timezone.utc)
+        candles = [
+            Candle(timestamp=ts + timedelta(hours=i), open=1.0, high=2.0, low=0.5, close=1.5, volume=100)
+            for i in range(3)
+        ]
+        frame = CandleFrame.from_records(candles, tz="UTC")
+        self.assertEqual(frame.ts[1] - frame.ts[0], 3600)
+        self.assertEqual(frame[0]["timestamp"], "2026-04-30 14:00:00+00:00")
+
+    def test_records_without_timestamp(self):
+        """Plain OHLCV dicts (no timestamp/volume) are accepted"""
+        frame = CandleFrame.from_records([{"open": 1, "high": 2, "low": 0, "close": 1}] * 3)
+        self.assertEqual(len(frame), 3)
+        np.testing.assert_array_equal(frame.volume, [0.0, 0.0, 0.0])
+
+    def test_to_dataframe(self):
+        """DataFrame has float columns and tz-aware timestamp"""
+        df = self.frame.to_dataframe()
+        self.assertEqual(list(df.columns), ["timestamp", "open", "high", "low", "close", "volume"])
+        self.assertEqual(str(df["timestamp"].dt.tz), "America/New_York")
+        self.assertEqual(df["timestamp"].dt.dayofweek.iloc[0], 0)
+
+    def test_json_boundary(self):
+        """json_default serializes CandleFrame as list of dicts"""
+        payload = {"market_data": {"candles": self.frame[-2:]}}
+        decoded = json.loads(json.dumps(payload, default=json_default))
+        self.assertEqual(decoded["market_data"]["candles"], self.records[-2:])
+
+
+class TestResample(unittest.TestCase):
+    """Test aggregation into coarser bars"""
+
+    @staticmethod
+    def _hourly(days=2):
+        stamps, i = [], 0
+        for d in range(days):
+            day = pd.Timestamp("2026-03-02 09:30", tz="America/New_York") + pd.Timedelta(days=d)
+            stamps += [day + pd.Timedelta(hours=h) for h in range(7)]
+        n = len(stamps)
+        return CandleFrame(
+            np.array([int(t.timestamp()) for t in stamps]),
+            open=np.arange(n, dtype=float), high=np.arange(n, dtype=float) + 1,
+            low=np.arange(n, dtype=float) - 1, close=np.arange(n, dtype=float) + 0.5,
+            volume=np.ones(n), tz="America/New_York",
+        )
+
+    def test_intraday_buckets_start_at_session_open(self):
+        """1h → 4h: 9:30–13:30 and 13:30–close per day; OHLCV aggregated"""
+        frame = self._hourly()
+        out = frame.resample(4 * 3600)
+
+        self.assertEqual(len(out), 4)
+        self.assertEqual(out.timestamps()[:2], ["2026-03-02 09:30:00-05:00", "2026-03-02 13:30:00-05:00"])
+        self.assertEqual(out.row(0), {"timestamp": "2026-03-02 09:30:00-05:00",
+                                      "open": 0.0, "high": 4.0, "low": -1.0, "close": 3.5, "volume": 4.0})
+        self.assertEqual(out.volume.tolist(), [4.0, 3.0, 4.0, 3.0])
+
+    def test_daily_and_weekly(self):
+        """Daily buckets follow the exchange date; weekly buckets start on Monday"""
+        frame = self._hourly(days=2)
+        daily = frame.resample(86400)
+        self.assertEqual(daily.close.tolist(), [6.5, 13.5])
+
+        records = _records(14)   # Mo 2026-03-02 .. So 2026-03-15
+        weekly = CandleFrame.from_records(records, tz="America/New_York").resample(7 * 86400)
+        self.assertEqual(len(weekly), 2)
+        self.assertEqual(weekly.open.tolist(), [100.0, 107.0])
+        self.assertEqual(weekly.close.tolist(), [106.5, 113.5])
+
+
+class TestCandlePanel(unittest.TestCase):
+    """CandlePanel aligns symbols on the union time axis"""
+
+    def setUp(self):
+        ts = np.arange(5) * 86400 + 1_700_000_000
+        self.a = CandleFrame(ts, *(np.arange(5.0) + i for i in range(5)), tz="America/New_York")
+        self.b = CandleFrame(ts[[1, 3, 4]], *(np.array([10.0, 30.0, 40.0]) for _ in range(5)))
+
+    def test_alignment_and_gaps(self):
+        panel = CandlePanel.from_frames({"A": self.a, "B": self.b})
+        self.assertEqual(panel.symbols, ["A", "B"])
+        self.assertEqual(panel.close.shape, (5, 2))
+        self.assertEqual(panel.tz, "America/New_York")
+        np.testing.assert_array_equal(panel.close[:, 1], [np.nan, 10.0, np.nan, 30.0, 40.0])
+        back = panel.frame("B")
+        np.testing.assert_array_equal(back.ts, self.b.ts)
+        np.testing.assert_array_equal(back.close, self.b.close)
+
+    def test_bars_window_and_empty(self):
+        panel = CandlePanel.from_frames({"A": self.a, "B": self.b, "C": []}, bars=2)
+        self.assertEqual(panel.symbols, ["A", "B"])
+        np.testing.assert_array_equal(panel.ts, self.a.ts[-2:])
+        np.testing.assert_array_equal(panel.close[:, 1], [30.0, 40.0])
+        self.assertEqual(len(CandlePanel.from_frames({})), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,11 +3,12 @@ Unit Tests for DataFetcher Module
 Tests caching, error handling, and data format compatibility with DEF_INDICATORS
 """
 
+import asyncio
 import unittest
 import os
 import logging
 from datetime import datetime, timedelta, timezone
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
 import json
 
 from data_fetcher import (
@@ -99,7 +100,7 @@ class TestDataFetcher(unittest.TestCase):
             with self.assertRaises(ValueError):
                 DataFetcher()
 
-    @patch("data_fetcher.requests.get")
+    @patch("data_fetcher.requests.Session.get")
     def test_fetch_hourly_candles_success(self, mock_get):
         """Test successful hourly candle fetch"""
         mock_response = MagicMock()
@@ -126,7 +127,7 @@ class TestDataFetcher(unittest.TestCase):
         self.assertEqual(result[0].close, 150.5)
         self.assertEqual(result[0].volume, 1000000)
 
-    @patch("data_fetcher.requests.get")
+    @patch("data_fetcher.requests.Session.get")
     def test_fetch_hourly_candles_empty(self, mock_get):
         """Test fetch with no bars returned"""
         mock_response = MagicMock()
@@ -137,7 +138,7 @@ class TestDataFetcher(unittest.TestCase):
 
         self.assertEqual(result, [])
 
-    @patch("data_fetcher.requests.get")
+    @patch("data_fetcher.requests.Session.get")
     def test_fetch_hourly_candles_network_error(self, mock_get):
         """Test network error handling"""
         import requests
@@ -150,7 +151,7 @@ class TestDataFetcher(unittest.TestCase):
 
     def test_cache_hourly_candles(self):
         """Test hourly candle caching"""
-        with patch("data_fetcher.requests.get") as mock_get:
+        with patch("data_fetcher.requests.Session.get") as mock_get:
             mock_response = MagicMock()
             mock_response.json.return_value = {
                 "bars": {
@@ -177,7 +178,7 @@ class TestDataFetcher(unittest.TestCase):
             # Should only call API once (second is from cache)
             mock_get.assert_called_once()
 
-    @patch("data_fetcher.requests.get")
+    @patch("data_fetcher.requests.Session.get")
     def test_fetch_current_price(self, mock_get):
         """Test current price fetch"""
         mock_response = MagicMock()
@@ -227,6 +228,176 @@ class TestDataFetcher(unittest.TestCase):
         self.assertIn("test_key", status["entries"])
 
 
+def _bar(hour: int, close: float) -> dict:
+    return {"t": f"2026-04-30T{hour:02d}:00:00Z", "o": close, "h": close + 1, "l": close - 1, "c": close, "v": 1000}
+
+
+def _response(payload: dict) -> MagicMock:
+    response = MagicMock()
+    response.json.return_value = payload
+    return response
+
+
+class TestDataFetcherBatch(unittest.TestCase):
+    """Test batched multi-symbol bars"""
+
+    def setUp(self):
+        with patch.dict(os.environ, {"APCA_API_KEY_ID": "test_key", "APCA_API_SECRET_KEY": "test_secret"}):
+            self.fetcher = DataFetcher()
+
+    @patch("data_fetcher.requests.Session.get")
+    def test_batch_follows_page_token(self, mock_get):
+        """One request per page; a symbol split across pages is merged"""
+        mock_get.side_effect = [
+            _response({"bars": {"AAPL": [_bar(14, 1.0), _bar(15, 2.0)], "MSFT": [_bar(14, 3.0)]},
+                       "next_page_token": "abc"}),
+            _response({"bars": {"MSFT": [_bar(15, 4.0)]}, "next_page_token": None}),
+        ]
+
+        result = self.fetcher.fetch_hourly_candles_batch(["AAPL", "MSFT", "NODATA"])
+
+        self.assertEqual(mock_get.call_count, 2)
+        first_params = mock_get.call_args_list[0].kwargs["params"]
+        self.assertEqual(first_params["symbols"], "AAPL,MSFT,NODATA")
+        self.assertNotIn("page_token", first_params)
+        self.assertEqual(mock_get.call_args_list[1].kwargs["params"]["page_token"], "abc")
+        self.assertEqual([c.close for c in result["MSFT"]], [3.0, 4.0])
+        self.assertEqual(len(result["AAPL"]), 2)
+        self.assertEqual(result["NODATA"], [])
+
+    @patch("data_fetcher.requests.Session.get")
+    def test_batch_fans_into_symbol_cache(self, mock_get):
+        """Batch results land in the per-symbol cache keys used by fetch_hourly_candles"""
+        mock_get.return_value = _response({"bars": {"AAPL": [_bar(14, 1.0)]}})
+
+        self.fetcher.fetch_hourly_candles_batch(["AAPL"])
+        self.assertIn("hourly_candles:AAPL", self.fetcher.get_cache_status()["entries"])
+
+        result = self.fetcher.fetch_hourly_candles("AAPL")
+        self.assertEqual(result[0].close, 1.0)
+        mock_get.assert_called_once()
+
+    @patch("data_fetcher.BARS_BATCH_SIZE", 2)
+    @patch("data_fetcher.requests.Session.get")
+    def test_batch_chunks_and_skips_cached(self, mock_get):
+        """Cached symbols are not requested; the rest is chunked"""
+        self.fetcher.cache.set("daily_candles:AAPL", [])
+        mock_get.return_value = _response({"bars": {}})
+
+        result = self.fetcher.fetch_daily_candles_batch(["AAPL", "A", "B", "C"])
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual([c.kwargs["params"]["symbols"] for c in mock_get.call_args_list], ["A,B", "C"])
+        self.assertEqual(sorted(result), ["A", "AAPL", "B", "C"])
+
+    @patch("data_fetcher.time.sleep")
+    @patch("data_fetcher.requests.Session.get")
+    def test_failed_batch_left_out(self, mock_get, _sleep):
+        """Symbols of a failed chunk are omitted for per-symbol fallback"""
+        import requests
+
+        mock_get.side_effect = requests.ConnectionError("Connection failed")
+
+        result = self.fetcher.fetch_hourly_candles_batch(["AAPL"], retry_count=2)
+
+        self.assertEqual(result, {})
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_fetch_all_symbols_uses_batch(self):
+        """fetch_all_symbols requests bars once per timeframe, not per symbol"""
+        batch = {"AAPL": [], "MSFT": []}
+        with patch.object(self.fetcher, "_fetch_bars_batch_async", AsyncMock(return_value=batch)) as bars, \
+                patch.object(self.fetcher, "_fetch_candles_async", AsyncMock()) as single, \
+                patch.object(self.fetcher, "fetch_iv_async", AsyncMock(return_value=0.3)), \
+                patch.object(self.fetcher, "fetch_current_price_async", AsyncMock(return_value=None)), \
+                patch.object(self.fetcher.quotes, "get_quotes", return_value={}):
+            results = self.fetcher.fetch_all_symbols(["AAPL", "MSFT"])
+
+        self.assertEqual([c.args[0] for c in bars.call_args_list], ["hourly", "daily"])
+        single.assert_not_called()
+        self.assertEqual(sorted(results), ["AAPL", "MSFT"])
+        self.assertEqual(len(results["AAPL"]["hourly_candles"]), 0)
+        self.assertEqual(results["MSFT"]["iv"], 0.3)
+
+
+class TestDataFetcherAsync(unittest.TestCase):
+    """Test asyncio fetch engine"""
+
+    def setUp(self):
+        self.quotes = MagicMock()
+        self.quotes.get_quotes.return_value = {}
+        with patch.dict(os.environ, {"APCA_API_KEY_ID": "test_key", "APCA_API_SECRET_KEY": "test_secret"}):
+            self.fetcher = DataFetcher(max_concurrency=8, quotes=self.quotes)
+
+    def tearDown(self):
+        self.fetcher.close()
+
+    def test_requests_run_concurrently(self):
+        """Per-symbol IV/quote requests overlap instead of adding up"""
+        import time
+
+        def slow_get(url, params=None, **kw):
+            time.sleep(0.1)
+            if "/v2/stocks/bars" in url:
+                return _response({"bars": {s: [_bar(14, 1.0)] for s in params["symbols"].split(",")}})
+            return _response({"quote": {"bp": 1.0, "ap": 1.1}})
+
+        symbols = ["S1", "S2", "S3", "S4"]
+        with patch("data_fetcher.requests.Session.get", side_effect=slow_get) as mock_get:
+            start = time.monotonic()
+            results = self.fetcher.fetch_all_symbols(symbols)
+            elapsed = time.monotonic() - start
+
+        # 2 batched bar requests + 4 IV + 4 quotes = 10 requests à 0.1s
+        self.assertEqual(mock_get.call_count, 10)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(list(results), symbols)
+        self.assertEqual(len(results["S3"]["daily_candles"]), 1)
+        self.assertEqual(results["S1"]["price"]["bid"], 1.0)
+
+    def test_prices_from_quote_service(self):
+        """Snapshot quotes replace the per-symbol quote requests"""
+        from quote_service import Quote
+
+        self.quotes.get_quotes.return_value = {"AAPL": Quote(symbol="AAPL", price=190.0, bid=189.9, ask=190.1)}
+        with patch.object(self.fetcher, "_fetch_bars_batch_async", AsyncMock(return_value={"AAPL": []})), \
+                patch.object(self.fetcher, "fetch_iv_async", AsyncMock(return_value=0.3)), \
+                patch.object(self.fetcher, "fetch_current_price_async", AsyncMock()) as single:
+            results = self.fetcher.fetch_all_symbols(["AAPL"])
+
+        single.assert_not_called()
+        self.assertEqual(results["AAPL"]["price"]["price"], 190.0)
+        self.assertEqual(results["AAPL"]["price"]["ask"], 190.1)
+
+    def test_retry_does_not_block(self):
+        """Retries wait via asyncio.sleep and reuse the shared session"""
+        import requests
+
+        responses = [requests.ConnectionError("reset"), _response({"quote": {"bp": 2.0, "ap": 2.5}})]
+        with patch("data_fetcher.requests.Session.get", side_effect=responses), \
+                patch("data_fetcher.asyncio.sleep", AsyncMock()) as sleep, \
+                patch("data_fetcher.time.sleep") as blocking_sleep:
+            result = asyncio.run(self.fetcher.fetch_current_price_async("AAPL"))
+
+        self.assertEqual(result.ask, 2.5)
+        sleep.assert_awaited_once_with(1)
+        blocking_sleep.assert_not_called()
+
+    def test_fetch_symbol_wrapper(self):
+        """Synchronous fetch_symbol keeps its dict format"""
+        def fake_get(url, params=None, **kw):
+            if "/v2/stocks/bars" in url:
+                return _response({"bars": {"AAPL": [_bar(14, 1.0)]}})
+            return _response({})
+
+        with patch("data_fetcher.requests.Session.get", side_effect=fake_get):
+            result = self.fetcher.fetch_symbol("AAPL")
+
+        self.assertEqual(result["hourly_candles"][0]["close"], 1.0)
+        self.assertEqual(result["iv"], 0.25)
+        self.assertEqual(result["price"]["price"], 0.0)
+
+
 class TestMarketDataAndIVData(unittest.TestCase):
     """Test data classes"""
 
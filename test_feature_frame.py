@@ -0,0 +1,95 @@
+"""
+Unit Tests for feature_frame Module
+Tests content-hash memoization and that snapshot / ML features share one indicator pass
+"""
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import feature_frame
+import indicator_kernels as k
+from candle_frame import CandleFrame
+
+
+def _frame(n=120, seed=3):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    volume = rng.integers(1_000_000, 5_000_000, n).astype(float)
+    ts = np.arange(n) * 86400 + 1_700_000_000
+    return CandleFrame(ts, close, close + spread, close - spread, close, volume, tz="UTC")
+
+
+class TestFeatureFrame(unittest.TestCase):
+    """Memoization by content and shared use across call sites"""
+
+    def setUp(self):
+        feature_frame.clear()
+        self.frame = _frame()
+
+    def test_memoized_by_content(self):
+        ff = feature_frame.get(self.frame)
+        self.assertIs(feature_frame.get(self.frame.to_records()), ff)
+        self.assertIs(feature_frame.get(CandleFrame.coerce(self.frame[:])), ff)
+
+        changed = _frame()
+        changed.close[-1] *= 1.01
+        self.assertIsNot(feature_frame.get(changed), ff)
+        self.assertIsNot(feature_frame.get(self.frame, cache=False), ff)
+        self.assertEqual(feature_frame.stats()["size"], 2)
+
+    def test_snapshot_matches_kernels(self):
+        snap = feature_frame.get(self.frame).snapshot()
+        self.assertEqual(snap["rsi_14"], k.last(k.rsi(self.frame.close)))
+        self.assertEqual(snap["adx"], k.last(k.adx(self.frame.high, self.frame.low, self.frame.close)["adx"]))
+        self.assertIsNone(snap["ema_200"])
+        self.assertEqual(snap["last_vol"], float(self.frame.volume[-1]))
+
+    def test_single_indicator_pass_for_all_consumers(self):
+        from DEF_INDICATORS import compute_indicators
+        from DEF_ML_SIGNAL import _build_feature_df
+
+        with mock.patch("feature_frame.kern.rsi", wraps=k.rsi) as rsi:
+            compute_indicators(self.frame)
+            df = _build_feature_df(self.frame.to_records())
+            df["extra"] = 1.0   # predict() ergänzt fehlende Spalten – darf den Cache nicht ändern
+            again = _build_feature_df(self.frame)
+        self.assertEqual(rsi.call_count, 1)
+        self.assertNotIn("extra", again.columns)
+        np.testing.assert_allclose(again["rsi"], k.rsi(self.frame.close), equal_nan=True)
+
+    def test_indicators_and_predict_share_one_load(self):
+        import DEF_ML_SIGNAL
+        from DEF_INDICATORS import compute_indicators
+
+        engine = DEF_ML_SIGNAL.MLSignalEngine()
+        engine.model = mock.Mock(predict_proba=mock.Mock(return_value=np.array([[0.3, 0.7]])),
+                                 feature_importances_=[0.6, 0.4])
+        engine.feature_cols = ["rsi", "adx"]
+        loads = feature_frame.stats()["loads"]
+        with mock.patch.object(DEF_ML_SIGNAL, "_fetch_live_market_ctx", return_value=None), \
+                mock.patch("indicator_state.values", side_effect=AssertionError("zweiter Durchlauf")), \
+                mock.patch("feature_frame.kern.rsi", wraps=k.rsi) as rsi:
+            # wie im Scanner: Frame einmal pro Symbol/Timeframe, Indikatoren und predict lesen daraus
+            features = feature_frame.get(self.frame)
+            ind = compute_indicators(self.frame, symbol="AAPL", timeframe="1d", features=features)
+            out = engine.predict(self.frame, symbol="AAPL", features=features)
+        self.assertEqual(feature_frame.stats()["loads"] - loads, 1)
+        self.assertEqual(rsi.call_count, 1)
+        self.assertEqual(ind["rsi_14"], features.snapshot()["rsi_14"])
+        self.assertEqual(out["short_term_signal"], "bullish")
+
+    def test_analytics_fallback_uses_shared_frame(self):
+        from analytics_engine import AnalyticsEngine
+
+        ff = feature_frame.get(self.frame)
+        with mock.patch("feature_frame.FeatureFrame.__init__", side_effect=AssertionError("recomputed")):
+            ind = AnalyticsEngine()._compute_indicators_manual(self.frame.to_records())
+        self.assertEqual(ind.rsi_14, k.last(ff.series["rsi_14"]))
+        self.assertEqual(ind.volume_ratio, k.last(k.volume_ratio(self.frame.volume)))
+
+
+if __name__ == "__main__":
+    unittest.main()
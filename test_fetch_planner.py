@@ -0,0 +1,66 @@
+"""
+Unit Tests for fetch_planner Module
+Tests lookback registry, bar → calendar-day planning and resample sources
+"""
+
+import unittest
+from unittest.mock import patch
+
+import fetch_planner
+from fetch_planner import calendar_days, finer_intervals, parse_timeframe, plan
+
+
+class TestFetchPlanner(unittest.TestCase):
+    """Test fetch planning"""
+
+    def setUp(self):
+        patcher = patch.dict(fetch_planner._lookbacks, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_required_bars_from_registry(self):
+        """Longest registered lookback plus warm-up; conservative default without registrations"""
+        self.assertEqual(fetch_planner.required_bars(), 250)
+
+        fetch_planner.register_lookback("rsi", 14)
+        self.assertEqual(fetch_planner.required_bars(), 64)
+        with patch("fetch_planner.FETCH_WARMUP_BARS", 0):
+            self.assertEqual(fetch_planner.required_bars(), fetch_planner.FETCH_MIN_BARS)
+
+        fetch_planner.register_lookback("ema", 100)
+        self.assertEqual(fetch_planner.required_bars(), 150)
+
+    def test_window_shrinks_with_lookback(self):
+        """Fewer bars needed → shorter period requested"""
+        fetch_planner.register_lookback("ema", 200)
+        daily, hourly = plan("1D"), plan("1H")
+        self.assertEqual((daily.interval, daily.bars, daily.period), ("1d", 250, "355d"))
+        self.assertEqual((hourly.interval, hourly.period), ("1h", "56d"))
+
+        self.assertEqual(plan("1D", bars=60).period, "89d")
+        self.assertLess(plan("1h", bars=60).days, hourly.days)
+
+    def test_provider_caps_and_resample_source(self):
+        """Intraday windows respect yfinance limits; 4h is loaded as 1h"""
+        self.assertEqual(plan("5m", bars=5000).days, 60)
+
+        four_hour = plan("4h", bars=100)
+        self.assertTrue(four_hour.resampled)
+        self.assertEqual((four_hour.interval, four_hour.ibkr_bar_size), ("1h", "1 hour"))
+        self.assertEqual(four_hour.days, calendar_days(100, parse_timeframe("4h")))
+
+    def test_timeframe_aliases(self):
+        """Aliases map to canonical keys; unknown timeframes fall back to daily"""
+        self.assertEqual(parse_timeframe("60min").key, "1h")
+        self.assertEqual(parse_timeframe("W").key, "1wk")
+        self.assertEqual(parse_timeframe("3 fortnights").key, "1d")
+
+    def test_finer_intervals(self):
+        """Coarser timeframes list in-memory sources, coarsest first; daily never from intraday"""
+        self.assertEqual(finer_intervals("4h"), ["1h", "30m", "15m", "5m"])
+        self.assertEqual(finer_intervals("1wk"), ["1d"])
+        self.assertEqual(finer_intervals("1d"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
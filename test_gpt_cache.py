@@ -0,0 +1,148 @@
+"""
+Unit Tests for gpt_cache Module
+Tests content keys, per-agent TTLs, SQLite persistence and single-flight for identical GPT calls
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from gpt_cache import GptResponseCache, cache_key
+
+
+class TestCacheKey(unittest.TestCase):
+    """Key covers agent, model, temperature, prompt and canonical payload"""
+
+    def test_key_is_order_independent_and_complete(self):
+        base = cache_key("momentum_agent", "gpt-4.1-mini", 0.1, "prompt", {"a": 1, "b": [1.5, 2]})
+        self.assertEqual(base, cache_key("momentum_agent", "gpt-4.1-mini", 0.1, "prompt", {"b": [1.5, 2], "a": 1}))
+        for variant in (
+            ("regime_agent", "gpt-4.1-mini", 0.1, "prompt", {"a": 1, "b": [1.5, 2]}),
+            ("momentum_agent", "gpt-4.1", 0.1, "prompt", {"a": 1, "b": [1.5, 2]}),
+            ("momentum_agent", "gpt-4.1-mini", 0.2, "prompt", {"a": 1, "b": [1.5, 2]}),
+            ("momentum_agent", "gpt-4.1-mini", 0.1, "prompt v2", {"a": 1, "b": [1.5, 2]}),
+            ("momentum_agent", "gpt-4.1-mini", 0.1, "prompt", {"a": 1, "b": [1.5, 2.01]}),
+        ):
+            self.assertNotEqual(base, cache_key(*variant))
+
+
+class TestGptResponseCache(unittest.TestCase):
+    """Memory + SQLite layers, TTLs, error handling and in-flight sharing"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "gpt.db")
+        self.cache = GptResponseCache(path=self.path, default_ttl=3600, agent_ttls={"news_agent": 60,
+                                                                                  "handels_agent": 0})
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _request(self, result=None):
+        def request():
+            self.calls += 1
+            return dict(result or {"bias": "bullish", "n": self.calls})
+        return request
+
+    def _call(self, cache=None, agent="momentum_agent", payload=None, result=None):
+        return (cache or self.cache).call(agent, "gpt-4.1-mini", 0.1, "prompt", payload or {"symbol": "AAPL"},
+                                          self._request(result))
+
+    def test_identical_calls_hit_cache(self):
+        first = self._call()
+        first["mutated"] = True
+        again = self._call()
+        self.assertEqual(self.calls, 1)
+        self.assertNotIn("mutated", again)
+        self._call(payload={"symbol": "MSFT"})
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.stats()["memory_hits"], 1)
+
+    def test_persists_across_instances(self):
+        self._call()
+        fresh = GptResponseCache(path=self.path, default_ttl=3600)
+        self.assertEqual(self._call(cache=fresh), {"bias": "bullish", "n": 1})
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(fresh.stats()["disk_hits"], 1)
+
+    def test_per_agent_ttl(self):
+        self._call(agent="handels_agent")
+        self._call(agent="handels_agent")
+        self.assertEqual(self.calls, 2)              # TTL 0 → nie gecacht
+
+        self._call(agent="news_agent")
+        later = time.time() + 120
+        with mock.patch("time.time", return_value=later):
+            self._call(cache=GptResponseCache(path=self.path, agent_ttls={"news_agent": 60}), agent="news_agent")
+        self.assertEqual(self.calls, 4)              # DB-Eintrag älter als 60 s
+
+    def test_errors_are_not_cached(self):
+        self._call(result={"error": "api_error"})
+        self._call(result={"raw_text": "x", "parse_error": True})
+        self._call()
+        self.assertEqual(self.calls, 3)
+
+    def test_concurrent_identical_calls_share_one_request(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_request():
+            self.calls += 1
+            started.set()
+            release.wait(5)
+            return {"bias": "neutral"}
+
+        results = []
+
+        def worker():
+            results.append(self.cache.call("trend_dow_agent", "m", 0.1, "p", {"x": 1}, slow_request))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for t in threads[1:]:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{"bias": "neutral"}] * 5)
+
+    def test_unwritable_db_falls_back_to_memory(self):
+        cache = GptResponseCache(path=os.path.join(self.tmp.name, "missing", "gpt.db"), default_ttl=3600)
+        self._call(cache=cache)
+        self._call(cache=cache)
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.stats()["db"])
+
+
+class TestCallGptAgentCache(unittest.TestCase):
+    """call_gpt_agent routes through the response cache"""
+
+    def test_call_gpt_agent_uses_cache(self):
+        import DEF_GPT_AGENTS
+        from gpt_engine import GptEngine
+        from test_gpt_engine import FakeAsyncClient
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        client = FakeAsyncClient('{"regime": "rangebound"}')
+        engine = GptEngine(client_factory=lambda *_: client)
+        self.addCleanup(engine.close)
+        with mock.patch.object(DEF_GPT_AGENTS.gpt_engine, "engine", engine), \
+                mock.patch.object(DEF_GPT_AGENTS.gpt_cache, "cache", GptResponseCache(path=os.path.join(tmp.name, "g.db"))):
+            payload = {"symbol": "AAPL", "candles": [{"close": 1.0}]}
+            first = DEF_GPT_AGENTS.safe_call_gpt_agent("regime_agent", payload)
+            second = DEF_GPT_AGENTS.safe_call_gpt_agent("regime_agent", dict(payload))
+        self.assertEqual(first, {"regime": "rangebound"})
+        self.assertEqual(second, first)
+        self.assertEqual(client.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
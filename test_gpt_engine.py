@@ -0,0 +1,151 @@
+"""
+Unit Tests for gpt_engine Module
+Tests the global in-flight limit, sync submission and thread-free run_calls_parallel
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock
+
+from gpt_cache import GptResponseCache
+from gpt_engine import GptEngine
+
+
+class FakeAsyncClient:
+    """Minimal AsyncOpenAI stand-in: chat.completions.create awaits delay and returns content."""
+
+    def __init__(self, content='{"ok": true}', delay=0.0):
+        self.content = content
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.threads = set()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        self.threads.add(threading.current_thread().name)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        content = self.content(kwargs) if callable(self.content) else self.content
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def close(self):
+        pass
+
+
+class TestGptEngine(unittest.TestCase):
+    """One loop thread, one global limit"""
+
+    def setUp(self):
+        self.client = FakeAsyncClient(delay=0.05)
+        self.engine = GptEngine(max_in_flight=3, client_factory=lambda *_: self.client)
+        self.addCleanup(self.engine.close)
+
+    def test_global_limit_across_threads(self):
+        def worker():
+            for _ in range(3):
+                self.engine.run(self.engine.complete("m", [], 0.1))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual(self.client.calls, 18)
+        self.assertEqual(self.client.peak, 3)
+        self.assertEqual(self.client.threads, {"gpt-engine"})
+        stats = self.engine.stats()
+        self.assertEqual(stats["peak_in_flight"], 3)
+        self.assertEqual(stats["completed"], 18)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_timeout_counts_as_failure(self):
+        self.client.delay = 1.0
+        with self.assertRaises(asyncio.TimeoutError):
+            self.engine.run(self.engine.complete("m", [], 0.1, timeout=0.05))
+        self.assertEqual(self.engine.stats()["failed"], 1)
+
+    def test_missing_openai_is_runtime_error(self):
+        def factory(*_):
+            raise RuntimeError("openai package ist nicht installiert – `pip install openai`.")
+
+        engine = GptEngine(client_factory=factory)
+        self.addCleanup(engine.close)
+        with self.assertRaises(RuntimeError):
+            engine.client()
+
+
+class TestRunCallsParallel(unittest.TestCase):
+    """Agent calls run as coroutines on the engine loop, not in a per-call thread pool"""
+
+    def setUp(self):
+        import DEF_GPT_AGENTS
+
+        self.agents = DEF_GPT_AGENTS
+        self.client = FakeAsyncClient(content=lambda kw: '{"agent": "%d"}' % len(kw["messages"][0]["content"]),
+                                      delay=0.1)
+        self.engine = GptEngine(max_in_flight=8, client_factory=lambda *_: self.client)
+        self.addCleanup(self.engine.close)
+        patches = [
+            mock.patch.object(DEF_GPT_AGENTS.gpt_engine, "engine", self.engine),
+            mock.patch.object(DEF_GPT_AGENTS.gpt_cache, "cache", GptResponseCache(path=None, enabled=False)),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_agent_partials_run_concurrently_without_threads(self):
+        names = ["regime_agent", "trend_dow_agent", "sr_formations_agent", "momentum_agent",
+                 "volume_oi_agent", "candlestick_agent", "intermarket_agent"]
+        tasks = [partial(self.agents.safe_call_gpt_agent, name, {"symbol": "AAPL"}) for name in names]
+        tasks.append(lambda: {"plain": True})
+        self.engine.run(asyncio.sleep(0))   # Loop-Thread läuft bereits
+        before = threading.active_count()
+        start = time.monotonic()
+        results = self.agents.run_calls_parallel(tasks, max_workers=1, per_call_timeout=5.0)
+        elapsed = time.monotonic() - start
+        self.assertEqual(self.client.peak, 7)                  # nicht mehr durch max_workers begrenzt
+        self.assertLess(elapsed, 0.5)
+        self.assertLessEqual(threading.active_count(), before + 1)   # höchstens der gemeinsame Fallback-Pool
+        expected = [{"agent": str(len(self.agents.PROMPTS[n]))} for n in names]
+        self.assertEqual(results, expected + [{"plain": True}])
+
+    def test_per_call_timeout_applies_to_request(self):
+        self.client.delay = 1.0
+        results = self.agents.run_calls_parallel(
+            [partial(self.agents.safe_call_gpt_agent, "regime_agent", {"symbol": "AAPL"})], per_call_timeout=0.05)
+        self.assertEqual(results[0]["error"], "timeout")
+        self.assertIn("TimeoutError", results[0]["exception"])
+
+    def test_deadline_covers_queue_wait_and_fallback(self):
+        engine = GptEngine(max_in_flight=1, client_factory=lambda *_: self.client)
+        self.addCleanup(engine.close)
+        self.client.delay = 1.0
+        blocker = engine.submit(engine.complete("m", [], 0.1))   # belegt den einzigen Slot
+        time.sleep(0.05)
+        tasks = [partial(self.agents.safe_call_gpt_agent, "regime_agent", {"symbol": "AAPL"}),
+                 lambda: time.sleep(1.0) or {"plain": True}]
+        start = time.monotonic()
+        with mock.patch.object(self.agents.gpt_engine, "engine", engine):
+            results = self.agents.run_calls_parallel(tasks, per_call_timeout=0.1)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual([r["error"] for r in results], ["timeout", "timeout"])
+        engine.run(asyncio.sleep(0.01))
+        self.assertEqual(engine.stats()["waiting"], 0)            # wartende Coroutine abgebrochen
+        self.assertEqual(self.client.calls, 1)                    # nur der Blocker hat angefragt
+        blocker.cancel()
+        engine.run(asyncio.sleep(0.01))
+
+
+if __name__ == "__main__":
+    unittest.main()
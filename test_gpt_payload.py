@@ -0,0 +1,98 @@
+"""
+Unit Tests for gpt_payload Module
+Tests columnar candle encoding, per-agent windows, summary statistics and token budgets
+"""
+
+import unittest
+
+import numpy as np
+
+import gpt_payload
+from candle_frame import CandleFrame
+from gpt_payload import MarketPayload, agent_payloads, encode, estimate_tokens, price_decimals
+
+
+def _market_data(n=250, price=150.0, step=86400, seed=1):
+    rng = np.random.default_rng(seed)
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    ts = np.arange(n) * step + 1_700_000_000 + 5 * 3600
+    frame = CandleFrame(ts, close, close * 1.01, close * 0.99, close,
+                        rng.integers(1_000_000, 5_000_000, n).astype(float), tz="America/New_York")
+    return {
+        "symbol": "AAPL",
+        "timeframe": "1D",
+        "candles": frame,
+        "orderbook": None,
+        "meta": {"source_api": "yfinance", "bars": n},
+        "indicators": {"rsi_14": 55.1234, "atr_14": 2.5},
+    }
+
+
+class TestMarketPayload(unittest.TestCase):
+    """Compact encoding and per-agent payloads"""
+
+    def setUp(self):
+        self.md = _market_data()
+        self.frame = self.md["candles"]
+
+    def test_columnar_rounded_candles(self):
+        payload = MarketPayload(self.md).for_agent("candlestick_agent", "AAPL", budget=10_000)
+        candles = payload["market_data"]["candles"]
+        self.assertEqual(set(candles), {"t", "o", "h", "l", "c", "v"})
+        self.assertEqual(len(candles["c"]), gpt_payload.AGENT_WINDOWS["candlestick_agent"])
+        self.assertEqual(candles["c"][-1], round(float(self.frame.close[-1]), price_decimals(self.frame.close[-1])))
+        self.assertIsInstance(candles["v"][-1], int)
+        self.assertRegex(candles["t"][-1], r"^\d{4}-\d{2}-\d{2}$")
+        self.assertEqual(payload["market_data"]["indicators"], self.md["indicators"])
+        self.assertNotIn("orderbook", payload["market_data"])
+
+    def test_intraday_timestamps_and_decimals(self):
+        md = _market_data(n=50, price=1.08, step=3600)
+        candles = MarketPayload(md).for_agent("regime_agent", "EURUSD")["market_data"]["candles"]
+        self.assertRegex(candles["t"][-1], r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$")
+        self.assertEqual(price_decimals(1.08), 4)
+        self.assertEqual(price_decimals(61234.5), 0)
+        self.assertEqual(price_decimals(150.2), 2)
+
+    def test_summary_covers_full_history(self):
+        summary = MarketPayload(self.md).summary
+        self.assertEqual(summary["bars"], 250)
+        self.assertAlmostEqual(summary["high"], float(self.frame.high.max()), places=2)
+        expected = (self.frame.close[-1] / self.frame.close[-21] - 1) * 100
+        self.assertAlmostEqual(summary["ret_pct"]["20"], expected, places=2)
+        self.assertIn("volatility_pct", summary)
+
+    def test_token_budget_shrinks_window(self):
+        full = MarketPayload(self.md).for_agent("trend_dow_agent", "AAPL", budget=100_000)
+        self.assertEqual(len(full["market_data"]["candles"]["c"]), 120)
+
+        budget = estimate_tokens(encode(full)) // 3
+        tight = MarketPayload(self.md).for_agent("trend_dow_agent", "AAPL", budget=budget)
+        bars = len(tight["market_data"]["candles"]["c"])
+        self.assertLess(bars, 120)
+        self.assertGreaterEqual(bars, gpt_payload.MIN_BARS)
+        self.assertLessEqual(estimate_tokens(encode(tight)), budget)
+
+        minimal = MarketPayload(self.md).for_agent("trend_dow_agent", "AAPL", budget=50)
+        self.assertNotIn("candles", minimal["market_data"])
+        self.assertIn("summary", minimal["market_data"])
+
+    def test_much_smaller_than_raw_records(self):
+        import json
+        from candle_frame import json_default
+
+        raw = estimate_tokens(json.dumps({"symbol": "AAPL", "market_data": self.md}, default=json_default))
+        payloads = agent_payloads("AAPL", self.md, gpt_payload.ANALYSIS_AGENTS)
+        self.assertEqual(set(payloads), set(gpt_payload.ANALYSIS_AGENTS))
+        for payload in payloads.values():
+            self.assertLess(estimate_tokens(encode(payload)), raw / 4)
+
+    def test_empty_candles(self):
+        md = dict(self.md, candles=[])
+        payload = MarketPayload(md).for_agent("regime_agent", "AAPL")
+        self.assertNotIn("candles", payload["market_data"])
+        self.assertEqual(payload["market_data"]["summary"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
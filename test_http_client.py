@@ -0,0 +1,154 @@
+"""
+Unit Tests for http_client Module
+Tests pooled sessions, default timeouts and the order-safe retry policy
+"""
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import http_client
+import rate_limit
+from http_client import PooledSession, _parse_host_limits
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    """Answers `error` for the first `failures` requests, then 200"""
+
+    failures = 0
+    error = 503
+    hits = 0
+    clients = set()
+
+    def _respond(self):
+        type(self).hits += 1
+        type(self).clients.add(self.client_address)
+        status = type(self).error if type(self).hits <= type(self).failures else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPooledSession(unittest.TestCase):
+    """Test retry policy against a local server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _FlakyHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        _FlakyHandler.failures = 2
+        _FlakyHandler.error = 503
+        _FlakyHandler.hits = 0
+        _FlakyHandler.clients = set()
+        with patch("http_client.HTTP_RETRY_BACKOFF", 0):
+            self.session = PooledSession("test", retries=3)
+
+    def test_get_retried_on_5xx(self):
+        """Idempotent GETs are retried until the server recovers"""
+        resp = self.session.get(self.url)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(_FlakyHandler.hits, 3)
+
+    def test_post_not_retried_on_5xx(self):
+        """Order POSTs reach the server exactly once"""
+        resp = self.session.post(self.url, json={"qty": 1})
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(_FlakyHandler.hits, 1)
+
+    def test_post_retried_after_429(self):
+        """429 throttles the provider bucket and is retried, also for POST"""
+        _FlakyHandler.error = 429
+        registry = rate_limit.RateLimitRegistry(limits={"local": (1000, 1, 10)})
+        registry._hosts = {"127.0.0.1": "local"}
+
+        with patch("rate_limit.registry", registry):
+            resp = self.session.post(self.url, json={"qty": 1})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(_FlakyHandler.hits, 3)
+        stats = registry.stats()["local"]
+        self.assertEqual(stats["throttled"], 2)
+        self.assertEqual(stats["acquired"], 3)
+
+    def test_retries_zero_disables_throttle_retries(self):
+        """A caller passing retries=0 gets the first 429/503 back without retrying"""
+        registry = rate_limit.RateLimitRegistry(limits={"local": (1000, 1, 10)})
+        registry._hosts = {"127.0.0.1": "local"}
+        session = PooledSession("no_retry", retries=0)
+
+        with patch("rate_limit.registry", registry):
+            for error in (429, 503):
+                _FlakyHandler.error = error
+                _FlakyHandler.hits = 0
+                self.assertEqual(session.get(self.url).status_code, error)
+                self.assertEqual(_FlakyHandler.hits, 1)
+
+    def test_connections_reused(self):
+        """Keep-alive: consecutive requests share one pooled connection"""
+        _FlakyHandler.failures = 0
+        _FlakyHandler.protocol_version = "HTTP/1.1"
+        try:
+            for _ in range(3):
+                self.session.get(self.url)
+            self.assertEqual(_FlakyHandler.hits, 3)
+            self.assertEqual(len(_FlakyHandler.clients), 1)
+        finally:
+            _FlakyHandler.protocol_version = "HTTP/1.0"
+
+
+class TestSessionRegistry(unittest.TestCase):
+    """Test shared sessions and defaults"""
+
+    def tearDown(self):
+        http_client.close_all()
+
+    def test_named_sessions_shared(self):
+        """Same name returns the same session; first call's options stick"""
+        a = http_client.get_session("shared", verify=False)
+        b = http_client.get_session("shared", verify=True)
+
+        self.assertIs(a, b)
+        self.assertFalse(b.verify)
+        self.assertIsNot(a, http_client.get_session("other"))
+
+    def test_default_timeout_injected(self):
+        """Requests without timeout get the session default; explicit ones win"""
+        session = PooledSession("t", timeout=(1.0, 2.0))
+        with patch("requests.Session.request") as mock_request:
+            session.get("https://example.com/a")
+            session.get("https://example.com/b", timeout=7)
+
+        self.assertEqual(mock_request.call_args_list[0].kwargs["timeout"], (1.0, 2.0))
+        self.assertEqual(mock_request.call_args_list[1].kwargs["timeout"], 7)
+        self.assertEqual(session.stats()["requests_by_host"], {"example.com": 2})
+
+    def test_host_limits(self):
+        """Hosts listed in HTTP_HOST_LIMITS get their own bounded pool"""
+        self.assertEqual(_parse_host_limits("finnhub.io=4, bad, x.com=2"), {"finnhub.io": 4, "x.com": 2})
+
+        session = PooledSession("limits", pool_maxsize=16, host_limits={"finnhub.io": 4})
+        self.assertEqual(session.get_adapter("https://finnhub.io/api/v1/quote")._pool_maxsize, 4)
+        self.assertEqual(session.get_adapter("https://data.alpaca.markets/v2")._pool_maxsize, 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,396 @@
+"""
+Unit Tests for the IBKR session layer in DEF_DATA_AGENT
+Tests reqId/orderId routing, history pacing, the conid cache and the shared history router with a fake EClient (no TWS needed)
+"""
+
+import asyncio
+import importlib
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Abhängigkeiten von DEF_DATA_AGENT vorab laden, damit patch.dict sie nicht wieder entfernt
+import bar_store  # noqa: F401
+import fetch_planner  # noqa: F401
+import provider_router  # noqa: F401
+import ttl_cache  # noqa: F401
+
+
+def _fake_ibapi() -> dict:
+    """Minimale ibapi-Module (EClient/EWrapper/Contract/Order), falls die TWS-API nicht installiert ist."""
+
+    class EClient:
+        def __init__(self, wrapper):
+            self.wrapper = wrapper
+
+    class EWrapper:
+        pass
+
+    class Contract:
+        pass
+
+    class Order:
+        pass
+
+    modules = {name: types.ModuleType(name) for name in (
+        "ibapi", "ibapi.client", "ibapi.wrapper", "ibapi.contract", "ibapi.order", "ibapi.common", "ibapi.ticktype",
+    )}
+    modules["ibapi.client"].EClient = EClient
+    modules["ibapi.wrapper"].EWrapper = EWrapper
+    modules["ibapi.contract"].Contract = Contract
+    modules["ibapi.order"].Order = Order
+    return modules
+
+
+if importlib.util.find_spec("ibapi") is None:
+    with patch.dict(sys.modules, _fake_ibapi()):
+        data_agent = importlib.import_module("DEF_DATA_AGENT")
+else:
+    data_agent = importlib.import_module("DEF_DATA_AGENT")
+
+
+class FakeIBClient(data_agent.IBKRClient):
+    """IBKRClient ohne Socket: Requests werden mitgeschrieben, Callbacks ruft der Test selbst auf."""
+
+    next_order_id = 1
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.requests = []
+        self.connected = False
+
+    def connect(self, host, port, client_id):
+        self.connected = True
+
+    def run(self):
+        self.nextValidId(self.next_order_id)
+
+    def isConnected(self):
+        return self.connected
+
+    def disconnect(self):
+        self.connected = False
+
+    def reqContractDetails(self, req_id, contract):
+        self.requests.append(("contract_details", req_id, contract.symbol))
+
+    def reqHistoricalData(self, reqId, contract, **kwargs):
+        self.requests.append(("historical_data", reqId, contract.conId))
+
+    def cancelHistoricalData(self, req_id):
+        self.requests.append(("cancel_history", req_id, None))
+
+    def placeOrder(self, order_id, contract, order):
+        self.requests.append(("order", order_id, order.action))
+
+
+def _contract_details(conid):
+    return SimpleNamespace(contract=SimpleNamespace(conId=conid))
+
+
+def _bar(date, close):
+    return SimpleNamespace(date=date, open=close, high=close, low=close, close=close, volume=100)
+
+
+class IBKRTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = data_agent.IBKRSession("127.0.0.1", 7497, 99, connect_timeout=2.0,
+                                              client_factory=FakeIBClient)
+        self.addCleanup(self.session.close)
+        self.app = self.session.ensure_connected()
+
+    def _order(self, action="BUY"):
+        order = SimpleNamespace(action=action)
+        return self.session.submit_order(lambda app, oid: app.placeOrder(oid, None, order))
+
+    def _contract(self, symbol="AAPL"):
+        contract = SimpleNamespace(symbol=symbol)
+        return self.session.submit("contract_details", lambda app, rid: app.reqContractDetails(rid, contract))
+
+
+class TestRequestRouting(IBKRTestCase):
+    """Orders and data requests share one connection but never an id"""
+
+    def test_data_req_ids_never_meet_order_ids(self):
+        order_id, order_future = self._order()
+        future = self._contract()
+        req_id = self.app.requests[-1][1]
+
+        self.assertEqual(order_id, FakeIBClient.next_order_id)
+        self.assertGreaterEqual(req_id, data_agent._DATA_REQ_ID_BASE)
+        health = self.session.health()
+        self.assertEqual((health["pending_requests"], health["open_orders"]), (1, 1))
+
+        self.app.contractDetails(req_id, _contract_details(265598))
+        self.app.contractDetailsEnd(req_id)
+        self.app.orderStatus(order_id, "Submitted", 0, 10, 0.0, 1, 0, 0.0, 99, "", 0.0)
+
+        self.assertEqual(future.result(1), [265598])
+        self.assertEqual(order_future.result(1)["status"], "Submitted")
+
+    def test_concurrent_history_requests_complete_independently(self):
+        futures = {}
+        for conid in (1, 2, 3):
+            contract = SimpleNamespace(conId=conid)
+            futures[conid] = self.session.submit(
+                "historical_data", lambda app, rid, c=contract: app.reqHistoricalData(reqId=rid, contract=c))
+        ids = {conid: rid for _, rid, conid in self.app.requests}
+
+        for conid in (3, 1, 2):
+            self.app.historicalData(ids[conid], _bar("20240105", float(conid)))
+            self.app.historicalDataEnd(ids[conid], "", "")
+
+        for conid, future in futures.items():
+            self.assertEqual([row["close"] for row in future.result(1)], [float(conid)])
+
+    def test_connection_loss_fails_orders_and_requests(self):
+        _, order_future = self._order()
+        future = self._contract()
+        self.app.connectionClosed()
+
+        with self.assertRaises(ConnectionError):
+            future.result(1)
+        with self.assertRaises(ConnectionError):
+            order_future.result(1)
+        self.assertEqual(self.session.health()["disconnects"], 1)
+
+
+class TestErrorRouting(IBKRTestCase):
+    """error() completes exactly the request it names, orders vs data requests"""
+
+    def test_order_rejection_does_not_fail_data_request(self):
+        order_id, order_future = self._order()
+        future = self._contract()
+        self.app.error(order_id, 201, "Order rejected")
+
+        result = order_future.result(1)
+        self.assertEqual((result["status"], result["errorCode"]), ("Error", 201))
+        self.assertFalse(future.done())
+        self.assertEqual(self.session.health()["pending_requests"], 1)
+
+    def test_data_error_raises_request_error(self):
+        order_id, order_future = self._order()
+        future = self._contract("NOPE")
+        req_id = self.app.requests[-1][1]
+        self.app.error(req_id, 200, "No security definition has been found")
+
+        with self.assertRaises(data_agent.IBKRRequestError) as ctx:
+            future.result(1)
+        self.assertEqual((ctx.exception.req_id, ctx.exception.code), (req_id, 200))
+        self.assertFalse(order_future.done())
+        self.assertEqual(self.session.health()["open_orders"], 1)
+
+    def test_warnings_do_not_complete_requests(self):
+        future = self._contract()
+        req_id = self.app.requests[-1][1]
+        for code in (2104, 2158, 10167):
+            self.app.error(req_id, code, "farm ok")
+        self.app.error(-1, 1100, "connectivity lost")
+
+        self.assertFalse(future.done())
+        self.app.contractDetailsEnd(req_id)
+        self.assertEqual(future.result(1), [])
+
+
+def _until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Bedingung nicht erfüllt")
+        time.sleep(0.005)
+
+
+class TestHistoricalPacer(IBKRTestCase):
+    """Pacer coalescing and cleanup when waiters time out"""
+
+    def setUp(self):
+        super().setUp()
+        self.session.history_pacer = data_agent.HistoricalPacer(max_in_flight=1, cancel=self.session._cancel_request)
+        self.api = data_agent.IBKRApi(conids=data_agent.ConidCache(path=":memory:"))
+        self.api.session = self.session
+
+    def _sent(self, conid):
+        return [rid for kind, rid, c in self.app.requests if kind == "historical_data" and c == conid]
+
+    def _complete(self, conid, close=1.0):
+        rid = self._sent(conid)[-1]
+        self.app.historicalData(rid, _bar("20240105", close))
+        self.app.historicalDataEnd(rid, "", "")
+
+    def test_timeout_releases_slot_and_inner_request(self):
+        future = self.api._submit_history(1, 5, "1 day")
+        _until(lambda: self._sent(1))
+        with self.assertRaises(RuntimeError):
+            self.session.wait(future, 0.05, "reqHistoricalData(A)")
+
+        stats = self.session.history_pacer.stats()
+        self.assertEqual((stats["in_flight"], stats["timed_out"]), (0, 1))
+        self.assertEqual(self.session.health()["pending_requests"], 0)
+        self.assertIn(("cancel_history", self._sent(1)[0], None), self.app.requests)
+
+        # mit max_in_flight=1 käme ohne freigegebenen Slot kein weiterer Request mehr durch
+        second = self.api._submit_history(2, 5, "1 day")
+        _until(lambda: self._sent(2))
+        self._complete(2, 42.0)
+        self.assertEqual(self.session.wait(second, 1.0, "reqHistoricalData(B)")[0]["close"], 42.0)
+
+    def test_queued_job_dropped_when_last_waiter_gives_up(self):
+        blocker = self.api._submit_history(1, 5, "1 day")
+        _until(lambda: self._sent(1))
+        queued = self.api._submit_history(2, 5, "1 day")
+        with self.assertRaises(RuntimeError):
+            self.session.wait(queued, 0.05, "reqHistoricalData(B)")
+
+        self._complete(1)
+        self.session.wait(blocker, 1.0, "reqHistoricalData(A)")
+        time.sleep(0.05)
+        self.assertEqual(self._sent(2), [])
+        self.assertEqual(self.session.history_pacer.stats()["queued"], 0)
+
+    def test_identical_requests_coalesce_and_survive_one_timeout(self):
+        first = self.api._submit_history(1, 5, "1 day")
+        second = self.api._submit_history(1, 5, "1 day")
+        self.assertIs(first, second)
+        _until(lambda: self._sent(1))
+
+        with self.assertRaises(RuntimeError):
+            self.session.wait(first, 0.05, "reqHistoricalData(A)")
+        self.assertFalse(second.done())
+
+        self._complete(1, 7.0)
+        self.assertEqual(self.session.wait(second, 1.0, "reqHistoricalData(A)")[0]["close"], 7.0)
+        self.assertEqual(len(self._sent(1)), 1)
+
+        cached = self.api._submit_history(1, 5, "1 day")
+        self.assertEqual(cached.result(0)[0]["close"], 7.0)
+        self.assertEqual(self.session.history_pacer.stats()["coalesced"], 2)
+
+    def test_async_timeout_does_not_cancel_shared_future(self):
+        future = self.api._submit_history(1, 5, "1 day")
+        self.api._submit_history(1, 5, "1 day")
+        _until(lambda: self._sent(1))
+
+        async def scenario():
+            slow = asyncio.ensure_future(self.session.wait_async(future, 2.0, "A"))
+            with self.assertRaises(RuntimeError):
+                await self.session.wait_async(future, 0.05, "A")
+            self.assertFalse(future.cancelled())
+            await asyncio.to_thread(self._complete, 1, 3.0)
+            return await slow
+
+        rows = asyncio.run(scenario())
+        self.assertEqual(rows[0]["close"], 3.0)
+
+
+class TestConidCache(unittest.TestCase):
+    """Memory + SQLite conid cache shared across IBKRApi instances"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "conids.db")
+
+    def test_hit_and_miss(self):
+        cache = data_agent.ConidCache(path=self.path)
+        self.assertIsNone(cache.get("AAPL"))
+        cache.put("aapl", 265598)
+        self.assertEqual(cache.get("AAPL"), 265598)
+        self.assertEqual(cache.get_many(["AAPL", "MSFT"]), {"AAPL": 265598})
+
+    def test_persists_across_instances(self):
+        data_agent.ConidCache(path=self.path).put_many({"AAPL": 265598, "MSFT": 272093})
+        fresh = data_agent.ConidCache(path=self.path)
+        self.assertEqual(fresh.get_many(["msft", "aapl"]), {"MSFT": 272093, "AAPL": 265598})
+        self.assertEqual(fresh.stats()["on_disk"], 2)
+
+    def test_expired_entries_are_misses(self):
+        data_agent.ConidCache(path=self.path).put("AAPL", 265598)
+        later = time.time() + 2 * 86400
+        with patch("time.time", return_value=later):
+            self.assertIsNone(data_agent.ConidCache(path=self.path, max_age_days=1).get("AAPL"))
+
+    def test_unwritable_db_falls_back_to_memory(self):
+        cache = data_agent.ConidCache(path=os.path.join(self.tmp.name, "missing", "conids.db"))
+        cache.put("AAPL", 265598)
+        self.assertEqual(cache.get("AAPL"), 265598)
+        self.assertIsNone(cache.stats()["on_disk"])
+
+    def test_preload_only_asks_tws_for_missing(self):
+        cache = data_agent.ConidCache(path=self.path)
+        cache.put("AAPL", 265598)
+        session = data_agent.IBKRSession("127.0.0.1", 7497, 98, connect_timeout=2.0, client_factory=FakeIBClient)
+        self.addCleanup(session.close)
+        app = session.ensure_connected()
+        api = data_agent.IBKRApi(conids=cache)
+        api.session = session
+
+        def answer():
+            _until(lambda: app.requests)
+            for _, rid, symbol in app.requests:
+                app.contractDetails(rid, _contract_details(272093))
+                app.contractDetailsEnd(rid)
+
+        responder = threading.Thread(target=answer)
+        responder.start()
+        conids = api.preload_conids(["AAPL", "MSFT"], timeout=2.0)
+        responder.join(2)
+
+        self.assertEqual(conids, {"AAPL": 265598, "MSFT": 272093})
+        self.assertEqual([symbol for _, _, symbol in app.requests], ["MSFT"])
+        self.assertEqual(data_agent.ConidCache(path=self.path).get("MSFT"), 272093)
+
+
+class TestHistoryRouter(unittest.TestCase):
+    """All DataAgents share one history router (circuit + latency health)"""
+
+    def test_agents_share_router_health(self):
+        api = data_agent.IBKRApi(conids=data_agent.ConidCache(path=":memory:"))
+        first = data_agent.DataAgent(ibkr_api=api, providers=["yfinance"])
+        second = data_agent.DataAgent(ibkr_api=api, providers=["ibkr", "yfinance"])
+
+        self.assertIs(first.router, second.router)
+        self.assertIs(provider_router._routers["history"], data_agent.history_router)
+        self.assertEqual(first.providers, ["yfinance"])
+        self.assertEqual(set(data_agent.history_router.providers), {"ibkr", "yfinance"})
+
+        router = data_agent.history_router
+        with patch.object(router, "cooldown_seconds", 60), patch.object(router, "_health", {
+                p: provider_router.ProviderHealth(p, 10) for p in router.providers}):
+            for _ in range(router.failure_threshold):
+                router.record("ibkr", 0.01, ok=False)
+            self.assertEqual(second.router.ranked(candidates=second.providers), ["yfinance"])
+
+
+
+class TestIbkrHistoryTimes(unittest.TestCase):
+    """IB bar times are exchange-local and must map to the same epoch seconds as bar_store"""
+
+    def _fetch(self, stamps, timeframe="1D"):
+        rows = [{"timestamp": ts, "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}
+                for ts in stamps]
+        api = SimpleNamespace(get_history=lambda symbol, days, bar_size: [dict(r) for r in rows])
+        agent = data_agent.DataAgent(ibkr_api=api, providers=["ibkr"])
+        return agent._fetch_ibkr_history("AAPL", fetch_planner.plan(timeframe))
+
+    def test_daily_bars_are_new_york_midnight(self):
+        frame = self._fetch(["20240105", "20240705"])
+        self.assertEqual(frame.ts.tolist(), [1704430800, 1720152000])   # 05:00 / 04:00 UTC (EST / EDT)
+        self.assertEqual(frame.tz, "US/Eastern")
+
+    def test_intraday_bars_use_suffix_or_default_zone(self):
+        frame = self._fetch(["20240105 09:30:00 US/Eastern", "20240105 09:35:00 US/Eastern"], "5m")
+        self.assertEqual(frame.ts.tolist(), [1704465000, 1704465300])   # 14:30 UTC
+        self.assertEqual(self._fetch(["20240705 09:30:00"], "5m").ts.tolist(), [1720186200])   # EDT
+        berlin = self._fetch(["20240105 09:00:00 Europe/Berlin"], "5m")
+        self.assertEqual((berlin.ts.tolist(), berlin.tz), ([1704441600], "Europe/Berlin"))
+
+
+if __name__ == "__main__":
+    unittest.main()
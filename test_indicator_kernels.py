@@ -0,0 +1,255 @@
+"""
+Unit Tests for indicator_kernels Module
+Tests equivalence of the NumPy kernels with the pandas(-ta) formulas they replace
+"""
+
+import importlib.util
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import indicator_kernels as k
+from candle_frame import CandleFrame
+
+_HAS_TA = importlib.util.find_spec("pandas_ta") is not None
+
+
+def _ohlcv(n=300, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    high = close + spread
+    low = close - spread
+    open_ = np.r_[close[0], close[:-1]]
+    volume = rng.integers(1_000_000, 5_000_000, n).astype(float)
+    return open_, high, low, close, volume
+
+
+# ── Referenz: pandas-Formeln wie im pandas-ta-Quelltext ───────────────────────
+
+def _ref_rma(s, n):
+    return s.ewm(alpha=1.0 / n, min_periods=n).mean()
+
+
+def _ref_ema(s, n):
+    s = s.copy()
+    s.iloc[n - 1] = s.iloc[:n].sum() / n
+    s.iloc[:n - 1] = np.nan
+    return s.ewm(span=n, adjust=False).mean()
+
+
+def _ref_atr(h, l, c, n):
+    prev = c.shift(1)
+    tr = pd.concat([h - l, (h - prev).abs(), (l - prev).abs()], axis=1).abs().max(axis=1)
+    tr.iloc[:1] = np.nan
+    return _ref_rma(tr, n)
+
+
+class TestKernelsVsPandas(unittest.TestCase):
+    """Kernels match the pandas formulas used by pandas-ta"""
+
+    def setUp(self):
+        _, h, l, c, v = _ohlcv()
+        self.h, self.l, self.c, self.v = h, l, c, v
+        self.hs, self.ls, self.cs, self.vs = (pd.Series(x) for x in (h, l, c, v))
+
+    def assertSame(self, actual, expected):
+        np.testing.assert_allclose(actual, np.asarray(expected, dtype=float), rtol=1e-9, atol=1e-9, equal_nan=True)
+
+    def test_moving_averages(self):
+        """SMA, EMA (SMA seed) and RMA"""
+        self.assertSame(k.sma(self.c, 20), self.cs.rolling(20).mean())
+        self.assertSame(k.ema(self.c, 20), _ref_ema(self.cs, 20))
+        self.assertSame(k.rma(self.c, 14), _ref_rma(self.cs, 14))
+
+    def test_rsi(self):
+        diff = self.cs.diff()
+        gain, loss = diff.copy(), diff.copy()
+        gain[gain < 0] = 0
+        loss[loss > 0] = 0
+        ref = 100 * _ref_rma(gain, 14) / (_ref_rma(gain, 14) + _ref_rma(loss, 14).abs())
+        self.assertSame(k.rsi(self.c, 14), ref)
+
+    def test_macd(self):
+        line = _ref_ema(self.cs, 12) - _ref_ema(self.cs, 26)
+        valid = line.loc[line.first_valid_index():]
+        signal = _ref_ema(valid, 9).reindex(line.index)
+        out = k.macd(self.c)
+        self.assertSame(out["macd"], line)
+        self.assertSame(out["signal"], signal)
+        self.assertSame(out["hist"], line - signal)
+
+    def test_atr_and_bbands(self):
+        self.assertSame(k.atr(self.h, self.l, self.c, 14), _ref_atr(self.hs, self.ls, self.cs, 14))
+
+        mid = self.cs.rolling(20).mean()
+        std = self.cs.rolling(20).std(ddof=0)
+        out = k.bbands(self.c, 20, 2.0)
+        self.assertSame(out["upper"], mid + 2 * std)
+        self.assertSame(out["bandwidth"], 100 * 4 * std / mid)
+        self.assertSame(out["pct"], (self.cs - (mid - 2 * std)) / (4 * std))
+
+    def test_adx(self):
+        up = self.hs.diff()
+        dn = -self.ls.diff()
+        pos = ((up > dn) & (up > 0)) * up
+        neg = ((dn > up) & (dn > 0)) * dn
+        scale = 100 / _ref_atr(self.hs, self.ls, self.cs, 14)
+        dmp, dmn = scale * _ref_rma(pos, 14), scale * _ref_rma(neg, 14)
+        dx = 100 * (dmp - dmn).abs() / (dmp + dmn)
+        out = k.adx(self.h, self.l, self.c, 14)
+        self.assertSame(out["dmp"], dmp)
+        self.assertSame(out["dmn"], dmn)
+        self.assertSame(out["adx"], _ref_rma(dx, 14))
+
+    def test_stoch_and_volume_ratio(self):
+        lowest, highest = self.ls.rolling(14).min(), self.hs.rolling(14).max()
+        raw = 100 * (self.cs - lowest) / (highest - lowest)
+        stoch_k = raw.rolling(3).mean()
+        out = k.stoch(self.h, self.l, self.c)
+        self.assertSame(out["k"], stoch_k)
+        self.assertSame(out["d"], stoch_k.rolling(3).mean())
+        self.assertSame(k.volume_ratio(self.v), self.vs / self.vs.rolling(20).mean())
+
+    def test_short_input_and_last(self):
+        """Too-short input yields all-NaN instead of raising; last() skips NaN"""
+        self.assertTrue(np.isnan(k.ema(self.c[:10], 20)).all())
+        self.assertTrue(np.isnan(k.rsi(self.c[:5], 14)).all())
+        self.assertEqual(k.last([1.0, 2.123456, np.nan]), 2.1235)
+        self.assertIsNone(k.last([np.nan]))
+
+
+@unittest.skipUnless(_HAS_TA, "pandas-ta not installed")
+class TestKernelsVsPandasTa(unittest.TestCase):
+    """Kernels reproduce pandas-ta outputs (current production reference)"""
+
+    def test_against_pandas_ta(self):
+        import pandas_ta as ta
+
+        _, h, l, c, v = _ohlcv()
+        hs, ls, cs, vs = (pd.Series(x) for x in (h, l, c, v))
+
+        def same(actual, expected):
+            np.testing.assert_allclose(actual, np.asarray(expected, dtype=float), rtol=1e-7, atol=1e-7, equal_nan=True)
+
+        same(k.rsi(c, 14), ta.rsi(cs, length=14))
+        same(k.ema(c, 50), ta.ema(cs, length=50))
+        same(k.atr(h, l, c, 14), ta.atr(hs, ls, cs, length=14))
+        same(k.sma(v, 20), ta.sma(vs, length=20))
+
+        m = ta.macd(cs, fast=12, slow=26, signal=9)
+        out = k.macd(c)
+        same(out["macd"], m.iloc[:, 0])
+        same(out["hist"], m.iloc[:, 1])
+        same(out["signal"], m.iloc[:, 2])
+
+        bb = ta.bbands(cs, length=20, std=2)
+        out = k.bbands(c, 20, 2.0)
+        for i, key in enumerate(("lower", "mid", "upper", "bandwidth", "pct")):
+            same(out[key], bb.iloc[:, i])
+
+        a = ta.adx(hs, ls, cs, length=14)
+        out = k.adx(h, l, c, 14)
+        same(out["adx"], a.iloc[:, 0])
+        same(out["dmp"], a.iloc[:, 1])
+        same(out["dmn"], a.iloc[:, 2])
+
+        s = ta.stoch(hs, ls, cs, k=14, d=3, smooth_k=3)
+        out = k.stoch(h, l, c)
+        same(out["k"], s.iloc[:, 0].reindex(cs.index))
+        same(out["d"], s.iloc[:, 1].reindex(cs.index))
+
+
+class TestPanelKernels(unittest.TestCase):
+    """2-D panels (time x symbols) give the same columns as the 1-D kernels"""
+
+    def setUp(self):
+        cols = [_ohlcv(300, seed) for seed in range(4)]
+        self.h, self.l, self.c = (np.column_stack([col[i] for col in cols]) for i in (1, 2, 3))
+        # Spalten mit kürzerer Historie: führende NaN
+        for j, start in enumerate((0, 40, 120, 260)):
+            for arr in (self.h, self.l, self.c):
+                arr[:start, j] = np.nan
+
+    def assertColumns(self, panel_out, fn):
+        for j in range(self.c.shape[1]):
+            np.testing.assert_allclose(panel_out[:, j], fn(j), rtol=1e-12, atol=1e-12, equal_nan=True,
+                                       err_msg=f"column {j}")
+
+    def _col(self, arr, j):
+        return arr[~np.isnan(arr[:, j]), j]
+
+    def _pad(self, values):
+        return np.r_[np.full(len(self.c) - len(values), np.nan), values]
+
+    def test_columns_match_series(self):
+        c, h, l = self.c, self.h, self.l
+        col = self._col
+        self.assertColumns(k.ema(c, 50), lambda j: self._pad(k.ema(col(c, j), 50)))
+        self.assertColumns(k.rsi(c, 14), lambda j: self._pad(k.rsi(col(c, j), 14)))
+        self.assertColumns(k.macd(c)["signal"], lambda j: self._pad(k.macd(col(c, j))["signal"]))
+        self.assertColumns(k.atr(h, l, c, 14), lambda j: self._pad(k.atr(col(h, j), col(l, j), col(c, j), 14)))
+        self.assertColumns(k.adx(h, l, c, 14)["adx"],
+                           lambda j: self._pad(k.adx(col(h, j), col(l, j), col(c, j), 14)["adx"]))
+        self.assertColumns(k.stoch(h, l, c)["d"], lambda j: self._pad(k.stoch(col(h, j), col(l, j), col(c, j))["d"]))
+        self.assertColumns(k.bbands(c)["pct"], lambda j: self._pad(k.bbands(col(c, j))["pct"]))
+
+    def test_pack_and_last_valid(self):
+        x = np.array([[1.0, np.nan], [np.nan, 5.0], [3.0, np.nan]])
+        np.testing.assert_array_equal(k.pack_columns(x), [[np.nan, np.nan], [1.0, np.nan], [3.0, 5.0]])
+        np.testing.assert_array_equal(k.last_valid(x), [3.0, 5.0])
+        np.testing.assert_array_equal(k.last_valid(np.full((2, 1), np.nan)), [np.nan])
+
+
+class TestCallSites(unittest.TestCase):
+    """Indicator call sites run on kernels without pandas-ta"""
+
+    def setUp(self):
+        o, h, l, c, v = _ohlcv(260)
+        self.frame = CandleFrame(np.arange(260) * 86400 + 1_700_000_000, o, h, l, c, v, tz="UTC")
+
+    def test_compute_indicators(self):
+        from DEF_INDICATORS import compute_indicators
+
+        out = compute_indicators(self.frame)
+        self.assertNotIn("error", out)
+        self.assertEqual(out["rsi_14"], k.last(k.rsi(self.frame.close)))
+        self.assertEqual(out["ema_200"], k.last(k.ema(self.frame.close, 200)))
+        self.assertEqual(out["stoch_k"], k.last(k.stoch(self.frame.high, self.frame.low, self.frame.close)["k"]))
+        for key in ("macd_cross", "ema_trend", "bb_pct", "adx_strength", "stoch_signal", "volume_ratio"):
+            self.assertIn(key, out)
+
+    def test_compute_indicators_batch(self):
+        """Batch snapshots equal per-symbol compute_indicators, incl. gaps and short histories"""
+        from DEF_INDICATORS import compute_indicators, compute_indicators_batch
+
+        frames = {"A": self.frame, "B": self.frame[30:], "C": self.frame[-10:]}
+        gappy = np.ones(len(self.frame), dtype=bool)
+        gappy[[5, 77, 200]] = False
+        frames["D"] = self.frame[gappy]
+        batch = compute_indicators_batch(frames)
+        self.assertEqual(set(batch), set(frames))
+        for symbol, frame in frames.items():
+            self.assertEqual(batch[symbol], compute_indicators(frame), symbol)
+        self.assertIn("error", batch["C"])
+
+    def test_backtest_frame(self):
+        from BACKTEST import _build_indicator_df
+
+        df = _build_indicator_df(self.frame)
+        self.assertEqual(len(df), 260 - 49)
+        self.assertAlmostEqual(df["ema50"].iloc[0], k.ema(self.frame.close, 50)[49])
+        self.assertTrue(set(df["macd_cross"].unique()) <= {-1, 0, 1})
+
+    def test_ml_features(self):
+        from DEF_ML_SIGNAL import _build_feature_df
+
+        df = _build_feature_df(self.frame)
+        np.testing.assert_allclose(df["rsi"], k.rsi(self.frame.close), equal_nan=True)
+        self.assertIn("stoch_d", df.columns)
+        self.assertIn("bb_pct_lag5", df.columns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+"""
+Unit Tests for indicator_state Module
+Tests bar-by-bar equivalence with the full kernels, forming bars, revisions and persistence
+"""
+
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import indicator_kernels as k
+from candle_frame import CandleFrame
+from indicator_state import IndicatorEngine, IndicatorState
+
+KEYS = ("rsi_14", "macd_value", "macd_signal", "macd_hist", "atr_14", "ema_20", "ema_50", "ema_200",
+        "bb_lower", "bb_mid", "bb_upper", "bb_bandwidth", "bb_pct", "vol_ma", "adx", "stoch_k", "stoch_d")
+
+
+def _frame(n=300, seed=11):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, n)))
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    volume = rng.integers(1_000_000, 5_000_000, n).astype(float)
+    ts = np.arange(n) * 86400 + 1_700_000_000
+    return CandleFrame(ts, np.r_[close[0], close[:-1]], close + spread, close - spread, close, volume, tz="UTC")
+
+
+def _kernel_series(frame):
+    c, h, l, v = frame.close, frame.high, frame.low, frame.volume
+    macd, bb, st = k.macd(c), k.bbands(c, 20, 2.0), k.stoch(h, l, c)
+    return {
+        "rsi_14": k.rsi(c, 14), "macd_value": macd["macd"], "macd_signal": macd["signal"],
+        "macd_hist": macd["hist"], "atr_14": k.atr(h, l, c, 14),
+        "ema_20": k.ema(c, 20), "ema_50": k.ema(c, 50), "ema_200": k.ema(c, 200),
+        "bb_lower": bb["lower"], "bb_mid": bb["mid"], "bb_upper": bb["upper"],
+        "bb_bandwidth": bb["bandwidth"], "bb_pct": bb["pct"], "vol_ma": k.sma(v, 20),
+        "adx": k.adx(h, l, c, 14)["adx"], "stoch_k": st["k"], "stoch_d": st["d"],
+    }
+
+
+class TestIndicatorState(unittest.TestCase):
+    """Streaming recursions reproduce the NumPy kernels"""
+
+    def test_bar_by_bar_matches_kernels(self):
+        frame = _frame()
+        ref = _kernel_series(frame)
+        state = IndicatorState()
+        for i in range(len(frame)):
+            out = state.append(int(frame.ts[i]), float(frame.high[i]), float(frame.low[i]),
+                               float(frame.close[i]), float(frame.volume[i]))
+            if i in (0, 13, 19, 60, 199, 250, len(frame) - 1):
+                for key in KEYS:
+                    np.testing.assert_allclose(out[key], ref[key][i], rtol=1e-9, atol=1e-9,
+                                               equal_nan=True, err_msg=f"{key}@{i}")
+
+    def test_peek_does_not_commit(self):
+        frame = _frame(60)
+        state = IndicatorState()
+        for i in range(59):
+            state.append(int(frame.ts[i]), float(frame.high[i]), float(frame.low[i]),
+                         float(frame.close[i]), float(frame.volume[i]))
+        before = state.to_dict()
+        peeked = state.peek(float(frame.high[59]), float(frame.low[59]), float(frame.close[59]), 1e6)
+        self.assertEqual(state.to_dict(), before)
+        committed = state.append(int(frame.ts[59]), float(frame.high[59]), float(frame.low[59]),
+                                 float(frame.close[59]), 1e6)
+        self.assertEqual(peeked, committed)
+
+    def test_round_trip(self):
+        frame = _frame(80)
+        state = IndicatorState()
+        for i in range(79):
+            state.append(int(frame.ts[i]), float(frame.high[i]), float(frame.low[i]),
+                         float(frame.close[i]), float(frame.volume[i]))
+        copy = IndicatorState.from_dict(state.to_dict())
+        args = (float(frame.high[79]), float(frame.low[79]), float(frame.close[79]), float(frame.volume[79]))
+        np.testing.assert_equal(copy.peek(*args), state.peek(*args))
+
+
+class TestIndicatorEngine(unittest.TestCase):
+    """Engine: incremental updates, forming bar, revision rebuild, disk state"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = IndicatorEngine(root=self.tmp.name)
+        self.frame = _frame()
+        self.ref = _kernel_series(self.frame)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assertMatches(self, values, idx):
+        for key in KEYS:
+            expected = self.ref[key][idx]
+            if np.isnan(expected):
+                self.assertIsNone(values[key], key)
+            else:
+                self.assertAlmostEqual(values[key], expected, places=9, msg=key)
+
+    def test_incremental_update(self):
+        self.engine.values("aapl", "1d", _slice(self.frame, 250))
+        out = self.engine.values("AAPL", "1d", _slice(self.frame, 251))
+        self.assertMatches(out, 250)
+        stats = self.engine.stats()
+        self.assertEqual(stats["rebuilds"], 1)
+        self.assertEqual(stats["appended_bars"], 249 + 1)
+        self.assertEqual(self.engine.latest("AAPL", "1d"), out)
+
+    def test_forming_bar_and_revision(self):
+        frame = _slice(self.frame, 200)
+        self.engine.values("AAPL", "1d", frame)
+        # laufender letzter Bar ändert sich → kein Rebuild, Wert folgt dem neuen Close
+        moved = _replace_close(frame, -1, float(frame.close[-1]) * 1.01)
+        self.engine.values("AAPL", "1d", moved)
+        self.assertEqual(self.engine.stats()["rebuilds"], 1)
+        # adjustierte Historie (Dividende) → letzter übernommener Bar passt nicht mehr → Rebuild
+        revised = _scale(moved, 0.98)
+        out = self.engine.values("AAPL", "1d", revised)
+        self.assertEqual(self.engine.stats()["rebuilds"], 2)
+        self.assertAlmostEqual(out["rsi_14"], k.rsi(revised.close)[-1], places=9)
+
+    def test_persistence(self):
+        self.engine.values("AAPL", "1d", _slice(self.frame, 250))
+        self.assertEqual(self.engine.flush(), 1)
+        fresh = IndicatorEngine(root=self.tmp.name)
+        out = fresh.values("AAPL", "1d", _slice(self.frame, 252))
+        self.assertEqual(fresh.stats()["rebuilds"], 0)
+        self.assertEqual(fresh.stats()["appended_bars"], 2)
+        self.assertMatches(out, 251)
+
+    def test_compute_indicators_uses_state(self):
+        import DEF_INDICATORS
+        import indicator_state
+
+        original = indicator_state.engine
+        indicator_state.engine = self.engine
+        try:
+            stateful = DEF_INDICATORS.compute_indicators(self.frame, symbol="AAPL", timeframe="1D")
+        finally:
+            indicator_state.engine = original
+        full = DEF_INDICATORS.compute_indicators(self.frame)
+        self.assertEqual(self.engine.stats()["calls"], 1)
+        self.assertEqual(stateful, full)
+
+
+def _slice(frame, n):
+    return CandleFrame(frame.ts[:n], frame.open[:n], frame.high[:n], frame.low[:n],
+                       frame.close[:n], frame.volume[:n], tz=frame.tz)
+
+
+def _replace_close(frame, idx, value):
+    close = frame.close.copy()
+    close[idx] = value
+    return CandleFrame(frame.ts, frame.open, np.maximum(frame.high, close), np.minimum(frame.low, close),
+                       close, frame.volume, tz=frame.tz)
+
+
+def _scale(frame, factor):
+    return CandleFrame(frame.ts, frame.open * factor, frame.high * factor, frame.low * factor,
+                       frame.close * factor, frame.volume, tz=frame.tz)
+
+
+class TestTrailingStopLookup(unittest.TestCase):
+    """position_monitor reads the live ATR under the engine's normalised timeframe key"""
+
+    def test_config_timeframe_is_normalised(self):
+        import position_monitor
+
+        engine = IndicatorEngine(persist=False)
+        engine.remember("AAPL", "1d", {"atr_14": 2.5})
+        with patch("indicator_state.engine", engine):
+            for configured in ("1D", "1d", "D"):
+                with patch.object(position_monitor, "TRAILING_STOP_ATR_TIMEFRAME", configured):
+                    self.assertEqual(position_monitor._live_atr("aapl"), 2.5)
+            self.assertIsNone(position_monitor._live_atr("MSFT"))
+
+
+if __name__ == "__main__":
+    unittest.main()
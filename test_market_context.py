@@ -0,0 +1,126 @@
+"""
+Unit Tests for market_context Module
+Tests snapshot refresh, shared consumers and failure fallback without network access
+"""
+
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import market_context
+from candle_frame import CandleFrame
+from market_context import MarketContextService
+
+
+def _series(start, drift, n=260):
+    close = start * np.exp(np.arange(n) * drift)
+    ts = np.arange(n) * 86400 + 1_700_000_000
+    return CandleFrame(ts, close, close * 1.01, close * 0.99, close, np.full(n, 1e6), tz="America/New_York")
+
+
+class FakeLoader:
+    def __init__(self, frames):
+        self.frames = frames
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, symbols, period):
+        self.calls.append(list(symbols))
+        if self.fail:
+            raise ConnectionError("offline")
+        return {s: self.frames[s] for s in symbols if s in self.frames}
+
+
+class TestMarketContextService(unittest.TestCase):
+    """One refresh serves every consumer until the interval elapses"""
+
+    def setUp(self):
+        self.loader = FakeLoader({
+            "^VIX": _series(14, 0.0),
+            "SPY": _series(400, 0.001),
+            "QQQ": _series(350, 0.001),
+            "XLK": _series(150, 0.002),
+        })
+        self.service = MarketContextService(symbols=["^VIX", "SPY", "QQQ"], refresh_seconds=3600, loader=self.loader)
+        self.addCleanup(self.service.stop)
+
+    def test_snapshot_is_shared_and_read_only(self):
+        snaps = []
+        threads = [threading.Thread(target=lambda: snaps.append(self.service.snapshot())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(self.loader.calls), 1)
+        self.assertTrue(all(s is snaps[0] for s in snaps))
+        self.assertEqual(snaps[0].vix, 14.0)
+        with self.assertRaises(ValueError):
+            snaps[0].series("SPY").close[-1] = 0.0
+
+    def test_regime_and_derived(self):
+        snap = self.service.snapshot()
+        regime = snap.regime()
+        self.assertEqual(regime["regime"], "bull")
+        self.assertGreater(regime["spy_vs_ema20"], 0)
+        self.assertNotIn("error", regime)
+        built = []
+        snap.derived("x", lambda s: built.append(1) or len(built))
+        self.assertEqual(snap.derived("x", lambda s: built.append(1) or len(built)), 1)
+
+    def test_registered_symbols_and_failure_keeps_snapshot(self):
+        first = self.service.snapshot()
+        self.service.register_symbols(["xlk"])
+        second = self.service.refresh()
+        self.assertIn("XLK", self.loader.calls[-1])
+        self.assertIsNotNone(second.series("XLK"))
+
+        self.loader.fail = True
+        self.assertIs(self.service.refresh(), second)
+        self.assertEqual(self.service.stats()["failures"], 1)
+        self.assertIsNot(first, second)
+
+    def test_no_data_falls_back_to_neutral(self):
+        self.loader.fail = True
+        snap = self.service.snapshot()
+        self.assertEqual(snap.vix, market_context.DEFAULT_VIX)
+        regime = snap.regime()
+        self.assertEqual(regime["regime"], "neutral")
+        self.assertIn("error", regime)
+
+
+class TestConsumers(unittest.TestCase):
+    """VIX, regime and ML context all read the same snapshot"""
+
+    def setUp(self):
+        self.loader = FakeLoader({
+            "^VIX": _series(30, 0.0),
+            "SPY": _series(400, 0.001),
+            "QQQ": _series(350, -0.001),
+            "XLK": _series(150, 0.002),
+        })
+        self.service = MarketContextService(symbols=["^VIX", "SPY", "QQQ", "XLK"], refresh_seconds=3600,
+                                            loader=self.loader)
+        patcher = mock.patch.object(market_context, "service", self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.service.stop)
+
+    def test_consumers(self):
+        from DEF_INDICATORS import compute_market_regime, get_vix_level
+        from DEF_ML_SIGNAL import _fetch_live_market_ctx
+
+        self.assertEqual(get_vix_level(), 30.0)
+        self.assertEqual(get_vix_level(12.5), 12.5)
+        regime = compute_market_regime()
+        self.assertEqual(regime["regime"], "neutral")   # SPY über, QQQ unter EMA20
+        ctx = _fetch_live_market_ctx("XLK")
+        self.assertIs(_fetch_live_market_ctx("XLK"), ctx)
+        self.assertIn("sector_rel_5d", ctx.columns)
+        self.assertFalse(np.isnan(ctx["spy_vs_ema200_pct"].iloc[-1]))
+        self.assertEqual(len(self.loader.calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""
+Unit Tests for PriceStream Module
+Tests the price book, message handling, synthetic ticks and an end-to-end replay
+"""
+
+import importlib.util
+import itertools
+import time
+import unittest
+from unittest.mock import patch
+
+import price_stream
+from price_stream import PriceBook, PriceStream, ReplayServer, synthetic_ticks
+
+HAS_WEBSOCKETS = importlib.util.find_spec("websockets") is not None
+
+
+class TestPriceBook(unittest.TestCase):
+    """Test in-memory last/high/low book"""
+
+    def test_trades_track_last_high_low(self):
+        """Trades update last, high, low and volume"""
+        book = PriceBook()
+        for price in (100.0, 102.0, 99.0, 101.0):
+            book.apply({"T": "t", "S": "AAPL", "p": price, "s": 10})
+
+        entry = book.get("AAPL")
+        self.assertEqual((entry.last, entry.high, entry.low), (101.0, 102.0, 99.0))
+        self.assertEqual((entry.volume, entry.ticks), (40, 4))
+
+    def test_quote_mid_without_trade(self):
+        """Without a trade the price is the quote midpoint"""
+        book = PriceBook()
+        book.apply({"T": "q", "S": "MSFT", "bp": 99.0, "ap": 101.0})
+
+        self.assertEqual(book.last_price("MSFT"), 100.0)
+        self.assertIsNone(book.last_price("OTHER"))
+
+    def test_max_age(self):
+        """Stale entries are ignored when max_age is given"""
+        book = PriceBook()
+        book.update_trade("AAPL", 100.0)
+
+        with patch("price_stream.time.time", return_value=time.time() + 30):
+            self.assertIsNone(book.get("AAPL", max_age=10))
+            self.assertEqual(book.prices(["AAPL"], max_age=60), {"AAPL": 100.0})
+
+    def test_listener_called(self):
+        """Listeners receive a copy of the updated entry"""
+        book = PriceBook()
+        seen = []
+        book.add_listener(seen.append)
+        book.update_trade("AAPL", 100.0)
+
+        self.assertEqual([e.last for e in seen], [100.0])
+
+
+class TestPriceStreamClient(unittest.TestCase):
+    """Test message handling and subscription bookkeeping without a socket"""
+
+    def test_handle_routes_ticks_to_book(self):
+        """Ticks for followed symbols land in the book; control and stray ticks are ignored"""
+        stream = PriceStream(url="ws://unused", record_path="")
+        stream.follow(["AAPL"])
+        stream._handle('[{"T":"success","msg":"connected"},{"T":"t","S":"AAPL","p":190.5,"s":5},'
+                       '{"T":"t","S":"MSFT","p":400.0,"s":1}]')
+
+        self.assertEqual(stream.book.symbols(), ["AAPL"])
+        self.assertEqual(stream.book.last_price("AAPL"), 190.5)
+        self.assertEqual(stream.stats()["messages"], 1)
+
+    def test_follow_unions_owners(self):
+        """Subscriptions are the union of every owner's symbols"""
+        stream = PriceStream(url="ws://unused", record_path="")
+        stream.follow(["aapl", "MSFT"], owner="positions")
+        stream.follow(["MSFT", "NVDA"], owner="api")
+
+        self.assertEqual(stream.wanted(), {"AAPL", "MSFT", "NVDA"})
+
+    def test_unfollow_keeps_other_owners(self):
+        """A consumer leaving drops only its own symbols; the shared stream keeps running"""
+        stream = PriceStream(url="ws://unused", record_path="")
+        stream.follow(["AAPL", "MSFT"], owner="positions")
+        stream.follow(["MSFT", "NVDA"], owner="options")
+        stream.unfollow("positions")
+
+        self.assertEqual(stream.wanted(), {"MSFT", "NVDA"})
+        with patch.object(price_stream, "_stream", stream), patch.object(stream, "stop") as stop:
+            price_stream.unfollow("options")
+            stop.assert_not_called()
+            self.assertIs(price_stream._stream, stream)
+        self.assertEqual(stream.wanted(), set())
+
+    def test_synthetic_ticks_deterministic(self):
+        """Seeded random walk is reproducible and alternates quote/trade"""
+        a = list(itertools.islice(synthetic_ticks(["AAPL", "MSFT"], seed=1), 8))
+        b = list(itertools.islice(synthetic_ticks(["AAPL", "MSFT"], seed=1), 8))
+
+        self.assertEqual([t["p"] for t in a if t["T"] == "t"], [t["p"] for t in b if t["T"] == "t"])
+        self.assertEqual([t["T"] for t in a[:2]], ["q", "t"])
+        self.assertEqual({t["S"] for t in a}, {"AAPL", "MSFT"})
+
+
+@unittest.skipUnless(HAS_WEBSOCKETS, "websockets not installed")
+class TestReplayEndToEnd(unittest.TestCase):
+    """Client against the local replay server"""
+
+    def test_stream_follows_subscriptions(self):
+        """Only subscribed symbols stream in; unsubscribed ones are dropped"""
+        with ReplayServer(rate=0, seed=7) as server:
+            stream = PriceStream(url=server.url, record_path="")
+            stream.follow(["AAPL", "MSFT"])
+            stream.start()
+            try:
+                self.assertTrue(stream.wait_connected(5))
+                deadline = time.time() + 5
+                while time.time() < deadline and len(stream.book.symbols()) < 2:
+                    time.sleep(0.05)
+                self.assertEqual(stream.book.symbols(), ["AAPL", "MSFT"])
+
+                stream.follow(["AAPL"])
+                deadline = time.time() + 5
+                while time.time() < deadline and stream.book.symbols() != ["AAPL"]:
+                    time.sleep(0.05)
+                self.assertEqual(stream.book.symbols(), ["AAPL"])
+                self.assertGreater(stream.book.get("AAPL").ticks, 0)
+            finally:
+                stream.stop()
+
+    def test_quote_service_reads_from_book(self):
+        """With an active stream, fresh prices are served without HTTP"""
+        from quote_service import QuoteService
+
+        recorded = [{"T": "t", "S": "AAPL", "p": 123.0, "s": 1}]
+        with ReplayServer(ticks=recorded, rate=100) as server, \
+                patch("quote_service.http_client.get") as mock_get:
+            stream = price_stream.start_stream(url=server.url)
+            try:
+                price_stream.follow(["AAPL"])
+                deadline = time.time() + 5
+                while time.time() < deadline and price_stream.fresh_price("AAPL") is None:
+                    time.sleep(0.05)
+
+                quote = QuoteService().get_quote("AAPL")
+                self.assertEqual((quote.price, quote.source), (123.0, "stream"))
+                mock_get.assert_not_called()
+                self.assertIs(stream.book, price_stream.book)
+            finally:
+                price_stream.stop_stream()
+
+
+if __name__ == "__main__":
+    unittest.main()
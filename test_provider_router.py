@@ -0,0 +1,169 @@
+"""
+Unit Tests for provider_router Module
+Tests latency ranking, circuit breaking, fallback and hedged requests
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from provider_router import AllProvidersFailed, ProviderRouter
+
+
+class TestRanking(unittest.TestCase):
+    """Test provider ordering"""
+
+    def test_ranked_by_latency_and_cost(self):
+        """Lower p50 wins; per-call cost scales the expected latency"""
+        router = ProviderRouter("t_rank", ["slow", "fast"])
+        for _ in range(5):
+            router.record("slow", 0.2, ok=True)
+            router.record("fast", 0.05, ok=True)
+
+        self.assertEqual(router.ranked(), ["fast", "slow"])
+        cost = {"slow": 1, "fast": 10}
+        self.assertEqual(router.ranked(cost=cost.get), ["slow", "fast"])
+        self.assertEqual(router.ranked(candidates=["slow"]), ["slow"])
+
+    def test_unsampled_keeps_config_order(self):
+        """Without measurements the configured order is used"""
+        router = ProviderRouter("t_order", ["a", "b", "c"])
+        self.assertEqual(router.ranked(), ["a", "b", "c"])
+
+    def test_failed_provider_reexplored_after_ttl(self):
+        """Errors push a provider back; once its samples expire it is tried again"""
+        router = ProviderRouter("t_ttl", ["ibkr", "yfinance"])
+        router.record("ibkr", 0.1, ok=False)
+        router.record("yfinance", 0.1, ok=True)
+        self.assertEqual(router.ranked(), ["yfinance", "ibkr"])
+
+        with patch("provider_router.PROVIDER_SAMPLE_TTL", 0):
+            time.sleep(0.01)
+            self.assertEqual(router.ranked(), ["ibkr", "yfinance"])
+
+
+class TestCircuit(unittest.TestCase):
+    """Test circuit breaker and fallback"""
+
+    def test_fallback_and_all_failed(self):
+        """An exception moves on to the next provider; none left raises"""
+        router = ProviderRouter("t_fallback", ["a", "b"])
+
+        def fn(provider):
+            if provider == "a":
+                raise ConnectionError("down")
+            return provider.upper()
+
+        routed = router.call(fn)
+        self.assertEqual((routed.provider, routed.value, routed.attempted), ("b", "B", ["a", "b"]))
+
+        with self.assertRaises(AllProvidersFailed) as ctx:
+            router.call(lambda p: 1 / 0)
+        self.assertIsInstance(ctx.exception.last_error, ZeroDivisionError)
+
+    def test_circuit_opens_and_probes(self):
+        """N consecutive failures open the circuit; after cooldown one probe closes it"""
+        router = ProviderRouter("t_circuit", ["a", "b"], failure_threshold=3, cooldown_seconds=60)
+        for _ in range(3):
+            router.record("a", 0.01, ok=False)
+
+        self.assertEqual(router.stats()["a"]["state"], "open")
+        self.assertEqual(router.ranked(), ["b"])
+        calls = []
+        router.call(lambda p: calls.append(p))
+        self.assertEqual(calls, ["b"])
+
+        router.cooldown_seconds = 0
+        self.assertEqual(router.stats()["a"]["state"], "half_open")
+        routed = router.call(lambda p: p, candidates=["a"])
+        self.assertEqual(routed.provider, "a")
+        self.assertEqual(router.stats()["a"]["state"], "closed")
+
+    def test_failed_probe_reopens(self):
+        """A failing half-open probe opens the circuit again immediately"""
+        router = ProviderRouter("t_probe", ["a"], failure_threshold=2, cooldown_seconds=0)
+        router.record("a", 0.01, ok=False)
+        router.record("a", 0.01, ok=False)
+
+        with self.assertRaises(AllProvidersFailed):
+            router.call(lambda p: 1 / 0)
+        router.cooldown_seconds = 60
+        self.assertEqual(router.stats()["a"]["state"], "open")
+
+    def test_half_open_admits_single_probe(self):
+        """Two callers that both ranked a half-open provider: only the first may probe it"""
+        router = ProviderRouter("t_single_probe", ["a", "b"], failure_threshold=1, cooldown_seconds=0)
+        router.record("a", 0.01, ok=False)
+        self.assertTrue(router._begin("a"))
+        self.assertFalse(router._begin("a"))
+
+        calls = []
+        with patch.object(router, "ranked", return_value=["a", "b"]):
+            routed = router.call(lambda p: calls.append(p) or p)
+        self.assertEqual((routed.provider, calls), ("b", ["b"]))
+
+    def test_concurrent_callers_probe_once(self):
+        """While the probe runs, other callers go to the next provider"""
+        router = ProviderRouter("t_probe_race", ["a", "b"], failure_threshold=1, cooldown_seconds=0)
+        router.record("a", 0.01, ok=False)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def fn(provider):
+            calls.append(provider)
+            if provider == "a":
+                started.set()
+                release.wait(2)
+            return provider
+
+        probe = threading.Thread(target=router.call, args=(fn,), kwargs={"candidates": ["a"]})
+        probe.start()
+        started.wait(2)
+        routed = router.call(fn)
+        release.set()
+        probe.join(2)
+
+        self.assertEqual(routed.provider, "b")
+        self.assertEqual(calls.count("a"), 1)
+        self.assertEqual(router.stats()["a"]["state"], "closed")
+
+
+class TestHedging(unittest.TestCase):
+    """Test hedged requests"""
+
+    def test_slow_primary_hedged(self):
+        """The backup starts once the primary exceeds its p95 and wins the race"""
+        router = ProviderRouter("t_hedge", ["primary", "backup"], hedge=True)
+        for _ in range(20):
+            router.record("primary", 0.01, ok=True)
+            router.record("backup", 0.02, ok=True)
+
+        def fn(provider):
+            time.sleep(0.5 if provider == "primary" else 0.0)
+            return provider
+
+        start = time.perf_counter()
+        routed = router.call(fn)
+
+        self.assertEqual(routed.provider, "backup")
+        self.assertEqual(routed.attempted, ["primary", "backup"])
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual(router.stats()["backup"]["hedged"], 1)
+
+    def test_fast_primary_not_hedged(self):
+        """A primary answering within p95 never starts the backup"""
+        router = ProviderRouter("t_nohedge", ["primary", "backup"], hedge=True)
+        for _ in range(20):
+            router.record("primary", 0.2, ok=True)
+            router.record("backup", 0.3, ok=True)
+
+        calls = []
+        routed = router.call(lambda p: calls.append(p) or p)
+
+        self.assertEqual(routed.provider, "primary")
+        self.assertEqual(calls, ["primary"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit Tests for QuoteService Module
+Tests batched snapshots, freshness window, fallbacks and request coalescing
+"""
+
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from quote_service import QuoteService
+
+ALPACA_ENV = {"APCA_API_KEY_ID": "key", "APCA_API_SECRET_KEY": "secret", "FINNHUB_API_KEY": ""}
+
+
+def _snapshot_response(symbols, price=100.0):
+    response = MagicMock(ok=True)
+    response.json.return_value = {
+        sym: {"latestTrade": {"p": price}, "latestQuote": {"bp": price - 0.1, "ap": price + 0.1, "bs": 3, "as": 4}}
+        for sym in symbols
+    }
+    return response
+
+
+class TestQuoteService(unittest.TestCase):
+    """Test shared quote service"""
+
+    def setUp(self):
+        patcher = patch.dict(os.environ, ALPACA_ENV)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = QuoteService(max_age_seconds=60)
+
+    @patch("quote_service.http_client.get")
+    def test_one_snapshot_for_many_symbols(self, mock_get):
+        """50 symbols cost one HTTP request; repeated lookups hit the cache"""
+        symbols = [f"S{i}" for i in range(50)]
+        mock_get.side_effect = lambda url, params, **kw: _snapshot_response(params["symbols"].split(","))
+
+        prices = self.service.get_prices(symbols)
+        for sym in symbols:
+            self.assertEqual(self.service.get_price(sym), 100.0)
+
+        self.assertEqual(len(prices), 50)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIn("/v2/stocks/snapshots", mock_get.call_args.args[0])
+
+    @patch("quote_service.http_client.get")
+    def test_quote_fields(self, mock_get):
+        """Last trade is the price; bid/ask come from the latest quote"""
+        mock_get.return_value = _snapshot_response(["AAPL"], price=190.0)
+
+        quote = self.service.get_quote("aapl")
+
+        self.assertEqual(quote.symbol, "AAPL")
+        self.assertEqual((quote.price, quote.bid, quote.ask), (190.0, 189.9, 190.1))
+        self.assertEqual((quote.bid_size, quote.ask_size, quote.source), (3, 4, "alpaca"))
+
+    @patch("quote_service.http_client.get")
+    def test_freshness_window(self, mock_get):
+        """Prices older than max_age are fetched again"""
+        service = QuoteService(max_age_seconds=0.05)
+        mock_get.side_effect = lambda url, params, **kw: _snapshot_response(params["symbols"].split(","))
+
+        service.get_price("AAPL")
+        time.sleep(0.1)
+        service.get_price("AAPL")
+
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("quote_service.http_client.get")
+    def test_finnhub_fallback_for_missing(self, mock_get):
+        """Symbols missing from the snapshot fall back to Finnhub individually"""
+        def fake_get(url, params, **kw):
+            if "finnhub" in url:
+                response = MagicMock(ok=True)
+                response.json.return_value = {"c": 42.0}
+                return response
+            return _snapshot_response(["AAPL"])
+
+        mock_get.side_effect = fake_get
+        with patch.dict(os.environ, {"FINNHUB_API_KEY": "fh"}):
+            prices = self.service.get_prices(["AAPL", "OTHER"])
+
+        self.assertEqual(prices, {"AAPL": 100.0, "OTHER": 42.0})
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch("quote_service.http_client.get")
+    def test_concurrent_requests_coalesce(self, mock_get):
+        """Threads asking for the same symbol share one fetch"""
+        release = threading.Event()
+
+        def slow_get(url, params, **kw):
+            release.wait(2)
+            return _snapshot_response(params["symbols"].split(","))
+
+        mock_get.side_effect = slow_get
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.service.get_price("AAPL")))
+                   for _ in range(10)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(results, [100.0] * 10)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(self.service.stats()["coalesced"], 9)
+
+    @patch("quote_service.http_client.get")
+    def test_option_snapshots(self, mock_get):
+        """Option symbols use the options snapshot endpoint"""
+        response = MagicMock(ok=True)
+        response.json.return_value = {"snapshots": {"AAPL260619C00200000": {"latestQuote": {"ap": 3.5, "bp": 3.3}}}}
+        mock_get.return_value = response
+
+        price = self.service.get_option_price("AAPL260619C00200000")
+
+        self.assertEqual(price, 3.5)
+        self.assertIn("/options/snapshots", mock_get.call_args.args[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
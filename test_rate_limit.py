@@ -0,0 +1,102 @@
+"""
+Unit Tests for rate_limit Module
+Tests token buckets, adaptive slow-down on 429 and provider lookup
+"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from rate_limit import RateLimitRegistry, TokenBucket, _parse_limits, parse_retry_after
+
+
+class _FakeClock:
+    """monotonic()/sleep() pair where sleeping advances time instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test token bucket pacing"""
+
+    def setUp(self):
+        self.clock = _FakeClock()
+        for name in ("monotonic", "sleep"):
+            patcher = patch(f"rate_limit.time.{name}", getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_burst_then_paced(self):
+        """Burst is free; further requests are spaced at 1/rate"""
+        bucket = TokenBucket("t", rate=10, burst=2)
+        waits = [bucket.acquire() for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1)
+        self.assertAlmostEqual(waits[3], 0.1)
+        stats = bucket.stats()
+        self.assertEqual((stats["acquired"], stats["waited"]), (4, 2))
+        self.assertAlmostEqual(stats["wait_max_s"], 0.1)
+
+    def test_throttled_blocks_and_halves_rate(self):
+        """429 pauses for Retry-After and halves the rate; successes recover it"""
+        bucket = TokenBucket("t", rate=10, burst=1)
+        bucket.on_throttled(retry_after=2.0)
+
+        self.assertAlmostEqual(bucket.acquire(), 2.0)
+        self.assertEqual(bucket.effective_rate, 5.0)
+        self.assertAlmostEqual(bucket.acquire(), 0.2)
+
+        for _ in range(20):
+            bucket.on_success()
+        self.assertEqual(bucket.effective_rate, 10.0)
+        self.assertEqual(bucket.stats()["throttled"], 1)
+
+    def test_timeout(self):
+        """acquire(timeout) refuses to wait longer than allowed"""
+        bucket = TokenBucket("t", rate=1, burst=1)
+        bucket.acquire()
+        with self.assertRaises(TimeoutError):
+            bucket.acquire(timeout=0.5)
+
+
+class TestRateLimitRegistry(unittest.TestCase):
+    """Test provider configuration and host lookup"""
+
+    def test_provider_for_url(self):
+        """Known hosts and broker URLs from the environment map to providers"""
+        with patch.dict(os.environ, {"IBKR_BASE_URL": "https://localhost:5003/v1/api",
+                                     "RATE_LIMIT_HOSTS": "news.example.com=serpapi"}):
+            registry = RateLimitRegistry()
+            self.assertEqual(registry.provider_for_url("https://finnhub.io/api/v1/quote"), "finnhub")
+            self.assertEqual(registry.provider_for_url("https://localhost:5003/v1/api/iserver"), "ibkr")
+            self.assertEqual(registry.provider_for_url("https://news.example.com/x"), "serpapi")
+            self.assertIsNone(registry.provider_for_url("https://example.org/"))
+
+    def test_overrides_and_unknown_provider(self):
+        """RATE_LIMITS overrides defaults; unknown providers are unlimited"""
+        with patch.dict(os.environ, {"RATE_LIMITS": "finnhub=30/60:5"}):
+            registry = RateLimitRegistry()
+            bucket = registry.bucket("finnhub")
+
+        self.assertEqual((bucket.rate, bucket.burst), (0.5, 5))
+        self.assertIsNone(registry.bucket("nope"))
+        self.assertEqual(registry.acquire("nope"), 0.0)
+
+    def test_parsers(self):
+        """Config strings and Retry-After headers are parsed leniently"""
+        self.assertEqual(_parse_limits("a=10/1:3, b=5, junk, c=x/1"), {"a": (10.0, 1.0, 3), "b": (5.0, 1.0, 1)})
+        self.assertEqual(parse_retry_after("2"), 2.0)
+        self.assertIsNone(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"))
+        self.assertIsNone(parse_retry_after(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
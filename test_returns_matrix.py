@@ -0,0 +1,154 @@
+"""
+Unit Tests for returns_matrix Module
+Tests rolling correlations against pandas, incremental day updates, batch loading and persistence
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from candle_frame import CandleFrame
+from returns_matrix import ReturnsMatrix, window_for
+
+T0 = 1_700_000_000 + 4 * 3600   # Tagesbars um Mitternacht New York
+
+
+def _universe(n_days=160, n_symbols=12, seed=5):
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.01, n_days)
+    ts = np.arange(n_days) * 86400 + T0
+    frames = {}
+    for k in range(n_symbols):
+        close = 100 * np.exp(np.cumsum(market * rng.uniform(0, 1.5) + rng.normal(0, 0.01, n_days)))
+        keep = np.ones(n_days, bool)
+        if k % 4 == 0:   # Feiertage / Handelspausen einzelner Symbole
+            keep[rng.choice(n_days, 15, replace=False)] = False
+        frames[f"S{k}"] = CandleFrame(ts[keep], close[keep], close[keep], close[keep], close[keep],
+                                      np.ones(keep.sum()), tz="UTC")
+    return frames
+
+
+def _until(frames, day):
+    out = {}
+    for sym, f in frames.items():
+        m = f.ts < T0 + day * 86400
+        out[sym] = CandleFrame(f.ts[m], f.open[m], f.high[m], f.low[m], f.close[m], f.volume[m], tz="UTC")
+    return out
+
+
+def _pandas_corr(frames, window, min_periods=20):
+    df = pd.DataFrame({s: pd.Series(f.close, index=f.ts // 86400).pct_change() for s, f in frames.items()})
+    return df.sort_index().iloc[-window:].corr(min_periods=min_periods)
+
+
+class TestReturnsMatrix(unittest.TestCase):
+    """Rolling pairwise correlations, incremental updates and lookups"""
+
+    def setUp(self):
+        self.frames = _universe()
+
+    def test_matrix_matches_pandas(self):
+        rm = ReturnsMatrix(path=None)
+        rm.update(self.frames)
+        names, corr = rm.matrix()
+        ref = _pandas_corr(self.frames, rm.window).loc[names, names].values
+        np.testing.assert_allclose(corr, ref, atol=1e-10)
+        self.assertAlmostEqual(rm.correlation("s1", "S2"), ref[1, 2], places=10)
+
+    def test_incremental_days_match_full_rebuild(self):
+        rm = ReturnsMatrix(path=None)
+        rm.update(_until(self.frames, 120))
+        for day in range(121, 161):
+            rm.update(_until(self.frames, day))
+        stats = rm.stats()
+        self.assertGreater(stats["incremental_updates"], 30)
+        self.assertLess(stats["full_rebuilds"], 5)
+        _, corr = rm.matrix()
+        fresh = ReturnsMatrix(path=None)
+        fresh.update(self.frames)
+        np.testing.assert_allclose(corr, fresh.matrix()[1], atol=1e-10)
+
+    def test_forming_bar_revision(self):
+        rm = ReturnsMatrix(path=None)
+        rm.update(self.frames)
+        moved = dict(self.frames)
+        f = moved["S1"]
+        close = f.close.copy()
+        close[-1] *= 1.03
+        moved["S1"] = CandleFrame(f.ts, f.open, f.high, f.low, close, f.volume, tz="UTC")
+        rm.update({"S1": moved["S1"]})
+        self.assertEqual(rm.stats()["incremental_updates"], 1)
+        ref = _pandas_corr(moved, rm.window)
+        self.assertAlmostEqual(rm.correlation("S1", "S3"), ref.loc["S1", "S3"], places=10)
+
+    def test_other_window_and_min_periods(self):
+        rm = ReturnsMatrix(path=None, min_periods=50)
+        rm.update(self.frames)
+        self.assertIsNone(rm.correlation("S1", "S2"))          # nur 42 Tage im Fenster
+        ref = _pandas_corr(self.frames, 100, min_periods=50)
+        self.assertAlmostEqual(rm.correlation("S1", "S2", window=100), ref.loc["S1", "S2"], places=10)
+        self.assertEqual(window_for("60d"), 42)
+        self.assertIsNone(rm.correlation("S1", "UNKNOWN"))
+
+    def test_max_correlation(self):
+        rm = ReturnsMatrix(path=None)
+        rm.update(self.frames)
+        others = ["S1", "S2", "S3", "S0"]
+        corr, sym = rm.max_correlation("S0", others)
+        expected = {o: rm.correlation("S0", o) for o in others if o != "S0"}
+        self.assertEqual(sym, max(expected, key=expected.get))
+        self.assertEqual(corr, expected[sym])
+
+    def test_ensure_loads_missing_in_one_batch(self):
+        calls = []
+
+        def loader(symbols, period):
+            calls.append(list(symbols))
+            return {s: self.frames[s] for s in symbols}
+
+        rm = ReturnsMatrix(path=None, loader=loader)
+        rm.ensure(["S1", "S2"])
+        rm.ensure(["S1", "S2"])
+        rm.ensure(["s2", "S3"])
+        self.assertEqual(calls, [["S1", "S2"], ["S3"]])
+
+    def test_stale_matrix_loads_only_wanted_on_order_path(self):
+        calls = []
+        universe = {f"U{k}": f for k, f in enumerate(_universe(n_symbols=40).values())}
+        frames = dict(self.frames, **universe)
+
+        def loader(symbols, period):
+            calls.append(sorted(symbols))
+            return {s: frames[s] for s in symbols if s in frames}
+
+        rm = ReturnsMatrix(path=None, loader=loader)
+        rm.update(frames)                                # Scanner-Prefetch
+        rm._symbol_at = dict.fromkeys(rm.symbols, 0.0)   # alles veraltet
+        with mock.patch.object(rm, "refresh_async") as background:
+            rm.ensure(["S1", "S2", "NEW"])
+        self.assertEqual(calls, [["NEW", "S1", "S2"]])
+        background.assert_called_once()
+
+        worker = rm.refresh_async()
+        worker.join(5)
+        self.assertEqual(len(calls[-1]), len(frames) - 2)   # Rest im Hintergrund, ohne S1/S2
+        self.assertEqual(rm.refresh(), 0)
+        self.assertEqual(rm.stats()["background_refreshes"], 1)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "returns.npz")
+            rm = ReturnsMatrix(path=path)
+            rm.update(self.frames)
+            fresh = ReturnsMatrix(path=path, loader=lambda s, p: self.fail("should not download"))
+            fresh.ensure(["S1", "S2"])
+            self.assertIsNone(fresh._refresher)
+            self.assertAlmostEqual(fresh.correlation("S1", "S2"), rm.correlation("S1", "S2"), places=12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Unit Tests for TTLCache Module
+Tests LRU eviction, TTLs, byte budget, single-flight loading and stats
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from ttl_cache import TTLCache, estimate_size
+
+
+class TestTTLCache(unittest.TestCase):
+    """Test bounded LRU + TTL cache"""
+
+    def test_lru_eviction(self):
+        """Least recently used entry is evicted when max_entries is exceeded"""
+        cache = TTLCache(max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.keys(), ["a", "c"])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_per_key_ttl(self):
+        """Per-key TTL overrides the default; per-call TTL limits age further"""
+        cache = TTLCache(default_ttl=60)
+        cache.set("short", 1, ttl_seconds=10)
+        cache.set("long", 2)
+
+        with patch("ttl_cache.time.time", return_value=time.time() + 30):
+            self.assertIsNone(cache.get("short"))
+            self.assertEqual(cache.get("long"), 2)
+            self.assertIsNone(cache.get("long", ttl_seconds=20))
+
+        self.assertEqual(cache.stats()["expirations"], 2)
+        self.assertEqual(len(cache), 0)
+
+    def test_byte_budget(self):
+        """Estimated value size is bounded by max_bytes"""
+        cache = TTLCache(max_bytes=1000)
+        cache.set("a", np.zeros(50))   # 400 bytes
+        cache.set("b", np.zeros(50))
+        cache.set("c", np.zeros(50))
+
+        self.assertEqual(cache.keys(), ["b", "c"])
+        self.assertEqual(cache.stats()["bytes"], 800)
+
+    def test_stats_counters(self):
+        """Hits and misses are counted"""
+        cache = TTLCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_estimate_size(self):
+        """Column containers are sized by their arrays"""
+        from candle_frame import CandleFrame
+
+        frame = CandleFrame.from_bars(
+            np.zeros(10, dtype=[("ts", "i8"), ("open", "f8"), ("high", "f8"),
+                                ("low", "f8"), ("close", "f8"), ("volume", "f8")])
+        )
+        self.assertEqual(estimate_size(frame), 480)
+        self.assertGreater(estimate_size([1.0] * 100), 800)
+
+
+class TestTTLCacheSingleFlight(unittest.TestCase):
+    """Test collapsing of concurrent misses"""
+
+    def test_concurrent_misses_share_one_load(self):
+        """Threads missing the same key trigger exactly one loader call"""
+        cache = TTLCache()
+        calls = []
+        release = threading.Event()
+
+        def loader():
+            calls.append(1)
+            release.wait(2)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 8)
+        self.assertEqual(cache.get("k"), "value")
+        self.assertEqual(cache.stats()["loads"], 1)
+
+    def test_loader_error_not_cached(self):
+        """Loader exceptions propagate and the next call retries"""
+        cache = TTLCache()
+
+        def failing():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            cache.get_or_load("k", failing)
+        self.assertEqual(cache.get_or_load("k", lambda: 42), 42)
+
+    def test_none_not_cached(self):
+        """None results are returned but not stored"""
+        cache = TTLCache()
+        self.assertIsNone(cache.get_or_load("k", lambda: None))
+        self.assertNotIn("k", cache)
+
+    def test_async_single_flight(self):
+        """Concurrent coroutines share one awaited load"""
+        cache = TTLCache()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 7
+
+        async def main():
+            return await asyncio.gather(*(cache.single_flight_async("k", load, store=True) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), [7] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get("k"), 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
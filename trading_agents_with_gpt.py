@@ -28,16 +28,18 @@ from functools import partial
 
 import requests
 import urllib3
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 from DEF_OPTIONS_AGENT import OptionsAgent
 from DEF_NEWS_CLIENT import NewsClient
 from DEF_GPT_AGENTS import safe_call_gpt_agent, run_calls_parallel
-from DEF_INDICATORS import compute_indicators, calculate_symbol_correlation
+from DEF_INDICATORS import compute_indicators
+import feature_frame
 from risk import compute_adaptive_kelly_size, PortfolioMetrics
+import http_client
+from gpt_payload import ANALYSIS_AGENTS, agent_payloads
 import position_monitor as _pm_module
+import returns_matrix
 import sqlite3
 from datetime import datetime, timezone
 
@@ -69,7 +71,6 @@ EXECUTION_MODE = os.getenv("EXECUTION_MODE", "simulate").strip().lower()
 PAPER_EXECUTE = _as_bool(os.getenv("PAPER_EXECUTE", "0"))
 MAX_QTY_CAP = _as_positive_float(os.getenv("MAX_QTY_CAP"))
 HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
-HTTP_RETRY_TOTAL = int(os.getenv("HTTP_RETRY_TOTAL", "3"))
 
 # ============================================================
 # 1. Broker-Config & HTTP-Utils
@@ -103,18 +104,12 @@ def _assert_env(name: str, value: Optional[str]):
 # Warnung für self-signed Zertifikat unterdrücken (IBKR localhost)
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# eine Session mit Retries benutzen → Cookies + resilient HTTP
-session = requests.Session()
-retry_strategy = Retry(
-    total=HTTP_RETRY_TOTAL,
-    backoff_factor=0.4,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["HEAD", "GET", "OPTIONS", "POST"],
+# gepoolte Session aus http_client → Cookies + Keep-Alive; POSTs (Orders) werden
+# nur bei Verbindungsaufbau-Fehlern wiederholt, nie nach 5xx/Timeouts
+session = http_client.get_session(
+    "execution",
+    headers={"User-Agent": "ExecutionAgent/1.0", "Accept": "application/json"},
 )
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session.mount("https://", adapter)
-session.mount("http://", adapter)
-session.headers.update({"User-Agent": "ExecutionAgent/1.0", "Accept": "application/json"})
 
 
 def http_get(url: str, headers: Optional[Dict[str, str]] = None) -> Any:
@@ -496,17 +491,11 @@ class ExecutionAgent:
         if not open_pos:
             return {"action": "ACCEPT", "reason": "No open positions", "max_correlation": 0.0}
 
-        max_corr = 0.0
-        most_correlated = None
-
-        for row in open_pos:
-            open_symbol = row[0]
-            if open_symbol == symbol:
-                continue
-            corr = calculate_symbol_correlation(symbol, open_symbol, period="60d")
-            if corr is not None and corr > max_corr:
-                max_corr = corr
-                most_correlated = open_symbol
+        # ein Batch-Nachladen für fehlende Symbole, danach reiner Lookup in der Returns-Matrix
+        open_symbols = [row[0] for row in open_pos if row[0] != symbol]
+        returns_matrix.engine.ensure([symbol] + open_symbols)
+        corr, most_correlated = returns_matrix.engine.max_correlation(symbol, open_symbols)
+        max_corr = max(corr or 0.0, 0.0)
 
         if max_corr > 0.85:
             return {
@@ -796,9 +785,12 @@ def run_single_symbol_mode(
         timeframe=timeframe,
     )
 
-    # Indikatoren berechnen und in market_data einbetten
+    # Indikatoren berechnen und in market_data einbetten; mit ML-Modell aus demselben
+    # FeatureFrame, den später predict nutzt (ein Indikator-Durchlauf pro Symbol/Timeframe)
     candles = market_data.get("candles") or []
-    indicators = compute_indicators(candles)
+    from DEF_ML_SIGNAL import _engine as _ml_engine
+    features = feature_frame.get(candles) if _ml_engine.is_loaded and len(candles) else None
+    indicators = compute_indicators(candles, symbol=symbol, timeframe=timeframe, features=features)
     market_data["indicators"] = indicators
 
     # Markt-Meta inkl. letztem Schlusskurs + ATR ableiten
@@ -837,17 +829,18 @@ def run_single_symbol_mode(
     ]
     news_output = safe_call_gpt_agent("news_agent", {"symbol": symbol, "recent_news": recent_news})
 
-    # 3) Analyse-Agents (parallel statt sequenziell)
+    # 3) Analyse-Agents (parallel statt sequenziell), kompakte Payload pro Agent
+    payloads = agent_payloads(symbol, market_data, ANALYSIS_AGENTS)
     agent_tasks = [
-        partial(safe_call_gpt_agent, "regime_agent", {"symbol": symbol, "market_data": market_data}),
-        partial(safe_call_gpt_agent, "trend_dow_agent", {"symbol": symbol, "market_data": market_data}),
-        partial(safe_call_gpt_agent, "sr_formations_agent", {"symbol": symbol, "market_data": market_data}),
-        partial(safe_call_gpt_agent, "momentum_agent", {"symbol": symbol, "market_data": market_data}),
-        partial(safe_call_gpt_agent, "volume_oi_agent", {"symbol": symbol, "market_data": market_data}),
-        partial(safe_call_gpt_agent, "candlestick_agent", {"symbol": symbol, "market_data": market_data}),
-        partial(safe_call_gpt_agent, "intermarket_agent", {"symbol": symbol, "market_data": market_data}),
+        partial(safe_call_gpt_agent, "regime_agent", payloads["regime_agent"]),
+        partial(safe_call_gpt_agent, "trend_dow_agent", payloads["trend_dow_agent"]),
+        partial(safe_call_gpt_agent, "sr_formations_agent", payloads["sr_formations_agent"]),
+        partial(safe_call_gpt_agent, "momentum_agent", payloads["momentum_agent"]),
+        partial(safe_call_gpt_agent, "volume_oi_agent", payloads["volume_oi_agent"]),
+        partial(safe_call_gpt_agent, "candlestick_agent", payloads["candlestick_agent"]),
+        partial(safe_call_gpt_agent, "intermarket_agent", payloads["intermarket_agent"]),
     ]
-    agent_results = run_calls_parallel(agent_tasks, max_workers=3, per_call_timeout=30.0)
+    agent_results = run_calls_parallel(agent_tasks, per_call_timeout=30.0)
 
     regime_output = agent_results[0] or {"error": "no_result"}
     trend_output = agent_results[1] or {"error": "no_result"}
@@ -872,9 +865,8 @@ def run_single_symbol_mode(
     synthese_output = safe_call_gpt_agent("synthese_agent", synth_input)
 
     # 5) Signal — ML-Modell, GPT als Fallback
-    from DEF_ML_SIGNAL import _engine as _ml_engine
     if _ml_engine.is_loaded:
-        signal_output = _ml_engine.predict(candles, symbol=symbol)
+        signal_output = _ml_engine.predict(candles, symbol=symbol, features=features)
     else:
         signal_output = safe_call_gpt_agent(
             "signal_scanner_agent",
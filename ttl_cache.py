@@ -0,0 +1,300 @@
+"""
+ttl_cache.py
+
+Thread-sicherer, begrenzter In-Memory-Cache mit LRU-Verdrängung und TTL pro Key.
+
+- Obergrenze per Anzahl Einträge (max_entries) und/oder geschätzter Größe
+  (max_bytes); bei Überschreitung fliegt der am längsten nicht benutzte Eintrag.
+- TTL pro Key (set(..., ttl_seconds)) oder pro Abfrage (get(..., ttl_seconds),
+  kompatibel zum alten data_fetcher.CacheManager). Abgelaufene Einträge werden
+  beim Zugriff und beim Schreiben entfernt.
+- get_or_load(): gleichzeitige Misses für denselben Key laufen in EINEN Loader-
+  Aufruf zusammen (single-flight); die anderen Threads warten auf dessen Ergebnis.
+- stats(): Hits, Misses, Evictions, Expirations, Loads für Status-Endpunkte.
+
+Nutzer:
+  - data_fetcher.CacheManager / DataFetcher.get_cache_status
+  - feature_frame (FeatureFrame pro Candle-Serie)
+  - gpt_cache (Speicher-Ebene + single-flight vor der SQLite-Tabelle)
+  - universe_manager.UniverseManager._cache
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+_MISSING = object()
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Grobe Größenschätzung in Bytes (NumPy/CandleFrame/DataFrame exakt, Container flach rekursiv)."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    # Spalten-Container mit __slots__ (CandleFrame): Summe der Array-Größen
+    arrays = [getattr(value, s, None) for s in getattr(type(value), "__slots__", ())]
+    if any(hasattr(a, "nbytes") for a in arrays):
+        return sum(a.nbytes for a in arrays if hasattr(a, "nbytes"))
+
+    size = sys.getsizeof(value)
+    if _depth >= 2:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, _depth + 1) for v in value)
+    elif hasattr(value, "__dict__"):
+        size += sys.getsizeof(value.__dict__)
+    return size
+
+
+class TTLCache:
+    """
+    LRU + TTL Cache.
+
+    max_entries:  maximale Anzahl Einträge (None = unbegrenzt)
+    max_bytes:    Budget für die geschätzte Größe aller Werte (None = unbegrenzt)
+    default_ttl:  TTL in Sekunden für set() ohne eigene TTL (None = kein Ablauf)
+    sizeof:       Größenschätzung für max_bytes (Default: estimate_size)
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        default_ttl: Optional[float] = None,
+        name: str = "cache",
+        sizeof: Callable[[Any], int] = estimate_size,
+    ) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._sizeof = sizeof
+        # key -> (value, gespeichert_um, ttl, bytes); Reihenfolge = LRU (vorne = ältester)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._inflight_async: Dict[Tuple[int, Hashable], "asyncio.Future[Any]"] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._loads = 0
+        self._shared_loads = 0
+
+    # ── Basis-Operationen ─────────────────────────────────────────────────────
+
+    def _lookup(self, key: Hashable, ttl_seconds: Optional[float]) -> Any:
+        """Wert oder _MISSING; zählt Hit/Miss, entfernt Abgelaufenes. Lock muss gehalten werden."""
+        entry = self._data.get(key)
+        if entry is None:
+            self._misses += 1
+            return _MISSING
+
+        value, stored_at, ttl, _ = entry
+        age = time.time() - stored_at
+        if (ttl is not None and age > ttl) or (ttl_seconds is not None and age > ttl_seconds):
+            self._remove(key)
+            self._expirations += 1
+            self._misses += 1
+            return _MISSING
+
+        self._data.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def get(self, key: Hashable, ttl_seconds: Optional[float] = None) -> Optional[Any]:
+        """Wert oder None. ttl_seconds begrenzt zusätzlich das erlaubte Alter dieses Zugriffs."""
+        with self._lock:
+            value = self._lookup(key, ttl_seconds)
+        return None if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Speichert value; ttl_seconds überschreibt default_ttl für diesen Key."""
+        ttl = self.default_ttl if ttl_seconds is None else ttl_seconds
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.time(), ttl, size)
+            self._bytes += size
+            self._enforce_limits()
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._data.keys())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Key vorhanden und nicht abgelaufen (zählt nicht in die Statistik)."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[2] is None or time.time() - entry[1] <= entry[2])
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def _enforce_limits(self) -> None:
+        """Erst Abgelaufenes entfernen, dann LRU verdrängen bis Anzahl/Bytes passen."""
+        if not self._over_limit():
+            return
+        now = time.time()
+        for key, (_, stored_at, ttl, _) in list(self._data.items()):
+            if ttl is not None and now - stored_at > ttl:
+                self._remove(key)
+                self._expirations += 1
+        while self._data and self._over_limit():
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def _over_limit(self) -> bool:
+        if self.max_entries is not None and len(self._data) > self.max_entries:
+            return True
+        # ein einzelner Eintrag über dem Budget bleibt trotzdem stehen
+        return self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1
+
+    # ── Single-Flight ─────────────────────────────────────────────────────────
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl_seconds: Optional[float] = None,
+    ) -> Any:
+        """
+        Cache-Hit oder loader(). Gleichzeitige Misses für denselben Key warten auf
+        den einen laufenden loader()-Aufruf. Ergebnisse != None werden gespeichert,
+        Exceptions an alle Wartenden weitergereicht (nicht gecacht).
+        """
+        return self.single_flight(key, loader, store=True, ttl_seconds=ttl_seconds)
+
+    def single_flight(
+        self,
+        key: Hashable,
+        fn: Callable[[], Any],
+        store: bool = False,
+        ttl_seconds: Optional[float] = None,
+    ) -> Any:
+        """
+        Führt fn() für gleichzeitige Aufrufer mit demselben Key nur einmal aus.
+        store=True: vorher im Cache nachsehen und das Ergebnis (falls nicht None) speichern.
+        store=False: fn() kümmert sich selbst um set() (z.B. nur nicht-leere Ergebnisse).
+        """
+        with self._lock:
+            if store:
+                value = self._lookup(key, None)
+                if value is not _MISSING:
+                    return value
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+                self._loads += 1
+            else:
+                self._shared_loads += 1
+
+        if not leader:
+            return pending.result()
+
+        try:
+            value = fn()
+            if store and value is not None:
+                self.set(key, value, ttl_seconds)
+            pending.set_result(value)
+            return value
+        except BaseException as exc:
+            pending.set_exception(exc)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def single_flight_async(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        store: bool = False,
+        ttl_seconds: Optional[float] = None,
+    ) -> Any:
+        """Wie single_flight, für Coroutinen desselben Event-Loops (blockiert den Loop nie)."""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            if store:
+                value = self._lookup(key, None)
+                if value is not _MISSING:
+                    return value
+            pending = self._inflight_async.get(flight_key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight_async[flight_key] = loop.create_future()
+                self._loads += 1
+            else:
+                self._shared_loads += 1
+
+        if not leader:
+            return await asyncio.shield(pending)
+
+        try:
+            value = await fn()
+            if store and value is not None:
+                self.set(key, value, ttl_seconds)
+            pending.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except BaseException as exc:
+            pending.set_exception(exc)
+            # niemand wartet → "exception was never retrieved" vermeiden
+            pending.exception()
+            raise
+        finally:
+            with self._lock:
+                self._inflight_async.pop(flight_key, None)
+
+    # ── Status ────────────────────────────────────────────────────────────────
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "bytes": self._bytes if self.max_bytes is not None else None,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "loads": self._loads,
+                "shared_loads": self._shared_loads,
+            }
@@ -3,8 +3,14 @@
 from __future__ import annotations
 from pathlib import Path
 import json
+import os
 from typing import List, Dict, Set, Optional
 
+from ttl_cache import TTLCache
+
+# Universen neu von der Platte lesen, falls universe_loader sie aktualisiert hat
+UNIVERSE_CACHE_TTL = float(os.getenv("UNIVERSE_CACHE_TTL_SECONDS", "3600"))
+
 
 class UniverseNotFoundError(FileNotFoundError):
     """Fehler, wenn ein Universum nicht existiert."""
@@ -67,8 +73,8 @@ class UniverseManager:
                 f"Universe-Ordner nicht gefunden: {self.universe_dir}"
             )
 
-        # Cache: name -> Liste von Symbolen
-        self._cache: Dict[str, List[str]] = {}
+        # Cache: name -> Liste von Symbolen (thread-safe, parallele Loads laufen zusammen)
+        self._cache = TTLCache(max_entries=64, default_ttl=UNIVERSE_CACHE_TTL, name="universes")
 
     # ---------- interne Helfer ----------
 
@@ -101,10 +107,9 @@ class UniverseManager:
         Nutzt Caching, um Mehrfach-Zugriffe zu beschleunigen.
         """
         normalized = self._normalize_name(name)
+        return self._cache.get_or_load(normalized, lambda: self._read_universe(name, normalized))
 
-        if normalized in self._cache:
-            return self._cache[normalized]
-
+    def _read_universe(self, name: str, normalized: str) -> List[str]:
         path = self._file_for_universe(normalized)
         if not path.exists():
             raise UniverseNotFoundError(
@@ -121,9 +126,7 @@ class UniverseManager:
                 f"Universe-Datei '{path}' muss eine JSON-Liste von Strings enthalten."
             )
 
-        symbols = sorted(set(x.strip().upper() for x in data if x.strip()))
-        self._cache[normalized] = symbols
-        return symbols
+        return sorted(set(x.strip().upper() for x in data if x.strip()))
 
     def combine_universes(self, names: List[str]) -> List[str]:
         """